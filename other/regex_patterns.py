@@ -42,7 +42,7 @@ BEVERAGE_PATTERN: Final = (
 
 FOOD_PATTERN: Final = (
     r'\b(egg and cheese croissant|egg and cheese|bacon egg and cheese|fruit|yogurt|'
-    r'oatmeal|egg and cheese on croissant||hash brown'
+    r'oatmeal|egg and cheese on croissant|hash brown|'
     r'grilled cheese|egg and cheese on english muffin|plain bagel|'
     r'everything bagel|sesame bagel|asiago bagel)s?\b'
 )
@@ -84,3 +84,10 @@ SPLIT_PATTERN: Final = (
     r'(?!\s+(\w+\s+){0,1}(?:' + SPLIT_EXCEPTION_PATTERN + r'))'
     r'(?!\s+(?:' + TEMPERATURE_PATTERN + r'))'
 )
+
+QUESTION_PATTERN: Final = r'\b(do you|how many|how much|does|what are)\b'
+
+MODIFICATION_PATTERN: Final = (
+    r"\b(actually remove|actually change|dont want|don't want|"
+    r"remove|change|swap|adjust|modify|take|away|replace|minus|deduct)\b"
+)
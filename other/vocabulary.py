@@ -0,0 +1,78 @@
+"""
+helpers to turn the regex patterns into plain vocabularies, for example:
+    COFFEE_PATTERN -> ["coffee", "black coffee", "cappuccino", ...]
+"""
+from typing import Final
+from other.regex_patterns import (
+    COFFEE_PATTERN, BEVERAGE_PATTERN, FOOD_PATTERN, BAKERY_PATTERN, ADD_ONS_PATTERN,
+    SWEETENER_PATTERN, MILK_PATTERN
+)
+
+ITEM_PATTERNS: Final = {
+    "coffee": COFFEE_PATTERN,
+    "beverage": BEVERAGE_PATTERN,
+    "food": FOOD_PATTERN,
+    "bakery": BAKERY_PATTERN,
+    "add_ons": ADD_ONS_PATTERN,
+    "sweeteners": SWEETENER_PATTERN,
+    "milk_type": MILK_PATTERN
+}
+
+
+def split_alternatives(
+        pattern: str
+) -> list[str]:
+    """
+    This function returns every alternative of the first capturing group of a pattern, including
+    empty alternatives and ones that still contain regex syntax.
+    @param pattern: regex pattern ex. r'\\b(small|medium||large)\\b'
+    @rtype: list[str]
+    @return: alternatives of the pattern ex. ["small", "medium", "", "large"]
+    """
+    start = 0
+    while True:
+        start = pattern.index('(', start)
+        if not pattern.startswith('(?', start):
+            break
+        start += 1
+
+    depth, alternatives, current = 0, [], ""
+    for char in pattern[start + 1:]:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            if depth == 0:
+                break
+            depth -= 1
+        elif char == '|' and depth == 0:
+            alternatives.append(current)
+            current = ""
+            continue
+        current += char
+    alternatives.append(current)
+
+    return [alternative.strip() for alternative in alternatives]
+
+
+def pattern_alternatives(
+        pattern: str
+) -> list[str]:
+    """
+    This function returns the plain word alternatives of the first capturing group of a pattern.
+    @param pattern: regex pattern ex. r'\\b(small|medium|large|extra large)\\b'
+    @rtype: list[str]
+    @return: plain words of the pattern ex. ["small", "medium", "large", "extra large"]
+    """
+    return [alternative for alternative in split_alternatives(pattern)
+            if alternative and '\\' not in alternative]
+
+
+def item_vocabulary(
+
+) -> dict[str, list[str]]:
+    """
+    This function returns the alternatives of every pattern that names something on the menu.
+    @rtype: dict[str, list[str]]
+    @return: alternatives keyed by the order detail they are parsed into ex. {"coffee": ["coffee", ...]}
+    """
+    return {kind: pattern_alternatives(pattern) for kind, pattern in ITEM_PATTERNS.items()}
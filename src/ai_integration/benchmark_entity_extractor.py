@@ -0,0 +1,144 @@
+"""
+This module contains the function `benchmark_entity_extractor` which parses the same transcriptions with
+one `re.findall` per pattern, the way `Order` used to, and with the single scan of the EntityExtractor.
+It reports the throughput of both, the p50/p99 latency per transcription and how many transcriptions
+were parsed identically:
+    python -m src.ai_integration.benchmark_entity_extractor
+"""
+import re
+import time
+import random
+import logging
+import numpy as np
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.entity_extractor import EntityExtractor, ENTITY_PATTERNS
+from other.vocabulary import pattern_alternatives
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+ORDERS = [
+    "two large cappuccinos with two sugars and two pumps of caramel then also two iced banana teas and "
+    "finally add a glazed donuts and four blueberry muffins",
+    "can i get a medium iced latte with oat milk and a shot of espresso plus an everything bagel",
+    "actually remove the hot chocolate and change the black coffee to a large with whole milk",
+    "how many glazed donuts do you have and does the blueberry muffin have any milk or eggs",
+]
+
+
+def regex_parse(
+        text: str
+) -> dict[str, list[str]]:
+    """
+    This function parses an order with one regex per pattern.
+    @param text: casefolded order
+    @rtype: dict[str, list[str]]
+    @return: matches of every pattern, the first group of patterns with several groups
+    """
+    entities = {}
+    for label, (pattern, _) in ENTITY_PATTERNS.items():
+        matches = [match for match in re.findall(pattern, text) if match]
+        entities[label] = [match[0] if isinstance(match, tuple) else match for match in matches]
+
+    return entities
+
+
+def transcriptions(
+        count: int, items: int = 12, seed: int = 0
+) -> list[str]:
+    """
+    This function makes long multi item transcriptions out of the example orders and the pattern
+    vocabularies.
+    @param count: number of transcriptions
+    @param items: number of items per transcription
+    @param seed: seed of the random generator
+    @rtype: list[str]
+    @return: casefolded transcriptions
+    """
+    generator = random.Random(seed)
+    words = [word for pattern, _ in ENTITY_PATTERNS.values() for word in pattern_alternatives(pattern)]
+    fillers = ["and", "with", "also", "then", "please", "a", "the", "of", "some"]
+
+    orders = []
+    for _ in range(count):
+        parts = [generator.choice(ORDERS)]
+        for _ in range(items):
+            parts.append(f"{generator.choice(fillers)} {generator.choice(words)}")
+        orders.append(" ".join(parts))
+
+    return orders
+
+
+def time_parser(
+        parser, orders: list[str], repeat: int
+) -> tuple[list[dict], list[float]]:
+    """
+    This function parses every order `repeat` times.
+    @param parser: function from an order to its entities
+    @param orders: casefolded orders
+    @param repeat: number of times every order is parsed
+    @rtype: tuple[list[dict], list[float]]
+    @return: entities of every order and the fastest latency of every order in microseconds
+    """
+    results, latencies = [], []
+    for order in orders:
+        fastest = float("inf")
+        for _ in range(repeat):
+            parse_time = time.perf_counter()
+            result = parser(order)
+            fastest = min(fastest, time.perf_counter() - parse_time)
+        results.append(result)
+        latencies.append(fastest * 1_000_000)
+
+    return results, latencies
+
+
+def benchmark_entity_extractor(
+        orders: list[str], repeat: int = 5
+) -> list[dict]:
+    """
+    This function measures both parsers on the same orders.
+    @param orders: casefolded orders
+    @param repeat: number of times every order is parsed, the fastest run is kept
+    @rtype: list[dict]
+    @return: one report per parser ex. [{"parser": "trie", "orders_per_s": 9000.0, "p50_us": 110.0,
+     "p99_us": 150.0, "identical": 1.0}]
+    """
+    extractor = EntityExtractor.instance()
+    expected, _ = time_parser(regex_parse, orders, 1)
+
+    reports = []
+    for name, parser in (("regex", regex_parse), ("trie", extractor.parse)):
+        results, latencies = time_parser(parser, orders, repeat)
+        reports.append({
+            "parser": name,
+            "orders_per_s": len(orders) / (sum(latencies) / 1_000_000),
+            "p50_us": float(np.percentile(latencies, 50)),
+            "p99_us": float(np.percentile(latencies, 99)),
+            "identical": sum(result == regex for result, regex in zip(results, expected)) / len(orders)
+        })
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    orders = transcriptions(500)
+    reports = benchmark_entity_extractor(orders)
+
+    print(f"{len(orders)} transcriptions, {sum(len(order) for order in orders) / len(orders):.0f} characters each")
+    print(f"{'parser':<10}{'orders/s':>12}{'p50 us':>10}{'p99 us':>10}{'identical':>11}")
+    for report in reports:
+        print(f"{report['parser']:<10}{report['orders_per_s']:>12.0f}{report['p50_us']:>10.1f}"
+              f"{report['p99_us']:>10.1f}{report['identical']:>11.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,125 @@
+"""
+This module contains the function `benchmark_ner_runtimes` which tags the held out sentences of
+`other/datasets/ner_dataset.csv` with the PyTorch model and its float32 and int8 ONNX exports. It reports
+the share of words tagged like the dataset, the share tagged like the PyTorch model and the p50/p99
+latency of one sentence. `fine_tune_ner_bert` splits the words, not the sentences, so the held out
+sentences were partly seen in training and compare the runtimes more than they measure generalization:
+    python -m src.ai_integration.benchmark_ner_onnx
+"""
+import time
+import logging
+from os import path
+from io import StringIO
+from typing import Any
+import numpy as np
+from simpletransformers.ner import NERModel
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.ner_tagger import split_sentences
+from src.ai_integration.ner_onnx import OnnxNERModel, export_ner_model, NER_MODEL_PATH, NER_ONNX_PATH, ONNX_FILE
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+def held_out_sentences(
+        fraction: float = 0.2, seed: int = 0, csv_file: StringIO = None
+) -> list[tuple[list[str], list[str]]]:
+    """
+    This function returns a random share of the tagged sentences of the dataset.
+    @param fraction: share of the sentences
+    @param seed: seed of the random generator
+    @param csv_file: dataset, defaults to `other/datasets/ner_dataset.csv`
+    @rtype: list[tuple[list[str], list[str]]]
+    @return: words and labels of every sentence ex. [(["a", "latte"], ["B-QUANTITY", "B-COFFEE-TYPE"])]
+    """
+    _, held_out = split_sentences(fraction, seed, csv_file)
+
+    return held_out
+
+
+def word_accuracy(
+        predictions: list[list[str]], expected: list[list[str]]
+) -> float:
+    """
+    This function returns the share of words which got the expected label.
+    @param predictions: labels of the words of every sentence
+    @param expected: labels the words should have
+    @rtype: float
+    @return: ex. 0.97
+    """
+    pairs = [(label, expected_label) for labels, expected_labels in zip(predictions, expected)
+             for label, expected_label in zip(labels, expected_labels)]
+
+    return sum(label == expected_label for label, expected_label in pairs) / len(pairs) if pairs else 0.0
+
+
+def benchmark_ner_runtimes(
+        models: dict[str, Any], sentences: list[tuple[list[str], list[str]]], repeat: int = 3
+) -> list[dict]:
+    """
+    This function tags every sentence alone, the way `ner_transformer` does, with every model. The first
+    model is the reference the others are compared to.
+    @param models: name -> model with a simpletransformers `predict` ex. {"pytorch": NERModel(...)}
+    @param sentences: output of held_out_sentences
+    @param repeat: number of times every sentence is tagged, the fastest run is kept
+    @rtype: list[dict]
+    @return: one report per model ex. [{"runtime": "onnx-int8", "accuracy": 0.95, "agreement": 0.99,
+     "sentences_per_s": 180.0, "p50_ms": 5.1, "p99_ms": 9.8}]
+    """
+    expected = [labels for _, labels in sentences]
+
+    reports, reference = [], None
+    for name, model in models.items():
+        predictions, latencies = [], []
+        for words, _ in sentences:
+            fastest = float("inf")
+            for _ in range(repeat):
+                predict_time = time.perf_counter()
+                prediction = model.predict([" ".join(words)])[0][0]
+                fastest = min(fastest, time.perf_counter() - predict_time)
+            predictions.append([label for word in prediction for label in word.values()])
+            latencies.append(fastest * 1000)
+        reference = reference if reference else predictions
+
+        reports.append({
+            "runtime": name,
+            "accuracy": word_accuracy(predictions, expected),
+            "agreement": word_accuracy(predictions, reference),
+            "sentences_per_s": len(sentences) / (sum(latencies) / 1000),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99))
+        })
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    if not path.exists(path.join(NER_ONNX_PATH, ONNX_FILE)):
+        export_ner_model()
+
+    models = {
+        "pytorch": NERModel('bert', NER_MODEL_PATH, use_cuda=False,
+                            args={"silent": True, "use_multiprocessing_for_evaluation": False}),
+        "onnx-fp32": OnnxNERModel(quantized=False),
+        "onnx-int8": OnnxNERModel(),
+    }
+    sentences = held_out_sentences()
+    reports = benchmark_ner_runtimes(models, sentences)
+
+    print(f"{len(sentences)} held out sentences")
+    print(f"{'runtime':<11}{'accuracy':>10}{'agreement':>11}{'sentences/s':>13}{'p50 ms':>9}{'p99 ms':>9}")
+    for report in reports:
+        print(f"{report['runtime']:<11}{report['accuracy']:>10.3f}{report['agreement']:>11.3f}"
+              f"{report['sentences_per_s']:>13.1f}{report['p50_ms']:>9.2f}{report['p99_ms']:>9.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,95 @@
+"""
+This module contains the function `benchmark_ner_tagger` which trains the NERTagger on the sentences of
+`other/datasets/ner_dataset.csv` which aren't held out, and tags the held out ones with it and with the
+fine-tuned BERT model. It reports the entity F1 against the dataset and against the first model, and the
+tokens per second and p50/p99 latency of one sentence. When the BERT model is there a second tagger is
+distilled from the labels BERT gives the training sentences:
+    python -m src.ai_integration.benchmark_ner_tagger
+"""
+import time
+import logging
+from os import path
+from typing import Any
+import numpy as np
+from seqeval.metrics import f1_score
+from simpletransformers.ner import NERModel
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.ner_onnx import NER_MODEL_PATH
+from src.ai_integration.ner_tagger import split_sentences, train_tagger, teacher_labels
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+def benchmark_ner_tagger(
+        models: dict[str, Any], sentences: list[tuple[list[str], list[str]]], repeat: int = 3
+) -> list[dict]:
+    """
+    This function tags every sentence alone, the way `ner_transformer` does, with every model. The first
+    model is the reference the others are compared to.
+    @param models: name -> model with a simpletransformers `predict` ex. {"bert": NERModel(...)}
+    @param sentences: held out words and labels of every sentence
+    @param repeat: number of times every sentence is tagged, the fastest run is kept
+    @rtype: list[dict]
+    @return: one report per model ex. [{"model": "tagger", "f1": 0.78, "f1_vs_reference": 0.9,
+     "tokens_per_s": 25000.0, "p50_us": 300.0, "p99_us": 900.0}]
+    """
+    expected = [labels for _, labels in sentences]
+    tokens = sum(len(words) for words, _ in sentences)
+
+    reports, reference = [], None
+    for name, model in models.items():
+        predictions, latencies = [], []
+        for words, _ in sentences:
+            fastest = float("inf")
+            for _ in range(repeat):
+                predict_time = time.perf_counter()
+                prediction = model.predict([" ".join(words)])[0][0]
+                fastest = min(fastest, time.perf_counter() - predict_time)
+            predictions.append([label for word in prediction for label in word.values()])
+            latencies.append(fastest * 1_000_000)
+        reference = reference if reference else predictions
+
+        reports.append({
+            "model": name,
+            "f1": float(f1_score(expected, predictions)),
+            "f1_vs_reference": float(f1_score(reference, predictions)),
+            "tokens_per_s": tokens / (sum(latencies) / 1_000_000),
+            "p50_us": float(np.percentile(latencies, 50)),
+            "p99_us": float(np.percentile(latencies, 99))
+        })
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    training, held_out = split_sentences()
+
+    models = {}
+    if path.exists(path.join(NER_MODEL_PATH, "config.json")):
+        models["bert"] = NERModel('bert', NER_MODEL_PATH, use_cuda=False,
+                                  args={"silent": True, "use_multiprocessing_for_evaluation": False})
+    models["tagger"] = train_tagger(training)
+    if "bert" in models:
+        models["tagger-distilled"] = train_tagger(teacher_labels(training, models["bert"]))
+
+    reports = benchmark_ner_tagger(models, held_out)
+
+    print(f"{len(training)} training and {len(held_out)} held out sentences, "
+          f"{models['tagger'].parameters()} tagger weights")
+    print(f"{'model':<18}{'f1':>7}{'f1 vs ' + next(iter(models)):>16}{'tokens/s':>11}{'p50 us':>10}{'p99 us':>10}")
+    for report in reports:
+        print(f"{report['model']:<18}{report['f1']:>7.3f}{report['f1_vs_reference']:>16.3f}"
+              f"{report['tokens_per_s']:>11.0f}{report['p50_us']:>10.1f}{report['p99_us']:>10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,135 @@
+"""
+This module contains the function `benchmark_quantity_aligner` which gives quantities to the items of the
+same split orders the way `Order` used to, with the `correct_*_order_quantities` functions, and the way it
+does now, with `verify_quantities`. It reports the throughput of both, the p50/p99 latency per order and
+how many orders got identical quantities, orders with quantities of several words ex. "twenty two" and
+items whose name starts with a flavor ex. "mango tea" are expected to differ:
+    python -m src.ai_integration.benchmark_quantity_aligner
+"""
+import time
+import logging
+import numpy as np
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.entity_extractor import EntityExtractor
+from src.ai_integration.quantity_aligner import verify_quantities, ITEM_LABELS
+from src.ai_integration.transcription_splitter import split_on_separators
+from src.ai_integration.benchmark_entity_extractor import transcriptions
+from other.quantity_correction import (
+    correct_coffee_order_quantities, correct_beverage_order_quantities, correct_food_order_quantities,
+    correct_bakery_order_quantities
+)
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+CORRECTIONS = {
+    "coffee": correct_coffee_order_quantities,
+    "beverage": correct_beverage_order_quantities,
+    "food": correct_food_order_quantities,
+    "bakery": correct_bakery_order_quantities,
+}
+
+
+def split_orders(
+        count: int, seed: int = 0
+) -> list[tuple[str, str, dict]]:
+    """
+    This function splits generated transcriptions into orders and parses them the way `Order` does.
+    @param count: number of transcriptions
+    @param seed: seed of the random generator
+    @rtype: list[tuple[str, str, dict]]
+    @return: order, order type and entities of every split order which has an item
+    """
+    extractor = EntityExtractor.instance()
+
+    orders = []
+    for transcription in transcriptions(count, seed=seed):
+        for order in split_on_separators(transcription):
+            order = order.strip()
+            entities = extractor.parse(order)
+            order_type = next((label for label in CORRECTIONS if entities[label]), None)
+            if order_type:
+                orders.append((order, order_type, entities))
+
+    return orders
+
+
+def legacy_quantities(
+        order: str, order_type: str, entities: dict
+) -> list[str]:
+    """
+    This function returns the quantities of an order the way `Order` did before the QuantityAligner.
+    @param order: casefolded order
+    @param order_type: coffee, beverage, food or bakery
+    @param entities: entities of the order
+    @rtype: list[str]
+    @return: ex. ["one", "a"]
+    """
+    num_additions = sum(len(entities[label]) for label in ITEM_LABELS[order_type][1:])
+    if num_additions or not entities["quantities"]:
+        return CORRECTIONS[order_type](entities, order)
+
+    return entities["quantities"]
+
+
+def benchmark_quantity_aligner(
+        orders: list[tuple[str, str, dict]], repeat: int = 5
+) -> list[dict]:
+    """
+    This function measures both ways of giving quantities on the same orders.
+    @param orders: output of split_orders
+    @param repeat: number of times every order is aligned, the fastest run is kept
+    @rtype: list[dict]
+    @return: one report per aligner ex. [{"aligner": "scan", "orders_per_s": 50000.0, "p50_us": 18.0,
+     "p99_us": 60.0, "identical": 0.99}]
+    """
+    aligners = {
+        "regex": legacy_quantities,
+        "scan": verify_quantities,
+    }
+    expected = [aligners["regex"](*order) for order in orders]
+
+    reports = []
+    for name, aligner in aligners.items():
+        results, latencies = [], []
+        for order in orders:
+            fastest = float("inf")
+            for _ in range(repeat):
+                align_time = time.perf_counter()
+                result = aligner(*order)
+                fastest = min(fastest, time.perf_counter() - align_time)
+            results.append(result)
+            latencies.append(fastest * 1_000_000)
+
+        reports.append({
+            "aligner": name,
+            "orders_per_s": len(orders) / (sum(latencies) / 1_000_000),
+            "p50_us": float(np.percentile(latencies, 50)),
+            "p99_us": float(np.percentile(latencies, 99)),
+            "identical": sum(result == regex for result, regex in zip(results, expected)) / len(orders)
+        })
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    orders = split_orders(300)
+    reports = benchmark_quantity_aligner(orders)
+
+    print(f"{len(orders)} split orders, {sum(len(order) for order, _, _ in orders) / len(orders):.0f} characters each")
+    print(f"{'aligner':<10}{'orders/s':>12}{'p50 us':>10}{'p99 us':>10}{'identical':>11}")
+    for report in reports:
+        print(f"{report['aligner']:<10}{report['orders_per_s']:>12.0f}{report['p50_us']:>10.1f}"
+              f"{report['p99_us']:>10.1f}{report['identical']:>11.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,116 @@
+"""
+This module contains the function `benchmark_transcription_splitter` which splits adversarial
+transcriptions of growing length with SPLIT_PATTERN and with `split_on_separators`. It reports the
+time of both per transcription and per character, a per character time which stays flat as the
+transcriptions grow means the splitter is linear, and whether both split the same way:
+    python -m src.ai_integration.benchmark_transcription_splitter
+"""
+import re
+import time
+import logging
+from typing import Final
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.transcription_splitter import split_on_separators, SEPARATORS
+from other.regex_patterns import SPLIT_PATTERN
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# name -> transcription of about `length` characters
+ADVERSARIAL: Final = {
+    # every backtracking step of the whitespace retries every exception pattern
+    "long pause": lambda length: "a latte and" + " " * length + "a glazed donut",
+    "pause after word": lambda length: "a latte and " + "uh" + " " * length + "a glazed donut",
+    "long word": lambda length: "a latte and " + "m" * length + " a glazed donut",
+    "only separators": lambda length: "and " * (length // 4),
+    "rambling": lambda length: ("and um also plus get " * (length // 21 + 1))[:length],
+    "near misses": lambda length: ("a latte and pumps of caramels and white raspberries plus hot vanillas "
+                                   * (length // 70 + 1))[:length],
+    "multi item": lambda length: ("two large cappuccinos with two sugars and two pumps of caramel then also "
+                                  "two iced banana teas and a glazed donut " * (length // 113 + 1))[:length],
+}
+
+
+def regex_split(
+        text: str
+) -> list[str]:
+    """
+    This function splits a transcription with SPLIT_PATTERN the way split_transcription used to.
+    @param text: transcription
+    @rtype: list[str]
+    @return: parts of the transcription without the separators
+    """
+    return [part for part in re.split(SPLIT_PATTERN, text) if part and part not in SEPARATORS]
+
+
+def fastest(
+        splitter, text: str, repeat: int
+) -> tuple[list[str], float]:
+    """
+    This function splits the transcription `repeat` times.
+    @param splitter: function from a transcription to its parts
+    @param text: transcription
+    @param repeat: number of runs
+    @rtype: tuple[list[str], float]
+    @return: parts and the fastest run in milliseconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        split_time = time.perf_counter()
+        parts = splitter(text)
+        best = min(best, time.perf_counter() - split_time)
+
+    return parts, best * 1000
+
+
+def benchmark_transcription_splitter(
+        lengths: list[int], repeat: int = 3
+) -> list[dict]:
+    """
+    This function measures both splitters on every adversarial transcription at every length.
+    @param lengths: lengths of the transcriptions in characters
+    @param repeat: number of runs, the fastest is kept
+    @rtype: list[dict]
+    @return: one report per transcription ex. [{"case": "long pause", "length": 10000, "regex_ms": 6.1,
+     "linear_ms": 0.1, "regex_us_per_char": 0.61, "linear_us_per_char": 0.01, "identical": True}]
+    """
+    reports = []
+    for case, transcription in ADVERSARIAL.items():
+        for length in lengths:
+            text = transcription(length)
+            expected, regex_ms = fastest(regex_split, text, repeat)
+            parts, linear_ms = fastest(split_on_separators, text, repeat)
+            reports.append({
+                "case": case,
+                "length": len(text),
+                "regex_ms": regex_ms,
+                "linear_ms": linear_ms,
+                "regex_us_per_char": regex_ms * 1000 / len(text),
+                "linear_us_per_char": linear_ms * 1000 / len(text),
+                "identical": parts == expected
+            })
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    reports = benchmark_transcription_splitter([1_000, 10_000, 100_000])
+
+    print(f"{'case':<18}{'length':>9}{'regex ms':>11}{'linear ms':>11}{'regex us/char':>15}"
+          f"{'linear us/char':>16}{'identical':>11}")
+    for report in reports:
+        print(f"{report['case']:<18}{report['length']:>9}{report['regex_ms']:>11.2f}{report['linear_ms']:>11.2f}"
+              f"{report['regex_us_per_char']:>15.3f}{report['linear_us_per_char']:>16.3f}"
+              f"{str(report['identical']):>11}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
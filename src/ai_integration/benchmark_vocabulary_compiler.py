@@ -0,0 +1,98 @@
+"""
+This module contains the function `benchmark_vocabulary_compiler` which compiles the menu with a growing
+number of made up SKUs, as if stores added their own items, and parses the same transcriptions with every
+compiled extractor. It reports the compile time and the p50/p99 latency per transcription, a latency which
+stays flat as the SKUs grow means parsing doesn't slow down with the menu:
+    python -m src.ai_integration.benchmark_vocabulary_compiler
+"""
+import time
+import random
+import logging
+import numpy as np
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.entity_extractor import EntityExtractor
+from src.ai_integration.vocabulary_compiler import compile_patterns
+from src.ai_integration.embeddings_api import parse_menu_csv, parse_deals_csv
+from src.ai_integration.benchmark_entity_extractor import transcriptions, time_parser
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+SYLLABLES = ["ba", "ko", "ri", "zu", "me", "ta", "lo", "ne", "si", "vu", "da", "pe"]
+# last words the compiler classifies the made up SKUs by
+NOUNS = ["latte", "smoothie", "bagel", "donut", "muffin", "tea", "croissant", "milk"]
+
+
+def made_up_skus(
+        count: int, seed: int = 0
+) -> list[str]:
+    """
+    This function makes distinct item names ending with a word of the menu.
+    @param count: number of names
+    @param seed: seed of the random generator
+    @rtype: list[str]
+    @return: ex. ["bakorime latte", "zumetaba donut"]
+    """
+    generator = random.Random(seed)
+
+    names = set()
+    while len(names) < count:
+        name = "".join(generator.choices(SYLLABLES, k=4))
+        names.add(f"{name} {generator.choice(NOUNS)}")
+
+    return sorted(names)
+
+
+def benchmark_vocabulary_compiler(
+        sku_counts: list[int], orders: list[str], repeat: int = 3
+) -> list[dict]:
+    """
+    This function compiles the menu with every number of made up SKUs and parses the orders.
+    @param sku_counts: number of SKUs added to the menu ex. [0, 1000, 10000]
+    @param orders: casefolded orders
+    @param repeat: number of times every order is parsed, the fastest run is kept
+    @rtype: list[dict]
+    @return: one report per number of SKUs ex. [{"skus": 1000, "alternatives": 1240, "compile_ms": 40.0,
+     "p50_us": 90.0, "p99_us": 160.0}]
+    """
+    menu_names = [item["MenuItem"]["item_name"] for item in parse_menu_csv()]
+    deals = [(deal["Deal"]["item_name"], deal["Deal"]["item_type"]) for deal in parse_deals_csv()]
+
+    reports = []
+    for count in sku_counts:
+        compile_time = time.perf_counter()
+        patterns, _ = compile_patterns(menu_names + made_up_skus(count), deals)
+        extractor = EntityExtractor(patterns)
+        compile_ms = (time.perf_counter() - compile_time) * 1000
+
+        _, latencies = time_parser(extractor.parse, orders, repeat)
+        reports.append({
+            "skus": count,
+            "alternatives": sum(pattern.count("|") + 1 for pattern, _ in patterns.values()),
+            "compile_ms": compile_ms,
+            "p50_us": float(np.percentile(latencies, 50)),
+            "p99_us": float(np.percentile(latencies, 99))
+        })
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    reports = benchmark_vocabulary_compiler([0, 1_000, 10_000, 50_000], transcriptions(300))
+
+    print(f"{'skus':>7}{'alternatives':>14}{'compile ms':>12}{'p50 us':>10}{'p99 us':>10}")
+    for report in reports:
+        print(f"{report['skus']:>7}{report['alternatives']:>14}{report['compile_ms']:>12.1f}"
+              f"{report['p50_us']:>10.1f}{report['p99_us']:>10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
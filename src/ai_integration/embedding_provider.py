@@ -0,0 +1,282 @@
+"""
+This module contains the providers used to embed orders, menu items and deals. The provider is selected
+with the EMBEDDING_PROVIDER environment variable and both tables have to be filled with the provider
+that is used to query them:
+    - openai: text-embedding-ada-002 through the OpenAI API (default)
+    - ngram: character n-gram TF-IDF fitted on the menu vocabulary, runs in process in well under a
+      millisecond with no network call and no model download
+    - llama-cpp: the embedding endpoint of the llama.cpp server from Dockerfile.llama-cpp, ex.
+      EMBEDDING_PROVIDER=llama-cpp LLAMA_CPP_URL=http://localhost:8080/v1
+"""
+import zlib
+import logging
+import threading
+from collections import Counter
+from os import getenv as env
+from typing import Final
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI
+from other.vocabulary import item_vocabulary
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.embeddings_api import (
+    EMBEDDING_MODEL, openai_embedding_api, openai_embedding_batch_api, async_openai_embedding_api,
+    parse_menu_csv, parse_deals_csv
+)
+from src.vector_db.menu_aliases import singular
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+load_dotenv()
+
+# dimensions of text-embedding-ada-002, the n-gram model hashes into as many so the tables keep their schema
+OPENAI_DIMENSIONS: Final = 1536
+# hidden size of llama-2-13b-chat
+LLAMA_CPP_DIMENSIONS: Final = 5120
+
+
+class EmbeddingProvider:
+    """
+    This class is the interface of an embedding provider. `model` keys the embedding cache, `remote`
+    tells callers whether a cache lookup is cheaper than embedding the text again.
+    """
+    model: str = None
+    dimensions: int = None
+    remote: bool = True
+
+    def embed(
+            self, text: str
+    ) -> list[float] | np.ndarray:
+        """
+        This method returns the embedding of one text.
+        @param text: ex. "black coffee"
+        @rtype: list[float] | np.ndarray
+        @return: vector representation of the text
+        """
+        return self.embed_batch([text])[0]
+
+    def embed_batch(
+            self, texts: list[str]
+    ) -> list[list[float] | np.ndarray]:
+        """
+        This method returns the embedding of every text, in the same order.
+        @param texts: ex. ["black coffee", "glazed donut"]
+        @rtype: list[list[float] | np.ndarray]
+        @return: vector representation of every text
+        """
+        raise NotImplementedError
+
+    async def aembed(
+            self, text: str
+    ) -> list[float] | np.ndarray:
+        """
+        This method is the awaitable version of `embed`.
+        @param text: ex. "black coffee"
+        @rtype: list[float] | np.ndarray
+        @return: vector representation of the text
+        """
+        return self.embed(text)
+
+    def __repr__(
+            self
+    ) -> str:
+        return f"{self.model}({self.dimensions})"
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    This class embeds texts with text-embedding-ada-002, through the one client `openai_embeddings` keeps
+    for its key.
+    """
+    model = EMBEDDING_MODEL
+    dimensions = OPENAI_DIMENSIONS
+
+    def __init__(
+            self, api_key: str = None
+    ) -> None:
+        self.__api_key = api_key
+
+    def embed(
+            self, text: str
+    ) -> list[float]:
+        return openai_embedding_api(text, self.__api_key)
+
+    def embed_batch(
+            self, texts: list[str]
+    ) -> list[list[float]]:
+        return openai_embedding_batch_api(texts, self.__api_key)
+
+    async def aembed(
+            self, text: str
+    ) -> list[float]:
+        return await async_openai_embedding_api(text, self.__api_key)
+
+
+def menu_vocabulary(
+
+) -> list[str]:
+    """
+    This function returns the texts the n-gram model is fitted on, every name an order can resolve to
+    and every text stored in the products and deals tables.
+    @rtype: list[str]
+    @return: ex. ["coffee", "latte", ..., "glazed donut", ...]
+    """
+    texts = [alternative for alternatives in item_vocabulary().values() for alternative in alternatives]
+    texts += [item["MenuItem"]["item_name"] for item in parse_menu_csv()]
+    texts += [deal["Deal"]["related_items"] for deal in parse_deals_csv()]
+
+    return texts
+
+
+class NgramEmbeddingProvider(EmbeddingProvider):
+    """
+    This class embeds texts as L2 normalized TF-IDF weights of their character n-grams, hashed into
+    `dimensions` buckets. Misspellings and plurals share most of their n-grams with the menu item so
+    they land next to it ("expresso" -> "espresso"), and the inverse document frequencies make words
+    found all over the menu ("coffee", "tea") count less than the ones that tell items apart.
+    The IDF weights come from the vocabulary, so refill the tables when the menu changes.
+    """
+    remote = False
+
+    def __init__(
+            self, vocabulary: list[str] = None, dimensions: int = OPENAI_DIMENSIONS, ngram_range: tuple = (2, 4)
+    ) -> None:
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.model = f"char-ngram-tfidf-{ngram_range[0]}-{ngram_range[1]}"
+        self.__vocabulary = vocabulary
+        self.__lock = threading.Lock()
+        self.__idf: np.ndarray | None = None
+
+    def fit(
+            self, texts: list[str]
+    ) -> 'NgramEmbeddingProvider':
+        """
+        This method computes the inverse document frequency of every bucket.
+        @param texts: vocabulary, ex. `menu_vocabulary()`
+        @rtype: NgramEmbeddingProvider
+        @return: self
+        """
+        document_frequency = np.zeros(self.dimensions, dtype=np.float32)
+        for text in set(texts):
+            document_frequency[list(self.__buckets(text))] += 1
+        # smoothed like scikit-learn so unseen buckets get the highest weight instead of dividing by zero
+        self.__idf = np.log((1 + len(set(texts))) / (1 + document_frequency)).astype(np.float32) + 1
+
+        return self
+
+    def embed(
+            self, text: str
+    ) -> np.ndarray:
+        idf = self.__idf if self.__idf is not None else self.__fit_vocabulary()
+
+        embedding = np.zeros(self.dimensions, dtype=np.float32)
+        for bucket, count in self.__buckets(text).items():
+            embedding[bucket] = (1 + np.log(count)) * idf[bucket]
+
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def embed_batch(
+            self, texts: list[str]
+    ) -> list[np.ndarray]:
+        return [self.embed(text) for text in texts]
+
+    def __fit_vocabulary(
+            self
+    ) -> np.ndarray:
+        with self.__lock:
+            if self.__idf is None:
+                self.fit(self.__vocabulary if self.__vocabulary is not None else menu_vocabulary())
+
+            return self.__idf
+
+    def __buckets(
+            self, text: str
+    ) -> Counter:
+        # words are padded so n-grams at the start and end of a word are told apart from the middle
+        padded = f" {' '.join(singular(word) for word in text.casefold().split())} "
+        low, high = self.ngram_range
+
+        # crc32 rather than hash() so the buckets are the same in every process
+        return Counter(zlib.crc32(padded[start:start + size].encode('utf-8')) % self.dimensions
+                       for size in range(low, high + 1)
+                       for start in range(len(padded) - size + 1))
+
+
+class LlamaCppEmbeddingProvider(EmbeddingProvider):
+    """
+    This class embeds texts with the OpenAI compatible embedding endpoint of the llama.cpp server, which
+    has to be started with `--embedding`.
+    """
+
+    def __init__(
+            self, base_url: str = None, model: str = None, dimensions: int = None
+    ) -> None:
+        base_url = base_url if base_url else env('LLAMA_CPP_URL', 'http://localhost:8080/v1')
+        self.model = model if model else env('LLAMA_CPP_MODEL', 'llama-2-13b-chat.Q4_K_M.gguf')
+        self.dimensions = dimensions if dimensions else int(env('LLAMA_CPP_EMBEDDING_DIMENSIONS',
+                                                               str(LLAMA_CPP_DIMENSIONS)))
+        self.__client = OpenAI(base_url=base_url, api_key="sk-no-key-required")
+        self.__async_client = AsyncOpenAI(base_url=base_url, api_key="sk-no-key-required")
+
+    def embed_batch(
+            self, texts: list[str]
+    ) -> list[list[float]]:
+        if not texts:
+            return []
+
+        response = self.__client.embeddings.create(model=self.model, input=texts)
+        return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+
+    async def aembed(
+            self, text: str
+    ) -> list[float]:
+        response = await self.__async_client.embeddings.create(model=self.model, input=[text])
+        return response.data[0].embedding
+
+
+_providers_lock = threading.Lock()
+_providers: dict[tuple[str, str | None], EmbeddingProvider] = {}
+
+
+def embedding_provider(
+        name: str = None, api_key: str = None
+) -> EmbeddingProvider:
+    """
+    This function returns the configured provider, created once per process (and per OpenAI key) so
+    clients and the fitted n-gram model are reused.
+    @param name: "openai", "ngram" or "llama-cpp", defaults to the EMBEDDING_PROVIDER environment variable
+    @param api_key: OpenAI auth, ignored by the other providers
+    @rtype: EmbeddingProvider
+    @return: embedding provider
+    """
+    name = (name if name else env('EMBEDDING_PROVIDER', 'openai')).lower()
+    key = (name, api_key if name == "openai" else None)
+
+    with _providers_lock:
+        if key not in _providers:
+            if name == "openai":
+                _providers[key] = OpenAIEmbeddingProvider(api_key)
+            elif name == "ngram":
+                _providers[key] = NgramEmbeddingProvider()
+            elif name in ("llama-cpp", "llama_cpp"):
+                _providers[key] = LlamaCppEmbeddingProvider()
+            else:
+                raise ValueError(f"unknown embedding provider {name}, expected openai, ngram or llama-cpp")
+
+        return _providers[key]
+
+
+def reset_embedding_providers(
+
+) -> None:
+    """
+    This function forgets every provider, used by tests and after the configuration changes.
+    @rtype: None
+    @return: Nothing
+    """
+    with _providers_lock:
+        _providers.clear()
+
@@ -2,6 +2,8 @@
 script to parse menu and deals csv and get embeddings for menu items to be used by database queries
 """
 import math
+import threading
+from typing import Final
 from os import path
 from os import getenv as env
 import pandas as pd
@@ -10,6 +12,42 @@ from langchain.embeddings import OpenAIEmbeddings
 
 load_dotenv()
 
+# default model of OpenAIEmbeddings, cached embeddings are keyed by it
+EMBEDDING_MODEL: Final = "text-embedding-ada-002"
+
+_clients_lock = threading.Lock()
+_clients: dict[str, OpenAIEmbeddings] = {}
+
+
+def openai_embeddings(
+        api_key: str = None
+) -> OpenAIEmbeddings:
+    """
+    This function returns the OpenAI embeddings client of the key, created once per process and key so
+    every call reuses it and its HTTP connections instead of building a new one
+    @param api_key: auth key for OpenAI, defaults to the OPENAI_API_KEY environment variable
+    @rtype: OpenAIEmbeddings
+    @return: langchain embeddings client
+    """
+    api_key = api_key if api_key else env('OPENAI_API_KEY')
+
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = OpenAIEmbeddings(api_key=api_key)
+
+        return _clients[api_key]
+
+
+def reset_openai_embeddings(
+
+) -> None:
+    """
+    This function forgets every client, used by tests and after a key is rotated
+    @rtype: None
+    @return: Nothing
+    """
+    with _clients_lock:
+        _clients.clear()
 
 
 def openai_embedding_api(
@@ -22,14 +60,44 @@ def openai_embedding_api(
     @rtype: list[list[float]] (embeddings vector)
     @return: vector representation of menu item
     """
-    if api_key:
-        embeddings = OpenAIEmbeddings(api_key=api_key)
-    else:
-        embeddings = OpenAIEmbeddings(api_key=env('OPENAI_API_KEY'))
+    embeddings = openai_embeddings(api_key)
 
     return embeddings.embed_query(text)
 
 
+async def async_openai_embedding_api(
+        text: str, api_key: str = None
+) -> list[float]:
+    """
+    This function is the awaitable version of `openai_embedding_api`
+    @param text: str = menu item
+    @param api_key: auth key for OpenAI
+    @rtype: list[float] (embeddings vector)
+    @return: vector representation of menu item
+    """
+    embeddings = openai_embeddings(api_key)
+
+    return await embeddings.aembed_query(text)
+
+
+def openai_embedding_batch_api(
+        texts: list[str], api_key: str = None
+) -> list[list[float]]:
+    """
+    This function takes in many menu items and returns their embeddings with one request
+    @param texts: list[str] = menu items
+    @param api_key: auth key for OpenAI
+    @rtype: list[list[float]] (embeddings vectors)
+    @return: vector representation of every menu item, in the same order
+    """
+    if not texts:
+        return []
+
+    embeddings = openai_embeddings(api_key)
+
+    return embeddings.embed_documents(texts)
+
+
 def get_item_quantity(
         row: pd.Series
 ) -> int:
@@ -0,0 +1,358 @@
+"""
+This module contains the EntityExtractor class which finds every entity of an order in one scan instead
+of one `re.findall` per pattern. The order is split into word and separator tokens once, and the
+alternatives of every pattern in `other/regex_patterns.py` are compiled into a single trie of tokens
+which is walked from every word:
+    EntityExtractor.instance().spans("two large lattes and a glazed donut")
+    -> [("quantities", "two", 0, 3), ("sizes", "large", 4, 9), ("coffee", "latte", 10, 16), ...]
+The matches are the ones `re.findall` returns for every pattern, the lookaheads of the patterns are
+checked by hand, ex. "iced" is not a temperature in "iced tea".
+"""
+import re
+import threading
+from itertools import accumulate
+from typing import Optional, Final
+from other.regex_patterns import (
+    SIZE_PATTERN, QUANTITY_PATTERN, COFFEE_PATTERN, TEMPERATURE_PATTERN, SWEETENER_PATTERN, FLAVOR_PATTERN,
+    BEVERAGE_PATTERN, FOOD_PATTERN, BAKERY_PATTERN, ADD_ONS_PATTERN, MILK_PATTERN, COMMON_ALLERGIES_PATTERN,
+    QUESTION_PATTERN, MODIFICATION_PATTERN
+)
+from other.vocabulary import split_alternatives
+
+# label -> (pattern, the pattern allows a plural "s" after the alternative)
+ENTITY_PATTERNS: Final = {
+    "sizes": (SIZE_PATTERN, False),
+    "quantities": (QUANTITY_PATTERN, False),
+    "coffee": (COFFEE_PATTERN, True),
+    "temperature": (TEMPERATURE_PATTERN, False),
+    "sweeteners": (SWEETENER_PATTERN, True),
+    "flavors": (FLAVOR_PATTERN, False),
+    "beverage": (BEVERAGE_PATTERN, True),
+    "food": (FOOD_PATTERN, True),
+    "bakery": (BAKERY_PATTERN, True),
+    "add_ons": (ADD_ONS_PATTERN, True),
+    "milk_type": (MILK_PATTERN, True),
+    "allergies": (COMMON_ALLERGIES_PATTERN, True),
+    "question": (QUESTION_PATTERN, False),
+    "modification": (MODIFICATION_PATTERN, False),
+}
+
+# label -> words which may not follow the alternative, the negative lookaheads of the patterns
+NOT_FOLLOWED_BY: Final = {
+    "flavors": ("donut", "muffin", "doughnut"),
+    "temperature": ("chocolate", "cocoa", "tea"),
+}
+
+# label -> labels which may not follow the alternative, ex. "hot" isn't a temperature in "hot vanilla"
+NOT_FOLLOWED_BY_LABEL: Final = {
+    "temperature": ("flavors",),
+}
+
+DIGITS: Final = "\\d+"
+END: Final = ""
+# word and separator tokens, a word token always starts at a `\b`
+TOKEN_PATTERN: Final = re.compile(r'\w+|\W+')
+WORD_PATTERN: Final = re.compile(r'\w')
+WHITESPACE_PATTERN: Final = re.compile(r'\s*')
+
+
+class EntityExtractor:
+    """
+    This singleton class holds the trie built from the patterns, it is read only once built so every
+    thread shares it.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['EntityExtractor'] = None
+
+    def __init__(
+            self, patterns: dict[str, tuple[str, bool]] = None
+    ) -> None:
+        self.__patterns = patterns if patterns else ENTITY_PATTERNS
+        self.__labels = list(self.__patterns)
+        # token -> child node, END -> [(label rank, priority, label, alternative)]
+        self.__trie: dict = {}
+        self.__digits: list[tuple[int, int, str]] = []
+        for rank, (label, (pattern, plural)) in enumerate(self.__patterns.items()):
+            for priority, alternative in enumerate(split_alternatives(pattern)):
+                self.__add(rank, label, priority, alternative, plural)
+
+    @staticmethod
+    def instance(
+
+    ) -> 'EntityExtractor':
+        """
+        This method is used to get the extractor built from `ENTITY_PATTERNS`.
+        @rtype: EntityExtractor
+        @return: extractor shared by every caller in this process
+        """
+        with EntityExtractor.__lock:
+            if not EntityExtractor.__instance:
+                EntityExtractor.__instance = EntityExtractor()
+
+            return EntityExtractor.__instance
+
+    @staticmethod
+    def swap(
+            extractor: 'EntityExtractor'
+    ) -> Optional['EntityExtractor']:
+        """
+        This method replaces the extractor `instance` returns. A trie is never changed once built, so
+        callers which already hold the previous extractor finish their parse with it.
+        @param extractor: extractor built from the new patterns
+        @rtype: Optional[EntityExtractor]
+        @return: extractor which was replaced
+        """
+        with EntityExtractor.__lock:
+            previous, EntityExtractor.__instance = EntityExtractor.__instance, extractor
+
+            return previous
+
+    def patterns(
+            self
+    ) -> dict[str, tuple[str, bool]]:
+        """
+        This method is used to get the patterns the trie was built from.
+        @rtype: dict[str, tuple[str, bool]]
+        @return: label -> (pattern, plural) ex. {"sizes": (SIZE_PATTERN, False), ...}
+        """
+        return dict(self.__patterns)
+
+    def labels(
+            self
+    ) -> list[str]:
+        """
+        This method is used to get the labels of the spans in the order of the patterns.
+        @rtype: list[str]
+        @return: ex. ["sizes", "quantities", "coffee", ...]
+        """
+        return list(self.__labels)
+
+    def spans(
+            self, text: str
+    ) -> list[tuple[str, str, int, int]]:
+        """
+        This method finds the entities of every label in one scan. Spans of one label never overlap, spans
+        of different labels can, ex. "blueberry" is a flavor inside the bakery item "blueberry muffin".
+        @param text: casefolded order ex. "two iced lattes"
+        @rtype: list[tuple[str, str, int, int]]
+        @return: (label, alternative, start, end) in the order the spans start, the alternative is
+        the matched text without its plural "s" ex. [("quantities", "two", 0, 3), ("coffee", "latte", 9, 15)]
+        """
+        tokens, offsets = self.tokenize(text)
+
+        spans = []
+        next_start: dict[str, int] = {}
+        first_word = 0 if WORD_PATTERN.match(text) else 1
+        for index in range(first_word, len(tokens), 2):
+            if tokens[index] not in self.__trie and not (self.__digits and tokens[index].isdecimal()):
+                continue
+
+            start = offsets[index]
+            for _, _, label, alternative, end in self.__candidates(tokens, offsets, index):
+                if start < next_start.get(label, 0) or self.__is_excluded(text, label, end):
+                    continue
+                spans.append((label, alternative, start, end))
+                next_start[label] = end
+
+        return spans
+
+    def tokenize(
+            self, text: str
+    ) -> tuple[list[str], list[int]]:
+        """
+        This method splits the text into the word and separator tokens the trie is walked with.
+        @param text: casefolded order ex. "two lattes"
+        @rtype: tuple[list[str], list[int]]
+        @return: tokens and the offset every token starts at, followed by the length of the text
+        ex. (["two", " ", "lattes"], [0, 3, 4, 10])
+        """
+        tokens = TOKEN_PATTERN.findall(text)
+
+        return tokens, list(accumulate(map(len, tokens), initial=0))
+
+    def labels_from(
+            self, text: str, start: int
+    ) -> set[str]:
+        """
+        This method returns the labels whose pattern matches from a word of the text. Only the tokens the
+        trie can reach are made, so it costs the same however long the rest of the text is.
+        @param text: casefolded order
+        @param start: offset of the first character of a word
+        @rtype: set[str]
+        @return: ex. {"milk_type"} for "oat milk please" at 0
+        """
+        # the tokens are made while the trie is walked, the token it stops at ends the longest candidate
+        tokens, node = [], self.__trie
+        for match in TOKEN_PATTERN.finditer(text, start):
+            tokens.append(match.group())
+            if tokens[-1] not in node:
+                break
+            node = node[tokens[-1]]
+
+        return self.labels_at(text, tokens, list(accumulate(map(len, tokens), initial=start)), 0)
+
+    def first_tokens(
+            self, labels: set[str] | frozenset[str]
+    ) -> frozenset[str]:
+        """
+        This method returns the word tokens which an alternative of the labels starts with, a word which
+        isn't one of them can't start a match of the labels.
+        @param labels: ex. {"milk_type"}
+        @rtype: frozenset[str]
+        @return: ex. frozenset({"whole", "oat", "cream", "creams", ...})
+        """
+        def has_label(node: dict) -> bool:
+            return any(label in labels for _, _, label, _ in node.get(END, ())) or \
+                any(has_label(child) for token, child in node.items() if token != END)
+
+        return frozenset(token for token, child in self.__trie.items() if token != END and has_label(child))
+
+    def matches_at(
+            self, text: str, tokens: list[str], offsets: list[int], index: int
+    ) -> list[tuple[str, str, int]]:
+        """
+        This method returns the matches of every label from the start of a word token, in the order the
+        patterns and their alternatives are tried by `re.match`.
+        @param text: casefolded order
+        @param tokens: tokens of the text
+        @param offsets: offsets of the tokens
+        @param index: index of a word token
+        @rtype: list[tuple[str, str, int]]
+        @return: (label, alternative, end) ex. [("flavors", "blueberry", 9), ("bakery", "blueberry muffin", 16)]
+        for "blueberry muffin" at index 0
+        """
+        if index >= len(tokens) or tokens[index] not in self.__trie and not (
+                self.__digits and tokens[index].isdecimal()):
+            return []
+
+        return [(label, alternative, end) for _, _, label, alternative, end in self.__candidates(tokens, offsets, index)
+                if not self.__is_excluded(text, label, end)]
+
+    def first_match_at(
+            self, text: str, tokens: list[str], offsets: list[int], index: int
+    ) -> tuple[str, str, int] | None:
+        """
+        This method returns the match `re.match` would find from the start of a word token with the
+        patterns joined into one alternation in their order.
+        @param text: casefolded order
+        @param tokens: tokens of the text
+        @param offsets: offsets of the tokens
+        @param index: index of a word token
+        @rtype: tuple[str, str, int] | None
+        @return: (label, alternative, end) ex. ("flavors", "blueberry", 9) for "blueberry muffin" at index 0
+        """
+        digits = self.__digits and tokens[index].isdecimal()
+        if tokens[index] not in self.__trie and not digits:
+            return None
+
+        # the alternatives of a node are added in the order they are tried, they only need sorting when
+        # alternatives of several lengths start at the token
+        ends, node, end = [], self.__trie, index
+        while end < len(tokens) and tokens[end] in node:
+            node = node[tokens[end]]
+            end += 1
+            if END in node:
+                ends.append((node[END], offsets[end]))
+        if len(ends) == 1 and not digits:
+            alternatives, end = ends[0]
+            for _, _, label, alternative in alternatives:
+                if not self.__is_excluded(text, label, end):
+                    return label, alternative, end
+            return None
+
+        for _, _, label, alternative, end in self.__candidates(tokens, offsets, index):
+            if not self.__is_excluded(text, label, end):
+                return label, alternative, end
+
+        return None
+
+    def labels_at(
+            self, text: str, tokens: list[str], offsets: list[int], index: int
+    ) -> set[str]:
+        """
+        This method returns the labels whose pattern matches from the start of a word token, the way
+        `re.match` would match it there.
+        @param text: casefolded order
+        @param tokens: tokens of the text
+        @param offsets: offsets of the tokens
+        @param index: index of a word token
+        @rtype: set[str]
+        @return: ex. {"flavors", "bakery"} for "blueberry muffin" at index 0
+        """
+        return {label for label, _, _ in self.matches_at(text, tokens, offsets, index)}
+
+    def parse(
+            self, text: str
+    ) -> dict[str, list[str]]:
+        """
+        This method groups the spans by label.
+        @param text: casefolded order ex. "two iced lattes"
+        @rtype: dict[str, list[str]]
+        @return: alternatives of every label ex. {"quantities": ["two"], "coffee": ["latte"], "sizes": [], ...}
+        """
+        entities = {label: [] for label in self.__labels}
+        for label, alternative, _, _ in self.spans(text):
+            entities[label].append(alternative)
+
+        return entities
+
+    def __add(
+            self, rank: int, label: str, priority: int, alternative: str, plural: bool
+    ) -> None:
+        if not alternative:
+            # ex. the "||" in FOOD_PATTERN, it only ever matches the empty string which is filtered out
+            return
+        if alternative == DIGITS:
+            self.__digits.append((rank, priority, label))
+            return
+        tokens = TOKEN_PATTERN.findall(alternative)
+        if "\\" in alternative or not WORD_PATTERN.match(tokens[0]) or not WORD_PATTERN.match(tokens[-1]):
+            raise ValueError(f"{label} alternative {alternative!r} isn't a plain word")
+
+        # the plural "s" is part of the last word token
+        variants = [tokens, tokens[:-1] + [tokens[-1] + "s"]] if plural else [tokens]
+        for variant in variants:
+            node = self.__trie
+            for token in variant:
+                node = node.setdefault(token, {})
+            node.setdefault(END, []).append((rank, priority, label, alternative))
+
+    def __candidates(
+            self, tokens: list[str], offsets: list[int], index: int
+    ) -> list[tuple[int, int, str, str, int]]:
+        # sorted by label and then in the order of the pattern, the order the regex engine tries them in
+        candidates = []
+
+        node, end = self.__trie, index
+        while end < len(tokens) and tokens[end] in node:
+            node = node[tokens[end]]
+            end += 1
+            for rank, priority, label, alternative in node.get(END, ()):
+                candidates.append((rank, priority, label, alternative, offsets[end]))
+
+        if self.__digits and tokens[index].isdecimal():
+            for rank, priority, label in self.__digits:
+                candidates.append((rank, priority, label, tokens[index], offsets[index + 1]))
+
+        candidates.sort()
+        return candidates
+
+    def __is_excluded(
+            self, text: str, label: str, end: int
+    ) -> bool:
+        if label not in NOT_FOLLOWED_BY and label not in NOT_FOLLOWED_BY_LABEL:
+            return False
+
+        following = WHITESPACE_PATTERN.match(text, end).end()
+        if following == end:
+            return False
+
+        if any(text.startswith(word, following) for word in NOT_FOLLOWED_BY.get(label, ())):
+            return True
+
+        # the labels only match from the start of a word token
+        if not WORD_PATTERN.match(text, following):
+            return False
+        labels = self.labels_from(text, following)
+
+        return any(other in labels for other in NOT_FOLLOWED_BY_LABEL.get(label, ()))
@@ -5,19 +5,19 @@ import re  # pylint: disable=W0614
 import time
 import logging
 import threading
-from os import path
-from os import getenv as env
 from dotenv import load_dotenv
-import psycopg2.pool
 from redis import Redis
-from simpletransformers.ner import NERModel
 from other.regex_patterns import *  # pylint: disable=W0401,W0614
-from other.quantity_correction import *  # pylint: disable=W0401,W0614
 from other.number_map import number_map
-from src.vector_db.get_item import get_item
+from src.ai_integration.entity_extractor import EntityExtractor
+from src.ai_integration.ner_server import NERServer
+from src.ai_integration.transcription_splitter import split_on_separators
+from src.ai_integration.quantity_aligner import verify_quantities, ITEM_LABELS
+from src.vector_db.get_item import get_item, get_items
+from src.vector_db.menu_index import MenuIndex
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
 from src.django_beanhub.settings import DEBUG
-from src.vector_db.aws_sdk_auth import get_secret
-from src.vector_db.aws_database_auth import connection_string
+from src.external_connections.credentials_provider import CredentialsProvider
 
 LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
 logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
@@ -31,6 +31,7 @@ def ner_transformer(
 ) -> list:
     """
     This function takes in a customer request and predicts the entities in the request using a fine-tuned BERT model
+    served by the NERServer of the process
     @param input_string: customer request ex. "I want a black coffee"
     @param print_prediction: boolean flag to print predictions
     @rtype: list of dictionaries
@@ -39,12 +40,8 @@ def ner_transformer(
     if not input_string or not isinstance(input_string, str):
         return []
 
-    transformer_file_path = path.join(path.dirname(path.realpath(__file__)), "../..",
-                                      "other/genai_models/ner_model")
-
-    model = NERModel('bert', transformer_file_path, use_cuda=False)
-
-    prediction, _ = model.predict([input_string])
+    # the model is loaded once per process and concurrent calls share a batch
+    prediction = NERServer.instance().predict([input_string])
 
     if print_prediction:
         print(prediction)
@@ -52,6 +49,18 @@ def ner_transformer(
     return prediction
 
 
+def openai_api_key(
+
+) -> str:
+    """
+    This function returns the OpenAI key from `other/openai_api_key.txt` or the environment, the file is
+    only read once per process
+    @rtype: str
+    @return: auth key for OpenAI
+    """
+    return CredentialsProvider.instance().openai_api_key()
+
+
 # pylint: disable=R0902, R0903
 class Order:
     """
@@ -60,7 +69,8 @@ class Order:
 
     def __init__(
             self, formatted_order: str, connection_pool=None,
-            embedding_cache: Redis = None, aws_connected: bool = False
+            embedding_cache: Redis = None, aws_connected: bool = False,
+            menu_index: MenuIndex = None
     ):
         init_time = time.time()
         self.__order: str = formatted_order.casefold().strip()
@@ -75,35 +85,31 @@ class Order:
         self.__num_calories: list[str] = []
         self.__cart_action: str = ""
         self.__size: str = ""
+        self.__entities: dict[str, list[str]] | None = None
+        self.__order_details: dict | None = None
         if embedding_cache:
             self.__embedding_cache = embedding_cache
         else:
             self.__embedding_cache = None
-        key_path = path.join(path.dirname(path.realpath(__file__)),
-                             "../../other/" + "openai_api_key.txt")
-        if path.exists(key_path):
-            with open(key_path, encoding='utf-8') as _key_:
-                self.__key = _key_.readline().strip()
-        else:
-            self.__key = env('OPENAI_API_KEY')
+        self.__menu_index = menu_index
+        self.__key = openai_api_key()
         if connection_pool:
             self.__connection_pool = connection_pool
         else:
             logging.debug("creating new connection pool")
-            self.__connection_pool = psycopg2.pool.SimpleConnectionPool(1,
-                                                                        10,
-                                                                        connection_string())
+            self.__connection_pool = PostgresConnectionPool(1, 10, CredentialsProvider.instance().connection_string())
 
         if not aws_connected:
             logging.debug("getting aws secret")
-            get_secret()
+            CredentialsProvider.instance().aws_secret()
         logging.debug("initialising order time: %s", (time.time() - init_time))
 
     def make_order(
-            self
+            self, item_details: dict[str, list[tuple]] = None
     ) -> dict:
         """
         This function processes the order and returns a dictionary object of the order
+        @param item_details: database rows for every name in `required_items`, looked up here if not passed in
         @rtype: dict
         @return: dictionary object of the order
         """
@@ -111,20 +117,43 @@ class Order:
         self.__verify_quantities(order_type, order_details)
 
         if order_type == "coffee":
-            return self.__make_coffee_order(order_details)
+            return self.__make_coffee_order(order_details, item_details)
         if order_type == "beverage":
-            return self.__make_beverage_order(order_details)
+            return self.__make_beverage_order(order_details, item_details)
         if order_type == "food":
-            return self.__make_food_order(order_details)
+            return self.__make_food_order(order_details, item_details)
         if order_type == "bakery":
-            return self.__make_bakery_order(order_details)
+            return self.__make_bakery_order(order_details, item_details)
 
         return {}
 
+    def required_items(
+            self
+    ) -> list[str]:
+        """
+        This function returns every name that has to be looked up in the database to make the order
+        @rtype: list[str]
+        @return: item name followed by the add-ons, sweeteners and milk of the order
+        """
+        order_type, order_details = self.__get_order_type()
+        if not order_type:
+            return []
+
+        names = [order_details[order_type][0]]
+        if order_type in ("coffee", "beverage"):
+            names.extend(order_details['add_ons'])
+            names.extend(order_details['sweeteners'])
+        if order_type == "coffee" and order_details['milk_type']:
+            names.append(str(order_details['milk_type'][0]))
+
+        return names
+
     def __get_order_type(
             self
     ) -> tuple[str, dict]:
-        order_details = self.__parse_order()
+        if self.__order_details is None:
+            self.__order_details = self.__parse_order()
+        order_details = self.__order_details
 
         if order_details['coffee']:
             return "coffee", order_details
@@ -138,7 +167,7 @@ class Order:
         return "", {}
 
     def __make_coffee_order(
-            self, order_details
+            self, order_details, item_details
     ) -> dict:
         self.__cart_action = self.__get_cart_action()
         self.__item_name = order_details['coffee'][0]
@@ -154,7 +183,7 @@ class Order:
         self.__size = "regular" \
             if not order_details['sizes'] \
             else str(order_details['sizes'][0])
-        self.__get_price_and_allergies_and_num_calories()
+        self.__get_price_and_allergies_and_num_calories(item_details)
         return {
             "CoffeeItem": {
                 "item_name": self.__item_name,
@@ -172,7 +201,7 @@ class Order:
         }
 
     def __make_beverage_order(
-            self, order_details
+            self, order_details, item_details
     ) -> dict:
         self.__cart_action = self.__get_cart_action()
         self.__item_name = order_details['beverage'][0]
@@ -185,7 +214,7 @@ class Order:
         self.__size = "regular" \
             if not order_details['sizes'] \
             else str(order_details['sizes'][0])
-        self.__get_price_and_allergies_and_num_calories()
+        self.__get_price_and_allergies_and_num_calories(item_details)
         return {
             "BeverageItem": {
                 "item_name": self.__item_name,
@@ -203,12 +232,13 @@ class Order:
 
     def __make_food_order(
             self,
-            order_details
+            order_details,
+            item_details
     ) -> dict:
         self.__cart_action = self.__get_cart_action()
         self.__item_name = order_details['food'][0]
         self.__calculate_quantity(order_details['quantities'])
-        self.__get_price_and_allergies_and_num_calories()
+        self.__get_price_and_allergies_and_num_calories(item_details)
         return {
             "FoodItem": {
                 "item_name": self.__item_name,
@@ -222,12 +252,13 @@ class Order:
 
     def __make_bakery_order(
             self,
-            order_details
+            order_details,
+            item_details
     ) -> dict:
         self.__cart_action = self.__get_cart_action()
         self.__item_name = order_details['bakery'][0]
         self.__calculate_quantity(order_details['quantities'])
-        self.__get_price_and_allergies_and_num_calories()
+        self.__get_price_and_allergies_and_num_calories(item_details)
         return {
             "BakeryItem": {
                 "item_name": self.__item_name,
@@ -266,150 +297,117 @@ class Order:
     def __is_question(
             self
     ) -> bool:
-        pattern = r'\b(do you|how many|how much|does|what are)\b'
-
-        return bool(re.search(pattern, self.__order))
+        return bool(self.__get_entities()['question'])
 
     def __is_modification(
             self
     ) -> bool:
-        pattern = (r'\b(actually remove|actually change|dont want|don\'t want|'
-                   r'remove|change|swap|adjust|modify|take|away|replace|minus|deduct)\b')
-
-        return bool(re.search(pattern, self.__order))
+        return bool(self.__get_entities()['modification'])
 
     def __get_price_and_allergies_and_num_calories(
-            self
+            self, item_details
     ) -> None:
         db_time = time.time()
 
-        item_thread = threading.Thread(target=self.__process_item_and_allergies)
-        add_ons_thread = threading.Thread(target=self.__process_add_ons)
-        sweeteners_thread = threading.Thread(target=self.__process_sweeteners)
-        milk_thread = threading.Thread(target=self.__process_milk)
-
-        item_thread.start()
-        add_ons_thread.start()
-        sweeteners_thread.start()
-        milk_thread.start()
+        if item_details is None:
+            item_details = self.__lookup_items()
 
-        item_thread.join()
-        add_ons_thread.join()
-        sweeteners_thread.join()
-        milk_thread.join()
+        # filled in a fixed order (item, add-ons, sweeteners, milk) so the price and calorie lists line up
+        self.__process_item_and_allergies(item_details)
+        self.__process_add_ons(item_details)
+        self.__process_sweeteners(item_details)
+        self.__process_milk(item_details)
 
         logging.debug("querying db for price, allergies, and num of calories time: %s",
                       time.time() - db_time)
 
-    def __process_item_and_allergies(
+    def __lookup_items(
             self
+    ) -> dict[str, list[tuple]]:
+        item_details = {}
+
+        def lookup(name: str) -> None:
+            item_details[name], _ = get_item(name,
+                                             connection_pool=self.__connection_pool,
+                                             embedding_cache=self.__embedding_cache
+                                             if self.__embedding_cache else None,
+                                             api_key=self.__key,
+                                             menu_index=self.__menu_index)
+
+        threads = [threading.Thread(target=lookup, args=(name,))
+                   for name in dict.fromkeys(self.required_items())]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return item_details
+
+    def __process_item_and_allergies(
+            self, item_details
     ) -> None:
-        item_details, _ = get_item(self.__item_name,
-                                   connection_pool=self.__connection_pool,
-                                   embedding_cache=self.__embedding_cache
-                                   if self.__embedding_cache else None,
-                                   api_key=self.__key)
+        details = item_details[self.__item_name]
 
         if self.__cart_action == "question":
             self.__quantity = []
-            self.__quantity.append(item_details[0][2])
+            self.__quantity.append(details[0][2])
 
-        self.__allergies = item_details[0][3]
-        self.__price.append(item_details[0][5])
-        self.__num_calories.append(item_details[0][4])
+        self.__allergies = details[0][3]
+        self.__price.append(details[0][5])
+        self.__num_calories.append(details[0][4])
 
     def __process_add_ons(
-            self
+            self, item_details
     ) -> None:
         for add_on in self.__add_ons:
-            add_on_details, _ = get_item(add_on,
-                                         connection_pool=self.__connection_pool,
-                                         embedding_cache=self.__embedding_cache
-                                         if self.__embedding_cache
-                                         else None,
-                                         api_key=self.__key)
+            add_on_details = item_details[add_on]
             self.__price.append(add_on_details[0][5])
             self.__num_calories.append(add_on_details[0][4])
             if self.__cart_action == "question":
                 self.__quantity.append(add_on_details[0][2])
 
     def __process_sweeteners(
-            self
+            self, item_details
     ) -> None:
         for sweetener in self.__sweeteners:
-            sweetener_details, _ = get_item(sweetener,
-                                            connection_pool=self.__connection_pool,
-                                            embedding_cache=self.__embedding_cache
-                                            if self.__embedding_cache
-                                            else None,
-                                            api_key=self.__key)
+            sweetener_details = item_details[sweetener]
             self.__price.append(sweetener_details[0][5])
             self.__num_calories.append(sweetener_details[0][4])
             if self.__cart_action == "question":
                 self.__quantity.append(sweetener_details[0][2])
 
     def __process_milk(
-            self
+            self, item_details
     ) -> None:
         if self.__milk_type and self.__milk_type != "regular":
-            milk_details, _ = get_item(self.__milk_type,
-                                       connection_pool=self.__connection_pool,
-                                       embedding_cache=self.__embedding_cache
-                                       if self.__embedding_cache
-                                       else None,
-                                       api_key=self.__key)
+            milk_details = item_details[self.__milk_type]
             self.__price.append(milk_details[0][5])
             self.__num_calories.append(milk_details[0][4])
             if self.__cart_action == "question":
                 self.__quantity.append(milk_details[0][2])
 
+    def __get_entities(
+            self
+    ) -> dict[str, list[str]]:
+        # every pattern is matched in one scan of the order
+        if self.__entities is None:
+            self.__entities = EntityExtractor.instance().parse(self.__order)
+
+        return self.__entities
+
     def __parse_order(
             self
     ) -> dict:
-        sizes = [match for match in re.findall(SIZE_PATTERN, self.__order) if match]
-        quantities = [match for match in re.findall(QUANTITY_PATTERN, self.__order) if match]
-        coffees = [match for match in re.findall(COFFEE_PATTERN, self.__order) if match]
-        temperatures = [match for match in re.findall(TEMPERATURE_PATTERN, self.__order) if match]
-        sweeteners = [match for match in re.findall(SWEETENER_PATTERN, self.__order) if match]
-        flavors = [match for match in re.findall(FLAVOR_PATTERN, self.__order) if match]
-        beverages = [match for match in re.findall(BEVERAGE_PATTERN, self.__order) if match]
-        foods = [match for match in re.findall(FOOD_PATTERN, self.__order) if match]
-        bakeries = [match for match in re.findall(BAKERY_PATTERN, self.__order) if match]
-        add_ons = [match for match in re.findall(ADD_ONS_PATTERN, self.__order) if match]
-        milk_types = [match for match in re.findall(MILK_PATTERN, self.__order) if match]
-        allergies = [match for match in re.findall(COMMON_ALLERGIES_PATTERN, self.__order) if match]
-
-        return {
-            "sizes": sizes,
-            "quantities": quantities,
-            "coffee": coffees,
-            "temperature": temperatures,
-            "sweeteners": sweeteners,
-            "flavors": flavors,
-            "beverage": beverages,
-            "food": foods,
-            "bakery": bakeries,
-            "add_ons": add_ons,
-            "milk_type": milk_types,
-            "allergies": allergies
-        }
+        return {label: list(matches) for label, matches in self.__get_entities().items()
+                if label not in ('question', 'modification')}
 
     def __verify_quantities(
             self, order_type, order_details
     ) -> None:
-        order_functions = {
-            "coffee": (correct_coffee_order_quantities, ["add_ons", "sweeteners", "milk_type"]),
-            "beverage": (correct_beverage_order_quantities, ["add_ons", "sweeteners"]),
-            "food": (correct_food_order_quantities, []),
-            "bakery": (correct_bakery_order_quantities, [])
-        }
-
-        if order_type in order_functions:
-            correction, total_additions = order_functions[order_type]
-            num_additions = sum(len(order_details[addition]) for addition in total_additions)
-            min_length = len(order_details['quantities']) + num_additions
-            if len(order_details['quantities']) < max(min_length, 1):
-                order_details['quantities'] = correction(order_details, self.__order)
+        if order_type in ITEM_LABELS:
+            order_details['quantities'] = verify_quantities(self.__order, order_type, order_details)
 
 
 def split_transcription(
@@ -422,12 +420,7 @@ def split_transcription(
     @return: order split into 4 types: coffee, beverage, food, and bakery
     """
     start_time = time.time()
-    split = re.split(SPLIT_PATTERN, order)
-    remove_words = {'plus', 'get', 'and', 'also'}
-    remove_chars = '[^a-zA-Z0-9]'
-
-    filtered_order = [order for order in split
-                      if order not in remove_words and order != remove_chars and order]
+    filtered_order = split_on_separators(order)
 
     logging.debug("split order time: %s", {time.time() - start_time})
     return filtered_order
@@ -435,59 +428,64 @@ def split_transcription(
 
 def make_order_report(
         split_orders: list[str], connection_pool=None, embedding_cache: Redis = None,
-        aws_connected: bool = False
+        aws_connected: bool = False, menu_index: MenuIndex = None
 ) -> [list[dict]] and str:
     """
-    This function processes the split orders and makes a report to be sent to the frontend
+    This function processes the split orders and makes a report to be sent to the frontend. Every split
+    order is parsed first, then all the names they need are resolved with one batched lookup, and finally
+    the reports are filled in, in the same order as `split_orders`.
     @param split_orders: order split into 4 types: coffee, beverage, food, and bakery
     @param connection_pool: connection for postgres vector database
     @param embedding_cache: redis cache to reduce database queries
     @param aws_connected: flag to check if aws credentials are connected
+    @param menu_index: in memory copy of the products table to skip the database
     @rtype: list[dict] and str
     @return: all the orders and the str version for conversational AI model
     """
     start_time = time.time()
     order_report, model_report = [], []
 
-    threads = []
-    for order in split_orders:
-        order_thread = threading.Thread(target=process_order, args=(order,
-                                                                    order_report,
-                                                                    model_report,
-                                                                    connection_pool,
-                                                                    embedding_cache,
-                                                                    aws_connected))
-        threads.append(order_thread)
+    if not split_orders:
+        return order_report, ''
+
+    if not connection_pool:
+        logging.debug("creating new connection pool")
+        connection_pool = PostgresConnectionPool(1, 10, CredentialsProvider.instance().connection_string())
 
-    for thread in threads:
-        thread.start()
+    orders = [Order(order, connection_pool, embedding_cache, aws_connected, menu_index)
+              for order in split_orders]
 
-    for thread in threads:
-        thread.join()
+    names = [name for order in orders for name in order.required_items()]
+    item_details, _ = get_items(names,
+                                api_key=openai_api_key(),
+                                connection_pool=connection_pool,
+                                embedding_cache=embedding_cache,
+                                menu_index=menu_index)
+    logging.debug("resolved %s distinct names for %s orders", len(item_details), len(orders))
+
+    for order in orders:
+        process_order(order, order_report, model_report, item_details)
 
     logging.debug("make order report time: %s", time.time() - start_time)
 
     return order_report, ''.join(model_report)
 
 
-# pylint: disable=too-many-arguments
 def process_order(
-        order, order_report, model_report, connection_pool,
-        embedding_cache, aws_connected
+        order: Order, order_report: list[dict], model_report: list[str],
+        item_details: dict[str, list[tuple]] = None
 ) -> None:
     """
     This function processes the split order and appends the final order to the order_report
     @param order: one of the split orders
     @param order_report: pass by reference to append the final order
     @param model_report: pass by reference to append the final order
-    @param connection_pool: connection for postgres vector database
-    @param embedding_cache: redis cache to reduce database queries
-    @param aws_connected: flag to check if aws credentials are connected
+    @param item_details: database rows for every name the order needs
     @rtype: None
     @return: None because order_report and model_report are passed by reference
     """
     item_types = ['CoffeeItem', 'BeverageItem', 'FoodItem', 'BakeryItem']
-    final_order = ((Order(order, connection_pool, embedding_cache, aws_connected).make_order()))
+    final_order = order.make_order(item_details)
 
     if final_order:
         model_report.append(str(final_order))
@@ -531,11 +529,6 @@ def accepted_deal(
 if __name__ == "__main__":  # pragma: no cover
     total_time = time.time()
 
-    key_file_path = path.join(path.dirname(path.realpath(__file__)),
-                              "../../other/" + "openai_api_key.txt")
-    with open(key_file_path, encoding='utf-8') as api_key:
-        key = api_key.readline().strip()
-
     ORDER = ("two large cappuccinos with two sugars and two pumps of caramel"
              " then also two iced banana teas and finally add a glazed donuts"
              " and four blueberry muffins")
@@ -0,0 +1,174 @@
+"""
+This module exports the fine-tuned BERT model of `other/genai_models/ner_model` to ONNX and quantizes its
+weights to int8. The OnnxNERModel serves the export with onnxruntime on the CPU, without torch, and
+predicts the labels `NERModel.predict` does:
+    [[{"a": "B-QUANTITY"}, {"large": "B-SIZE"}, {"latte": "B-COFFEE-TYPE"}]]
+Export once after fine-tuning, then set NER_RUNTIME=onnx for the NERServer to serve it:
+    python -m src.ai_integration.ner_onnx
+"""
+import json
+import shutil
+import inspect
+import logging
+from os import path, makedirs
+from pathlib import Path
+from typing import Final
+import numpy as np
+from transformers import AutoTokenizer
+from onnxruntime import InferenceSession, SessionOptions
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from src.django_beanhub.settings import DEBUG
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+NER_MODEL_PATH: Final = path.join(path.dirname(path.realpath(__file__)), "../..", "other/genai_models/ner_model")
+NER_ONNX_PATH: Final = path.join(NER_MODEL_PATH, "onnx")
+
+ONNX_FILE: Final = "ner_model.onnx"
+QUANTIZED_FILE: Final = "ner_model.int8.onnx"
+INPUT_NAMES: Final = ("input_ids", "attention_mask", "token_type_ids")
+# max_seq_length of simpletransformers, the model was fine-tuned with it
+MAX_SEQUENCE_LENGTH: Final = 128
+
+
+def model_labels(
+        model_path: str
+) -> list[str]:
+    """
+    This function returns the labels of a fine-tuned model in the order of its logits, simpletransformers
+    keeps them in model_args.json.
+    @param model_path: directory of the model or of its export
+    @rtype: list[str]
+    @return: ex. ["O", "B-QUANTITY", "B-SIZE", ...]
+    """
+    model_args_path = path.join(model_path, "model_args.json")
+    if path.exists(model_args_path):
+        with open(model_args_path, encoding="utf-8") as model_args:
+            labels = json.load(model_args).get("labels_list")
+        if labels:
+            return labels
+
+    with open(path.join(model_path, "config.json"), encoding="utf-8") as config:
+        id2label = json.load(config)["id2label"]
+
+    return [id2label[str(index)] for index in range(len(id2label))]
+
+
+def export_ner_model(
+        model_path: str = NER_MODEL_PATH, output_dir: str = NER_ONNX_PATH, opset: int = 14
+) -> tuple[str, str]:
+    """
+    This function exports the model to ONNX with a dynamic batch and sequence length, and quantizes the
+    weights of its matrix multiplications to int8 next to it. The tokenizer and the labels are copied so
+    the export directory is all OnnxNERModel needs.
+    @param model_path: directory simpletransformers saved the fine-tuned model to
+    @param output_dir: directory of the export
+    @param opset: ONNX opset
+    @rtype: tuple[str, str]
+    @return: paths of the float32 and the int8 model
+    """
+    # imported here, serving the export doesn't need torch
+    import torch  # pylint: disable=C0415
+    from transformers import AutoModelForTokenClassification  # pylint: disable=C0415
+
+    makedirs(output_dir, exist_ok=True)
+    onnx_path, quantized_path = path.join(output_dir, ONNX_FILE), path.join(output_dir, QUANTIZED_FILE)
+
+    model = AutoModelForTokenClassification.from_pretrained(model_path).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    example = tokenizer([["a", "large", "latte"]], is_split_into_words=True, return_tensors="pt")
+
+    # torch 2.5+ exports with dynamo by default, which needs onnxscript
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(example[name] for name in INPUT_NAMES), onnx_path,
+                          input_names=list(INPUT_NAMES), output_names=["logits"],
+                          dynamic_axes={name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES + ("logits",)},
+                          opset_version=opset, **options)
+
+    quantize_dynamic(Path(onnx_path), Path(quantized_path), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    if path.exists(path.join(model_path, "model_args.json")):
+        shutil.copy(path.join(model_path, "model_args.json"), output_dir)
+
+    logging.info("exported the NER model to %s (%s MB) and %s (%s MB)", onnx_path,
+                 round(path.getsize(onnx_path) / 2 ** 20, 1), quantized_path,
+                 round(path.getsize(quantized_path) / 2 ** 20, 1))
+
+    return onnx_path, quantized_path
+
+
+class OnnxNERModel:
+    """
+    This class predicts entities with an export of `export_ner_model`, a word gets the label of its first
+    sub-token like it does with simpletransformers.
+    """
+    def __init__(
+            self, model_dir: str = NER_ONNX_PATH, quantized: bool = True, threads: int = None
+    ) -> None:
+        self.labels = model_labels(model_dir)
+        self.__tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        model_path = path.join(model_dir, QUANTIZED_FILE if quantized else ONNX_FILE)
+        self.__session = InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.__input_names = [name for name in INPUT_NAMES
+                              if name in {model_input.name for model_input in self.__session.get_inputs()}]
+
+    def predict(
+            self, sentences: list[str]
+    ) -> tuple[list, list]:
+        """
+        This method predicts the label of every word of the sentences, words are split on spaces.
+        @param sentences: customer requests ex. ["a large latte"]
+        @rtype: tuple[list, list]
+        @return: labels and logits of every word, the way `NERModel.predict` returns them
+        ex. ([[{"a": "B-QUANTITY"}, {"large": "B-SIZE"}, {"latte": "B-COFFEE-TYPE"}]], [[{"a": [...]}, ...]])
+        """
+        words = [sentence.split() for sentence in sentences]
+        if not words:
+            return [], []
+
+        encoding = self.__tokenizer(words, is_split_into_words=True, padding=True, truncation=True,
+                                    max_length=MAX_SEQUENCE_LENGTH, return_tensors="np")
+        logits = self.__session.run(None, {name: encoding[name].astype(np.int64) for name in self.__input_names})[0]
+
+        predictions, outputs = [], []
+        for row, sentence_words in enumerate(words):
+            first_tokens = {}
+            for position, word_index in enumerate(encoding.word_ids(row)):
+                if word_index is not None:
+                    first_tokens.setdefault(word_index, position)
+
+            # words cut by the max sequence length are outside of every entity
+            word_logits = [logits[row, first_tokens[index]] if index in first_tokens else None
+                           for index in range(len(sentence_words))]
+            predictions.append([{word: self.labels[int(np.argmax(scores))] if scores is not None else self.labels[0]}
+                                for word, scores in zip(sentence_words, word_logits)])
+            outputs.append([{word: scores.tolist() if scores is not None else []}
+                            for word, scores in zip(sentence_words, word_logits)])
+
+        return predictions, outputs
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    onnx_path, quantized_path = export_ner_model()
+    print(f"float32: {onnx_path} {path.getsize(onnx_path) / 2 ** 20:.1f} MB")
+    print(f"int8:    {quantized_path} {path.getsize(quantized_path) / 2 ** 20:.1f} MB")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,250 @@
+"""
+This module contains the NERServer class which keeps the fine-tuned BERT model loaded for the life of the
+worker. `predict` calls of every thread are put on one queue, a single inference thread takes the first one
+and waits at most `max_wait_ms` for more, so concurrent orders share one forward pass:
+    3 threads call predict within 5ms -> 1 batch of 3 sentences
+A call waits at most NER_PREDICT_TIMEOUT seconds for its batch, and a server whose model failed to load
+is replaced by the next `instance`, so the load is retried. The latency of every call, from the queue to
+its predictions, and the size of every batch are recorded:
+    NERServer.instance().metrics() -> {"calls": 120, "batches": 41, "mean_batch_size": 2.9, "p50_ms": 38.0, ...}
+"""
+import time
+import logging
+import threading
+from os import getenv as env
+from queue import Queue, Empty
+from collections import deque
+from typing import Optional, Callable, Final, Any
+import numpy as np
+from dotenv import load_dotenv
+from simpletransformers.ner import NERModel
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.ner_onnx import OnnxNERModel, NER_MODEL_PATH
+from src.ai_integration.ner_tagger import NERTagger
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+load_dotenv()
+
+# keep the most recent latencies and batch sizes for percentiles
+MAX_SAMPLES: Final = 1024
+
+
+def load_ner_model(
+
+) -> Any:
+    """
+    This function loads the fine-tuned BERT model from `other/genai_models/ner_model` on the CPU, with
+    PyTorch or, if NER_RUNTIME is onnx, the int8 export of `ner_onnx.export_ner_model` with onnxruntime.
+    NER_RUNTIME tagger loads the perceptron of `ner_tagger` instead.
+    @rtype: NERModel | OnnxNERModel | NERTagger
+    @return: model with a simpletransformers `predict`
+    """
+    runtime = env('NER_RUNTIME', 'pytorch').lower()
+    if runtime == 'onnx':
+        return OnnxNERModel()
+    if runtime == 'tagger':
+        return NERTagger.load()
+
+    return NERModel('bert', NER_MODEL_PATH, use_cuda=False)
+
+
+class NERServer:
+    """
+    This singleton class loads the NER model once, in its inference thread, and predicts the sentences of
+    concurrent callers in micro-batches.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['NERServer'] = None
+
+    def __init__(
+            self, load_model: Callable[[], Any] = None, max_batch_size: int = None, max_wait_ms: float = None,
+            predict_timeout: float = None
+    ) -> None:
+        self.__load_model = load_model if load_model else load_ner_model
+        self.max_batch_size = max_batch_size if max_batch_size else int(env('NER_MAX_BATCH_SIZE', '16'))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(env('NER_MAX_WAIT_MS', '5'))
+        self.predict_timeout = predict_timeout if predict_timeout else float(env('NER_PREDICT_TIMEOUT', '30'))
+        self.__requests: Queue = Queue()
+        self.__model = None
+        self.__load_error: Exception | None = None
+        self.__loaded = threading.Event()
+        self.__metrics_lock = threading.Lock()
+        self.__latencies: deque[float] = deque(maxlen=MAX_SAMPLES)
+        self.__batch_sizes: deque[int] = deque(maxlen=MAX_SAMPLES)
+        self.__calls = 0
+        self.__batches = 0
+        self.__load_ms: float | None = None
+        self.__worker = threading.Thread(target=self.__serve, daemon=True)
+        self.__worker.start()
+
+    @staticmethod
+    def instance(
+
+    ) -> 'NERServer':
+        """
+        This method is used to get the server of this process, the model starts loading the first time and
+        again whenever the last load failed.
+        @rtype: NERServer
+        @return: server shared by every caller in this process
+        """
+        with NERServer.__lock:
+            failed = NERServer.__instance if NERServer.__instance and NERServer.__instance.__failed() else None
+            if not NERServer.__instance or failed:
+                NERServer.__instance = NERServer()
+            server = NERServer.__instance
+
+        if failed:
+            failed.stop()
+
+        return server
+
+    @staticmethod
+    def shutdown(
+
+    ) -> None:
+        """
+        This method stops the server of this process once the calls it holds are answered, the next
+        `instance` loads the model again. Used by tests and before the model on disk is replaced.
+        @rtype: None
+        @return: Nothing
+        """
+        with NERServer.__lock:
+            server, NERServer.__instance = NERServer.__instance, None
+
+        if server:
+            server.stop()
+
+    def stop(
+            self
+    ) -> None:
+        """
+        This method ends the inference thread after the calls already queued.
+        @rtype: None
+        @return: Nothing
+        """
+        self.__requests.put(None)
+        self.__worker.join()
+
+    def wait_until_loaded(
+            self, timeout: float = None
+    ) -> bool:
+        """
+        This method blocks until the model is loaded, call it at startup so the first order doesn't pay it.
+        @param timeout: seconds to wait, forever if None
+        @rtype: bool
+        @return: True if the model is loaded
+        """
+        return self.__loaded.wait(timeout) and self.__load_error is None
+
+    def predict(
+            self, sentences: list[str]
+    ) -> list:
+        """
+        This method predicts the entities of the sentences in the next batch of the inference thread, it
+        raises TimeoutError if the batch isn't answered within `predict_timeout` seconds.
+        @param sentences: customer requests ex. ["I want a black coffee"]
+        @rtype: list
+        @return: prediction of every sentence, the way `NERModel.predict` returns them
+        ex. [[{"I": "O"}, {"want": "O"}, {"a": "O"}, {"black": "B-COFFEE_TYPE"}, {"coffee": "I-COFFEE_TYPE"}]]
+        """
+        if not sentences:
+            return []
+
+        request = {"sentences": list(sentences), "done": threading.Event(), "queued": time.perf_counter(),
+                   "predictions": None, "error": None}
+        self.__requests.put(request)
+        if not request["done"].wait(self.predict_timeout):
+            raise TimeoutError(f"NER prediction took longer than {self.predict_timeout}s")
+
+        if request["error"] is not None:
+            raise request["error"]
+
+        return request["predictions"]
+
+    def metrics(
+            self
+    ) -> dict:
+        """
+        This method returns the latency of the recent calls and the size of the recent batches.
+        @rtype: dict
+        @return: ex. {"calls": 120, "batches": 41, "mean_batch_size": 2.9, "max_batch_size": 8,
+        "p50_ms": 38.0, "p99_ms": 95.0, "load_ms": 2100.0}
+        """
+        with self.__metrics_lock:
+            latencies, batch_sizes = list(self.__latencies), list(self.__batch_sizes)
+            metrics = {"calls": self.__calls, "batches": self.__batches, "load_ms": self.__load_ms}
+
+        metrics["mean_batch_size"] = float(np.mean(batch_sizes)) if batch_sizes else 0.0
+        metrics["max_batch_size"] = max(batch_sizes, default=0)
+        metrics["p50_ms"] = float(np.percentile(latencies, 50)) if latencies else 0.0
+        metrics["p99_ms"] = float(np.percentile(latencies, 99)) if latencies else 0.0
+
+        return metrics
+
+    def __failed(
+            self
+    ) -> bool:
+        return self.__loaded.is_set() and self.__load_error is not None
+
+    def __serve(
+            self
+    ) -> None:
+        load_time = time.perf_counter()
+        try:
+            self.__model = self.__load_model()
+        except Exception as e:
+            logging.error(f"Failed to load the NER model {e}")
+            self.__load_error = e
+        with self.__metrics_lock:
+            self.__load_ms = (time.perf_counter() - load_time) * 1000
+        self.__loaded.set()
+        logging.debug("NER model load time %s ms", self.__load_ms)
+
+        stopping = False
+        while not stopping:
+            request = self.__requests.get()
+            if request is None:
+                break
+
+            batch, size = [request], len(request["sentences"])
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while size < self.max_batch_size:
+                try:
+                    request = self.__requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request["sentences"])
+
+            self.__run(batch, size)
+
+    def __run(
+            self, batch: list[dict], size: int
+    ) -> None:
+        try:
+            if self.__load_error is not None:
+                raise self.__load_error
+            predictions, _ = self.__model.predict([sentence for request in batch for sentence in request["sentences"]])
+            start = 0
+            for request in batch:
+                request["predictions"] = predictions[start:start + len(request["sentences"])]
+                start += len(request["sentences"])
+        except Exception as e:
+            logging.error(f"Failed to predict a batch of {size} sentences {e}")
+            for request in batch:
+                request["error"] = e
+
+        answered = time.perf_counter()
+        with self.__metrics_lock:
+            self.__calls += len(batch)
+            self.__batches += 1
+            self.__batch_sizes.append(size)
+            self.__latencies.extend((answered - request["queued"]) * 1000 for request in batch)
+
+        for request in batch:
+            request["done"].set()
@@ -0,0 +1,336 @@
+"""
+This module contains the NERTagger class, an averaged perceptron which tags the words of an order with the
+labels of the fine-tuned BERT model from the words around them, the labels it gave the words before and the
+spans of the EntityExtractor. It has a row of label weights per feature, tagging a word sums the rows of
+its 20 or so features, and it predicts the way `NERModel.predict` does, so the NERServer serves it when
+NER_RUNTIME is tagger. It is trained on `other/datasets/ner_dataset.csv`, or on the labels the BERT model
+gives its sentences:
+    python -m src.ai_integration.ner_tagger
+"""
+import random
+import logging
+from os import path
+from io import StringIO
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Final
+import numpy as np
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.entity_extractor import EntityExtractor
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+NER_TAGGER_PATH: Final = path.join(path.dirname(path.realpath(__file__)), "../..",
+                                   "other/genai_models/ner_tagger.npz")
+
+OUTSIDE: Final = "O"
+# the label of the words before the first word
+START: Final = "-START-"
+
+
+def vocabulary_labels(
+        words: list[str], extractor: EntityExtractor = None
+) -> list[list[str]]:
+    """
+    This function returns the labels of the EntityExtractor spans every word is part of, the hand written
+    vocabulary tells the tagger about words it never saw tagged.
+    @param words: words of the sentence ex. ["two", "oat", "milk", "lattes"]
+    @param extractor: defaults to the shared EntityExtractor
+    @rtype: list[list[str]]
+    @return: ex. [["B-quantities"], ["B-milk_type"], ["I-milk_type"], ["B-coffee"]]
+    """
+    extractor = extractor if extractor else EntityExtractor.instance()
+    casefolded = [word.casefold() for word in words]
+    starts = list(accumulate((len(word) + 1 for word in casefolded), initial=0))
+
+    labels = [[] for _ in words]
+    for label, _, start, end in extractor.spans(" ".join(casefolded)):
+        first = bisect_right(starts, start) - 1
+        for index in range(first, len(words)):
+            if starts[index] >= end:
+                break
+            labels[index].append(f"{'B' if starts[index] == start else 'I'}-{label}")
+
+    return labels
+
+
+def word_features(
+        words: list[str], index: int, previous: str, before_previous: str, vocabulary: list[list[str]]
+) -> list[str]:
+    """
+    This function returns the features of a word, its spelling, the words around it, the labels of the
+    two words before it and the vocabulary labels of it and the next word.
+    @param words: words of the sentence
+    @param index: index of the word
+    @param previous: label of the word before
+    @param before_previous: label of the word two before
+    @param vocabulary: output of vocabulary_labels
+    @rtype: list[str]
+    @return: ex. ["bias", "w=latte", "s3=tte", ..., "t-1=B-SIZE", ..., "v=B-coffee"]
+    """
+    lowered = [word.lower() for word in words[max(index - 2, 0):index + 3]]
+    position = min(index, 2)
+    word = lowered[position]
+    before = lowered[position - 1] if position > 0 else START
+    after = lowered[position + 1] if position + 1 < len(lowered) else "-END-"
+
+    shape = "digit" if word.isdigit() else "title" if words[index].istitle() else "lower"
+    features = [
+        "bias",
+        f"w={word}",
+        f"p3={word[:3]}",
+        f"s2={word[-2:]}",
+        f"s3={word[-3:]}",
+        f"shape={shape}",
+        f"w-1={before}",
+        f"w-2={lowered[position - 2] if position > 1 else START}",
+        f"w+1={after}",
+        f"w+2={lowered[position + 2] if position + 2 < len(lowered) else '-END-'}",
+        f"w-1,w={before},{word}",
+        f"w,w+1={word},{after}",
+        f"t-1={previous}",
+        f"t-2,t-1={before_previous},{previous}",
+        f"t-1,w={previous},{word}",
+    ]
+    features.extend(f"v={label}" for label in vocabulary[index])
+    if index + 1 < len(words):
+        features.extend(f"v+1={label}" for label in vocabulary[index + 1])
+
+    return features
+
+
+class NERTagger:
+    """
+    This class tags words greedily from left to right with the averaged weights of a perceptron, a row
+    of label weights per feature.
+    """
+    def __init__(
+            self, labels: list[str], features: list[str], weights: np.ndarray
+    ) -> None:
+        self.labels = list(labels)
+        self.__rows = {feature: row for row, feature in enumerate(features)}
+        # a last row of zeros for the features which were never seen in training
+        self.__weights = np.vstack([weights, np.zeros((1, len(self.labels)), dtype=weights.dtype)])
+
+    @staticmethod
+    def load(
+            tagger_path: str = NER_TAGGER_PATH
+    ) -> 'NERTagger':
+        """
+        This method loads a tagger saved by `save`.
+        @param tagger_path: npz file of the tagger
+        @rtype: NERTagger
+        @return: tagger
+        """
+        with np.load(tagger_path) as tagger:
+            return NERTagger(tagger["labels"].tolist(), tagger["features"].tolist(), tagger["weights"])
+
+    def save(
+            self, tagger_path: str = NER_TAGGER_PATH
+    ) -> None:
+        """
+        This method saves the labels, the features and their weights.
+        @param tagger_path: npz file of the tagger
+        @rtype: None
+        @return: Nothing
+        """
+        np.savez_compressed(tagger_path, labels=np.array(self.labels), features=np.array(list(self.__rows)),
+                            weights=self.__weights[:-1])
+
+    def parameters(
+            self
+    ) -> int:
+        """
+        This method returns the number of weights.
+        @rtype: int
+        @return: ex. 120000
+        """
+        return self.__weights[:-1].size
+
+    def scores(
+            self, features: list[str]
+    ) -> np.ndarray:
+        """
+        This method returns the score of every label for the features of a word.
+        @param features: output of word_features
+        @rtype: np.ndarray
+        @return: score of every label in the order of `labels`
+        """
+        unseen = len(self.__rows)
+        return self.__weights[[self.__rows.get(feature, unseen) for feature in features]].sum(axis=0)
+
+    def tag(
+            self, words: list[str]
+    ) -> list[str]:
+        """
+        This method returns the label of every word.
+        @param words: words of the sentence ex. ["two", "large", "lattes"]
+        @rtype: list[str]
+        @return: ex. ["B-QUANTITY", "B-SIZE", "B-COFFEE-TYPE"]
+        """
+        return [label for label, _ in self.__tag(words)]
+
+    def predict(
+            self, sentences: list[str]
+    ) -> tuple[list, list]:
+        """
+        This method predicts the label of every word of the sentences, words are split on spaces.
+        @param sentences: customer requests ex. ["a large latte"]
+        @rtype: tuple[list, list]
+        @return: labels and scores of every word, the way `NERModel.predict` returns them
+        ex. ([[{"a": "B-QUANTITY"}, {"large": "B-SIZE"}, {"latte": "B-COFFEE-TYPE"}]], [[{"a": [...]}, ...]])
+        """
+        predictions, outputs = [], []
+        for sentence in sentences:
+            words = sentence.split()
+            tagged = self.__tag(words)
+            predictions.append([{word: label} for word, (label, _) in zip(words, tagged)])
+            outputs.append([{word: scores.tolist()} for word, (_, scores) in zip(words, tagged)])
+
+        return predictions, outputs
+
+    def __tag(
+            self, words: list[str]
+    ) -> list[tuple[str, np.ndarray]]:
+        tagged, previous, before_previous = [], START, START
+        vocabulary = vocabulary_labels(words)
+        for index in range(len(words)):
+            scores = self.scores(word_features(words, index, previous, before_previous, vocabulary))
+            label = self.labels[int(np.argmax(scores))]
+            tagged.append((label, scores))
+            before_previous, previous = previous, label
+
+        return tagged
+
+
+def split_sentences(
+        fraction: float = 0.2, seed: int = 0, csv_file: StringIO = None
+) -> tuple[list[tuple[list[str], list[str]]], list[tuple[list[str], list[str]]]]:
+    """
+    This function splits the tagged sentences of the dataset, the words of a sentence stay together.
+    @param fraction: share of the sentences which are held out
+    @param seed: seed of the random generator
+    @param csv_file: dataset, defaults to `other/datasets/ner_dataset.csv`
+    @rtype: tuple[list[tuple[list[str], list[str]]], list[tuple[list[str], list[str]]]]
+    @return: training and held out words and labels of every sentence
+    ex. ([(["a", "latte"], ["B-QUANTITY", "B-COFFEE-TYPE"]), ...], [...])
+    """
+    # imported here, tagging doesn't need simpletransformers
+    from src.ai_integration.bert_fine_tuning import load_data  # pylint: disable=C0415
+
+    data = load_data(csv_file)
+    sentences = []
+    for _, group in data.groupby("sentence_id", sort=True):
+        # a few words of the dataset have spaces ex. "caramel syrup", orders are split on spaces
+        words, labels = [], []
+        for word, label in zip(group["words"].astype(str), group["labels"]):
+            pieces = word.split()
+            words.extend(pieces)
+            labels.extend([label] + [label if label == OUTSIDE else f"I-{label[2:]}"] * (len(pieces) - 1))
+        sentences.append((words, labels))
+    random.Random(seed).shuffle(sentences)
+    held_out = round(len(sentences) * fraction)
+
+    return sentences[held_out:], sentences[:held_out]
+
+
+def teacher_labels(
+        sentences: list[tuple[list[str], list[str]]], teacher: Any, batch_size: int = 32
+) -> list[tuple[list[str], list[str]]]:
+    """
+    This function replaces the labels of the sentences with the ones the teacher predicts, a tagger trained
+    on them learns to tag like the teacher.
+    @param sentences: words and labels of every sentence
+    @param teacher: model with a simpletransformers `predict` ex. NERModel('bert', ...)
+    @param batch_size: sentences per `predict`
+    @rtype: list[tuple[list[str], list[str]]]
+    @return: words and predicted labels of every sentence
+    """
+    relabeled = []
+    for start in range(0, len(sentences), batch_size):
+        batch = sentences[start:start + batch_size]
+        predictions, _ = teacher.predict([" ".join(words) for words, _ in batch])
+        relabeled.extend((words, [label for word in prediction for label in word.values()])
+                         for (words, _), prediction in zip(batch, predictions))
+
+    return relabeled
+
+
+def train_tagger(
+        sentences: list[tuple[list[str], list[str]]], epochs: int = 5, seed: int = 0
+) -> NERTagger:
+    """
+    This function trains an averaged perceptron, the weights are averaged over every word of every epoch
+    so the ones of the last updates don't dominate.
+    @param sentences: words and labels of every sentence
+    @param epochs: passes over the sentences, they are shuffled every pass
+    @param seed: seed of the random generator
+    @rtype: NERTagger
+    @return: tagger
+    """
+    # ties go to the first label, OUTSIDE is first so an unknown word is outside of every entity
+    labels = [OUTSIDE] + sorted({label for _, sentence_labels in sentences for label in sentence_labels} - {OUTSIDE})
+    weights: dict[str, dict[str, float]] = {}
+    # sum of every weight over the steps and the step it last changed, for the average
+    totals: dict[tuple[str, str], float] = {}
+    stamps: dict[tuple[str, str], int] = {}
+
+    generator, step = random.Random(seed), 0
+    sentences = list(sentences)
+    vocabularies = {id(words): vocabulary_labels(words) for words, _ in sentences}
+    for epoch in range(epochs):
+        generator.shuffle(sentences)
+        mistakes = 0
+        for words, sentence_labels in sentences:
+            previous, before_previous = START, START
+            vocabulary = vocabularies[id(words)]
+            for index, truth in enumerate(sentence_labels):
+                step += 1
+                features = word_features(words, index, previous, before_previous, vocabulary)
+                scores = dict.fromkeys(labels, 0.0)
+                for feature in features:
+                    for label, weight in weights.get(feature, {}).items():
+                        scores[label] += weight
+                guess = max(labels, key=scores.__getitem__)
+                if guess != truth:
+                    mistakes += 1
+                    for feature in features:
+                        label_weights = weights.setdefault(feature, {})
+                        for label, change in ((truth, 1.0), (guess, -1.0)):
+                            key, weight = (feature, label), label_weights.get(label, 0.0)
+                            totals[key] = totals.get(key, 0.0) + (step - stamps.get(key, 0)) * weight
+                            stamps[key] = step
+                            label_weights[label] = weight + change
+                before_previous, previous = previous, guess
+        logging.debug("epoch %s: %s mistakes", epoch, mistakes)
+
+    columns = {label: column for column, label in enumerate(labels)}
+    features = list(weights)
+    averaged = np.zeros((len(features), len(labels)), dtype=np.float32)
+    for row, feature in enumerate(features):
+        for label, weight in weights[feature].items():
+            total = totals.get((feature, label), 0.0) + (step - stamps.get((feature, label), 0)) * weight
+            averaged[row, columns[label]] = total / step
+
+    return NERTagger(labels, features, averaged)
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    training, _ = split_sentences(fraction=0.0)
+    tagger = train_tagger(training)
+    tagger.save()
+
+    print(f"{len(training)} sentences, {tagger.parameters()} weights saved to {NER_TAGGER_PATH}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,285 @@
+"""
+This module contains the QuantityAligner class which gives every item, add-on, sweetener and milk of an
+order the quantity said right before it, in one scan of the order:
+    "one black coffee with one cream and a pump of caramel" -> ["one", "one", "a"]
+It cuts the order into the same pieces `quantity_correction.split_order` does, the captured alternative
+of the first pattern which matches and the text between the matches, but walks the token trie of the
+EntityExtractor instead of running the 14 patterns of split_order. Number words which follow each other
+are read as one quantity:
+    "twenty two lattes" -> ["22"]
+    "a couple of lattes" -> ["2"]
+    "two dozen donuts" -> ["24"]
+An item whose name starts with a flavor is matched whole instead of the flavor split_order stops at:
+    "two mango smoothies" -> ["two"]
+"""
+import threading
+from typing import Optional, Final
+from other.number_map import NUMBERS
+from src.ai_integration.entity_extractor import EntityExtractor, WORD_PATTERN
+
+# split_order matches "cheese" without a word boundary and doesn't capture it
+CHEESE: Final = "cheese"
+
+# the order split_order tries the patterns in
+SPLIT_LABELS: Final = (
+    "sizes", "coffee", "quantities", "temperature", CHEESE, "sweeteners", "flavors", "beverage", "food",
+    "bakery", "add_ons", "milk_type", "allergies"
+)
+
+# order type -> labels whose entities get a quantity
+ITEM_LABELS: Final = {
+    "coffee": ("coffee", "add_ons", "sweeteners", "milk_type"),
+    "beverage": ("beverage", "add_ons", "sweeteners"),
+    "food": ("food",),
+    "bakery": ("bakery",),
+}
+
+TENS: Final = frozenset({"twenty"})
+UNITS: Final = frozenset({"one", "two", "three", "four", "five", "six", "seven", "eight", "nine"})
+MULTIPLIERS: Final = frozenset({"dozen", "bakers dozen"})
+# quantities which can follow "a" and be followed by "of", ex. "a couple of"
+QUANTIFIERS: Final = frozenset({"couple", "few", "dozen", "bakers dozen", "lot", "a lot"})
+
+
+def number_value(
+        word: str
+) -> int | None:
+    """
+    This function returns the value of a quantity matched by QUANTITY_PATTERN.
+    @param word: ex. "twelve" or "12"
+    @rtype: int | None
+    @return: ex. 12, None if the word isn't a number
+    """
+    if word.isdecimal():
+        return int(word)
+
+    return NUMBERS.get(word)
+
+
+def combine(
+        phrase: tuple[list[str], int] | None, word: str, value: int
+) -> tuple[list[str], int]:
+    """
+    This function adds a number word to the quantity said before it, a word which can't continue the
+    quantity starts a new one, ex. "one two lattes" is two lattes.
+    @param phrase: words of the quantity and its value ex. (["twenty"], 20)
+    @param word: next number word ex. "two"
+    @param value: value of the word ex. 2
+    @rtype: tuple[list[str], int]
+    @return: ex. (["twenty", "two"], 22)
+    """
+    if phrase is None:
+        return [word], value
+
+    words, total = phrase
+    if words[-1] in TENS and (word in UNITS or word.isdecimal() and 0 < value < 10):
+        return words + [word], total + value
+    if word in MULTIPLIERS and words[-1] not in MULTIPLIERS:
+        return words + [word], total * value
+    if words == ["a"] or words == ["an"]:
+        if word in QUANTIFIERS:
+            return words + [word], value
+
+    return [word], value
+
+
+def compound_quantity(
+        text: str, quantities: list[str]
+) -> bool:
+    """
+    This function checks if two quantities of the order follow each other and are read as one quantity.
+    @param text: casefolded order ex. "twenty two lattes"
+    @param quantities: quantities the EntityExtractor parsed ex. ["twenty", "two"]
+    @rtype: bool
+    @return: True if the order has a quantity of several words ex. "twenty two", "a couple" or "two dozen"
+    """
+    padded = f" {text} "
+    for previous, word in zip(quantities, quantities[1:]):
+        previous_value, value = number_value(previous), number_value(word)
+        if previous_value is None or value is None:
+            continue
+        if len(combine(([previous], previous_value), word, value)[0]) > 1 and f" {previous} {word} " in padded:
+            return True
+
+    return False
+
+
+class QuantityAligner:
+    """
+    This singleton class aligns quantities with the trie of an EntityExtractor.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['QuantityAligner'] = None
+
+    def __init__(
+            self, extractor: EntityExtractor = None
+    ) -> None:
+        self.__extractor = extractor if extractor else EntityExtractor.instance()
+        # the labels in the order split_order tries them, so the first candidate of a token is its match
+        patterns = self.__extractor.patterns()
+        self.__splitter = EntityExtractor({label: patterns[label] for label in SPLIT_LABELS if label in patterns})
+        # a word which isn't one of these or a number can't start a match
+        self.__first_tokens = self.__splitter.first_tokens(frozenset(SPLIT_LABELS))
+        self.__cheese_rank = SPLIT_LABELS.index(CHEESE)
+        self.__ranks = {label: rank for rank, label in enumerate(SPLIT_LABELS)}
+
+    @staticmethod
+    def instance(
+
+    ) -> 'QuantityAligner':
+        """
+        This method is used to get the aligner of the shared EntityExtractor, it is rebuilt when the
+        extractor was swapped.
+        @rtype: QuantityAligner
+        @return: aligner shared by every caller in this process
+        """
+        extractor = EntityExtractor.instance()
+        with QuantityAligner.__lock:
+            if not QuantityAligner.__instance or QuantityAligner.__instance.__extractor is not extractor:
+                QuantityAligner.__instance = QuantityAligner(extractor)
+
+            return QuantityAligner.__instance
+
+    def pieces(
+            self, text: str, items: set[str] = None
+    ) -> list[tuple[str, str]]:
+        """
+        This method cuts the order into the pieces of `split_order`.
+        @param text: casefolded order ex. "two lattes with oat milk"
+        @param items: items matched whole when split_order would stop at the first of their words
+        ex. {"mango smoothie"} for "two mango smoothies"
+        @rtype: list[tuple[str, str]]
+        @return: piece and the label which matched it, "" for the text between matches
+        ex. [("two", "quantities"), ("latte", "coffee"), ("with", ""), ("oat milk", "milk_type")]
+        """
+        tokens, offsets = self.__splitter.tokenize(text)
+        # the word tokens alternate with the separators, only the ones which can start a match are tried
+        first_tokens = self.__first_tokens
+        starts = [index for index in range(0 if WORD_PATTERN.match(text) else 1, len(tokens), 2)
+                  if tokens[index] in first_tokens or tokens[index].isdecimal()]
+
+        # only the first word of an item of several words can start a longer match than split_order's
+        item_starts = {item[:item.find(" ")] for item in items if " " in item} if items else set()
+
+        pieces, position, cheese, next_start = [], 0, -1, 0
+        while True:
+            if cheese < position:
+                cheese = text.find(CHEESE, position)
+            start, match = -1, None
+            while next_start < len(starts):
+                index = starts[next_start]
+                if offsets[index] >= position:
+                    if 0 <= cheese < offsets[index]:
+                        break
+                    match = self.__first_match(text, tokens, offsets, index, offsets[index] == cheese)
+                    if match and tokens[index] in item_starts and match[1] not in items:
+                        match = self.__item_match(text, tokens, offsets, index, items, match)
+                    if match:
+                        start = offsets[index]
+                        break
+                next_start += 1
+            if match is None:
+                if cheese < 0:
+                    break
+                start, match = cheese, (CHEESE, "", cheese + len(CHEESE))
+
+            label, alternative, end = match
+            gap = text[position:start].strip()
+            if gap:
+                pieces.append((gap, ""))
+            if alternative:
+                pieces.append((alternative, label))
+            position = end
+
+        gap = text[position:].strip()
+        if gap:
+            pieces.append((gap, ""))
+
+        return pieces
+
+    def align(
+            self, text: str, items: set[str]
+    ) -> list[str]:
+        """
+        This method returns the quantity of every piece of the order which is one of the items. The
+        quantity is the number said right before the item, or "1" if it isn't a number. The list is empty
+        when none of the items is a piece of the order.
+        @param text: casefolded order ex. "one black coffee with a cream"
+        @param items: entities which need a quantity ex. {"black coffee", "cream"}
+        @rtype: list[str]
+        @return: the number word, or the digits of a quantity of several words ex. ["one", "a"]
+        """
+        quantities = []
+        phrase, previous = None, ""
+        for piece, label in self.pieces(text, items):
+            if piece in items:
+                if phrase:
+                    words, value = phrase
+                    quantities.append(words[0] if len(words) == 1 else str(value))
+                else:
+                    quantities.append(previous if previous.isnumeric() else "1")
+
+            value = number_value(piece) if label == "quantities" else None
+            if value is not None:
+                phrase = combine(phrase, piece, value)
+            elif not (piece == "of" and phrase and phrase[0][-1] in QUANTIFIERS):
+                phrase = None
+            previous = piece
+
+        return quantities
+
+    def __first_match(
+            self, text: str, tokens: list[str], offsets: list[int], index: int, cheese: bool
+    ) -> tuple[str, str, int] | None:
+        match = self.__splitter.first_match_at(text, tokens, offsets, index)
+        if cheese and (match is None or self.__ranks[match[0]] > self.__cheese_rank):
+            return CHEESE, "", offsets[index] + len(CHEESE)
+
+        return match
+
+    def __item_match(
+            self, text: str, tokens: list[str], offsets: list[int], index: int, items: set[str],
+            match: tuple[str, str, int]
+    ) -> tuple[str, str, int]:
+        longer = [candidate for candidate in self.__splitter.matches_at(text, tokens, offsets, index)
+                  if candidate[1] in items and candidate[2] > match[2]]
+
+        return max(longer, key=lambda candidate: candidate[2]) if longer else match
+
+
+def align_quantities(
+        text: str, order_type: str, order_details: dict
+) -> list[str]:
+    """
+    This function returns the quantity of every item, add-on, sweetener and milk of an order.
+    @param text: casefolded order
+    @param order_type: coffee, beverage, food or bakery
+    @param order_details: entities of the order ex. {"coffee": ["latte"], "add_ons": [], ...}
+    @rtype: list[str]
+    @return: quantities in the order the items are said ex. ["two", "1"], the parsed quantities if none of
+    the items is found in the order
+    """
+    items = {item for label in ITEM_LABELS[order_type] for item in order_details[label]}
+    quantities = QuantityAligner.instance().align(text, items)
+
+    return quantities if quantities else list(order_details["quantities"])
+
+
+def verify_quantities(
+        text: str, order_type: str, order_details: dict
+) -> list[str]:
+    """
+    This function returns the quantities of an order, they are only aligned when the order has add-ons,
+    sweeteners or milk, no quantity, or a quantity of several words.
+    @param text: casefolded order
+    @param order_type: coffee, beverage, food or bakery
+    @param order_details: entities of the order ex. {"quantities": ["twenty", "two"], "coffee": ["latte"], ...}
+    @rtype: list[str]
+    @return: ex. ["22"] for "twenty two lattes", the parsed quantities when they don't need aligning
+    """
+    num_additions = sum(len(order_details[label]) for label in ITEM_LABELS[order_type][1:])
+    quantities = order_details["quantities"]
+    if num_additions or not quantities or compound_quantity(text, quantities):
+        return align_quantities(text, order_type, order_details)
+
+    return quantities
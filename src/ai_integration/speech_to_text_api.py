@@ -5,14 +5,13 @@ import io
 import time
 import wave
 import logging
-from os import path
-from os import getenv as env
 import whisper
 from deepgram import Deepgram
 from dotenv import load_dotenv
 from pydub import AudioSegment
 import speech_recognition as speech
 from src.django_beanhub.settings import DEBUG
+from src.external_connections.credentials_provider import CredentialsProvider
 
 load_dotenv()
 
@@ -68,12 +67,7 @@ def nova_speech_api(
     @rtype: str
     @return: transcription
     """
-    key = env("DEEPGRAM_API_KEY")
-    if not key:
-        key_path = path.join(path.dirname(path.realpath(__file__)),
-                             "../..", "other", "deepgram_api_key.txt")
-        with open(key_path, encoding='utf-8') as api_key:
-            key = api_key.readline().strip()
+    key = CredentialsProvider.instance().deepgram_api_key()
 
     start_time = time.time()
     dg = Deepgram(key)
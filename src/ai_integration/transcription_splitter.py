@@ -0,0 +1,118 @@
+"""
+This module contains the TranscriptionSplitter class and the function split_on_separators which split a
+transcription into one order per item at the separator words of SPLIT_PATTERN, ex.
+    "a latte and a glazed donut" -> ["a latte ", " a glazed donut"]
+A separator doesn't split when one of the SPLIT_EXCEPTION_PATTERN patterns follows it, or follows the
+word after it, ex. "a latte and oat milk". Every separator only looks at the two words after it and
+only tokenizes them when they can start an exception, so the time grows linearly with the transcription
+however long the whitespace runs, the words or the menu are.
+"""
+import re
+import threading
+from typing import Optional, Final
+from other.regex_patterns import SPLIT_PATTERN
+from other.vocabulary import split_alternatives
+from src.ai_integration.entity_extractor import EntityExtractor
+
+SEPARATORS: Final = frozenset(split_alternatives(SPLIT_PATTERN))
+# the patterns of SPLIT_EXCEPTION_PATTERN by the label the EntityExtractor gives them
+EXCEPTION_LABELS: Final = frozenset({"flavors", "milk_type", "add_ons", "temperature", "sweeteners"})
+# SPLIT_EXCEPTION_PATTERN matches "cheese" without a word boundary, ex. "and cheesecake" doesn't split
+EXCEPTION_PREFIXES: Final = ("cheese",)
+SEPARATOR_PATTERN: Final = re.compile(r'\b(?:' + '|'.join(sorted(SEPARATORS)) + r')\b')
+# whitespace, a word, then whitespace and a word. The quantifiers are possessive so nothing backtracks
+FOLLOWING_PATTERN: Final = re.compile(r'\s++(\w++)(?:\s++(\w++))?')
+
+
+class TranscriptionSplitter:
+    """
+    This singleton class splits transcriptions with the trie of an EntityExtractor.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['TranscriptionSplitter'] = None
+
+    def __init__(
+            self, extractor: EntityExtractor = None
+    ) -> None:
+        self.__extractor = extractor if extractor else EntityExtractor.instance()
+        # a word which isn't one of these can't start an exception, most words after a separator aren't
+        self.__first_tokens = self.__extractor.first_tokens(EXCEPTION_LABELS)
+
+    @staticmethod
+    def instance(
+
+    ) -> 'TranscriptionSplitter':
+        """
+        This method is used to get the splitter of the shared EntityExtractor, it is rebuilt when the
+        extractor was swapped.
+        @rtype: TranscriptionSplitter
+        @return: splitter shared by every caller in this process
+        """
+        extractor = EntityExtractor.instance()
+        with TranscriptionSplitter.__lock:
+            if not TranscriptionSplitter.__instance or TranscriptionSplitter.__instance.__extractor is not extractor:
+                TranscriptionSplitter.__instance = TranscriptionSplitter(extractor)
+
+            return TranscriptionSplitter.__instance
+
+    def separators(
+            self, text: str
+    ) -> list[tuple[int, int]]:
+        """
+        This method finds the separators which split the transcription.
+        @param text: transcription ex. "a latte and a glazed donut"
+        @rtype: list[tuple[int, int]]
+        @return: start and end of every separator ex. [(8, 11)]
+        """
+        found = []
+        for separator in SEPARATOR_PATTERN.finditer(text):
+            # the separator, whitespace, an optional word and whitespace, then the exception
+            following = FOLLOWING_PATTERN.match(text, separator.end())
+            if following is None or not self.__is_exception(text, following):
+                found.append(separator.span())
+
+        return found
+
+    def split(
+            self, text: str
+    ) -> list[str]:
+        """
+        This method splits the transcription at every separator, the separators and empty parts are dropped.
+        @param text: transcription ex. "a latte and a glazed donut"
+        @rtype: list[str]
+        @return: ex. ["a latte ", " a glazed donut"]
+        """
+        parts, previous = [], 0
+        for start, end in self.separators(text):
+            parts.append(text[previous:start])
+            previous = end
+        parts.append(text[previous:])
+
+        return [part for part in parts if part and part not in SEPARATORS]
+
+    def __is_exception(
+            self, text: str, following: re.Match
+    ) -> bool:
+        for word in (1, 2):
+            start = following.start(word)
+            if start < 0:
+                return False
+            if text.startswith(EXCEPTION_PREFIXES, start):
+                return True
+            if following.group(word) in self.__first_tokens and \
+                    not EXCEPTION_LABELS.isdisjoint(self.__extractor.labels_from(text, start)):
+                return True
+
+        return False
+
+
+def split_on_separators(
+        text: str
+) -> list[str]:
+    """
+    This function splits the transcription at every separator, the separators and empty parts are dropped.
+    @param text: transcription ex. "a latte and a glazed donut"
+    @rtype: list[str]
+    @return: ex. ["a latte ", " a glazed donut"]
+    """
+    return TranscriptionSplitter.instance().split(text)
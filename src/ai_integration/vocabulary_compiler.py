@@ -0,0 +1,290 @@
+"""
+This module contains the VocabularyCompiler class which adds the names of the products and deals tables
+to the hand written vocabularies of `other/regex_patterns.py` and builds the EntityExtractor from them,
+so a new menu item is recognized without editing a pattern:
+    "Flat White" with a CoffeeItem deal -> coffee alternative "flat white"
+    "Strawberry Smoothie"               -> beverage, it ends like "mango smoothie"
+The alternatives are compiled into the token trie of the EntityExtractor, a transcription costs one
+dictionary lookup per token however many items the menu has. A new extractor is built aside and swapped
+in atomically when the names change, parses which are running keep the extractor they started with:
+    python -m src.ai_integration.vocabulary_compiler
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional, Final
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.entity_extractor import EntityExtractor, ENTITY_PATTERNS
+from src.ai_integration.embeddings_api import parse_menu_csv, parse_deals_csv
+from src.vector_db.menu_aliases import singular
+from other.vocabulary import ITEM_PATTERNS, split_alternatives, pattern_alternatives
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# item_type of the deals table -> label of the EntityExtractor
+ITEM_TYPE_LABELS: Final = {
+    "CoffeeItem": "coffee",
+    "BeverageItem": "beverage",
+    "FoodItem": "food",
+    "BakeryItem": "bakery",
+}
+
+# label of menu names whose words don't tell what they are
+CATEGORIES: Final = {
+    "flat white": "coffee",
+    "mocha": "coffee",
+    "lemonade": "beverage",
+    "hashbrowns": "food",
+    "wrap": "food",
+    "cannoli": "bakery",
+}
+
+# leading words a name must share with an alternative to get its label, one shared leading word is
+# usually a flavor, ex. "vanilla" in "vanilla cannoli" and "vanilla milkshake"
+MIN_SHARED_PREFIX: Final = 2
+
+
+def menu_words(
+        name: str
+) -> str:
+    """
+    This function returns a menu name the way it is spelled in a casefolded transcription.
+    @param name: ex. "Egg and Cheese on a Croissant"
+    @rtype: str
+    @return: ex. "egg and cheese on a croissant"
+    """
+    return " ".join(re.findall(r'[a-z0-9]+', name.casefold()))
+
+
+def vocabulary_index(
+        vocabulary: dict[str, list[str]]
+) -> dict[tuple[str, tuple[str, ...]], str]:
+    """
+    This function maps the last words, and the first `MIN_SHARED_PREFIX` or more words, of every
+    alternative to its label, the first label wins where alternatives of several labels share them.
+    @param vocabulary: alternatives of every label ex. {"add_ons": ["pump of caramel"]}
+    @rtype: dict[tuple[str, tuple[str, ...]], str]
+    @return: ex. {("suffix", ("caramel",)): "add_ons", ("prefix", ("pump", "of")): "add_ons", ...}
+    """
+    index = {}
+    for label, alternatives in vocabulary.items():
+        for alternative in alternatives:
+            words = tuple(singular(word) for word in alternative.split())
+            for shared in range(1, len(words) + 1):
+                index.setdefault(("suffix", words[-shared:]), label)
+                if shared >= MIN_SHARED_PREFIX:
+                    index.setdefault(("prefix", words[:shared]), label)
+
+    return index
+
+
+def classify(
+        name: str, index: dict[tuple[str, tuple[str, ...]], str]
+) -> str | None:
+    """
+    This function returns the label of the alternative which ends with the most words of the name, the
+    last words of a menu name say what the item is. A name only gets the label of an alternative it
+    starts like if they share `MIN_SHARED_PREFIX` words and no alternative ends with as many of its words.
+    @param name: menu name ex. "pump of espresso"
+    @param index: output of vocabulary_index
+    @rtype: str | None
+    @return: ex. "add_ons", None if no alternative is alike
+    """
+    words = tuple(singular(word) for word in name.split())
+
+    for shared in range(len(words), 0, -1):
+        label = index.get(("suffix", words[-shared:])) or index.get(("prefix", words[:shared]))
+        if label:
+            return label
+
+    return None
+
+
+def compile_patterns(
+        menu_names: list[str], deals: list[tuple[str, str]], patterns: dict[str, tuple[str, bool]] = None,
+        categories: dict[str, str] = None
+) -> tuple[dict[str, tuple[str, bool]], list[str]]:
+    """
+    This function adds every menu and deal name which isn't an alternative yet to the pattern of its
+    label. The hand written alternatives keep their order, so they still win where a name starts the
+    same way, and empty alternatives are dropped.
+    @param menu_names: item_name of every product ex. ["Flat White", "Latte"]
+    @param deals: item_name and item_type of every deal ex. [("flat white", "CoffeeItem")]
+    @param patterns: label -> (pattern, plural) the names are added to, defaults to ENTITY_PATTERNS
+    @param categories: label of names, or of the last word of names, which can't be classified, defaults
+    to CATEGORIES ex. {"mocha": "coffee", "wrap": "food"}
+    @rtype: tuple[dict[str, tuple[str, bool]], list[str]]
+    @return: patterns for the EntityExtractor and the names which couldn't be given a label
+    """
+    patterns = patterns if patterns else ENTITY_PATTERNS
+    categories = categories if categories is not None else CATEGORIES
+    labels = {menu_words(name): label for name, label in categories.items()}
+    for item_name, item_type in deals:
+        if item_type in ITEM_TYPE_LABELS:
+            labels.setdefault(menu_words(item_name), ITEM_TYPE_LABELS[item_type])
+
+    alternatives = {label: [alternative for alternative in split_alternatives(pattern) if alternative]
+                    for label, (pattern, _) in patterns.items()}
+    known = {alternative for label_alternatives in alternatives.values() for alternative in label_alternatives}
+    index = vocabulary_index({label: pattern_alternatives(pattern) for label, (pattern, _) in patterns.items()
+                              if label in ITEM_PATTERNS})
+
+    added, unclassified = 0, []
+    for name in [item_name for item_name, _ in deals] + list(menu_names):
+        name = menu_words(name)
+        if not name or name in known or " ".join(name.split()[:-1] + [singular(name.split()[-1])]) in known:
+            continue
+        label = labels.get(name) or labels.get(name.split()[-1]) or classify(name, index)
+        if label not in alternatives:
+            unclassified.append(name)
+            continue
+        alternatives[label].append(name)
+        known.add(name)
+        added += 1
+
+    logging.debug("compiled %s menu names into the vocabulary, %s unclassified", added, len(unclassified))
+
+    compiled = {}
+    for label, (_, plural) in patterns.items():
+        group = r'\b(' + '|'.join(alternatives[label]) + r')'
+        compiled[label] = (group + (r's?\b' if plural else r'\b'), plural)
+
+    return compiled, unclassified
+
+
+def fingerprint(
+        menu_names: list[str], deals: list[tuple[str, str]]
+) -> str:
+    """
+    This function hashes the names the vocabulary is compiled from, the order of the rows doesn't matter.
+    @param menu_names: item_name of every product
+    @param deals: item_name and item_type of every deal
+    @rtype: str
+    @return: sha256 hex digest
+    """
+    names = sorted(menu_words(name) for name in menu_names)
+    typed = sorted(f"{menu_words(item_name)}:{item_type}" for item_name, item_type in deals)
+
+    return hashlib.sha256("\n".join(names + ["--"] + typed).encode("utf-8")).hexdigest()
+
+
+class VocabularyCompiler:
+    """
+    This singleton class recompiles the EntityExtractor when the menu changes. The extractor is built
+    outside of the lock the parses take, so orders are never blocked while it compiles.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['VocabularyCompiler'] = None
+
+    def __init__(
+            self, patterns: dict[str, tuple[str, bool]] = None, categories: dict[str, str] = None
+    ) -> None:
+        self.__patterns = patterns if patterns else ENTITY_PATTERNS
+        self.__categories = categories if categories is not None else CATEGORIES
+        self.__reload_lock = threading.Lock()
+        self.__fingerprint: str | None = None
+        self.__unclassified: list[str] = []
+
+    @staticmethod
+    def instance(
+
+    ) -> 'VocabularyCompiler':
+        """
+        This method is used to get the compiler of the process wide EntityExtractor.
+        @rtype: VocabularyCompiler
+        @return: compiler shared by every caller in this process
+        """
+        with VocabularyCompiler.__lock:
+            if not VocabularyCompiler.__instance:
+                VocabularyCompiler.__instance = VocabularyCompiler()
+
+            return VocabularyCompiler.__instance
+
+    def reload(
+            self, menu_names: list[str], deals: list[tuple[str, str]], force: bool = False
+    ) -> bool:
+        """
+        This method compiles the names and swaps the new extractor in, unless the names are the ones it
+        was compiled from last.
+        @param menu_names: item_name of every product
+        @param deals: item_name and item_type of every deal
+        @param force: compile even if the names didn't change
+        @rtype: bool
+        @return: True if the extractor was swapped
+        """
+        names_fingerprint = fingerprint(menu_names, deals)
+        with self.__reload_lock:
+            if not force and names_fingerprint == self.__fingerprint:
+                return False
+
+            compile_time = time.time()
+            patterns, self.__unclassified = compile_patterns(menu_names, deals, self.__patterns, self.__categories)
+            EntityExtractor.swap(EntityExtractor(patterns))
+            self.__fingerprint = names_fingerprint
+
+        logging.info("vocabulary compile time %s: %s names couldn't be classified %s",
+                     time.time() - compile_time, len(self.__unclassified), self.__unclassified)
+        return True
+
+    def load(
+            self, connection_pool=None, force: bool = False
+    ) -> bool:
+        """
+        This method compiles the names of the products and deals tables, or of menu.csv and deals.csv
+        without a connection pool.
+        @param connection_pool: pool of the database with the products and deals tables
+        @param force: compile even if the names didn't change
+        @rtype: bool
+        @return: True if the extractor was swapped
+        """
+        if connection_pool is None:
+            menu_names = [item["MenuItem"]["item_name"] for item in parse_menu_csv()]
+            deals = [(deal["Deal"]["item_name"], deal["Deal"]["item_type"]) for deal in parse_deals_csv()]
+            return self.reload(menu_names, deals, force)
+
+        db_connection = connection_pool.getconn()
+        try:
+            cur = db_connection.cursor()
+            cur.execute("SELECT item_name FROM products;")
+            menu_names = [item_name for item_name, in cur.fetchall() if item_name]
+            cur.execute("SELECT item_name, item_type FROM deals;")
+            deals = [(item_name, item_type) for item_name, item_type in cur.fetchall() if item_name]
+            cur.close()
+        finally:
+            connection_pool.putconn(db_connection)
+
+        return self.reload(menu_names, deals, force)
+
+    def unclassified(
+            self
+    ) -> list[str]:
+        """
+        This method returns the names of the last compile which are not recognized in orders.
+        @rtype: list[str]
+        @return: ex. ["mocha", "lemonade"]
+        """
+        return list(self.__unclassified)
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    compiler = VocabularyCompiler.instance()
+    compiler.load()
+
+    labels = EntityExtractor.instance().labels()
+    print(f"labels: {', '.join(labels)}")
+    print(f"unclassified: {', '.join(compiler.unclassified())}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -51,6 +51,8 @@ class AudioView(APIView):
         ###########################
         ## POSTGRESQL CONNECTION ##
         self.__connection_pool = self.connections.connection_pool()
+        self.__menu_index = self.connections.menu_index()
+        self.__deal_map = self.connections.deal_map()
         ###########################
 
     @swagger_auto_schema(
@@ -214,12 +216,14 @@ class AudioView(APIView):
         order_report, model_report = make_order_report(formatted_transcription,
                                                        self.__connection_pool,
                                                        self.__embedding_cache,
-                                                       aws_connected=True)
+                                                       aws_connected=True,
+                                                       menu_index=self.__menu_index)
 
         if offer_deal and len(order_report) > 0:  # pragma: no cover
             deal, deal_object, _ = get_deal(order_report[0],
                                             connection_pool=self.__connection_pool,
-                                            embedding_cache=self.__embedding_cache)
+                                            embedding_cache=self.__embedding_cache,
+                                            deal_map=self.__deal_map)
 
         rabbitmq_thread = threading.Thread(target=self.rabbitmq_stream,
                                            args=(transcription,
@@ -277,7 +281,8 @@ class AudioView(APIView):
             order_report, _ = make_order_report(formatted_transcription,
                                                 self.__connection_pool,
                                                 self.__embedding_cache,
-                                                aws_connected=True)
+                                                aws_connected=True,
+                                                menu_index=self.__menu_index)
             order_report.extend(deal_report)
 
         old_conv_history = self.__conversation_cache.get(
@@ -314,12 +319,14 @@ class AudioView(APIView):
         order_report, model_report = make_order_report(formatted_transcription,
                                                        self.__connection_pool,
                                                        self.__embedding_cache,
-                                                       aws_connected=True)
+                                                       aws_connected=True,
+                                                       menu_index=self.__menu_index)
 
         if offer_deal and len(order_report) > 0:
             deal, deal_object, _ = get_deal(order_report[0],
                                             connection_pool=self.__connection_pool,
-                                            embedding_cache=self.__embedding_cache)
+                                            embedding_cache=self.__embedding_cache,
+                                            deal_map=self.__deal_map)
 
         old_conv_history = self.__conversation_cache.get(f"conversation_history_{unique_id}")
         rabbitmq_thread = threading.Thread(target=self.rabbitmq_stream,
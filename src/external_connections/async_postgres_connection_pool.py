@@ -0,0 +1,77 @@
+"""
+This module creates the asyncpg pool used by the async request path. Like PostgresConnectionPool every
+connection is configured once when it is opened (pgvector codec registered, statement timeout, vector
+index search parameters). asyncpg prepares and caches every statement it runs per connection and sends
+the vector parameters in binary, so no PREPARE bookkeeping is needed on this path.
+"""
+import logging
+import asyncpg
+import psycopg2.extensions
+from pgvector.asyncpg import register_vector
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.vector_index import VectorIndex
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# libpq keywords which asyncpg names differently
+ASYNCPG_KEYWORDS = {"dbname": "database"}
+
+
+def connect_kwargs(
+        dsn: str
+) -> dict:
+    """
+    This function turns a libpq connection string into asyncpg connect arguments.
+    @param dsn: ex. "dbname=mydb user=myuser password=mypassword host=localhost port=5432"
+    @rtype: dict
+    @return: ex. {"database": "mydb", "user": "myuser", "password": "mypassword", "host": "localhost",
+     "port": 5432}
+    """
+    kwargs = {ASYNCPG_KEYWORDS.get(key, key): value
+              for key, value in psycopg2.extensions.parse_dsn(dsn).items()}
+    if "port" in kwargs:
+        kwargs["port"] = int(kwargs["port"])
+
+    return kwargs
+
+
+async def configure_connection(
+        connection: asyncpg.Connection, index: VectorIndex = None
+) -> None:
+    """
+    This function registers the vector type and sets the index search parameters on a new connection.
+    @param connection: asyncpg connection
+    @param index: vector index strategy of the tables
+    @rtype: None
+    @return: Nothing
+    """
+    await register_vector(connection)
+    if index:
+        await connection.execute(index.session_sql())
+
+
+async def create_async_connection_pool(
+        dsn: str, min_size: int = 1, max_size: int = 10, statement_timeout: int = 5000,
+        index: VectorIndex = None
+) -> asyncpg.Pool:
+    """
+    This function opens an asyncpg pool of preconfigured connections, it must be awaited on the event
+    loop which will use it.
+    @param dsn: libpq connection string from `connection_string`
+    @param min_size: connections opened up front
+    @param max_size: most connections open at once
+    @param statement_timeout: milliseconds a statement may run for
+    @param index: vector index strategy of the tables
+    @rtype: asyncpg.Pool
+    @return: pool whose connections are ready to run vector queries
+    """
+    async def init(connection: asyncpg.Connection) -> None:
+        await configure_connection(connection, index)
+
+    pool = await asyncpg.create_pool(min_size=min_size, max_size=max_size,
+                                     server_settings={"statement_timeout": str(int(statement_timeout))},
+                                     init=init, **connect_kwargs(dsn))
+    logging.debug("async postgres pool opened, min %s, max %s", min_size, max_size)
+
+    return pool
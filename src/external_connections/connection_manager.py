@@ -2,19 +2,33 @@
 This module is used to manage connections to external services such as AWS, PostgreSQL, etc.
 """
 import time
+import asyncio
 import logging
 import threading
+from weakref import WeakKeyDictionary
 import redis
+import redis.asyncio
+import asyncpg
 from os import getenv as env
 import boto3
 import psycopg2.pool
 from dotenv import load_dotenv
 import pika
-from typing import Optional
+from typing import Optional, Final
 from src.django_beanhub.settings import DEBUG
 from src.external_connections.rabbitmq_connection_pool import RabbitMQConnectionPool
-from src.vector_db.aws_database_auth import connection_string
-from src.vector_db.aws_sdk_auth import get_secret
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
+from src.external_connections.async_postgres_connection_pool import create_async_connection_pool
+from src.external_connections.credentials_provider import CredentialsProvider
+from src.vector_db.menu_index import MenuIndex
+from src.vector_db.deal_map import DealMap
+from src.vector_db.menu_repository import MenuRepository
+from src.vector_db.inventory import Inventory
+from src.vector_db.vector_index import vector_index
+from src.vector_db.embedding_cache import EmbeddingCache
+from src.vector_db.warm_embedding_cache import warm_embedding_cache
+from src.ai_integration.vocabulary_compiler import VocabularyCompiler
+from src.ai_integration.ner_server import NERServer
 
 LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
 logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
@@ -28,17 +42,29 @@ class ConnectionManager():
     """
     __lock: threading.Lock = threading.Lock()
     __instance: Optional['ConnectionManager'] = None
+    REDIS_DBS: Final = {"conversation": 0, "deal": 1, "embedding": 2, "inventory": 3}
 
     def __init__(
             self
     ) -> None:
+        self.__credentials = CredentialsProvider.instance()
         self.__s3 = None
         self.__bucket_name = None
         self.__conversation_cache = None
         self.__deal_cache = None
         self.__embedding_cache = None
+        self.__inventory_cache = None
+        self.__inventory = None
         self.__rabbitmq_connection_pool = None
-        self.postgres_max_connections = 10
+        self.__menu_index = None
+        self.__deal_map = None
+        self.__menu_repository = None
+        # asyncpg pools and async redis clients can only be used on the event loop that created them
+        self.__async_connections: WeakKeyDictionary[asyncio.AbstractEventLoop, dict] = WeakKeyDictionary()
+        self.postgres_min_connections = int(env('POSTGRES_MIN_CONNECTIONS', '1'))
+        self.postgres_max_connections = int(env('POSTGRES_MAX_CONNECTIONS', '10'))
+        self.postgres_statement_timeout = int(env('POSTGRES_STATEMENT_TIMEOUT_MS', '5000'))
+        self.postgres_checkout_timeout = float(env('POSTGRES_CHECKOUT_TIMEOUT', '5'))
         self.rabbitmq_max_connections = 5
 
     @staticmethod
@@ -62,20 +88,42 @@ class ConnectionManager():
     ) -> None:
         ####################
         ## AWS CONNECTION ##
-        get_secret()
+        self.__credentials.aws_secret()
         self.__s3 = self.__connect_to_s3()
         self.__bucket_name = env('S3_BUCKET_NAME')
         ######################
         ## REDIS CONNECTION ##
-        self.__conversation_cache = self.__connect_to_redis_cache(0)
-        self.__deal_cache = self.__connect_to_redis_cache(1)
-        self.__embedding_cache = self.__connect_to_redis_cache(2)
+        self.__conversation_cache = self.__connect_to_redis_cache(self.REDIS_DBS["conversation"])
+        self.__deal_cache = self.__connect_to_redis_cache(self.REDIS_DBS["deal"])
+        # hot menu names are answered in process before going to redis
+        self.__embedding_cache = EmbeddingCache(self.__connect_to_redis_cache(self.REDIS_DBS["embedding"]))
+        if env('WARM_EMBEDDING_CACHE', 'false').lower() == 'true':
+            threading.Thread(target=warm_embedding_cache, args=(self.__embedding_cache,),
+                             kwargs={"progress": False}, daemon=True).start()
         #########################
         ## RABBITMQ CONNECTION ##
         self.__rabbitmq_pool = self.__connect_to_rabbitmq_pool()
         ###########################
         ## POSTGRESQL CONNECTION ##
         self.__connection_pool = self.__connect_to_postgresql()
+        # the vector_db helpers share this pool and the embedding cache through the repository
+        self.__menu_repository = MenuRepository.connect(connection_pool=self.__connection_pool,
+                                                        embedding_cache=self.__embedding_cache)
+        self.__menu_index = self.__menu_repository.menu_index()
+        self.__deal_map = self.__menu_repository.deal_map()
+        # menu items which aren't in the hand written patterns are recognized in orders
+        if env('COMPILE_VOCABULARY', 'false').lower() == 'true':
+            threading.Thread(target=VocabularyCompiler.instance().load, args=(self.__connection_pool,),
+                             daemon=True).start()
+        # the NER model is loaded in the background so the first order doesn't pay for it
+        if env('NER_WARM_START', 'false').lower() == 'true':
+            NERServer.instance()
+        ###############
+        ## INVENTORY ##
+        self.__inventory_cache = self.__connect_to_redis_cache(self.REDIS_DBS["inventory"])
+        self.__inventory = Inventory(self.__inventory_cache, self.__connection_pool)
+        if env('INVENTORY_SYNC', 'false').lower() == 'true':
+            threading.Thread(target=self.__inventory.run, daemon=True).start()
         ###########################
 
     def s3(
@@ -102,9 +150,9 @@ class ConnectionManager():
             self, _type_: str
     ) -> redis.Redis:
         """
-        This method is used to get the cache for conversation, deal, or embedding.
+        This method is used to get the cache for conversation, deal, embedding or inventory.
         @rtype: redis.Redis
-        @return: cache for conversation, deal, or embedding
+        @return: cache for conversation, deal, embedding or inventory
         """
         cache_name = f'_ConnectionManager__{_type_}_cache'
         return getattr(self, cache_name)
@@ -121,14 +169,98 @@ class ConnectionManager():
 
     def connection_pool(
             self
-    ) -> psycopg2.pool.SimpleConnectionPool:
+    ) -> PostgresConnectionPool:
         """
         This method is used to get the postgresql connection pool.
-        @rtype: psycopg2.pool.SimpleConnectionPool
+        @rtype: PostgresConnectionPool
         @return: postgresql connection pool
         """
         return self.__connection_pool
 
+    def menu_repository(
+            self
+    ) -> MenuRepository:
+        """
+        This method is used to get the repository the vector_db helpers query the menu through.
+        @rtype: MenuRepository
+        @return: menu repository shared by every request in this process
+        """
+        return self.__menu_repository
+
+    def menu_index(
+            self
+    ) -> MenuIndex:
+        """
+        This method is used to get the in memory index of the products table.
+        @rtype: MenuIndex
+        @return: menu index shared by every request in this process
+        """
+        return self.__menu_index
+
+    def deal_map(
+            self
+    ) -> DealMap:
+        """
+        This method is used to get the precomputed best deal of every product.
+        @rtype: DealMap
+        @return: deal map shared by every request in this process
+        """
+        return self.__deal_map
+
+    def inventory(
+            self
+    ) -> Inventory:
+        """
+        This method is used to get the redis stock counters of the products table.
+        @rtype: Inventory
+        @return: inventory shared by every request in this process
+        """
+        return self.__inventory
+
+    async def async_connection_pool(
+            self
+    ) -> asyncpg.Pool:
+        """
+        This method is used to get the asyncpg pool of the running event loop, it is opened on first use.
+        @rtype: asyncpg.Pool
+        @return: async postgresql connection pool
+        """
+        connections = self.__async_connections.setdefault(asyncio.get_running_loop(), {})
+        if "postgres" not in connections:
+            pool = await create_async_connection_pool(
+                dsn=self.__credentials.connection_string(),
+                min_size=self.postgres_min_connections,
+                max_size=self.postgres_max_connections,
+                statement_timeout=self.postgres_statement_timeout,
+                index=vector_index()
+            )
+            # another coroutine may have opened one while this one was connecting
+            if "postgres" in connections:
+                await pool.close()
+            else:
+                connections["postgres"] = pool
+
+        return connections["postgres"]
+
+    def async_redis_cache(
+            self, _type_: str
+    ) -> redis.asyncio.Redis:
+        """
+        This method is used to get the async cache for conversation, deal, or embedding of the running
+        event loop.
+        @rtype: redis.asyncio.Redis
+        @return: async redis client
+        """
+        connections = self.__async_connections.setdefault(asyncio.get_running_loop(), {})
+        if _type_ not in connections:
+            connections[_type_] = redis.asyncio.StrictRedis(
+                host=env('REDIS_HOST'),
+                port=env('REDIS_PORT'),
+                db=self.REDIS_DBS[_type_]
+            )
+
+        return connections[_type_]
+
     @staticmethod
     def __connect_to_s3(
 
@@ -178,14 +310,21 @@ class ConnectionManager():
 
     def __connect_to_postgresql(
             self
-    ) -> psycopg2.pool.SimpleConnectionPool:
+    ) -> PostgresConnectionPool:
         """
-        @rtype: psycopg2.pool.SimpleConnectionPool
+        @rtype: PostgresConnectionPool
         @return: postgresql connection pool
         """
         while True:
             try:
-                pool = psycopg2.pool.SimpleConnectionPool(1, self.postgres_max_connections, connection_string())
+                pool = PostgresConnectionPool(
+                    minconn=self.postgres_min_connections,
+                    maxconn=self.postgres_max_connections,
+                    dsn=self.__credentials.connection_string(),
+                    statement_timeout=self.postgres_statement_timeout,
+                    checkout_timeout=self.postgres_checkout_timeout,
+                    index=vector_index()
+                )
                 logging.debug("Connected to PostgreSQL successfully.")
                 return pool
             except psycopg2.Error as e:
@@ -0,0 +1,145 @@
+"""
+This module contains the CredentialsProvider class which resolves the database connection string, the
+AWS secret and the API keys once per process instead of reading csv and key files (and calling Secrets
+Manager) on every request. Values can be refreshed periodically by setting CREDENTIALS_REFRESH_SECONDS,
+by default they are kept until `invalidate` is called.
+"""
+import time
+import logging
+import threading
+from os import path
+from os import getenv as env
+from typing import Callable, Optional
+from dotenv import load_dotenv
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.aws_sdk_auth import get_secret
+from src.vector_db.aws_database_auth import connection_string
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+load_dotenv()
+
+KEYS_DIRECTORY = path.join(path.dirname(path.realpath(__file__)), "../..", "other")
+
+
+def read_key_file(
+        file_name: str
+) -> str | None:
+    """
+    This function reads an API key from the `other` directory.
+    @param file_name: ex. "openai_api_key.txt"
+    @rtype: str | None
+    @return: first line of the file, None if the file doesn't exist
+    """
+    key_path = path.join(KEYS_DIRECTORY, file_name)
+    if not path.exists(key_path):
+        return None
+
+    with open(key_path, encoding='utf-8') as api_key:
+        return api_key.readline().strip()
+
+
+class CredentialsProvider:
+    """
+    This singleton class caches every credential the request path needs. Each value is resolved the
+    first time it is asked for and kept for `refresh_interval` seconds, forever when it is 0.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['CredentialsProvider'] = None
+
+    def __init__(
+            self, refresh_interval: float = None
+    ) -> None:
+        self.__refresh_interval = refresh_interval if refresh_interval is not None \
+            else float(env('CREDENTIALS_REFRESH_SECONDS', '0'))
+        self.__lock = threading.Lock()
+        # name -> (resolved at, value)
+        self.__values: dict[str, tuple[float, object]] = {}
+
+    @staticmethod
+    def instance(
+
+    ) -> 'CredentialsProvider':
+        """
+        This method is used to get the provider shared by the process.
+        @rtype: CredentialsProvider
+        @return: credentials provider
+        """
+        with CredentialsProvider.__lock:
+            if not CredentialsProvider.__instance:
+                CredentialsProvider.__instance = CredentialsProvider()
+
+            return CredentialsProvider.__instance
+
+    def connection_string(
+            self
+    ) -> str:
+        """
+        This method returns the connection string of the AWS RDS database.
+        @rtype: str
+        @return: ex. "dbname=mydb user=myuser password=mypassword host=localhost port=5432"
+        """
+        return self.__resolve("connection_string", connection_string)
+
+    def aws_secret(
+            self
+    ) -> str:
+        """
+        This method returns the secret stored in AWS Secrets Manager.
+        @rtype: str
+        @return: secret string from `get_secret`
+        """
+        return self.__resolve("aws_secret", get_secret)
+
+    def openai_api_key(
+            self
+    ) -> str | None:
+        """
+        This method returns the OpenAI key from `other/openai_api_key.txt` or the environment.
+        @rtype: str | None
+        @return: auth key for OpenAI
+        """
+        return self.__resolve("openai_api_key",
+                              lambda: read_key_file("openai_api_key.txt") or env('OPENAI_API_KEY'))
+
+    def deepgram_api_key(
+            self
+    ) -> str | None:
+        """
+        This method returns the Deepgram key from the environment or `other/deepgram_api_key.txt`.
+        @rtype: str | None
+        @return: auth key for Deepgram
+        """
+        return self.__resolve("deepgram_api_key",
+                              lambda: env('DEEPGRAM_API_KEY') or read_key_file("deepgram_api_key.txt"))
+
+    def invalidate(
+            self, name: str = None
+    ) -> None:
+        """
+        This method makes a credential, or all of them, be resolved again on the next use.
+        @param name: ex. "openai_api_key", every credential when None
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__lock:
+            if name:
+                self.__values.pop(name, None)
+            else:
+                self.__values.clear()
+
+    def __resolve(
+            self, name: str, resolver: Callable[[], object]
+    ):
+        with self.__lock:
+            cached = self.__values.get(name)
+            if cached and (not self.__refresh_interval or time.monotonic() - cached[0] < self.__refresh_interval):
+                return cached[1]
+
+            resolve_time = time.time()
+            value = resolver()
+            self.__values[name] = (time.monotonic(), value)
+            logging.debug("resolved %s in %s", name, time.time() - resolve_time)
+
+            return value
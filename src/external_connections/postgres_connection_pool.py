@@ -0,0 +1,234 @@
+"""
+This module contains the PostgresConnectionPool class, a thread safe replacement for
+psycopg2.pool.SimpleConnectionPool. Connections are configured once when they are created (autocommit,
+pgvector type registered, statement timeout, vector index search parameters) so callers can run
+queries straight after `getconn()`.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+import psycopg2
+import psycopg2.pool
+import psycopg2.extensions
+from pgvector.psycopg2 import register_vector
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.vector_index import VectorIndex
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+class PoolTimeoutError(psycopg2.pool.PoolError):
+    """
+    This exception is raised when no connection became available within the checkout timeout.
+    """
+
+
+class PostgresConnectionPool:
+    """
+    This class hands out preconfigured PostgreSQL connections to many threads. It keeps between
+    `minconn` and `maxconn` connections, checks idle connections before handing them out and makes
+    callers wait at most `checkout_timeout` seconds for a free connection.
+    """
+
+    def __init__(
+            self, minconn: int = 1, maxconn: int = 10, dsn: str = None, statement_timeout: int = 5000,
+            checkout_timeout: float = 5.0, health_check_interval: float = 30.0, index: VectorIndex = None
+    ) -> None:
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise psycopg2.pool.PoolError(f"invalid pool size min {minconn}, max {maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.__dsn = dsn
+        self.__statement_timeout = statement_timeout
+        self.__checkout_timeout = checkout_timeout
+        self.__health_check_interval = health_check_interval
+        self.__index = index
+        self.__condition = threading.Condition()
+        # (connection, time it was returned), most recently returned last
+        self.__idle: deque[tuple[psycopg2.extensions.connection, float]] = deque()
+        self.__in_use: set[int] = set()
+        self.__size = 0
+        self.__closed = False
+
+        for _ in range(minconn):
+            self.__idle.append((self.__create_connection(), time.monotonic()))
+            self.__size += 1
+
+    def getconn(
+            self
+    ) -> psycopg2.extensions.connection:
+        """
+        This method checks a healthy connection out of the pool.
+        @rtype: psycopg2.extensions.connection
+        @return: connection in autocommit mode with the vector type registered
+        """
+        deadline = time.monotonic() + self.__checkout_timeout
+        while True:
+            with self.__condition:
+                while True:
+                    if self.__closed:
+                        raise psycopg2.pool.PoolError("connection pool is closed")
+                    if self.__idle:
+                        db_connection, returned_at = self.__idle.pop()
+                        break
+                    if self.__size < self.maxconn:
+                        self.__size += 1
+                        db_connection, returned_at = None, None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(f"no connection available after {self.__checkout_timeout}s")
+                    self.__condition.wait(remaining)
+
+            # connecting and health checks happen outside the lock so other threads aren't blocked
+            try:
+                if db_connection is None:
+                    db_connection = self.__create_connection()
+                elif not self.__is_healthy(db_connection, returned_at):
+                    logging.debug("discarding unhealthy postgres connection")
+                    self.__discard(db_connection)
+                    continue
+            except psycopg2.Error:
+                self.__release_slot()
+                raise
+
+            with self.__condition:
+                self.__in_use.add(id(db_connection))
+
+            return db_connection
+
+    def putconn(
+            self, db_connection: psycopg2.extensions.connection, close: bool = False
+    ) -> None:
+        """
+        This method returns a connection to the pool.
+        @param db_connection: connection from `getconn`
+        @param close: close the connection instead of reusing it
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__condition:
+            if id(db_connection) not in self.__in_use:
+                raise psycopg2.pool.PoolError("trying to put unkeyed connection")
+            self.__in_use.discard(id(db_connection))
+
+        if close or self.__closed or db_connection.closed:
+            self.__discard(db_connection)
+            return
+
+        try:
+            if db_connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                db_connection.rollback()
+            if not db_connection.autocommit:
+                db_connection.autocommit = True
+        except psycopg2.Error:
+            self.__discard(db_connection)
+            return
+
+        with self.__condition:
+            self.__idle.append((db_connection, time.monotonic()))
+            self.__condition.notify()
+
+    @contextmanager
+    def connection(
+            self
+    ) -> Iterator[psycopg2.extensions.connection]:
+        """
+        This method checks a connection out for the duration of a with block.
+        @rtype: Iterator[psycopg2.extensions.connection]
+        @return: connection from `getconn`
+        """
+        db_connection = self.getconn()
+        try:
+            yield db_connection
+        finally:
+            self.putconn(db_connection)
+
+    def closeall(
+            self
+    ) -> None:
+        """
+        This method closes every idle connection, connections in use are closed when they are returned.
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__condition:
+            self.__closed = True
+            idle = [db_connection for db_connection, _ in self.__idle]
+            self.__idle.clear()
+            self.__size -= len(idle)
+            self.__condition.notify_all()
+
+        for db_connection in idle:
+            if not db_connection.closed:
+                db_connection.close()
+
+    def stats(
+            self
+    ) -> dict:
+        """
+        This method returns the number of open and idle connections.
+        @rtype: dict
+        @return: ex. {"size": 3, "idle": 2, "in_use": 1, "max": 10}
+        """
+        with self.__condition:
+            return {
+                "size": self.__size,
+                "idle": len(self.__idle),
+                "in_use": len(self.__in_use),
+                "max": self.maxconn
+            }
+
+    def __create_connection(
+            self
+    ) -> psycopg2.extensions.connection:
+        db_connection = psycopg2.connect(self.__dsn)
+        db_connection.autocommit = True
+        register_vector(db_connection)
+
+        cur = db_connection.cursor()
+        cur.execute(f"SET statement_timeout = {int(self.__statement_timeout)};")
+        if self.__index:
+            cur.execute(self.__index.session_sql())
+        cur.close()
+
+        return db_connection
+
+    def __is_healthy(
+            self, db_connection: psycopg2.extensions.connection, returned_at: float
+    ) -> bool:
+        if db_connection.closed:
+            return False
+        # connections used recently are trusted, the rest are pinged
+        if time.monotonic() - returned_at < self.__health_check_interval:
+            return True
+
+        try:
+            cur = db_connection.cursor()
+            cur.execute("SELECT 1;")
+            cur.close()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def __discard(
+            self, db_connection: psycopg2.extensions.connection
+    ) -> None:
+        try:
+            if not db_connection.closed:
+                db_connection.close()
+        finally:
+            self.__release_slot()
+
+    def __release_slot(
+            self
+    ) -> None:
+        with self.__condition:
+            self.__size -= 1
+            self.__condition.notify()
@@ -1,18 +1,17 @@
 """
-Currently unused, but will be used to add individual items to the database
+Currently unused, but will be used to add individual items to the database. Items are synced the same
+way as the menu, so adding an item which already exists updates it instead of adding a duplicate.
 """
 # pylint: disable=R0801
 from io import StringIO
 from os import path
-import psycopg2
-from src.vector_db.aws_sdk_auth import get_secret
-from src.ai_integration.embeddings_api import openai_embedding_api
-from src.vector_db.aws_database_auth import connection_string
+from src.vector_db.menu_repository import MenuRepository
+from src.vector_db.sync_menu import sync_products
 
 
 def add_item(
         item: dict, key: str = None, aws_csv_file: StringIO = None,
-        database_csv_file: StringIO = None
+        database_csv_file: StringIO = None, repository: MenuRepository = None
 ) -> bool:
     """
     This API is used to add a new item to the database
@@ -28,32 +27,21 @@ def add_item(
                    }
                }
     @param key: auth key for OpenAI
-    @param aws_csv_file: SDK auth for AWS
-    @param database_csv_file: auth to manager AWS RDS and PostgreSQL database
+    @param aws_csv_file: SDK auth for AWS, only used when the repository is created
+    @param database_csv_file: auth to manager AWS RDS and PostgreSQL database, only used when the
+    repository is created
+    @param repository: defaults to the process wide MenuRepository
     @rtype: boolean
     @return: success if added into database else failure
     """
     if not item:
         return False
 
-    get_secret(aws_csv_file if not None else None)
-    db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
-    db_connection.set_session(autocommit=True)
+    repository = repository if repository else MenuRepository.connect(aws_csv_file=aws_csv_file,
+                                                                      database_csv_file=database_csv_file)
 
-    cur = db_connection.cursor()
-
-    cur.execute("""
-                INSERT INTO products (item_name, item_quantity, common_allergin, num_calories, price, embeddings)
-                VALUES (%s, %s, %s, %s, %s, %s);
-            """, (item["MenuItem"]["itemName"],
-                  item["MenuItem"]["item_quantity"],
-                  item["MenuItem"]["common_allergin"],
-                  item["MenuItem"]["num_calories"],
-                  item["MenuItem"]["price"],
-                  openai_embedding_api(str(item), key if key else None)))
-
-    cur.close()
-    db_connection.close()
+    # embedded from the item name like every other row, not the whole payload
+    sync_products([item], key, repository=repository, delete_missing=False)
 
     return True
 
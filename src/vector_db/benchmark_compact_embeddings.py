@@ -0,0 +1,170 @@
+"""
+This module contains the function `benchmark_compact_embeddings` which compares compact embedding
+storage against the full precision column. For every configuration it reports the index and column
+size, p50/p99 query latency and how often the top-1 row agrees with an exact full precision search.
+It measures the lookups that reach PostgreSQL, MenuIndex and DealMap search in memory in full precision.
+Everything runs on a temporary copy of the table inside a transaction that is rolled back:
+    python -m src.vector_db.benchmark_compact_embeddings products
+"""
+import sys
+import time
+import logging
+from os import path
+import numpy as np
+from pgvector.psycopg2 import register_vector
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.warm_embedding_cache import warm_up_texts
+from src.vector_db.vector_index import VectorIndex, vector_index
+from src.vector_db.benchmark_vector_index import BENCHMARK_TABLE, nearest_ids
+from src.vector_db.compact_embeddings import CompactEmbeddings, COMPACT_COLUMN
+from src.vector_db.menu_repository import MenuRepository
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+def storage_size(
+        cur, column: str
+) -> tuple[int, int]:
+    """
+    This function returns how much space a vector column and its index take in the benchmark table.
+    @param cur: psycopg2 cursor
+    @param column: ex. "embeddings_compact"
+    @rtype: tuple[int, int]
+    @return: bytes of the index and bytes of the column values
+    """
+    cur.execute(f"SELECT pg_relation_size('{BENCHMARK_TABLE}_{column}_idx'), "
+                f"COALESCE(sum(pg_column_size({column})), 0) FROM {BENCHMARK_TABLE};")
+    index_bytes, column_bytes = cur.fetchone()
+
+    return int(index_bytes), int(column_bytes)
+
+
+def compact_nearest_ids(
+        cur, storage: CompactEmbeddings, queries: list[np.ndarray]
+) -> tuple[list[int], list[float]]:
+    """
+    This function runs one compact nearest neighbour query per embedding against the benchmark table.
+    @param cur: psycopg2 cursor
+    @param storage: compact storage to search
+    @param queries: full precision embeddings to search for
+    @rtype: tuple[list[int], list[float]]
+    @return: id of the closest row and the latency in milliseconds of every query
+    """
+    ids, latencies = [], []
+    for query in queries:
+        query_time = time.perf_counter()
+        ids.append(storage.nearest(cur, BENCHMARK_TABLE, "id", query)[0][0])
+        latencies.append((time.perf_counter() - query_time) * 1000)
+
+    return ids, latencies
+
+
+def benchmark_compact_embeddings(
+        db_connection, table: str, queries: list[np.ndarray], storages: list[CompactEmbeddings],
+        index: VectorIndex = None
+) -> list[dict]:
+    """
+    This function measures size, latency and top-1 agreement of every compact storage.
+    @param db_connection: psycopg2 connection
+    @param table: "products" or "deals"
+    @param queries: embeddings to search for, ex. the embeddings of the menu vocabulary
+    @param storages: compact storages to compare
+    @param index: index strategy used for every column, defaults to the VECTOR_INDEX environment variable
+    @rtype: list[dict]
+    @return: one report per storage ex. [{"storage": "halfvec(64) rerank 5", "index_bytes": 16384,
+     "column_bytes": 4400, "top1_agreement": 1.0, "p50_ms": 0.3, "p99_ms": 0.9}]
+    """
+    db_connection.set_session(autocommit=False)
+    register_vector(db_connection)
+    cur = db_connection.cursor()
+
+    cur.execute(f"CREATE TEMP TABLE {BENCHMARK_TABLE} ON COMMIT DROP AS "
+                f"SELECT id, embeddings FROM {table};")
+    cur.execute(f"SELECT count(*) FROM {BENCHMARK_TABLE};")
+    index = index if index else vector_index(num_rows=cur.fetchone()[0])
+
+    exact_ids, _ = nearest_ids(cur, queries)
+
+    cur.execute(index.create_sql(BENCHMARK_TABLE))
+    cur.execute(f"ANALYZE {BENCHMARK_TABLE};")
+    # the menu is small enough that the planner would otherwise prefer a sequential scan
+    cur.execute("SET LOCAL enable_seqscan = off;")
+    cur.execute(index.session_sql().replace("SET ", "SET LOCAL ", 1))
+
+    ids, latencies = nearest_ids(cur, queries)
+    index_bytes, column_bytes = storage_size(cur, "embeddings")
+    reports = [{
+        "storage": f"vector({len(queries[0])})",
+        "index_bytes": index_bytes,
+        "column_bytes": column_bytes,
+        "top1_agreement": sum(found == exact for found, exact in zip(ids, exact_ids)) / len(queries),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99))
+    }]
+
+    for storage in storages:
+        cur.execute("SAVEPOINT benchmark_storage;")
+        storage.migrate(db_connection, BENCHMARK_TABLE, index)
+        cur.execute(f"ANALYZE {BENCHMARK_TABLE};")
+
+        ids, latencies = compact_nearest_ids(cur, storage, queries)
+        index_bytes, column_bytes = storage_size(cur, COMPACT_COLUMN)
+        cur.execute("ROLLBACK TO SAVEPOINT benchmark_storage;")
+
+        reports.append({
+            "storage": repr(storage),
+            "index_bytes": index_bytes,
+            "column_bytes": column_bytes,
+            "top1_agreement": sum(found == exact for found, exact in zip(ids, exact_ids)) / len(queries),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99))
+        })
+
+    db_connection.rollback()
+    cur.close()
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    key_path = path.join(path.dirname(path.realpath(__file__)), "../..",
+                         "other", "openai_api_key.txt")
+    with open(key_path, encoding='utf-8') as api_key:
+        key = api_key.readline().strip()
+
+    table = sys.argv[1] if len(sys.argv) > 1 else "products"
+    texts, _ = warm_up_texts()
+    queries = [np.asarray(embedding) for embedding in embedding_provider(api_key=key).embed_batch(texts)]
+    storages = [
+        CompactEmbeddings(precision="float16"),
+        CompactEmbeddings(dimensions=256, precision="float32"),
+        CompactEmbeddings(dimensions=64, precision="float16"),
+        CompactEmbeddings(dimensions=64, precision="float16", rerank=5),
+        CompactEmbeddings(precision="binary"),
+        CompactEmbeddings(precision="binary", rerank=10),
+    ]
+
+    db_connection = MenuRepository.connect().direct_connection()
+    reports = benchmark_compact_embeddings(db_connection, table, queries, storages)
+    db_connection.close()
+
+    print(f"{len(queries)} queries against {table}")
+    print(f"{'storage':<30}{'index KB':>10}{'column KB':>11}{'top-1':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for report in reports:
+        print(f"{report['storage']:<30}{report['index_bytes'] / 1024:>10.1f}"
+              f"{report['column_bytes'] / 1024:>11.1f}{report['top1_agreement']:>8.3f}"
+              f"{report['p50_ms']:>10.3f}{report['p99_ms']:>10.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
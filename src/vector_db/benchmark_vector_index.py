@@ -0,0 +1,145 @@
+"""
+This module contains the function `benchmark_vector_index` which replays the menu vocabulary against
+every index strategy and reports recall@1 against an exact search along with p50/p99 query latency.
+Each index is built on a temporary copy of the table so the live indexes are never touched:
+    python -m src.vector_db.benchmark_vector_index products
+"""
+import sys
+import time
+import logging
+from os import path
+import psycopg2
+import numpy as np
+from pgvector.psycopg2 import register_vector
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.aws_sdk_auth import get_secret
+from src.vector_db.aws_database_auth import connection_string
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.warm_embedding_cache import warm_up_texts
+from src.vector_db.vector_index import VectorIndex, IvfflatIndex, HnswIndex
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+BENCHMARK_TABLE = "vector_index_benchmark"
+
+
+def nearest_ids(
+        cur, queries: list[np.ndarray]
+) -> tuple[list[int], list[float]]:
+    """
+    This function runs one nearest neighbour query per embedding against the benchmark table.
+    @param cur: psycopg2 cursor
+    @param queries: embeddings to search for
+    @rtype: tuple[list[int], list[float]]
+    @return: id of the closest row and the latency in milliseconds of every query
+    """
+    ids, latencies = [], []
+    for query in queries:
+        query_time = time.perf_counter()
+        cur.execute(f""" SELECT id
+                         FROM {BENCHMARK_TABLE}
+                         ORDER BY embeddings <-> %s
+                         LIMIT 1;""",
+                    (np.asarray(query),))
+        ids.append(cur.fetchone()[0])
+        latencies.append((time.perf_counter() - query_time) * 1000)
+
+    return ids, latencies
+
+
+def benchmark_vector_index(
+        db_connection, table: str, queries: list[np.ndarray], indexes: list[VectorIndex]
+) -> list[dict]:
+    """
+    This function measures recall@1 and latency of every index strategy.
+    @param db_connection: psycopg2 connection
+    @param table: "products" or "deals"
+    @param queries: embeddings to search for, ex. the embeddings of the menu vocabulary
+    @param indexes: index strategies to compare
+    @rtype: list[dict]
+    @return: one report per strategy ex. [{"index": "hnsw(m = 16, ...)", "recall@1": 0.98,
+     "p50_ms": 0.4, "p99_ms": 1.1, "build_ms": 35.0}]
+    """
+    db_connection.set_session(autocommit=False)
+    register_vector(db_connection)
+    cur = db_connection.cursor()
+
+    cur.execute(f"CREATE TEMP TABLE {BENCHMARK_TABLE} ON COMMIT DROP AS "
+                f"SELECT id, embeddings FROM {table};")
+    cur.execute(f"ANALYZE {BENCHMARK_TABLE};")
+
+    exact_ids, exact_latencies = nearest_ids(cur, queries)
+    reports = [{
+        "index": "exact",
+        "recall@1": 1.0,
+        "p50_ms": float(np.percentile(exact_latencies, 50)),
+        "p99_ms": float(np.percentile(exact_latencies, 99)),
+        "build_ms": 0.0
+    }]
+
+    for index in indexes:
+        cur.execute("SAVEPOINT benchmark_index;")
+        build_time = time.perf_counter()
+        cur.execute(index.create_sql(BENCHMARK_TABLE))
+        build_ms = (time.perf_counter() - build_time) * 1000
+        # the menu is small enough that the planner would otherwise prefer a sequential scan
+        cur.execute("SET LOCAL enable_seqscan = off;")
+        cur.execute(index.session_sql().replace("SET ", "SET LOCAL ", 1))
+
+        ids, latencies = nearest_ids(cur, queries)
+        cur.execute("ROLLBACK TO SAVEPOINT benchmark_index;")
+
+        reports.append({
+            "index": repr(index),
+            "recall@1": sum(found == exact for found, exact in zip(ids, exact_ids)) / len(queries),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "build_ms": build_ms
+        })
+
+    db_connection.rollback()
+    cur.close()
+
+    return reports
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    key_path = path.join(path.dirname(path.realpath(__file__)), "../..",
+                         "other", "openai_api_key.txt")
+    with open(key_path, encoding='utf-8') as api_key:
+        key = api_key.readline().strip()
+
+    table = sys.argv[1] if len(sys.argv) > 1 else "products"
+    texts, _ = warm_up_texts()
+    queries = [np.asarray(embedding) for embedding in embedding_provider(api_key=key).embed_batch(texts)]
+    indexes = [
+        IvfflatIndex(lists=8, probes=1),
+        IvfflatIndex(lists=8, probes=2),
+        IvfflatIndex(lists=8, probes=4),
+        HnswIndex(m=16, ef_construction=64, ef_search=40),
+        HnswIndex(m=8, ef_construction=32, ef_search=16),
+    ]
+
+    get_secret()
+    db_connection = psycopg2.connect(connection_string())
+    reports = benchmark_vector_index(db_connection, table, queries, indexes)
+    db_connection.close()
+
+    print(f"{len(queries)} queries against {table}")
+    print(f"{'index':<55}{'recall@1':>10}{'p50 ms':>10}{'p99 ms':>10}{'build ms':>10}")
+    for report in reports:
+        print(f"{report['index']:<55}{report['recall@1']:>10.3f}{report['p50_ms']:>10.3f}"
+              f"{report['p99_ms']:>10.3f}{report['build_ms']:>10.1f}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,205 @@
+"""
+This module contains the helpers used to bulk load the products and deals tables. Rows are embedded in
+large batches with a bounded number of concurrent requests and streamed into PostgreSQL with binary
+`COPY`, one transaction per batch so an interrupted load can be resumed by skipping the rows which
+are already in the table.
+
+Binary COPY format: https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4
+"""
+import time
+import struct
+import logging
+from io import BytesIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Final, Iterator
+import numpy as np
+from tqdm import tqdm
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.embedding_provider import embedding_provider
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+COPY_SIGNATURE: Final = b'PGCOPY\n\xff\r\n\x00'
+COPY_TRAILER: Final = struct.pack('>h', -1)
+INT4_OID: Final = 23
+
+
+def encode_text(
+        value: str
+) -> bytes:
+    """
+    @param value: ex. "black coffee"
+    @rtype: bytes
+    @return: binary COPY representation of a text column
+    """
+    return value.encode('utf-8')
+
+
+def encode_int4(
+        value: int
+) -> bytes:
+    """
+    @param value: ex. 7
+    @rtype: bytes
+    @return: binary COPY representation of an int column
+    """
+    return struct.pack('>i', int(value))
+
+
+def encode_float8(
+        value: float
+) -> bytes:
+    """
+    @param value: ex. 2.0
+    @rtype: bytes
+    @return: binary COPY representation of a double precision column
+    """
+    return struct.pack('>d', float(value))
+
+
+def encode_vector(
+        value: list[float] | np.ndarray
+) -> bytes:
+    """
+    @param value: embedding ex. [0.1, 0.2, 0.3]
+    @rtype: bytes
+    @return: binary COPY representation of a pgvector column (dimensions, unused, big endian float4s)
+    """
+    vector = np.asarray(value, dtype='>f4')
+    return struct.pack('>hh', vector.shape[0], 0) + vector.tobytes()
+
+
+def encode_calorie_range(
+        value: tuple[int, int]
+) -> bytes:
+    """
+    @param value: ex. (60, 120)
+    @rtype: bytes
+    @return: binary COPY representation of the calorie_range composite type
+    """
+    fields = b''.join(struct.pack('>ii', INT4_OID, 4) + encode_int4(field) for field in value)
+    return struct.pack('>i', len(value)) + fields
+
+
+def copy_buffer(
+        rows: list[tuple], encoders: list[Callable]
+) -> BytesIO:
+    """
+    This function serializes rows to the binary COPY format.
+    @param rows: rows in column order
+    @param encoders: one encoder per column ex. [encode_text, encode_int4, encode_vector]
+    @rtype: BytesIO
+    @return: file object that can be passed to `copy_expert`
+    """
+    buffer = BytesIO()
+    buffer.write(COPY_SIGNATURE)
+    buffer.write(struct.pack('>ii', 0, 0))
+
+    field_count = struct.pack('>h', len(encoders))
+    for row in rows:
+        buffer.write(field_count)
+        for value, encoder in zip(row, encoders):
+            if value is None:
+                buffer.write(struct.pack('>i', -1))
+                continue
+            field = encoder(value)
+            buffer.write(struct.pack('>i', len(field)))
+            buffer.write(field)
+
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+
+    return buffer
+
+
+def copy_rows(
+        cur, table: str, columns: list[str], rows: list[tuple], encoders: list[Callable]
+) -> None:
+    """
+    This function streams rows into a table with binary COPY.
+    @param cur: psycopg2 cursor
+    @param table: ex. "products"
+    @param columns: ex. ["item_name", "price", "embeddings"]
+    @param rows: rows in column order
+    @param encoders: one encoder per column
+    @rtype: None
+    @return: Nothing
+    """
+    if not rows:
+        return
+
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+                    copy_buffer(rows, encoders))
+
+
+def embedded_batches(
+        rows: list, texts: list[str], key: str = None, batch_size: int = 512, max_workers: int = 4
+) -> Iterator[tuple[list, list[list[float]]]]:
+    """
+    This generator embeds rows in batches with at most `max_workers` requests in flight and yields
+    them in their original order.
+    @param rows: rows to embed
+    @param texts: text to embed for every row
+    @param key: OpenAI auth
+    @param batch_size: number of texts per embedding request
+    @param max_workers: number of concurrent embedding requests
+    @rtype: Iterator[tuple[list, list[list[float]]]]
+    @return: batches of rows along with their embeddings
+    """
+    provider = embedding_provider(api_key=key if key else None)
+    starts = iter(range(0, len(rows), batch_size))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+
+        def submit() -> None:
+            start = next(starts, None)
+            if start is not None:
+                in_flight.append((rows[start:start + batch_size], executor.submit(
+                    provider.embed_batch, texts[start:start + batch_size])))
+
+        for _ in range(max_workers):
+            submit()
+
+        while in_flight:
+            batch, future = in_flight.popleft()
+            embeddings = future.result()
+            submit()
+            yield batch, embeddings
+
+
+def bulk_load(
+        db_connection, table: str, columns: list[str], encoders: list[Callable], rows: list[tuple],
+        texts: list[str], key: str = None, batch_size: int = 512, max_workers: int = 4
+) -> int:
+    """
+    This function embeds every row and COPYs it into the table, committing after every batch.
+    @param db_connection: psycopg2 connection, not in autocommit mode
+    @param table: ex. "products"
+    @param columns: columns of the rows followed by the embedding column
+    @param encoders: one encoder per column
+    @param rows: rows without their embedding
+    @param texts: text to embed for every row
+    @param key: OpenAI auth
+    @param batch_size: number of rows per embedding request and transaction
+    @param max_workers: number of concurrent embedding requests
+    @rtype: int
+    @return: number of rows loaded
+    """
+    load_time = time.time()
+    loaded = 0
+    cur = db_connection.cursor()
+
+    with tqdm(total=len(rows), desc=f"loading {table}", unit="row") as progress:
+        for batch, embeddings in embedded_batches(rows, texts, key, batch_size, max_workers):
+            copy_rows(cur, table, columns,
+                      [row + (embedding,) for row, embedding in zip(batch, embeddings)], encoders)
+            db_connection.commit()
+            loaded += len(batch)
+            progress.update(len(batch))
+
+    cur.close()
+    logging.debug("bulk load %s rows into %s time %s:", loaded, table, time.time() - load_time)
+
+    return loaded
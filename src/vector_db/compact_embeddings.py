@@ -0,0 +1,483 @@
+"""
+This module contains the compact storage of the products and deals embeddings. The tables only hold a
+few dozen short menu phrases, so the float32 dimensions of the embedding provider (1536 for
+text-embedding-ada-002, 5120 for llama.cpp) can be
+    - projected onto fewer dimensions with a PCA fitted on the table (the providers have no dimension
+      parameter, so the projection is stored in the `embedding_projections` table and applied to every
+      query),
+    - stored as half precision (pgvector `halfvec`) or binary quantized (pgvector `bit`, searched by
+      hamming distance),
+in an `embeddings_compact` column next to the full precision column, which is kept to rerank the top
+candidates. The projection of a table is fingerprinted every `refresh_interval` seconds, the way MenuIndex
+fingerprints the products, so a migration run from another process is picked up by every worker. Every
+lookup that reaches PostgreSQL searches the compact column when it is configured
+(get_item, get_items, get_deal, their async versions and the MenuRepository queries). MenuIndex and
+DealMap hold the few dozen rows in memory and search the full precision embeddings exactly, so the
+compact column doesn't change what they return. The fill scripts encode the tables they create, and
+sync_menu the rows it changes. The migration re-encodes an existing table:
+    EMBEDDING_DIMENSIONS=64 EMBEDDING_PRECISION=float16 python -m src.vector_db.compact_embeddings products
+"""
+import sys
+import time
+import hashlib
+import logging
+import threading
+from os import getenv as env
+from typing import Final
+import numpy as np
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from pgvector.psycopg2 import register_vector
+from pgvector.utils import to_db
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.vector_index import VectorIndex, vector_index
+from src.vector_db.prepared_statements import vector_param
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+load_dotenv()
+
+COMPACT_COLUMN: Final = "embeddings_compact"
+PROJECTIONS_TABLE: Final = "embedding_projections"
+# precision -> (pgvector type, distance operator, operator class)
+PRECISIONS: Final = {
+    "float32": ("vector", "<->", "vector_l2_ops"),
+    "float16": ("halfvec", "<->", "halfvec_l2_ops"),
+    "binary": ("bit", "<~>", "bit_hamming_ops"),
+}
+# formatted with the placeholder of the driver, "%s" for psycopg2 and "$1" for asyncpg
+LOAD_PROJECTION_SQL: Final = "SELECT mean, components, md5(mean || components) FROM " + PROJECTIONS_TABLE + \
+                             " WHERE table_name = {};"
+PROJECTION_FINGERPRINT_SQL: Final = "SELECT md5(mean || components) FROM " + PROJECTIONS_TABLE + \
+                                    " WHERE table_name = {};"
+
+
+class EmbeddingProjection:
+    """
+    This class projects embeddings onto the principal components of a table's embeddings. When there
+    are fewer rows than dimensions the rows span the whole subspace, so the nearest row to any query is
+    the same before and after the projection.
+    """
+
+    def __init__(
+            self, mean: np.ndarray, components: np.ndarray
+    ) -> None:
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @staticmethod
+    def fit(
+            embeddings: np.ndarray, dimensions: int
+    ) -> 'EmbeddingProjection':
+        """
+        This method fits the projection on the embeddings of a table.
+        @param embeddings: (rows, full dimensions) matrix
+        @param dimensions: dimensions to keep
+        @rtype: EmbeddingProjection
+        @return: projection, padded with zero components if the table has fewer rows than dimensions
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        mean = embeddings.mean(axis=0)
+        _, _, components = np.linalg.svd(embeddings - mean, full_matrices=False)
+        components = components[:dimensions]
+        if len(components) < dimensions:
+            components = np.vstack([components, np.zeros((dimensions - len(components), embeddings.shape[1]),
+                                                          dtype=np.float32)])
+
+        return EmbeddingProjection(mean, components)
+
+    @property
+    def dimensions(
+            self
+    ) -> int:
+        """
+        @rtype: int
+        @return: dimensions of the projected embeddings
+        """
+        return len(self.components)
+
+    def project(
+            self, embeddings: np.ndarray
+    ) -> np.ndarray:
+        """
+        This method projects one embedding or a matrix of embeddings.
+        @param embeddings: (full dimensions,) or (rows, full dimensions)
+        @rtype: np.ndarray
+        @return: (dimensions,) or (rows, dimensions)
+        """
+        return (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components.T
+
+    def to_bytes(
+            self
+    ) -> tuple[bytes, bytes]:
+        """
+        @rtype: tuple[bytes, bytes]
+        @return: mean and components as raw float32 bytes
+        """
+        return self.mean.tobytes(), self.components.tobytes()
+
+    @staticmethod
+    def from_bytes(
+            mean: bytes, components: bytes
+    ) -> 'EmbeddingProjection':
+        """
+        @param mean: bytes from `to_bytes`
+        @param components: bytes from `to_bytes`
+        @rtype: EmbeddingProjection
+        @return: projection
+        """
+        mean = np.frombuffer(mean, dtype=np.float32)
+        return EmbeddingProjection(mean, np.frombuffer(components, dtype=np.float32).reshape(-1, len(mean)))
+
+
+class CompactEmbeddings:
+    """
+    This class encodes and searches the compact embeddings column. With `rerank` set, the `rerank`
+    closest rows by compact distance are reordered by their full precision distance. The full
+    dimensions are the ones of the configured embedding provider unless they are given. A loaded
+    projection is used for `refresh_interval` seconds, then reloaded if its fingerprint changed.
+    """
+
+    def __init__(
+            self, dimensions: int = None, precision: str = "float32", rerank: int = 0, full_dimensions: int = None,
+            refresh_interval: float = 30.0
+    ) -> None:
+        full_dimensions = full_dimensions if full_dimensions else embedding_provider().dimensions
+        dimensions = dimensions if dimensions else full_dimensions
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown embedding precision {precision}, expected one of {', '.join(PRECISIONS)}")
+        if not 0 < dimensions <= full_dimensions:
+            raise ValueError(f"embedding dimensions must be between 1 and {full_dimensions}, got {dimensions}")
+
+        self.full_dimensions = full_dimensions
+        self.dimensions = dimensions
+        self.precision = precision
+        self.rerank = rerank
+        self.refresh_interval = refresh_interval
+        # table -> (projection, fingerprint, time it was last checked)
+        self.__projections: dict[str, tuple[EmbeddingProjection | None, str | None, float]] = {}
+
+    def column_type(
+            self
+    ) -> str:
+        """
+        @rtype: str
+        @return: ex. "halfvec(64)"
+        """
+        return f"{PRECISIONS[self.precision][0]}({self.dimensions})"
+
+    def opclass(
+            self
+    ) -> str:
+        """
+        @rtype: str
+        @return: operator class used to index the column ex. "halfvec_l2_ops"
+        """
+        return PRECISIONS[self.precision][2]
+
+    def encode(
+            self, embedding: list[float] | np.ndarray, projection: EmbeddingProjection = None
+    ) -> str:
+        """
+        This method turns a full precision embedding into the literal of the compact column.
+        @param embedding: vector representation of the text
+        @param projection: projection of the table, required when fewer dimensions are kept
+        @rtype: str
+        @return: ex. "[0.1,0.2]" or "0110" for binary
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if projection is not None:
+            embedding = projection.project(embedding)
+        elif self.dimensions < self.full_dimensions:
+            raise ValueError(f"a projection is needed to keep {self.dimensions} dimensions")
+
+        if self.precision == "binary":
+            return ''.join('1' if value > 0 else '0' for value in embedding)
+
+        return to_db(embedding)
+
+    def nearest_sql(
+            self, table: str, columns: str, limit: int = 1, placeholders: tuple[str, str] = ("%s", "%s")
+    ) -> str:
+        """
+        This method returns the nearest neighbour query on the compact column.
+        @param table: ex. "products"
+        @param columns: selected columns ex. "id, item_name"
+        @param limit: rows to return
+        @param placeholders: of the compact literal and the full embedding, ("$1::text", "$2") for asyncpg
+        @rtype: str
+        @return: query taking the compact literal, and the full embedding if reranking
+        """
+        _, operator, _ = PRECISIONS[self.precision]
+        compact, full = placeholders
+        if not self.rerank:
+            return (f"SELECT {columns} FROM {table} "
+                    f"ORDER BY {COMPACT_COLUMN} {operator} {compact}::{self.column_type()} LIMIT {int(limit)};")
+
+        return (f"SELECT {columns} FROM ("
+                f"SELECT {columns}, embeddings FROM {table} "
+                f"ORDER BY {COMPACT_COLUMN} {operator} {compact}::{self.column_type()} "
+                f"LIMIT {max(int(self.rerank), int(limit))}"
+                f") AS candidates ORDER BY embeddings <-> {full} LIMIT {int(limit)};")
+
+    def nearest(
+            self, cur, table: str, columns: str, embedding: list[float] | np.ndarray, limit: int = 1
+    ) -> list[tuple]:
+        """
+        This method runs the nearest neighbour query on the compact column.
+        @param cur: psycopg2 cursor of a connection with the vector type registered
+        @param table: ex. "products"
+        @param columns: selected columns ex. "id, item_name"
+        @param embedding: full precision embedding of the order
+        @param limit: rows to return
+        @rtype: list[tuple]
+        @return: rows closest to the embedding
+        """
+        params = (self.encode(embedding, self.projection(cur, table)),)
+        if self.rerank:
+            params += (vector_param(embedding),)
+        cur.execute(self.nearest_sql(table, columns, limit), params)
+
+        return cur.fetchall()
+
+    async def async_nearest(
+            self, connection, table: str, columns: str, embedding: list[float] | np.ndarray, limit: int = 1
+    ) -> list[tuple]:
+        """
+        This method is the awaitable version of `nearest` for asyncpg connections.
+        @param connection: asyncpg connection with the vector codec registered
+        @param table: ex. "products"
+        @param columns: selected columns ex. "id, item_name"
+        @param embedding: full precision embedding of the order
+        @param limit: rows to return
+        @rtype: list[tuple]
+        @return: rows closest to the embedding
+        """
+        projection = None
+        if self.dimensions < self.full_dimensions:
+            if self.__is_fresh(table):
+                projection = self.__projections[table][0]
+            elif table in self.__projections and self.__projections[table][1] == await connection.fetchval(
+                    PROJECTION_FINGERPRINT_SQL.format("$1"), table):
+                projection = self.__checked(table)
+            else:
+                projection = self.__store_projection(
+                    table, await connection.fetchrow(LOAD_PROJECTION_SQL.format("$1"), table))
+
+        params = (self.encode(embedding, projection),)
+        if self.rerank:
+            params += (vector_param(embedding),)
+        records = await connection.fetch(self.nearest_sql(table, columns, limit, ("$1::text", "$2")), *params)
+
+        return [tuple(record) for record in records]
+
+    def projection(
+            self, cur, table: str
+    ) -> EmbeddingProjection | None:
+        """
+        This method returns the projection of the table. It is loaded from the database the first time and
+        reloaded when its fingerprint changed, which is checked at most every `refresh_interval` seconds.
+        @param cur: psycopg2 cursor
+        @param table: ex. "products"
+        @rtype: EmbeddingProjection | None
+        @return: projection, None if every dimension is kept
+        """
+        if self.dimensions == self.full_dimensions:
+            return None
+
+        if self.__is_fresh(table):
+            return self.__projections[table][0]
+        if table in self.__projections:
+            cur.execute(PROJECTION_FINGERPRINT_SQL.format("%s"), (table,))
+            row = cur.fetchone()
+            if self.__projections[table][1] == (row[0] if row else None):
+                return self.__checked(table)
+
+        cur.execute(LOAD_PROJECTION_SQL.format("%s"), (table,))
+
+        return self.__store_projection(table, cur.fetchone())
+
+    def migrate(
+            self, db_connection, table: str, index: VectorIndex = None
+    ) -> int:
+        """
+        This method re-encodes the full precision embeddings of a table into the compact column and
+        indexes it. Nothing is committed, the caller decides.
+        @param db_connection: psycopg2 connection with the vector type registered
+        @param table: "products" or "deals"
+        @param index: index strategy of the compact column, defaults to the VECTOR_INDEX environment variable
+        @rtype: int
+        @return: number of rows re-encoded
+        """
+        cur = db_connection.cursor()
+        cur.execute(f"SELECT id, embeddings FROM {table} WHERE embeddings IS NOT NULL;")
+        rows = cur.fetchall()
+
+        projection = None
+        if self.dimensions < self.full_dimensions:
+            projection = EmbeddingProjection.fit(np.stack([row[1] for row in rows]), self.dimensions)
+        self.__save_projection(cur, table, projection)
+
+        cur.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {COMPACT_COLUMN};")
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {COMPACT_COLUMN} {self.column_type()};")
+        psycopg2.extras.execute_values(
+            cur,
+            f"UPDATE {table} SET {COMPACT_COLUMN} = encoded.compact::{self.column_type()} "
+            f"FROM (VALUES %s) AS encoded (id, compact) WHERE {table}.id = encoded.id;",
+            [(row[0], self.encode(row[1], projection)) for row in rows])
+
+        index = index if index else vector_index(num_rows=len(rows))
+        cur.execute(index.create_sql(table, column=COMPACT_COLUMN, opclass=self.opclass()))
+        cur.close()
+
+        logging.info("re-encoded %s rows of %s as %s", len(rows), table, self.column_type())
+
+        return len(rows)
+
+    def encode_table(
+            self, db_connection, table: str, index: VectorIndex = None
+    ) -> int:
+        """
+        This method migrates a table the fill scripts just created, which has no compact column yet, in
+        one transaction of their autocommit connection.
+        @param db_connection: psycopg2 connection in autocommit mode with the vector type registered
+        @param table: "products" or "deals"
+        @param index: index strategy of the compact column, defaults to the VECTOR_INDEX environment variable
+        @rtype: int
+        @return: number of rows encoded
+        """
+        db_connection.set_session(autocommit=False)
+        try:
+            rows = self.migrate(db_connection, table, index)
+            db_connection.commit()
+        except Exception:
+            db_connection.rollback()
+            raise
+        finally:
+            db_connection.set_session(autocommit=True)
+
+        return rows
+
+    def __save_projection(
+            self, cur, table: str, projection: EmbeddingProjection | None
+    ) -> None:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PROJECTIONS_TABLE} (
+                table_name text PRIMARY KEY,
+                mean bytea,
+                components bytea
+            );
+        """)
+        cur.execute(f"DELETE FROM {PROJECTIONS_TABLE} WHERE table_name = %s;", (table,))
+        fingerprint = None
+        if projection is not None:
+            mean, components = projection.to_bytes()
+            cur.execute(f"INSERT INTO {PROJECTIONS_TABLE} (table_name, mean, components) VALUES (%s, %s, %s);",
+                        (table, psycopg2.Binary(mean), psycopg2.Binary(components)))
+            fingerprint = hashlib.md5(mean + components).hexdigest()
+        self.__projections[table] = (projection, fingerprint, time.time())
+
+    def __is_fresh(
+            self, table: str
+    ) -> bool:
+        return table in self.__projections and time.time() - self.__projections[table][2] < self.refresh_interval
+
+    def __checked(
+            self, table: str
+    ) -> EmbeddingProjection | None:
+        projection, fingerprint, _ = self.__projections[table]
+        self.__projections[table] = (projection, fingerprint, time.time())
+
+        return projection
+
+    def __store_projection(
+            self, table: str, row
+    ) -> EmbeddingProjection | None:
+        projection = EmbeddingProjection.from_bytes(bytes(row[0]), bytes(row[1])) if row else None
+        self.__projections[table] = (projection, row[2] if row else None, time.time())
+
+        return projection
+
+    def __repr__(
+            self
+    ) -> str:
+        return f"{self.column_type()}{f' rerank {self.rerank}' if self.rerank else ''}"
+
+
+_storages_lock = threading.Lock()
+_storages: dict[tuple[int, str, int, int], CompactEmbeddings] = {}
+
+
+def compact_embeddings(
+        dimensions: int = None, precision: str = None, rerank: int = None
+) -> CompactEmbeddings | None:
+    """
+    This function returns the configured compact storage, created once per process and configuration so
+    the projections are only loaded once.
+    @param dimensions: defaults to the EMBEDDING_DIMENSIONS environment variable, then the full dimensions of
+    the embedding provider
+    @param precision: "float32", "float16" or "binary", defaults to the EMBEDDING_PRECISION environment variable
+    @param rerank: candidates reranked in full precision, defaults to the EMBEDDING_RERANK environment variable
+    @rtype: CompactEmbeddings | None
+    @return: compact storage, None if the full precision column is searched directly
+    """
+    full_dimensions = embedding_provider().dimensions
+    dimensions = dimensions if dimensions else int(env('EMBEDDING_DIMENSIONS', str(full_dimensions)))
+    precision = (precision if precision else env('EMBEDDING_PRECISION', 'float32')).lower()
+    rerank = rerank if rerank is not None else int(env('EMBEDDING_RERANK', '0'))
+
+    if dimensions == full_dimensions and precision == "float32":
+        return None
+
+    key = (dimensions, precision, rerank, full_dimensions)
+    with _storages_lock:
+        if key not in _storages:
+            _storages[key] = CompactEmbeddings(dimensions, precision, rerank, full_dimensions)
+
+        return _storages[key]
+
+
+def reset_compact_embeddings(
+
+) -> None:
+    """
+    This function forgets every storage and the projections they loaded, used by tests and after a migration.
+    @rtype: None
+    @return: Nothing
+    """
+    with _storages_lock:
+        _storages.clear()
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successful
+    """
+    # imported here, the repository imports this module
+    from src.vector_db.menu_repository import MenuRepository  # pylint: disable=C0415
+
+    storage = compact_embeddings()
+    if storage is None:
+        print("EMBEDDING_DIMENSIONS and EMBEDDING_PRECISION keep the full precision column, nothing to do")
+        return 1
+
+    db_connection = MenuRepository.connect().direct_connection()
+    register_vector(db_connection)
+    db_connection.set_session(autocommit=False)
+    for table in sys.argv[1:] if len(sys.argv) > 1 else ["products", "deals"]:
+        rows = storage.migrate(db_connection, table)
+        db_connection.commit()
+        print(f"{table}: {rows} rows stored as {storage!r}")
+    db_connection.close()
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -4,50 +4,56 @@ This module contains the function to check if an item is in stock and if the qua
 import json
 from os import path
 from io import StringIO
-import psycopg2
-import numpy as np
-from pgvector.psycopg2 import register_vector
-from src.vector_db.aws_sdk_auth import get_secret
-from src.ai_integration.embeddings_api import openai_embedding_api
-from src.vector_db.aws_database_auth import connection_string
+from src.vector_db.embedding_cache import EmbeddingCache, get_cached_embedding, set_cached_embedding, provider_cache
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.menu_repository import MenuRepository
+from src.vector_db.inventory import Inventory
 
 
 def contains_quantity(
         order: str, quantity: int = 1, key: str = None,
-        aws_csv_file: StringIO = None, database_csv_file: StringIO = None
+        aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        embedding_cache: EmbeddingCache = None, repository: MenuRepository = None,
+        inventory: Inventory = None
 ) -> str:
     """
     This API is used to check if the item is in stock and if the quantity is available.
     @param order: customers order ex. "Can I have a black coffee with 3 shots of cream."
     @param quantity:
     @param key: auth key for OpenAI
-    @param aws_csv_file: AWS SDK auth
-    @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param aws_csv_file: AWS SDK auth, only used when the repository is created
+    @param database_csv_file: AWS RDS and PostgreSQL auth, only used when the repository is created
+    @param embedding_cache: cache to reduce number of calls to OpenAI API, defaults to the repository's
+    @param repository: defaults to the process wide MenuRepository
+    @param inventory: redis stock counters, a menu item name is then checked with one redis call
     @rtype: bool
     @return: Boolean flag to show whether the item is in stock
     """
     if not order:
         return json.dumps(False)
 
-    get_secret(aws_csv_file if not None else None)
-    db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
-    db_connection.set_session(autocommit=True)
+    if inventory:
+        stock = inventory.check(order)
+        if stock:
+            return json.dumps([stock[1] >= quantity, stock[1]])
 
-    cur = db_connection.cursor()
+    repository = repository if repository else MenuRepository.connect(aws_csv_file=aws_csv_file,
+                                                                      database_csv_file=database_csv_file)
 
-    embedding = openai_embedding_api(order, key if key else None)
-    register_vector(db_connection)
+    embedding_cache, model = provider_cache(embedding_cache, embedding_provider(api_key=key if key else None))
+    embedding = get_cached_embedding(embedding_cache, order, model) if embedding_cache else None
+    if embedding is None:
+        embedding = repository.embedding(order, key)
+        if embedding_cache:
+            set_cached_embedding(embedding_cache, order, embedding, model)
 
-    cur.execute(""" SELECT id, item_name, item_quantity, common_allergin, num_calories, price
-                            FROM products
-                            ORDER BY embeddings <-> %s limit 1;""",
-                (np.array(embedding),))
+    result = repository.nearest_product(embedding)
 
-    result = cur.fetchall()
-    cur.close()
-    db_connection.close()
+    available = inventory.available(result[0][0]) if inventory else None
+    if available is None:
+        available = result[0][2]
 
-    return json.dumps([result[0][2] >= quantity, result[0][2]])
+    return json.dumps([available >= quantity, available])
 
 
 def main(
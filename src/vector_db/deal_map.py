@@ -0,0 +1,165 @@
+"""
+This module contains the DealMap class which precomputes the best deal for every product so that
+`get_deal` can answer with a dictionary lookup instead of an embedding and a vector search. The deal
+catalogue is tiny and changes rarely, so the whole mapping is rebuilt with one query whenever the
+products or deals table changes.
+"""
+import time
+import logging
+import threading
+from io import StringIO
+import psycopg2
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.aws_database_auth import connection_string
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
+from src.vector_db.menu_aliases import MenuAliases, normalize_name
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+class DealMap:
+    """
+    This class maps every product, and every alias of it, to the deal `get_deal` would have found for
+    it. Both tables are fingerprinted every `refresh_interval` seconds and the mapping, and the alias
+    table of the products it holds, are rebuilt if either changed. The mapping is built from the full
+    precision embeddings, the compact column only serves the `get_deal` lookups it misses.
+    """
+
+    def __init__(
+            self, connection_pool=None, refresh_interval: float = 30.0,
+            database_csv_file: StringIO = None, aliases: MenuAliases = None
+    ) -> None:
+        self.__connection_pool = connection_pool
+        self.__fixed_aliases = aliases
+        self.__database_csv_file = database_csv_file
+        self.__refresh_interval = refresh_interval
+        self.__lock = threading.Lock()
+        # (aliases, deals by normalized product name) is swapped as one tuple so readers never see a half reload
+        self.__deals: tuple[MenuAliases, dict[str, tuple]] | None = None
+        self.__fingerprint: tuple | None = None
+        self.__last_checked: float = 0.0
+
+    def lookup(
+            self, product_name: str
+    ) -> tuple | None:
+        """
+        This method returns the best deal for the product in O(1).
+        @param product_name: item_name from the order report ex. "glazed donut"
+        @rtype: tuple | None
+        @return: (deal, item_type, item_name, item_quantity, price) same as a row of `get_deal`'s query,
+         None if the product isn't on the menu
+        """
+        if not product_name:
+            return None
+
+        aliases, deals = self.__current_deals()
+        deal = deals.get(normalize_name(product_name))
+        if deal is None:
+            key = aliases.resolve(product_name)
+            deal = deals.get(key) if key else None
+
+        return deal
+
+    def invalidate(
+            self
+    ) -> None:
+        """
+        This method forces the next lookup to rebuild the mapping.
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__lock:
+            self.__fingerprint = None
+            self.__last_checked = 0.0
+
+    def reload(
+            self
+    ) -> None:
+        """
+        This method rebuilds the mapping from the products and deals tables.
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__lock:
+            self.__reload()
+
+    def __current_deals(
+            self
+    ) -> tuple[MenuAliases, dict[str, tuple]]:
+        if self.__deals is not None and time.time() - self.__last_checked < self.__refresh_interval:
+            return self.__deals
+
+        with self.__lock:
+            if self.__deals is None or time.time() - self.__last_checked >= self.__refresh_interval:
+                self.__refresh()
+
+            return self.__deals
+
+    def __refresh(
+            self
+    ) -> None:
+        # the mapping is built from the embeddings, so re-embedding either table must rebuild it
+        fingerprint = tuple(self.__query(""" SELECT (SELECT md5(string_agg(concat_ws(':', id, item_name,
+                                                                                     md5(embeddings::text)),
+                                                                      ',' ORDER BY id))
+                                                     FROM products),
+                                                    (SELECT md5(string_agg(concat_ws(':', id, deal, item_type,
+                                                                                     item_name, item_quantity,
+                                                                                     price, related_items,
+                                                                                     md5(embeddings::text)),
+                                                                      ',' ORDER BY id))
+                                                     FROM deals);""")[0])
+        self.__last_checked = time.time()
+
+        if self.__deals is None or fingerprint != self.__fingerprint:
+            logging.debug("products or deals table changed, rebuilding deal map")
+            self.__reload()
+            self.__fingerprint = fingerprint
+
+    def __reload(
+            self
+    ) -> None:
+        load_time = time.time()
+        # same search as `get_deal`, the products were embedded from their item_name
+        result = self.__query(""" SELECT products.item_name, best_deal.deal, best_deal.item_type,
+                                         best_deal.item_name, best_deal.item_quantity, best_deal.price
+                                  FROM products
+                                  CROSS JOIN LATERAL (
+                                      SELECT deal, item_type, item_name, item_quantity, price
+                                      FROM deals
+                                      ORDER BY deals.embeddings <-> products.embeddings
+                                      LIMIT 1
+                                  ) AS best_deal
+                                  ORDER BY products.id DESC;""")
+
+        aliases = self.__fixed_aliases
+        if aliases is None:
+            aliases = MenuAliases(menu=[{"MenuItem": {"item_name": row[0]}} for row in result if row[0]],
+                                  previous=self.__deals[0] if self.__deals else None)
+        self.__deals = (aliases, {normalize_name(row[0]): tuple(row[1:]) for row in result if row[0]})
+        self.__last_checked = time.time()
+        logging.debug("deal map load time %s:", time.time() - load_time)
+
+    def __query(
+            self, sql: str
+    ) -> list[tuple]:
+        if self.__connection_pool:
+            db_connection = self.__connection_pool.getconn()
+        else:
+            db_connection = psycopg2.connect(connection_string(self.__database_csv_file))
+
+        try:
+            if not isinstance(self.__connection_pool, PostgresConnectionPool):
+                db_connection.set_session(autocommit=True)
+            cur = db_connection.cursor()
+            cur.execute(sql)
+            result = cur.fetchall()
+            cur.close()
+        finally:
+            if self.__connection_pool:
+                self.__connection_pool.putconn(db_connection)
+            else:
+                db_connection.close()
+
+        return result
@@ -0,0 +1,361 @@
+"""
+This module contains the codec used to store embeddings in the redis embedding cache. Embeddings are
+stored as raw little endian float32 bytes (6 KB for 1536 dimensions instead of ~30 KB of json text)
+under keys versioned by the embedding model and the normalized text, ex.
+    "emb:v2:text-embedding-ada-002:black coffee"
+Reads are a single GET, or a single MGET for a batch, and decode into a numpy array without a copy.
+
+The EmbeddingCache class puts a bounded in-process LRU in front of redis so hot menu names cost a
+dictionary lookup instead of a network hop. Every function in this module accepts either a redis
+client or an EmbeddingCache, the async functions take a redis.asyncio client.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Final
+import numpy as np
+import redis
+import redis.asyncio
+from src.ai_integration.embeddings_api import EMBEDDING_MODEL
+from src.ai_integration.embedding_provider import EmbeddingProvider
+from src.vector_db.menu_aliases import singular
+from src.django_beanhub.settings import DEBUG
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# bump when the key format or the stored bytes change so old entries are never decoded
+KEY_VERSION: Final = 2
+EMBEDDING_DTYPE: Final = np.dtype('<f4')
+
+
+def normalize_text(
+        text: str
+) -> str:
+    """
+    This function returns the text the embedding is cached under.
+    @param text: ex. "  Glazed  Donuts "
+    @rtype: str
+    @return: ex. "glazed donut"
+    """
+    return ' '.join(singular(word) for word in text.casefold().split())
+
+
+def cache_key(
+        text: str, model: str = EMBEDDING_MODEL
+) -> str:
+    """
+    This function returns the redis key of the embedding of the text.
+    @param text: ex. "black coffee"
+    @param model: embedding model the vector was created with
+    @rtype: str
+    @return: ex. "emb:v2:text-embedding-ada-002:black coffee"
+    """
+    return f"emb:v{KEY_VERSION}:{model}:{normalize_text(text)}"
+
+
+def provider_cache(
+        embedding_cache, provider: EmbeddingProvider
+) -> tuple:
+    """
+    This function returns the cache the embeddings of the provider are read from and written to, and
+    the model they are keyed by, so a vector of another model is never returned. Local providers embed
+    faster than a cache round trip and get no cache.
+    @param embedding_cache: redis client, EmbeddingCache or redis.asyncio client, None if there is none
+    @param provider: provider the embeddings are created with
+    @rtype: tuple
+    @return: (cache or None, model) ex. (EmbeddingCache(...), "text-embedding-ada-002")
+    """
+    return embedding_cache if provider.remote else None, provider.model
+
+
+def encode_embedding(
+        embedding: list[float] | np.ndarray
+) -> bytes:
+    """
+    This function serializes an embedding to raw float32 bytes.
+    @param embedding: vector representation of the text
+    @rtype: bytes
+    @return: 4 bytes per dimension
+    """
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def decode_embedding(
+        raw: bytes
+) -> np.ndarray:
+    """
+    This function deserializes raw float32 bytes without copying them.
+    @param raw: bytes returned by redis
+    @rtype: np.ndarray
+    @return: read only float32 array backed by `raw`
+    """
+    return np.frombuffer(raw, dtype=EMBEDDING_DTYPE)
+
+
+def get_cached_embedding(
+        embedding_cache: redis.Redis, text: str, model: str = EMBEDDING_MODEL
+) -> np.ndarray | None:
+    """
+    This function returns the cached embedding of the text with one round trip.
+    @param embedding_cache: redis db 2 or the EmbeddingCache in front of it
+    @param text: ex. "black coffee"
+    @param model: embedding model the vector was created with
+    @rtype: np.ndarray | None
+    @return: embedding, None on a cache miss
+    """
+    if isinstance(embedding_cache, EmbeddingCache):
+        return embedding_cache.get_embedding(text, model)
+
+    raw = embedding_cache.get(cache_key(text, model))
+
+    return decode_embedding(raw) if raw else None
+
+
+def get_cached_embeddings(
+        embedding_cache: redis.Redis, texts: list[str], model: str = EMBEDDING_MODEL
+) -> list[np.ndarray | None]:
+    """
+    This function returns the cached embedding of every text with one MGET.
+    @param embedding_cache: redis db 2 or the EmbeddingCache in front of it
+    @param texts: ex. ["black coffee", "glazed donut"]
+    @param model: embedding model the vectors were created with
+    @rtype: list[np.ndarray | None]
+    @return: embedding or None for every text, in the same order
+    """
+    if not texts:
+        return []
+    if isinstance(embedding_cache, EmbeddingCache):
+        return embedding_cache.get_embeddings(texts, model)
+
+    raw_embeddings = embedding_cache.mget([cache_key(text, model) for text in texts])
+
+    return [decode_embedding(raw) if raw else None for raw in raw_embeddings]
+
+
+def set_cached_embedding(
+        embedding_cache: redis.Redis, text: str, embedding: list[float] | np.ndarray,
+        model: str = EMBEDDING_MODEL
+) -> None:
+    """
+    This function caches the embedding of the text.
+    @param embedding_cache: redis db 2 or the EmbeddingCache in front of it
+    @param text: ex. "black coffee"
+    @param embedding: vector representation of the text
+    @param model: embedding model the vector was created with
+    @rtype: None
+    @return: Nothing
+    """
+    if isinstance(embedding_cache, EmbeddingCache):
+        embedding_cache.set_embeddings({text: embedding}, model)
+        return
+
+    embedding_cache.set(cache_key(text, model), encode_embedding(embedding))
+
+
+def set_cached_embeddings(
+        embedding_cache: redis.Redis, embeddings: dict[str, list[float] | np.ndarray],
+        model: str = EMBEDDING_MODEL
+) -> None:
+    """
+    This function caches many embeddings with one MSET.
+    @param embedding_cache: redis db 2 or the EmbeddingCache in front of it
+    @param embeddings: embedding keyed by text ex. {"black coffee": [...]}
+    @param model: embedding model the vectors were created with
+    @rtype: None
+    @return: Nothing
+    """
+    if not embeddings:
+        return
+    if isinstance(embedding_cache, EmbeddingCache):
+        embedding_cache.set_embeddings(embeddings, model)
+        return
+
+    embedding_cache.mset({cache_key(text, model): encode_embedding(embedding)
+                          for text, embedding in embeddings.items()})
+
+
+async def async_get_cached_embedding(
+        embedding_cache: redis.asyncio.Redis, text: str, model: str = EMBEDDING_MODEL
+) -> np.ndarray | None:
+    """
+    This function returns the cached embedding of the text without blocking the event loop.
+    @param embedding_cache: async client of redis db 2
+    @param text: ex. "black coffee"
+    @param model: embedding model the vector was created with
+    @rtype: np.ndarray | None
+    @return: embedding, None on a cache miss
+    """
+    raw = await embedding_cache.get(cache_key(text, model))
+
+    return decode_embedding(raw) if raw else None
+
+
+async def async_set_cached_embedding(
+        embedding_cache: redis.asyncio.Redis, text: str, embedding: list[float] | np.ndarray,
+        model: str = EMBEDDING_MODEL
+) -> None:
+    """
+    This function caches the embedding of the text without blocking the event loop.
+    @param embedding_cache: async client of redis db 2
+    @param text: ex. "black coffee"
+    @param embedding: vector representation of the text
+    @param model: embedding model the vector was created with
+    @rtype: None
+    @return: Nothing
+    """
+    await embedding_cache.set(cache_key(text, model), encode_embedding(embedding))
+
+
+class EmbeddingCache:
+    """
+    This class is a thread safe LRU with a time to live in front of the redis embedding cache. Entries
+    are keyed by `cache_key` so names that only differ in case, spacing or plurals share one entry.
+    """
+
+    def __init__(
+            self, redis_cache: redis.Redis = None, max_size: int = 1024, ttl: float = 3600.0
+    ) -> None:
+        self.__redis_cache = redis_cache
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        # key -> (expires at, embedding), most recently used last
+        self.__entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self.__hits = 0
+        self.__redis_hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__expirations = 0
+
+    def redis_cache(
+            self
+    ) -> redis.Redis | None:
+        """
+        This method returns the redis client behind the in-process tier.
+        @rtype: redis.Redis | None
+        @return: redis db 2, None if the cache is in-process only
+        """
+        return self.__redis_cache
+
+    def get_embedding(
+            self, text: str, model: str = EMBEDDING_MODEL
+    ) -> np.ndarray | None:
+        """
+        This method returns the embedding of the text from memory, falling back to redis.
+        @param text: ex. "black coffee"
+        @param model: embedding model the vector was created with
+        @rtype: np.ndarray | None
+        @return: embedding, None if neither tier has it
+        """
+        return self.get_embeddings([text], model)[0]
+
+    def get_embeddings(
+            self, texts: list[str], model: str = EMBEDDING_MODEL
+    ) -> list[np.ndarray | None]:
+        """
+        This method returns the embedding of every text, the in-process misses are read with one MGET.
+        @param texts: ex. ["black coffee", "glazed donut"]
+        @param model: embedding model the vectors were created with
+        @rtype: list[np.ndarray | None]
+        @return: embedding or None for every text, in the same order
+        """
+        keys = [cache_key(text, model) for text in texts]
+        embeddings = [self.__get(key) for key in keys]
+
+        missing = [index for index, embedding in enumerate(embeddings) if embedding is None]
+        if missing and self.__redis_cache is not None:
+            raw_embeddings = self.__redis_cache.mget([keys[index] for index in missing])
+            for index, raw in zip(missing, raw_embeddings):
+                if raw:
+                    embeddings[index] = decode_embedding(raw)
+                    self.__put(keys[index], embeddings[index])
+
+        with self.__lock:
+            self.__hits += len(texts) - len(missing)
+            found = sum(embeddings[index] is not None for index in missing)
+            self.__redis_hits += found
+            self.__misses += len(missing) - found
+
+        return embeddings
+
+    def set_embeddings(
+            self, embeddings: dict[str, list[float] | np.ndarray], model: str = EMBEDDING_MODEL
+    ) -> None:
+        """
+        This method stores the embeddings in memory and in redis with one MSET.
+        @param embeddings: embedding keyed by text ex. {"black coffee": [...]}
+        @param model: embedding model the vectors were created with
+        @rtype: None
+        @return: Nothing
+        """
+        if not embeddings:
+            return
+
+        encoded = {cache_key(text, model): encode_embedding(embedding)
+                   for text, embedding in embeddings.items()}
+        for key, raw in encoded.items():
+            self.__put(key, decode_embedding(raw))
+
+        if self.__redis_cache is not None:
+            self.__redis_cache.mset(encoded)
+
+    def clear(
+            self
+    ) -> None:
+        """
+        This method empties the in-process tier, redis is left untouched.
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(
+            self
+    ) -> dict:
+        """
+        This method returns how often lookups were answered without a network hop.
+        @rtype: dict
+        @return: ex. {"hits": 90, "redis_hits": 8, "misses": 2, "hit_rate": 0.9, "evictions": 0,
+         "expirations": 0, "size": 40}
+        """
+        with self.__lock:
+            lookups = self.__hits + self.__redis_hits + self.__misses
+            return {
+                "hits": self.__hits,
+                "redis_hits": self.__redis_hits,
+                "misses": self.__misses,
+                "hit_rate": self.__hits / lookups if lookups else 0.0,
+                "evictions": self.__evictions,
+                "expirations": self.__expirations,
+                "size": len(self.__entries)
+            }
+
+    def __get(
+            self, key: str
+    ) -> np.ndarray | None:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, embedding = entry
+            if expires_at <= time.monotonic():
+                del self.__entries[key]
+                self.__expirations += 1
+                return None
+
+            self.__entries.move_to_end(key)
+            return embedding
+
+    def __put(
+            self, key: str, embedding: np.ndarray
+    ) -> None:
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.__ttl, embedding)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
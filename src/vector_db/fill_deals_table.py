@@ -3,20 +3,27 @@ This module contains the function fill_deals_table which is used to fill
  the deals table in the database with the deal csv file.
 """
 # pylint: disable=R0801
+import logging
 from os import path
 from io import StringIO
-import psycopg2
 from tqdm import tqdm
 from pgvector.psycopg2 import register_vector
 from other.red import input_red
-from src.vector_db.aws_sdk_auth import get_secret
-from src.vector_db.aws_database_auth import connection_string
-from src.ai_integration.embeddings_api import parse_deals_csv, openai_embedding_api
+from src.vector_db.menu_repository import MenuRepository
+from src.ai_integration.embeddings_api import parse_deals_csv
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.vector_index import VectorIndex, vector_index, MAX_INDEX_DIMENSIONS
+from src.vector_db.bulk_load import bulk_load, encode_text, encode_int4, encode_float8, encode_vector
+from src.django_beanhub.settings import DEBUG
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
 
 
 def fill_deals_table(
         deals: list[dict], key: str = None,
-        aws_csv_file: StringIO = None, database_csv_file: StringIO = None
+        aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        index: VectorIndex = None
 ) -> bool:
     """
     This function is used to fill the deals table in the database with the deal csv file.
@@ -25,6 +32,7 @@ def fill_deals_table(
     @param aws_csv_file:  used for unit tests and if you want to pass in own AWS authentication
     @param database_csv_file: used for unit tests and if you want
      to pass in own database authentication
+    @param index: index strategy for the embeddings, defaults to the VECTOR_INDEX environment variable
     @rtype: bool
     @return: true if successfully created and filled table
     """
@@ -35,9 +43,9 @@ def fill_deals_table(
     if str(input("Enter the passkey to confirm: ")) != "beanKnowsWhatBeanWants":
         return False
 
-    get_secret(aws_csv_file if not None else None)
-    db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
-    db_connection.set_session(autocommit=True)
+    provider = embedding_provider(api_key=key if key else None)
+    repository = MenuRepository.connect(aws_csv_file=aws_csv_file, database_csv_file=database_csv_file)
+    db_connection = repository.direct_connection()
 
     cur = db_connection.cursor()
 
@@ -45,7 +53,7 @@ def fill_deals_table(
     register_vector(db_connection)
     cur.execute("DROP TABLE IF EXISTS deals;")
 
-    cur.execute("""
+    cur.execute(f"""
             CREATE TABLE IF NOT EXISTS deals (
                 id SERIAL PRIMARY KEY,
                 deal text,
@@ -54,7 +62,7 @@ def fill_deals_table(
                 item_quantity int,
                 price double precision,
                 related_items text,
-                embeddings vector(1536)
+                embeddings vector({provider.dimensions})
             );
     """)
 
@@ -72,18 +80,119 @@ def fill_deals_table(
               item["Deal"]["item_quantity"],
               item["Deal"]["price"],
               related_items,
-              openai_embedding_api(related_items, key if key else None)))
+              provider.embed(related_items)))
+
+    index = index if index else vector_index(num_rows=len(deals))
+    # pgvector can't index more dimensions, a sequential scan of the menu is still fast
+    if provider.dimensions <= MAX_INDEX_DIMENSIONS:
+        cur.execute(index.create_sql("deals"))
+    # the table was created without the compact column the lookups search when it is configured
+    storage = repository.storage()
+    if storage:
+        storage.encode_table(db_connection, "deals", index)
+
+    cur.execute("VACUUM ANALYZE deals;")
+
+    cur.close()
+    db_connection.close()
+    repository.invalidate()
+
+    return True
+
+
+def bulk_fill_deals_table(
+        deals: list[dict], key: str = None,
+        aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        batch_size: int = 512, max_workers: int = 4, resume: bool = True,
+        index: VectorIndex = None
+) -> bool:
+    """
+    This function is used to fill the deals table with many deals. Deals are embedded in batches
+    and streamed in with binary COPY, the index is built once every row is loaded.
+    @param deals: all the menu items which have to be embedded and inserted in DB
+    @param key: key for OpenAI auth
+    @param aws_csv_file:  used for unit tests and if you want to pass in own AWS authentication
+    @param database_csv_file: used for unit tests and if you want
+     to pass in own database authentication
+    @param batch_size: number of deals per embedding request and transaction
+    @param max_workers: number of concurrent embedding requests
+    @param resume: keep the deals already in the table and only load the missing ones,
+     otherwise the table is dropped first
+    @param index: index strategy for the embeddings, defaults to the VECTOR_INDEX environment variable
+    @rtype: bool
+    @return: true if successfully created and filled table
+    """
+    if not resume:
+        if input_red() != "YES":
+            return False
+
+        if str(input("Enter the passkey to confirm: ")) != "beanKnowsWhatBeanWants":
+            return False
 
-    cur.execute("""
-            CREATE INDEX ON deals
-            USING ivfflat (embeddings) 
-            WITH (lists = 8);
+    provider = embedding_provider(api_key=key if key else None)
+    repository = MenuRepository.connect(aws_csv_file=aws_csv_file, database_csv_file=database_csv_file)
+    db_connection = repository.direct_connection()
+
+    cur = db_connection.cursor()
+
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    register_vector(db_connection)
+    if not resume:
+        cur.execute("DROP TABLE IF EXISTS deals;")
+
+    cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS deals (
+                id SERIAL PRIMARY KEY,
+                deal text,
+                item_type text,
+                item_name text,
+                item_quantity int,
+                price double precision,
+                related_items text,
+                embeddings vector({provider.dimensions})
+            );
     """)
+    # maintaining the index row by row is slower than building it once at the end
+    cur.execute("DROP INDEX IF EXISTS deals_embeddings_idx;")
+
+    cur.execute("SELECT deal, item_name FROM deals;")
+    loaded = set(cur.fetchall())
+
+    rows = {}
+    for item in deals:
+        deal = item["Deal"]["deal"].lower()
+        item_name = item["Deal"]["item_name"].lower()
+        if (deal, item_name) in loaded or (deal, item_name) in rows:
+            continue
+        rows[(deal, item_name)] = (deal,
+                                   item["Deal"]["item_type"],
+                                   item_name,
+                                   item["Deal"]["item_quantity"],
+                                   item["Deal"]["price"],
+                                   item["Deal"]["related_items"].lower())
+    logging.info("%s deals already loaded, loading %s", len(loaded), len(rows))
+
+    db_connection.set_session(autocommit=False)
+    bulk_load(db_connection, "deals",
+              ["deal", "item_type", "item_name", "item_quantity", "price", "related_items", "embeddings"],
+              [encode_text, encode_text, encode_text, encode_int4, encode_float8, encode_text, encode_vector],
+              list(rows.values()), [row[5] for row in rows.values()], key, batch_size, max_workers)
+    db_connection.set_session(autocommit=True)
+
+    index = index if index else vector_index(num_rows=len(loaded) + len(rows))
+    # pgvector can't index more dimensions, a sequential scan of the menu is still fast
+    if provider.dimensions <= MAX_INDEX_DIMENSIONS:
+        cur.execute(index.create_sql("deals"))
+    # the table was created without the compact column the lookups search when it is configured
+    storage = repository.storage()
+    if storage:
+        storage.encode_table(db_connection, "deals", index)
 
     cur.execute("VACUUM ANALYZE deals;")
 
     cur.close()
     db_connection.close()
+    repository.invalidate()
 
     return True
 
@@ -101,19 +210,10 @@ def main(
         key = api_key.readline().strip()
 
     deals = parse_deals_csv()
-    fill_deals_table(deals, key)
+    bulk_fill_deals_table(deals, key)
 
     return 0
 
 
 if __name__ == "__main__":  # pragma: no cover
     main()
-
-# pylint: disable=W0105
-'''
-If ever want to use hnsw instead of ivfflat, use this code:
-    cur.execute(f"""CREATE INDEX ON deals
-                    USING hnsw(embedding vector_cosine_ops)
-                    WITH (m=2, ef_construction=5);
-    """)
-'''
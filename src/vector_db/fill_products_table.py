@@ -2,21 +2,31 @@
 This module contains the function fill_products_table which is used to
 fill the products table in the database with menu csv file.
 """
+import logging
 from os import path
 from io import StringIO
-import psycopg2
 from tqdm import tqdm
 from pgvector.psycopg2 import register_vector
 from other.red import input_red
-from src.vector_db.aws_sdk_auth import get_secret
-from src.ai_integration.embeddings_api import openai_embedding_api, parse_menu_csv
-from src.vector_db.aws_database_auth import connection_string
+from src.ai_integration.embeddings_api import parse_menu_csv
+from src.vector_db.menu_repository import MenuRepository
+from src.vector_db.sync_menu import menu_row, embedding_hash, content_hash, HASH_COLUMNS
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.vector_index import VectorIndex, vector_index, MAX_INDEX_DIMENSIONS
+from src.vector_db.bulk_load import (
+    bulk_load, encode_text, encode_int4, encode_float8, encode_vector, encode_calorie_range
+)
+from src.django_beanhub.settings import DEBUG
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
 
 
 
 def fill_products_table(
         data: list[dict], key: str = None,
-        aws_csv_file: StringIO = None, database_csv_file: StringIO = None
+        aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        index: VectorIndex = None
 ) -> bool:
     """
     This function is used to fill the products table in the database with the menu csv file.
@@ -25,6 +35,7 @@ def fill_products_table(
     @param aws_csv_file:  used for unit tests and if you want to pass in own AWS authentication
     @param database_csv_file: used for unit tests and
     if you want to pass in own database authentication
+    @param index: index strategy for the embeddings, defaults to the VECTOR_INDEX environment variable
     @rtype: bool
     @return: true if successfully created and filled table
     """
@@ -35,9 +46,9 @@ def fill_products_table(
     if str(input("Enter the passkey to confirm: ")) != "beanKnowsWhatBeanWants":
         return False
 
-    get_secret(aws_csv_file if not None else None)
-    db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
-    db_connection.set_session(autocommit=True)
+    provider = embedding_provider(api_key=key if key else None)
+    repository = MenuRepository.connect(aws_csv_file=aws_csv_file, database_csv_file=database_csv_file)
+    db_connection = repository.direct_connection()
 
     cur = db_connection.cursor()
 
@@ -57,7 +68,7 @@ def fill_products_table(
     register_vector(db_connection)
     cur.execute("DROP TABLE IF EXISTS products;")
 
-    cur.execute("""
+    cur.execute(f"""
             CREATE TABLE IF NOT EXISTS products (
                 id SERIAL PRIMARY KEY,
                 item_name text,
@@ -65,35 +76,143 @@ def fill_products_table(
                 common_allergin text,
                 num_calories calorie_range,
                 price double precision,
-                embeddings vector(1536)
+                embedding_hash text,
+                content_hash text,
+                embeddings vector({provider.dimensions})
             );
     """)
 
     for item in tqdm(data):
-        num_calories = (int(item["MenuItem"]["num_calories"][0]),
-                        int(item["MenuItem"]["num_calories"][1]))
-        item_name = item["MenuItem"]["item_name"].lower()
+        row = menu_row(item)
 
         cur.execute("""
-            INSERT INTO products (item_name, item_quantity, common_allergin, num_calories, price, embeddings)
-            VALUES (%s, %s, %s, %s, %s, %s);
-        """, (item_name,
-              item["MenuItem"]["item_quantity"],
-              item["MenuItem"]["common_allergin"].lower(),
-              num_calories,
-              item["MenuItem"]["price"],
-              openai_embedding_api(item_name, key if key else None)))
+            INSERT INTO products (item_name, item_quantity, common_allergin, num_calories, price, embedding_hash,
+                                  content_hash, embeddings)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
+        """, row + (embedding_hash(row[0], provider.model), content_hash(row), provider.embed(row[0])))
+
+    index = index if index else vector_index(num_rows=len(data))
+    # pgvector can't index more dimensions, a sequential scan of the menu is still fast
+    if provider.dimensions <= MAX_INDEX_DIMENSIONS:
+        cur.execute(index.create_sql("products"))
+    # the table was created without the compact column the lookups search when it is configured
+    storage = repository.storage()
+    if storage:
+        storage.encode_table(db_connection, "products", index)
+
+    cur.execute("VACUUM ANALYZE products;")
+
+    cur.close()
+    db_connection.close()
+    repository.invalidate()
+
+    return True
+
+
+def bulk_fill_products_table(
+        data: list[dict], key: str = None,
+        aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        batch_size: int = 512, max_workers: int = 4, resume: bool = True,
+        index: VectorIndex = None
+) -> bool:
+    """
+    This function is used to fill the products table with many menu items. Items are embedded in batches
+    and streamed in with binary COPY, the index is built once every row is loaded.
+    @param data: all the menu items which have to be embedded and inserted in DB
+    @param key: key for OpenAI auth
+    @param aws_csv_file:  used for unit tests and if you want to pass in own AWS authentication
+    @param database_csv_file: used for unit tests and
+    if you want to pass in own database authentication
+    @param batch_size: number of items per embedding request and transaction
+    @param max_workers: number of concurrent embedding requests
+    @param resume: keep the items already in the table and only load the missing ones,
+    otherwise the table is dropped first
+    @param index: index strategy for the embeddings, defaults to the VECTOR_INDEX environment variable
+    @rtype: bool
+    @return: true if successfully created and filled table
+    """
+    if not resume:
+        if input_red() != "YES":
+            return False
+
+        if str(input("Enter the passkey to confirm: ")) != "beanKnowsWhatBeanWants":
+            return False
+
+    provider = embedding_provider(api_key=key if key else None)
+    repository = MenuRepository.connect(aws_csv_file=aws_csv_file, database_csv_file=database_csv_file)
+    db_connection = repository.direct_connection()
+
+    cur = db_connection.cursor()
 
     cur.execute("""
-            CREATE INDEX ON products
-            USING ivfflat (embeddings) 
-            WITH (lists = 8);
+        DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'calorie_range') THEN
+                CREATE TYPE calorie_range AS (
+                    min int,
+                    max int
+                );
+            END IF;
+        END $$;
+    """)
+
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    register_vector(db_connection)
+    if not resume:
+        cur.execute("DROP TABLE IF EXISTS products;")
+
+    cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS products (
+                id SERIAL PRIMARY KEY,
+                item_name text,
+                item_quantity int,
+                common_allergin text,
+                num_calories calorie_range,
+                price double precision,
+                embedding_hash text,
+                content_hash text,
+                embeddings vector({provider.dimensions})
+            );
     """)
+    # tables filled before the rows were hashed
+    for column in HASH_COLUMNS:
+        cur.execute(f"ALTER TABLE products ADD COLUMN IF NOT EXISTS {column} text;")
+    # maintaining the index row by row is slower than building it once at the end
+    cur.execute("DROP INDEX IF EXISTS products_embeddings_idx;")
+
+    cur.execute("SELECT item_name FROM products;")
+    loaded = {row[0] for row in cur.fetchall()}
+
+    rows = {}
+    for item in data:
+        row = menu_row(item)
+        if row[0] in loaded or row[0] in rows:
+            continue
+        rows[row[0]] = row + (embedding_hash(row[0], provider.model), content_hash(row))
+    logging.info("%s menu items already loaded, loading %s", len(loaded), len(rows))
+
+    db_connection.set_session(autocommit=False)
+    bulk_load(db_connection, "products",
+              ["item_name", "item_quantity", "common_allergin", "num_calories", "price", "embedding_hash",
+               "content_hash", "embeddings"],
+              [encode_text, encode_int4, encode_text, encode_calorie_range, encode_float8, encode_text, encode_text,
+               encode_vector],
+              list(rows.values()), list(rows), key, batch_size, max_workers)
+    db_connection.set_session(autocommit=True)
+
+    index = index if index else vector_index(num_rows=len(loaded) + len(rows))
+    # pgvector can't index more dimensions, a sequential scan of the menu is still fast
+    if provider.dimensions <= MAX_INDEX_DIMENSIONS:
+        cur.execute(index.create_sql("products"))
+    # the table was created without the compact column the lookups search when it is configured
+    storage = repository.storage()
+    if storage:
+        storage.encode_table(db_connection, "products", index)
 
     cur.execute("VACUUM ANALYZE products;")
 
     cur.close()
     db_connection.close()
+    repository.invalidate()
 
     return True
 
@@ -111,19 +230,11 @@ def main(
         key = api_key.readline().strip()
 
     menu = parse_menu_csv()
-    fill_products_table(menu, key)
+    # only fills an empty table, run src.vector_db.sync_menu to apply changes to the menu
+    bulk_fill_products_table(menu, key)
 
     return 0
 
 
 if __name__ == "__main__":  # pragma: no cover
     main()
-
-# pylint: disable=W0105
-'''
-If ever want to use hnsw instead of ivfflat, use this code:
-    cur.execute(f"""CREATE INDEX ON embeddings
-                    USING hnsw(embedding vector_cosine_ops)
-                    WITH (m=2, ef_construction=5);
-    """)
-'''
\ No newline at end of file
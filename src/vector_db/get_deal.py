@@ -4,21 +4,27 @@ retrieve the closest embedding from the database
 """
 # pylint: disable=R0801
 import time
-import json
 import queue
+import asyncio
 import logging
 import threading
 from io import StringIO
 from os import path
 import psycopg2
-import psycopg2.pool
-import numpy as np
 import redis
+import redis.asyncio
+import asyncpg
 from pgvector.psycopg2 import register_vector
 from src.django_beanhub.settings import DEBUG
 from src.vector_db.aws_sdk_auth import get_secret
 from src.vector_db.aws_database_auth import connection_string
-from src.ai_integration.embeddings_api import openai_embedding_api
+from src.vector_db.deal_map import DealMap
+from src.vector_db.menu_repository import DEAL_COLUMNS
+from src.vector_db.compact_embeddings import compact_embeddings
+from src.vector_db.prepared_statements import execute_prepared, async_execute_prepared, vector_param
+from src.vector_db.get_item import get_embedding, async_get_embedding
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
+from src.external_connections.async_postgres_connection_pool import connect_kwargs, configure_connection
 
 LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
 logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
@@ -27,7 +33,8 @@ logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(mes
 # pylint: disable=R0914, R0915
 def get_deal(
         order: dict, api_key: str = None, connection_pool=None,
-        embedding_cache: redis.Redis = None, database_csv_file: StringIO = None
+        embedding_cache: redis.Redis = None, database_csv_file: StringIO = None,
+        deal_map: DealMap = None
 ) -> str and dict and bool:
     """
     This API is used to get the best deal for the customer based on the order.
@@ -36,6 +43,7 @@ def get_deal(
     @param connection_pool:
     @param embedding_cache: cache to reduce number of calls to OpenAI API
     @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param deal_map: precomputed best deal of every product, skips the embedding and the query when passed in
     @rtype: str + dict + bool
     @return: Closest embedding along with object that can be used by frontend,
     a boolean flag to mark successful retrieval
@@ -45,33 +53,20 @@ def get_deal(
 
     return_queue = queue.Queue()
 
-    item_types = ['CoffeeItem', 'BeverageItem', 'FoodItem', 'BakeryItem']
-    product_name = None
-
-    for item_type in item_types:
-        if order.get(item_type) and order[item_type]['cart_action'] != 'question':
-            product_name = order[item_type]['item_name']
-            break
-
+    product_name = deal_product_name(order)
     if not product_name:
         return None, None, False
 
-    def get_embedding() -> None:
-        openai_embedding_time = time.time()
-        if embedding_cache and embedding_cache.exists(product_name):
-            logging.debug("cache hit")
-            vector_embedding = json.loads(embedding_cache.get(product_name))
-        else:
-            logging.debug("cache miss")
-            vector_embedding = openai_embedding_api(product_name, api_key if api_key else None)
-            if embedding_cache:
-                serialized_embedding = json.dumps(vector_embedding)
-                embedding_cache.set(product_name, serialized_embedding)
+    if deal_map:
+        result = deal_map.lookup(product_name)
+        if result:
+            logging.debug("deal map hit")
+            return deal_response(result)
 
-        return_queue.put(vector_embedding)
-        logging.debug("openai_embedding time %s:", {time.time() - openai_embedding_time})
+    def get_embedding_thread_target() -> None:
+        return_queue.put(get_embedding(product_name, api_key, embedding_cache))
 
-    get_embedding_thread = threading.Thread(target=get_embedding)
+    get_embedding_thread = threading.Thread(target=get_embedding_thread_target)
     get_embedding_thread.start()
 
     connection_time = time.time()
@@ -81,59 +76,155 @@ def get_deal(
         db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
     logging.debug("db connection time %s:", time.time() - connection_time)
 
-    set_session_time = time.time()
-    db_connection.set_session(autocommit=True)
-    logging.debug("start new db session time %s:", {time.time() - set_session_time})
+    try:
+        # connections from a PostgresConnectionPool are already in autocommit with the vector type registered
+        pg_register_vector_thread = None
+        if not isinstance(connection_pool, PostgresConnectionPool):
+            set_session_time = time.time()
+            db_connection.set_session(autocommit=True)
+            logging.debug("start new db session time %s:", {time.time() - set_session_time})
+
+            def pg_register_vector() -> None:
+                register_vector_time = time.time()
+                register_vector(db_connection)
+                logging.debug("register_vector time %s:", {time.time() - register_vector_time})
+
+            pg_register_vector_thread = threading.Thread(target=pg_register_vector)
+            pg_register_vector_thread.start()
+
+        cursor_time = time.time()
+        cur = db_connection.cursor()
+        logging.debug("connecting cursor time %s:", {time.time() - cursor_time})
+
+        get_embedding_thread.join()
+        if pg_register_vector_thread:
+            pg_register_vector_thread.join()
+
+        try:
+            embedding = return_queue.get(timeout=5)
+        except queue.Empty:
+            logging.debug("queue empty")
+            return ("Error, return_queue.get turned into a deadlock."
+                    " Check the `get_embedding` function"), None, False
+
+        execute_time = time.time()
+        # searches the compact embeddings column when EMBEDDING_DIMENSIONS or EMBEDDING_PRECISION is set
+        storage = compact_embeddings()
+        if storage:
+            result = storage.nearest(cur, "deals", DEAL_COLUMNS, embedding)
+        else:
+            result = execute_prepared(cur, "nearest_deal", (vector_param(embedding),))
+        logging.debug("execute query time %s:", {time.time() - execute_time})
+
+        close_time = time.time()
+        cur.close()
+        logging.debug("close cursor time %s:", {time.time() - close_time})
+    finally:
+        close_connection_time = time.time()
+        if connection_pool:
+            connection_pool.putconn(db_connection)
+        else:
+            db_connection.close()
+        logging.debug("close db connection time %s:", {time.time() - close_connection_time})
+
+    return deal_response(result[0])
 
-    def pg_register_vector() -> None:
-        register_vector_time = time.time()
-        register_vector(db_connection)
-        logging.debug("register_vector time %s:", {time.time() - register_vector_time})
 
-    pg_register_vector_thread = threading.Thread(target=pg_register_vector)
-    pg_register_vector_thread.start()
+async def async_get_deal(
+        order: dict, api_key: str = None, connection_pool: asyncpg.Pool = None,
+        embedding_cache: redis.asyncio.Redis = None, database_csv_file: StringIO = None,
+        deal_map: DealMap = None
+) -> str and dict and bool:
+    """
+    This API is the awaitable version of `get_deal`, the embedding is fetched while a connection is
+    checked out instead of on a separate thread.
+    @param order: order_report from fine_tuned_nlp.py
+    @param api_key: OpenAI auth
+    @param connection_pool: asyncpg pool from `create_async_connection_pool`
+    @param embedding_cache: async redis client to reduce number of calls to OpenAI API
+    @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param deal_map: precomputed best deal of every product, skips the embedding and the query when passed in
+    @rtype: str + dict + bool
+    @return: Closest embedding along with object that can be used by frontend,
+    a boolean flag to mark successful retrieval
+    """
+    if not order:
+        return None, None, False
+
+    product_name = deal_product_name(order)
+    if not product_name:
+        return None, None, False
 
-    cursor_time = time.time()
-    cur = db_connection.cursor()
-    logging.debug("connecting cursor time %s:", {time.time() - cursor_time})
+    if deal_map:
+        result = deal_map.lookup(product_name)
+        if result:
+            logging.debug("deal map hit")
+            return deal_response(result)
 
-    get_embedding_thread.join()
-    pg_register_vector_thread.join()
+    get_embedding_task = asyncio.create_task(async_get_embedding(product_name, api_key, embedding_cache))
 
+    connection_time = time.time()
     try:
-        embedding = return_queue.get(timeout=5)
-    except queue.Empty:
-        logging.debug("queue empty")
-        return ("Error, return_queue.get turned into a deadlock."
-                " Check the `get_embedding` function"), None, False
-
-    execute_time = time.time()
-    cur.execute(""" SELECT deal, item_type, item_name, item_quantity, price
-                    FROM deals
-                    ORDER BY embeddings <-> %s 
-                    LIMIT 1;""",
-                (np.array(embedding),))
-    logging.debug("execute query time %s:", {time.time() - execute_time})
-
-    fetchall_time = time.time()
-    result = cur.fetchall()
-    logging.debug("fetchall time %s:", {time.time() - fetchall_time})
-
-    close_time = time.time()
-    cur.close()
-    logging.debug("close cursor time %s:", {time.time() - close_time})
-
-    close_connection_time = time.time()
-    if connection_pool:
-        connection_pool.putconn(db_connection)
-    else:
-        db_connection.close()
-    logging.debug("close db connection time %s:", {time.time() - close_connection_time})
+        if connection_pool:
+            db_connection = await connection_pool.acquire()
+        else:
+            db_connection = await asyncpg.connect(**connect_kwargs(connection_string(database_csv_file)))
+            await configure_connection(db_connection)
+    except BaseException:
+        get_embedding_task.cancel()
+        raise
+    logging.debug("db connection time %s:", time.time() - connection_time)
+
+    try:
+        embedding = await get_embedding_task
+
+        execute_time = time.time()
+        storage = compact_embeddings()
+        if storage:
+            result = await storage.async_nearest(db_connection, "deals", DEAL_COLUMNS, embedding)
+        else:
+            result = await async_execute_prepared(db_connection, "nearest_deal", (vector_param(embedding),))
+        logging.debug("execute query time %s:", {time.time() - execute_time})
+    finally:
+        if connection_pool:
+            await connection_pool.release(db_connection)
+        else:
+            await db_connection.close()
+
+    return deal_response(result[0])
+
+
+def deal_product_name(
+        order: dict
+) -> str | None:
+    """
+    This function returns the name of the product a deal is looked up for.
+    @param order: order_report from fine_tuned_nlp.py
+    @rtype: str | None
+    @return: item_name of the first item that isn't a question, None if there is none
+    """
+    item_types = ['CoffeeItem', 'BeverageItem', 'FoodItem', 'BakeryItem']
 
-    deal = result[0][0]
-    item_type: str = result[0][1]
-    item_name: str = result[0][2]
-    item_price = result[0][4]
+    for item_type in item_types:
+        if order.get(item_type) and order[item_type]['cart_action'] != 'question':
+            return order[item_type]['item_name']
+
+    return None
+
+
+def deal_response(
+        result: tuple
+) -> str and dict and bool:
+    """
+    This function turns a row of the deals table into the response of `get_deal`.
+    @param result: (deal, item_type, item_name, item_quantity, price)
+    @rtype: str + dict + bool
+    @return: deal, object that can be used by frontend, a boolean flag to mark successful retrieval
+    """
+    deal = result[0]
+    item_type: str = result[1]
+    item_name: str = result[2]
+    item_price = result[4]
 
     deal_object = {
         item_type: {
@@ -165,7 +256,7 @@ def main(
             "cart_action": "insertion"
         }
     }
-    connection_pool = psycopg2.pool.SimpleConnectionPool(1, 10, connection_string())
+    connection_pool = PostgresConnectionPool(1, 10, connection_string())
 
     get_secret()
 
@@ -180,16 +271,3 @@ def main(
 
 if __name__ == "__main__":  # pragma: no cover
     main()
-
-
-# pylint: disable=W0105
-'''
-If ever change to hnsw index, use this code:
-    cur.execute(f"""
-                    SELECT id, item_name, item_quantity, common_allergin, num_calories, price
-                    FROM products
-                    WHERE 1 - (embeddings <=> %s) > {0.8}
-                    ORDER BY embeddings ASC
-                    LIMIT 1;""",
-                (np.array(embedding),))
-'''
\ No newline at end of file
@@ -9,20 +9,33 @@ This module is responsible for retrieving the closest embedding to a given order
 """
 # pylint: disable=R0801
 import time
-import json
 import queue
+import asyncio
 import logging
 import threading
 from os import path
 from io import StringIO
 import psycopg2
-import psycopg2.pool
 import numpy as np
 import redis
+import redis.asyncio
+import asyncpg
 from pgvector.psycopg2 import register_vector
 from src.vector_db.aws_sdk_auth import get_secret
-from src.ai_integration.embeddings_api import openai_embedding_api
+from src.ai_integration.embedding_provider import embedding_provider
 from src.vector_db.aws_database_auth import connection_string
+from src.vector_db.menu_index import MenuIndex
+from src.vector_db.menu_repository import PRODUCT_COLUMNS
+from src.vector_db.compact_embeddings import compact_embeddings
+from src.vector_db.prepared_statements import (
+    execute_prepared, async_execute_prepared, vector_param, vector_array_param
+)
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
+from src.external_connections.async_postgres_connection_pool import connect_kwargs, configure_connection
+from src.vector_db.embedding_cache import (
+    get_cached_embedding, get_cached_embeddings, set_cached_embedding, set_cached_embeddings,
+    async_get_cached_embedding, async_set_cached_embedding, provider_cache
+)
 from src.django_beanhub.settings import DEBUG
 
 LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
@@ -32,7 +45,7 @@ logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(mes
 # pylint: disable=R0914, R0915
 def get_item(
         order: str, api_key: str = None, connection_pool=None, embedding_cache: redis.Redis = None,
-        database_csv_file: StringIO = None
+        database_csv_file: StringIO = None, menu_index: MenuIndex = None
 ) -> str and bool:
     """
     This API is used to get the order details of the item they requested.
@@ -41,30 +54,33 @@ def get_item(
     @param connection_pool:
     @param embedding_cache: cache to reduce number of calls to OpenAI API
     @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param menu_index: in memory copy of the products table, skips the database when passed in
     @rtype: str + bool
     @return: Closest embedding along with a boolean flag to mark successful retrieval
     """
     if not order:
         return None, False
 
-    return_queue = queue.Queue()
+    if menu_index:
+        result = menu_index.lookup(order)
+        if result:
+            logging.debug("alias hit")
+            return result, True
 
-    def get_embedding() -> None:
-        openai_embedding_time = time.time()
-        if embedding_cache and embedding_cache.exists(order):
-            logging.debug("cache hit")
-            vector_embedding = json.loads(embedding_cache.get(order))
-        else:
-            logging.debug("cache miss")
-            vector_embedding = openai_embedding_api(order, api_key if api_key else None)
-            if embedding_cache:
-                serialized_embedding = json.dumps(vector_embedding)
-                embedding_cache.set(order, serialized_embedding)
+        embedding = get_embedding(order, api_key, embedding_cache)
+
+        search_time = time.time()
+        result = menu_index.nearest(embedding)
+        logging.debug("menu index search time %s:", {time.time() - search_time})
+
+        return result, True
+
+    return_queue = queue.Queue()
 
-        return_queue.put(vector_embedding)
-        logging.debug("openai_embedding time %s:", {time.time() - openai_embedding_time})
+    def get_embedding_thread_target() -> None:
+        return_queue.put(get_embedding(order, api_key, embedding_cache))
 
-    get_embedding_thread = threading.Thread(target=get_embedding)
+    get_embedding_thread = threading.Thread(target=get_embedding_thread_target)
     get_embedding_thread.start()
 
     connection_time = time.time()
@@ -74,56 +90,285 @@ def get_item(
         db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
     logging.debug("db connection time %s:", time.time() - connection_time)
 
-    set_session_time = time.time()
-    db_connection.set_session(autocommit=True)
-    logging.debug("start new db session time %s:", {time.time() - set_session_time})
+    try:
+        # connections from a PostgresConnectionPool are already in autocommit with the vector type registered
+        pg_register_vector_thread = None
+        if not isinstance(connection_pool, PostgresConnectionPool):
+            set_session_time = time.time()
+            db_connection.set_session(autocommit=True)
+            logging.debug("start new db session time %s:", {time.time() - set_session_time})
+
+            def pg_register_vector() -> None:
+                register_vector_time = time.time()
+                register_vector(db_connection)
+                logging.debug("register_vector time %s:", {time.time() - register_vector_time})
+
+            pg_register_vector_thread = threading.Thread(target=pg_register_vector)
+            pg_register_vector_thread.start()
 
-    def pg_register_vector() -> None:
-        register_vector_time = time.time()
-        register_vector(db_connection)
-        logging.debug("register_vector time %s:", {time.time() - register_vector_time})
+        cursor_time = time.time()
+        cur = db_connection.cursor()
+        logging.debug("connecting cursor time %s:", {time.time() - cursor_time})
 
-    pg_register_vector_thread = threading.Thread(target=pg_register_vector)
-    pg_register_vector_thread.start()
+        get_embedding_thread.join()
+        if pg_register_vector_thread:
+            pg_register_vector_thread.join()
 
-    cursor_time = time.time()
-    cur = db_connection.cursor()
-    logging.debug("connecting cursor time %s:", {time.time() - cursor_time})
+        try:
+            embedding = return_queue.get(timeout=5)
+        except queue.Empty:
+            logging.debug("queue empty")
+            return ("Error, return_queue.get turned into a deadlock."
+                    " Check the `get_embedding` function"), False
 
-    get_embedding_thread.join()
-    pg_register_vector_thread.join()
+        execute_time = time.time()
+        # searches the compact embeddings column when EMBEDDING_DIMENSIONS or EMBEDDING_PRECISION is set
+        storage = compact_embeddings()
+        if storage:
+            result = storage.nearest(cur, "products", PRODUCT_COLUMNS, embedding)
+        else:
+            result = execute_prepared(cur, "nearest_product", (vector_param(embedding),))
+        logging.debug("execute query time %s:", {time.time() - execute_time})
+
+        close_time = time.time()
+        cur.close()
+        logging.debug("close cursor time %s:", {time.time() - close_time})
+    finally:
+        close_connection_time = time.time()
+        if connection_pool:
+            connection_pool.putconn(db_connection)
+        else:
+            db_connection.close()
+        logging.debug("close db connection time %s:", {time.time() - close_connection_time})
+
+    return result, True
+
+
+async def async_get_item(
+        order: str, api_key: str = None, connection_pool: asyncpg.Pool = None,
+        embedding_cache: redis.asyncio.Redis = None, database_csv_file: StringIO = None,
+        menu_index: MenuIndex = None
+) -> str and bool:
+    """
+    This API is the awaitable version of `get_item`, the embedding is fetched while a connection is
+    checked out instead of on a separate thread.
+    @param order: customers order ex. "Can I have a black coffee with 3 shots of cream."
+    @param api_key: OpenAI auth
+    @param connection_pool: asyncpg pool from `create_async_connection_pool`
+    @param embedding_cache: async redis client to reduce number of calls to OpenAI API
+    @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param menu_index: in memory copy of the products table, skips the database when passed in
+    @rtype: str + bool
+    @return: Closest embedding along with a boolean flag to mark successful retrieval
+    """
+    if not order:
+        return None, False
+
+    if menu_index:
+        result = menu_index.lookup(order)
+        if result:
+            logging.debug("alias hit")
+            return result, True
+
+        embedding = await async_get_embedding(order, api_key, embedding_cache)
+
+        return menu_index.nearest(embedding), True
+
+    get_embedding_task = asyncio.create_task(async_get_embedding(order, api_key, embedding_cache))
+
+    connection_time = time.time()
+    try:
+        if connection_pool:
+            db_connection = await connection_pool.acquire()
+        else:
+            db_connection = await asyncpg.connect(**connect_kwargs(connection_string(database_csv_file)))
+            await configure_connection(db_connection)
+    except BaseException:
+        get_embedding_task.cancel()
+        raise
+    logging.debug("db connection time %s:", time.time() - connection_time)
 
     try:
-        embedding = return_queue.get(timeout=5)
-    except queue.Empty:
-        logging.debug("queue empty")
-        return ("Error, return_queue.get turned into a deadlock."
-                " Check the `get_embedding` function"), False
-
-    execute_time = time.time()
-    cur.execute(""" SELECT id, item_name, item_quantity, common_allergin, num_calories, price
-                    FROM products
-                    ORDER BY embeddings <-> %s 
-                    LIMIT 1;""",
-                (np.array(embedding),))
-    logging.debug("execute query time %s:", {time.time() - execute_time})
-
-    fetchall_time = time.time()
-    result = cur.fetchall()
-    logging.debug("fetchall time %s:", {time.time() - fetchall_time})
-
-    close_time = time.time()
-    cur.close()
-    logging.debug("close cursor time %s:", {time.time() - close_time})
-
-    close_connection_time = time.time()
+        embedding = await get_embedding_task
+
+        execute_time = time.time()
+        storage = compact_embeddings()
+        if storage:
+            result = await storage.async_nearest(db_connection, "products", PRODUCT_COLUMNS, embedding)
+        else:
+            result = await async_execute_prepared(db_connection, "nearest_product", (vector_param(embedding),))
+        logging.debug("execute query time %s:", {time.time() - execute_time})
+    finally:
+        if connection_pool:
+            await connection_pool.release(db_connection)
+        else:
+            await db_connection.close()
+
+    return result, True
+
+
+def get_items(
+        orders: list[str], api_key: str = None, connection_pool=None,
+        embedding_cache: redis.Redis = None, database_csv_file: StringIO = None,
+        menu_index: MenuIndex = None
+) -> dict[str, list[tuple]] and bool:
+    """
+    This API resolves every distinct name in a request with one batched embedding call and one query.
+    @param orders: names extracted from every split order ex. ["latte", "whipped cream", "oat milk"]
+    @param api_key: OpenAI auth
+    @param connection_pool:
+    @param embedding_cache: cache to reduce number of calls to OpenAI API
+    @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param menu_index: in memory copy of the products table, skips the database when passed in
+    @rtype: dict[str, list[tuple]] + bool
+    @return: `get_item` shaped result for every name along with a boolean flag to mark successful retrieval
+    """
+    names = list(dict.fromkeys(order for order in orders if order))
+    if not names:
+        return {}, False
+
+    results = {}
+    if menu_index:
+        for name in names:
+            result = menu_index.lookup(name)
+            if result:
+                results[name] = result
+        names = [name for name in names if name not in results]
+        logging.debug("alias hits %s, semantic searches %s", len(results), len(names))
+        if not names:
+            return results, True
+
+    embeddings = get_embeddings(names, api_key, embedding_cache)
+
+    if menu_index:
+        search_time = time.time()
+        results.update(zip(names, menu_index.nearest_many(embeddings)))
+        logging.debug("menu index batch search time %s:", {time.time() - search_time})
+
+        return results, True
+
     if connection_pool:
-        connection_pool.putconn(db_connection)
+        db_connection = connection_pool.getconn()
     else:
-        db_connection.close()
-    logging.debug("close db connection time %s:", {time.time() - close_connection_time})
+        db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
 
-    return result, True
+    try:
+        if not isinstance(connection_pool, PostgresConnectionPool):
+            db_connection.set_session(autocommit=True)
+            register_vector(db_connection)
+        cur = db_connection.cursor()
+
+        execute_time = time.time()
+        storage = compact_embeddings()
+        if storage:
+            # one query per name on the same connection, the compact query has no batched form
+            result = [(ordinality,) + tuple(row) for ordinality, embedding in enumerate(embeddings, start=1)
+                      for row in storage.nearest(cur, "products", PRODUCT_COLUMNS, embedding)]
+        else:
+            result = execute_prepared(cur, "nearest_product_batch", (vector_array_param(embeddings),))
+        logging.debug("execute batch query time %s:", {time.time() - execute_time})
+
+        cur.close()
+    finally:
+        if connection_pool:
+            connection_pool.putconn(db_connection)
+        else:
+            db_connection.close()
+
+    return {names[row[0] - 1]: [tuple(row[1:])] for row in result}, True
+
+
+def get_embeddings(
+        orders: list[str], api_key: str = None, embedding_cache: redis.Redis = None
+) -> list[list[float] | np.ndarray]:
+    """
+    This function returns the embedding of every order, only sending the cache misses to the provider.
+    @param orders: customers orders ex. ["black coffee", "glazed donut"]
+    @param api_key: OpenAI auth
+    @param embedding_cache: cache to reduce number of calls to OpenAI API, skipped for local providers
+    @rtype: list[list[float] | np.ndarray]
+    @return: vector representation of every order, in the same order
+    """
+    embedding_time = time.time()
+    provider = embedding_provider(api_key=api_key if api_key else None)
+    embedding_cache, model = provider_cache(embedding_cache, provider)
+    if embedding_cache:
+        vector_embeddings = get_cached_embeddings(embedding_cache, orders, model)
+    else:
+        vector_embeddings = [None] * len(orders)
+
+    missing = [index for index, embedding in enumerate(vector_embeddings) if embedding is None]
+    logging.debug("cache hits %s, cache misses %s", len(orders) - len(missing), len(missing))
+
+    if missing:
+        new_embeddings = provider.embed_batch([orders[index] for index in missing])
+        for index, embedding in zip(missing, new_embeddings):
+            vector_embeddings[index] = embedding
+        if embedding_cache:
+            set_cached_embeddings(embedding_cache, {orders[index]: embedding
+                                                    for index, embedding in zip(missing, new_embeddings)},
+                                  model)
+
+    logging.debug("%s batch time %s:", provider.model, {time.time() - embedding_time})
+
+    return vector_embeddings
+
+
+def get_embedding(
+        order: str, api_key: str = None, embedding_cache: redis.Redis = None
+) -> list[float] | np.ndarray:
+    """
+    This function returns the embedding of the order, from the cache if it has been seen before.
+    @param order: customers order ex. "black coffee"
+    @param api_key: OpenAI auth
+    @param embedding_cache: cache to reduce number of calls to OpenAI API, skipped for local providers
+    @rtype: list[float] | np.ndarray
+    @return: vector representation of the order
+    """
+    embedding_time = time.time()
+    provider = embedding_provider(api_key=api_key if api_key else None)
+    embedding_cache, model = provider_cache(embedding_cache, provider)
+    vector_embedding = get_cached_embedding(embedding_cache, order, model) if embedding_cache else None
+    if vector_embedding is not None:
+        logging.debug("cache hit")
+    else:
+        logging.debug("cache miss")
+        vector_embedding = provider.embed(order)
+        if embedding_cache:
+            set_cached_embedding(embedding_cache, order, vector_embedding, model)
+
+    logging.debug("%s time %s:", provider.model, {time.time() - embedding_time})
+
+    return vector_embedding
+
+
+async def async_get_embedding(
+        order: str, api_key: str = None, embedding_cache: redis.asyncio.Redis = None
+) -> list[float] | np.ndarray:
+    """
+    This function is the awaitable version of `get_embedding`.
+    @param order: customers order ex. "black coffee"
+    @param api_key: OpenAI auth
+    @param embedding_cache: async redis client to reduce number of calls to OpenAI API, skipped for local providers
+    @rtype: list[float] | np.ndarray
+    @return: vector representation of the order
+    """
+    embedding_time = time.time()
+    provider = embedding_provider(api_key=api_key if api_key else None)
+    embedding_cache, model = provider_cache(embedding_cache, provider)
+    vector_embedding = await async_get_cached_embedding(embedding_cache, order, model) \
+        if embedding_cache else None
+    if vector_embedding is not None:
+        logging.debug("cache hit")
+    else:
+        logging.debug("cache miss")
+        vector_embedding = await provider.aembed(order)
+        if embedding_cache:
+            await async_set_cached_embedding(embedding_cache, order, vector_embedding, model)
+
+    logging.debug("%s time %s:", provider.model, {time.time() - embedding_time})
+
+    return vector_embedding
 
 
 def main(
@@ -138,7 +383,7 @@ def main(
     with open(key_path, encoding='utf-8') as api_key:
         key = api_key.readline().strip()
 
-    connection_pool = psycopg2.pool.SimpleConnectionPool(1, 10, connection_string())
+    connection_pool = PostgresConnectionPool(1, 10, connection_string())
 
     get_secret()
 
@@ -158,15 +403,3 @@ def main(
 
 if __name__ == "__main__":  # pragma: no cover
     main()
-
-# pylint: disable=W0105
-'''
-If ever change to hnsw index, use this code:
-    cur.execute(f"""
-                    SELECT id, item_name, item_quantity, common_allergin, num_calories, price
-                    FROM products
-                    WHERE 1 - (embeddings <=> %s) > {0.8}
-                    ORDER BY embeddings ASC
-                    LIMIT 1;""",
-                (np.array(embedding),))
-'''
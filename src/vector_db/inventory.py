@@ -0,0 +1,369 @@
+"""
+This module contains the Inventory class which mirrors `products.item_quantity` into redis so stock
+checks and reservations are a single round trip instead of an embedding and a vector query. Every
+operation which reads and writes stock is a Lua script, so concurrent lanes can never reserve the same
+unit twice:
+    - inventory:stock        hash, product id -> units available to reserve
+    - inventory:names        hash, normalized item name -> product id
+    - inventory:pending      hash, product id -> units sold which aren't written back to postgres yet
+    - inventory:expiry       sorted set, reservation id scored by the time it expires
+    - inventory:reservation:<id> hash, product id -> units held by the reservation
+Reservations which are neither committed nor released before they expire are put back in stock, and
+committed units are subtracted from `products.item_quantity` by the write back worker.
+"""
+import time
+import logging
+import threading
+from os import getenv as env
+from typing import Final
+import redis
+import psycopg2.extras
+from dotenv import load_dotenv
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.menu_aliases import normalize_name
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+load_dotenv()
+
+STOCK_KEY: Final = "inventory:stock"
+NAMES_KEY: Final = "inventory:names"
+PENDING_KEY: Final = "inventory:pending"
+EXPIRY_KEY: Final = "inventory:expiry"
+RESERVATION_PREFIX: Final = "inventory:reservation:"
+
+# KEYS: stock, pending, expiry, names. ARGV: reservation prefix, force, then id, name, quantity per product
+LOAD_SCRIPT: Final = """
+if ARGV[2] == '0' and redis.call('EXISTS', KEYS[1]) == 1 then
+    local added = 0
+    for i = 3, #ARGV, 3 do
+        redis.call('HSET', KEYS[4], ARGV[i + 1], ARGV[i])
+        added = added + redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 2])
+    end
+    return added
+end
+local reserved = {}
+for _, reservation in ipairs(redis.call('ZRANGE', KEYS[3], 0, -1)) do
+    local held = redis.call('HGETALL', ARGV[1] .. reservation)
+    for i = 1, #held, 2 do
+        reserved[held[i]] = (reserved[held[i]] or 0) + tonumber(held[i + 1])
+    end
+end
+redis.call('DEL', KEYS[1], KEYS[4])
+for i = 3, #ARGV, 3 do
+    local pending = tonumber(redis.call('HGET', KEYS[2], ARGV[i]) or '0')
+    redis.call('HSET', KEYS[1], ARGV[i], tonumber(ARGV[i + 2]) - pending - (reserved[ARGV[i]] or 0))
+    redis.call('HSET', KEYS[4], ARGV[i + 1], ARGV[i])
+end
+return (#ARGV - 2) / 3
+"""
+
+# KEYS: names, stock. ARGV: normalized name. Returns {product id, available} or nil for an unknown name
+CHECK_SCRIPT: Final = """
+local product = redis.call('HGET', KEYS[1], ARGV[1])
+if not product then
+    return nil
+end
+return {product, redis.call('HGET', KEYS[2], product)}
+"""
+
+# KEYS: stock, expiry, reservation. ARGV: reservation id, ttl seconds, then id, quantity per product.
+# Returns {1} when every product is reserved, {0, product id} for the first product short of stock
+# and {-1} if the reservation already exists
+RESERVE_SCRIPT: Final = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return {-1}
+end
+local wanted = {}
+for i = 3, #ARGV, 2 do
+    wanted[ARGV[i]] = (wanted[ARGV[i]] or 0) + tonumber(ARGV[i + 1])
+end
+for product, quantity in pairs(wanted) do
+    local available = tonumber(redis.call('HGET', KEYS[1], product))
+    if not available or available < quantity then
+        return {0, product}
+    end
+end
+for product, quantity in pairs(wanted) do
+    redis.call('HINCRBY', KEYS[1], product, -quantity)
+    redis.call('HSET', KEYS[3], product, quantity)
+end
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[2], tonumber(now[1]) + tonumber(ARGV[2]), ARGV[1])
+return {1}
+"""
+
+# KEYS: stock or pending, expiry, reservation. ARGV: reservation id. Moves the held units back to stock
+# (release) or to the units waiting to be written back (commit), returns the number of units moved
+SETTLE_SCRIPT: Final = """
+local held = redis.call('HGETALL', KEYS[3])
+local units = 0
+for i = 1, #held, 2 do
+    redis.call('HINCRBY', KEYS[1], held[i], held[i + 1])
+    units = units + tonumber(held[i + 1])
+end
+redis.call('DEL', KEYS[3])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return units
+"""
+
+# KEYS: stock, expiry. ARGV: reservation prefix, most reservations to release. Returns the released ids
+RELEASE_EXPIRED_SCRIPT: Final = """
+local now = redis.call('TIME')
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, reservation in ipairs(expired) do
+    local held = redis.call('HGETALL', ARGV[1] .. reservation)
+    for i = 1, #held, 2 do
+        redis.call('HINCRBY', KEYS[1], held[i], held[i + 1])
+    end
+    redis.call('DEL', ARGV[1] .. reservation)
+    redis.call('ZREM', KEYS[2], reservation)
+end
+return expired
+"""
+
+# KEYS: pending. Returns and clears the units sold since the last write back
+DRAIN_SCRIPT: Final = """
+local pending = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return pending
+"""
+
+
+class Inventory:
+    """
+    This class keeps the stock of every product in redis and writes sold units back to postgres in
+    the background.
+    """
+
+    def __init__(
+            self, redis_client: redis.Redis, connection_pool, reservation_ttl: int = None,
+            write_back_interval: float = None
+    ) -> None:
+        self.__redis = redis_client
+        self.__connection_pool = connection_pool
+        self.reservation_ttl = reservation_ttl if reservation_ttl is not None \
+            else int(env('INVENTORY_RESERVATION_TTL', '900'))
+        self.write_back_interval = write_back_interval if write_back_interval is not None \
+            else float(env('INVENTORY_WRITE_BACK_INTERVAL', '5'))
+        self.__load = redis_client.register_script(LOAD_SCRIPT)
+        self.__check = redis_client.register_script(CHECK_SCRIPT)
+        self.__reserve = redis_client.register_script(RESERVE_SCRIPT)
+        self.__settle = redis_client.register_script(SETTLE_SCRIPT)
+        self.__release_expired = redis_client.register_script(RELEASE_EXPIRED_SCRIPT)
+        self.__drain = redis_client.register_script(DRAIN_SCRIPT)
+        self.__stop = threading.Event()
+
+    def load(
+            self, force: bool = False
+    ) -> int:
+        """
+        This method mirrors the products table into redis. Existing counters are only overwritten when
+        `force` is set, so processes starting up don't undo each other's reservations, and units which
+        are reserved or waiting to be written back are subtracted when they are.
+        @param force: overwrite the counters, ex. after the products table is refilled
+        @rtype: int
+        @return: number of counters created
+        """
+        db_connection = self.__connection_pool.getconn()
+        try:
+            cur = db_connection.cursor()
+            cur.execute("SELECT id, item_name, item_quantity FROM products;")
+            rows = cur.fetchall()
+            cur.close()
+        finally:
+            self.__connection_pool.putconn(db_connection)
+
+        args = [RESERVATION_PREFIX, int(force)]
+        for product_id, item_name, item_quantity in rows:
+            args += [product_id, normalize_name(item_name), item_quantity if item_quantity else 0]
+
+        loaded = int(self.__load(keys=[STOCK_KEY, PENDING_KEY, EXPIRY_KEY, NAMES_KEY], args=args))
+        logging.info("inventory mirrored %s products", loaded)
+
+        return loaded
+
+    def available(
+            self, product_id: int
+    ) -> int | None:
+        """
+        This method returns the units of a product which can still be reserved.
+        @param product_id: id in the products table
+        @rtype: int | None
+        @return: units in stock, None if the product isn't mirrored
+        """
+        available = self.__redis.hget(STOCK_KEY, product_id)
+
+        return int(available) if available is not None else None
+
+    def check(
+            self, item_name: str
+    ) -> tuple[int, int] | None:
+        """
+        This method resolves a menu item name and returns its stock with one round trip.
+        @param item_name: ex. "Glazed Donuts"
+        @rtype: tuple[int, int] | None
+        @return: (product id, units in stock), None if the name isn't on the menu
+        """
+        result = self.__check(keys=[NAMES_KEY, STOCK_KEY], args=[normalize_name(item_name)])
+        if not result or result[1] is None:
+            return None
+
+        return int(result[0]), int(result[1])
+
+    def reserve(
+            self, reservation_id: str, items: dict[int, int]
+    ) -> tuple[bool, int | None]:
+        """
+        This method holds every item of an order or none of them.
+        @param reservation_id: ex. the conversation id of the order
+        @param items: units keyed by product id ex. {7: 2, 12: 1}
+        @rtype: tuple[bool, int | None]
+        @return: (True, None) once reserved, (False, product id) for the first product short of stock
+        """
+        if not items:
+            return True, None
+
+        args = [reservation_id, self.reservation_ttl]
+        for product_id, quantity in items.items():
+            args += [product_id, int(quantity)]
+
+        result = self.__reserve(keys=[STOCK_KEY, EXPIRY_KEY, RESERVATION_PREFIX + reservation_id], args=args)
+        if int(result[0]) == -1:
+            raise ValueError(f"reservation {reservation_id} already exists")
+
+        return int(result[0]) == 1, int(result[1]) if len(result) > 1 else None
+
+    def commit(
+            self, reservation_id: str
+    ) -> int:
+        """
+        This method marks the reserved units as sold, they are written back to postgres by the worker.
+        @param reservation_id: id passed to `reserve`
+        @rtype: int
+        @return: units sold, 0 if the reservation expired or doesn't exist
+        """
+        return int(self.__settle(keys=[PENDING_KEY, EXPIRY_KEY, RESERVATION_PREFIX + reservation_id],
+                                 args=[reservation_id]))
+
+    def release(
+            self, reservation_id: str
+    ) -> int:
+        """
+        This method puts the reserved units back in stock, ex. when the customer cancels.
+        @param reservation_id: id passed to `reserve`
+        @rtype: int
+        @return: units put back, 0 if the reservation expired or doesn't exist
+        """
+        return int(self.__settle(keys=[STOCK_KEY, EXPIRY_KEY, RESERVATION_PREFIX + reservation_id],
+                                 args=[reservation_id]))
+
+    def release_expired(
+            self, limit: int = 100
+    ) -> list[str]:
+        """
+        This method puts the units of expired reservations back in stock.
+        @param limit: most reservations released per call
+        @rtype: list[str]
+        @return: ids of the released reservations
+        """
+        expired = self.__release_expired(keys=[STOCK_KEY, EXPIRY_KEY], args=[RESERVATION_PREFIX, limit])
+        if expired:
+            logging.debug("released %s expired reservations", len(expired))
+
+        return [reservation.decode() if isinstance(reservation, bytes) else reservation for reservation in expired]
+
+    def write_back(
+            self
+    ) -> int:
+        """
+        This method subtracts the units sold since the last write back from `products.item_quantity`
+        in one statement. If the update fails the units are kept to be written back next time.
+        @rtype: int
+        @return: number of products updated
+        """
+        pending = self.__drain(keys=[PENDING_KEY])
+        sold = [(int(pending[i]), int(pending[i + 1])) for i in range(0, len(pending), 2)]
+        if not sold:
+            return 0
+
+        try:
+            db_connection = self.__connection_pool.getconn()
+            try:
+                cur = db_connection.cursor()
+                psycopg2.extras.execute_values(
+                    cur,
+                    "UPDATE products SET item_quantity = products.item_quantity - sold.quantity "
+                    "FROM (VALUES %s) AS sold (id, quantity) WHERE products.id = sold.id;",
+                    sold)
+                cur.close()
+            finally:
+                self.__connection_pool.putconn(db_connection)
+        except Exception:
+            pipeline = self.__redis.pipeline()
+            for product_id, quantity in sold:
+                pipeline.hincrby(PENDING_KEY, product_id, quantity)
+            pipeline.execute()
+            raise
+
+        logging.debug("wrote back sold units of %s products", len(sold))
+
+        return len(sold)
+
+    def run(
+            self
+    ) -> None:
+        """
+        This method mirrors the products table and then releases expired reservations and writes sold
+        units back every `write_back_interval` seconds until `stop` is called. Run it in a daemon thread.
+        @rtype: None
+        @return: Nothing
+        """
+        while not self.__stop.is_set():
+            try:
+                self.load()
+                break
+            except Exception as e:
+                logging.error(f"Failed to mirror inventory {e}. Retrying...")
+                self.__stop.wait(self.write_back_interval)
+
+        while not self.__stop.wait(self.write_back_interval):
+            sync_time = time.time()
+            try:
+                self.release_expired()
+                self.write_back()
+            except Exception as e:
+                logging.error(f"Failed to sync inventory {e}.")
+            logging.debug("inventory sync time %s:", time.time() - sync_time)
+
+    def stop(
+            self
+    ) -> None:
+        """
+        This method stops `run` after its current iteration.
+        @rtype: None
+        @return: Nothing
+        """
+        self.__stop.set()
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    Run after the products table is refilled, the product ids change.
+    @rtype: int
+    @return: 0 if successful
+    """
+    # imported here, the connection manager imports this module
+    from src.external_connections.connection_manager import ConnectionManager  # pylint: disable=C0415
+
+    inventory = ConnectionManager.connect().inventory()
+    print(f"mirrored {inventory.load(force=True)} products")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
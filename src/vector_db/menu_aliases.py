@@ -0,0 +1,145 @@
+"""
+This module contains the MenuAliases class which maps names extracted from an order straight to a row
+of the products table when they match a menu item exactly or after simple normalization, ex.
+    "Glazed Doughnuts" -> "glazed donut"
+Only names which miss the alias table need an embedding and a semantic search.
+"""
+import re
+import threading
+from typing import Final
+from other.vocabulary import item_vocabulary
+from src.ai_integration.embeddings_api import parse_menu_csv
+
+ARTICLES: Final = frozenset({"a", "an", "the"})
+
+SPELLINGS: Final = {
+    "doughnut": "donut",
+}
+
+# pattern alternatives that name a menu item differently
+SYNONYMS: Final = {
+    "coffee": "black coffee",
+    "hot cocoa": "hot chocolate",
+    "boston cream": "boston cream donut",
+    "jasmine tea": "jasmine",
+    "sugar packet": "sugar",
+}
+
+
+def singular(
+        word: str
+) -> str:
+    """
+    This function returns the singular form of a word for the regular plurals used on the menu
+    @param word: ex. "smoothies"
+    @rtype: str
+    @return: ex. "smoothie"
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-1]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+
+    return word
+
+
+def normalize_name(
+        name: str
+) -> str:
+    """
+    This function returns the key used to compare names, ignoring case, plurals, articles, spacing and
+    alternative spellings
+    @param name: ex. "Egg and Cheese on a Croissant"
+    @rtype: str
+    @return: ex. "eggandcheeseoncroissant"
+    """
+    words = re.sub(r'[^a-z0-9]+', ' ', name.casefold()).split()
+    words = [SPELLINGS.get(singular(word), singular(word)) for word in words if word not in ARTICLES]
+
+    return ''.join(words)
+
+
+class MenuAliases:
+    """
+    This class holds the precomputed alias table and counts how often a name resolves without
+    an embedding. A table rebuilt from a reloaded menu shares the counters of the one it replaces.
+    """
+
+    def __init__(
+            self, menu: list[dict] = None, vocabulary: list[str] = None, previous: 'MenuAliases' = None
+    ) -> None:
+        if menu is None:
+            menu = parse_menu_csv()
+        if vocabulary is None:
+            vocabulary = [name for names in item_vocabulary().values() for name in names]
+
+        # [hits, misses] and their lock, shared with the previous table so no lookup is lost to a reload
+        self.__lock = previous.__lock if previous else threading.Lock()
+        self.__counts = previous.__counts if previous else [0, 0]
+
+        menu_keys = {normalize_name(item["MenuItem"]["item_name"]) for item in menu}
+        self.__aliases: dict[str, str] = {key: key for key in menu_keys}
+        for alias, name in SYNONYMS.items():
+            if normalize_name(name) in menu_keys:
+                self.__aliases[normalize_name(alias)] = normalize_name(name)
+
+        # exact spellings the regex patterns extract, so the common case skips normalization
+        self.__exact: dict[str, str] = {}
+        self.__unresolved: list[str] = []
+        for name in vocabulary:
+            key = self.__aliases.get(normalize_name(name))
+            if key:
+                self.__exact[name] = key
+            else:
+                self.__unresolved.append(name)
+        for item in menu:
+            self.__exact[item["MenuItem"]["item_name"].lower()] = normalize_name(item["MenuItem"]["item_name"])
+
+    def resolve(
+            self, name: str
+    ) -> str | None:
+        """
+        This method returns the normalized menu name the extracted name refers to.
+        @param name: name extracted from the order ex. "glazed doughnuts"
+        @rtype: str | None
+        @return: key of the menu item ex. "glazeddonut", None if semantic search is needed
+        """
+        if not name:
+            return None
+
+        key = self.__exact.get(name)
+        if key is None:
+            key = self.__aliases.get(normalize_name(name))
+
+        with self.__lock:
+            self.__counts[0 if key else 1] += 1
+
+        return key
+
+    def unresolved(
+            self
+    ) -> list[str]:
+        """
+        This method returns the pattern alternatives which don't match any menu item.
+        @rtype: list[str]
+        @return: names that will always go to semantic search
+        """
+        return list(self.__unresolved)
+
+    def stats(
+            self
+    ) -> dict:
+        """
+        This method returns how often the alias table made an embedding unnecessary.
+        @rtype: dict
+        @return: ex. {"hits": 90, "misses": 10, "hit_rate": 0.9, "aliases": 72}
+        """
+        with self.__lock:
+            hits, misses = self.__counts
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "aliases": len(self.__aliases) + len(self.__exact)
+        }
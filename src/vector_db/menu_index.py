@@ -0,0 +1,225 @@
+"""
+This module contains the MenuIndex class which keeps the products table and its embeddings in
+memory so that nearest neighbour lookups can be answered in process instead of with a database
+round trip. The menu only has a few dozen rows, so a brute force search over a contiguous float32
+matrix is faster than sending `ORDER BY embeddings <-> %s LIMIT 1` to PostgreSQL.
+"""
+import time
+import logging
+import threading
+from io import StringIO
+import psycopg2
+import numpy as np
+from pgvector.psycopg2 import register_vector
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.aws_database_auth import connection_string
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
+from src.vector_db.menu_aliases import MenuAliases, normalize_name
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+class MenuIndex:
+    """
+    This class loads the rows of the products table once and answers nearest neighbour lookups
+    with vectorized L2 distance math. The table is fingerprinted every `refresh_interval` seconds
+    and reloaded if it changed. Names that match a menu item after normalization are resolved
+    through the alias table without an embedding, it is rebuilt from the rows of every reload and
+    keeps counting its hits and misses.
+    The full precision embeddings are searched even when the database searches a compact column,
+    the few dozen rows fit in memory and an exact search can only agree with it more.
+    """
+
+    def __init__(
+            self, connection_pool=None, refresh_interval: float = 30.0,
+            database_csv_file: StringIO = None, aliases: MenuAliases = None
+    ) -> None:
+        self.__connection_pool = connection_pool
+        self.__fixed_aliases = aliases
+        # (aliases, rows by normalized name) is swapped as one tuple like the snapshot
+        self.__names: tuple[MenuAliases | None, dict[str, tuple]] = (aliases, {})
+        self.__database_csv_file = database_csv_file
+        self.__refresh_interval = refresh_interval
+        self.__lock = threading.Lock()
+        # (rows, matrix, squared norms) is swapped as one tuple so readers never see a half reload
+        self.__snapshot: tuple[list[tuple], np.ndarray, np.ndarray] | None = None
+        self.__fingerprint: tuple | None = None
+        self.__last_checked: float = 0.0
+
+    def lookup(
+            self, name: str
+    ) -> list[tuple] | None:
+        """
+        This method resolves a name to its product row through the alias table in O(1).
+        @param name: name extracted from the order ex. "glazed doughnuts"
+        @rtype: list[tuple] | None
+        @return: same shape as `get_item`, None if the name needs a semantic search
+        """
+        self.__current_snapshot()
+        aliases, rows_by_name = self.__names
+
+        key = aliases.resolve(name) if aliases else None
+        row = rows_by_name.get(key) if key else None
+
+        return [row] if row else None
+
+    def alias_stats(
+            self
+    ) -> dict:
+        """
+        This method returns the hit and miss counters of the alias table since the index was created.
+        @rtype: dict
+        @return: ex. {"hits": 90, "misses": 10, "hit_rate": 0.9, "aliases": 72}
+        """
+        aliases, _ = self.__names
+        if aliases is None:
+            return {"hits": 0, "misses": 0, "hit_rate": 0.0, "aliases": 0}
+
+        return aliases.stats()
+
+    def nearest(
+            self, embedding: list[float] | np.ndarray
+    ) -> list[tuple]:
+        """
+        This method returns the product closest to the embedding.
+        @param embedding: vector representation of the customers order
+        @rtype: list[tuple]
+        @return: same shape as `get_item` ex. [(id, item_name, item_quantity, common_allergin,
+         num_calories, price)]
+        """
+        return self.nearest_many([embedding])[0]
+
+    def nearest_many(
+            self, embeddings: list[list[float]] | np.ndarray
+    ) -> list[list[tuple]]:
+        """
+        This method returns the closest product for every embedding with one matrix multiply.
+        @param embeddings: vector representations of the customers orders
+        @rtype: list[list[tuple]]
+        @return: one `get_item` shaped result per embedding, in the same order
+        """
+        rows, matrix, norms = self.__current_snapshot()
+        if not rows:
+            return [[] for _ in embeddings]
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        # ||m - q||^2 = ||m||^2 - 2 m.q + ||q||^2, the last term doesn't change the argmin
+        distances = norms[:, None] - 2.0 * (matrix @ queries.T)
+        closest = np.argmin(distances, axis=0)
+
+        return [[rows[index]] for index in closest]
+
+    def rows(
+            self
+    ) -> list[tuple]:
+        """
+        This method returns every product row currently held by the index.
+        @rtype: list[tuple]
+        @return: rows of the products table without the embeddings
+        """
+        rows, _, _ = self.__current_snapshot()
+        return rows
+
+    def invalidate(
+            self
+    ) -> None:
+        """
+        This method forces the next lookup to reload the products table.
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__lock:
+            self.__fingerprint = None
+            self.__last_checked = 0.0
+
+    def reload(
+            self
+    ) -> None:
+        """
+        This method loads the products table into memory.
+        @rtype: None
+        @return: Nothing
+        """
+        with self.__lock:
+            self.__reload()
+
+    def __current_snapshot(
+            self
+    ) -> tuple[list[tuple], np.ndarray, np.ndarray]:
+        if (self.__snapshot is not None and
+                time.time() - self.__last_checked < self.__refresh_interval):
+            return self.__snapshot
+
+        with self.__lock:
+            if (self.__snapshot is None or
+                    time.time() - self.__last_checked >= self.__refresh_interval):
+                self.__refresh()
+
+            return self.__snapshot
+
+    def __refresh(
+            self
+    ) -> None:
+        # the embeddings are hashed too, re-embedding with another provider rewrites them in place
+        fingerprint = self.__query(""" SELECT count(*), md5(string_agg(
+                                           concat_ws(':', id, item_name, item_quantity,
+                                                     common_allergin, num_calories, price,
+                                                     md5(embeddings::text)),
+                                           ',' ORDER BY id))
+                                       FROM products;""")[0]
+        self.__last_checked = time.time()
+
+        if self.__snapshot is None or fingerprint != self.__fingerprint:
+            logging.debug("products table changed, reloading menu index")
+            self.__reload()
+            self.__fingerprint = fingerprint
+
+    def __reload(
+            self
+    ) -> None:
+        load_time = time.time()
+        result = self.__query(""" SELECT id, item_name, item_quantity, common_allergin, num_calories, price,
+                                         embeddings
+                                  FROM products
+                                  ORDER BY id;""")
+
+        rows = [tuple(row[:6]) for row in result]
+        if result:
+            matrix = np.ascontiguousarray(np.vstack([row[6] for row in result]), dtype=np.float32)
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        norms = np.einsum('ij,ij->i', matrix, matrix)
+
+        aliases = self.__fixed_aliases
+        if aliases is None:
+            aliases = MenuAliases(menu=[{"MenuItem": {"item_name": row[1]}} for row in rows if row[1]],
+                                  previous=self.__names[0])
+        self.__names = (aliases, {normalize_name(row[1]): row for row in reversed(rows) if row[1]})
+        self.__snapshot = (rows, matrix, norms)
+        self.__last_checked = time.time()
+        logging.debug("menu index load time %s:", time.time() - load_time)
+
+    def __query(
+            self, sql: str
+    ) -> list[tuple]:
+        if self.__connection_pool:
+            db_connection = self.__connection_pool.getconn()
+        else:
+            db_connection = psycopg2.connect(connection_string(self.__database_csv_file))
+
+        try:
+            if not isinstance(self.__connection_pool, PostgresConnectionPool):
+                db_connection.set_session(autocommit=True)
+                register_vector(db_connection)
+            cur = db_connection.cursor()
+            cur.execute(sql)
+            result = cur.fetchall()
+            cur.close()
+        finally:
+            if self.__connection_pool:
+                self.__connection_pool.putconn(db_connection)
+            else:
+                db_connection.close()
+
+        return result
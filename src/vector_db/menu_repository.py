@@ -0,0 +1,248 @@
+"""
+This module contains the MenuRepository class, the single entry point the vector_db helpers use to
+reach the products and deals tables. It looks the secrets up once, keeps a pool of preconfigured
+connections, runs the nearest neighbour queries as prepared statements and owns the embedding cache,
+the menu index and the deal map, so no request pays for a new connection or a secrets lookup:
+    repository = MenuRepository.connect()
+    row = repository.nearest_product(repository.embedding("black coffee"))
+"""
+import logging
+import threading
+from io import StringIO
+from typing import Optional, Final
+import psycopg2
+import psycopg2.extensions
+import numpy as np
+from src.django_beanhub.settings import DEBUG
+from src.vector_db.aws_sdk_auth import get_secret
+from src.vector_db.aws_database_auth import connection_string
+from src.ai_integration.embedding_provider import embedding_provider
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
+from src.external_connections.credentials_provider import CredentialsProvider
+from src.vector_db.embedding_cache import EmbeddingCache, get_cached_embedding, set_cached_embedding
+from src.vector_db.prepared_statements import execute_prepared, vector_param
+from src.vector_db.vector_index import VectorIndex, vector_index
+from src.vector_db.menu_index import MenuIndex
+from src.vector_db.deal_map import DealMap
+from src.vector_db.compact_embeddings import CompactEmbeddings, compact_embeddings
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+PRODUCT_COLUMNS: Final = "id, item_name, item_quantity, common_allergin, num_calories, price"
+DEAL_COLUMNS: Final = "deal, item_type, item_name, item_quantity, price"
+
+
+class MenuRepository:
+    """
+    This singleton class owns every resource used to query the menu. The first call to `connect`
+    decides how the repository authenticates, later calls return the same instance.
+    """
+    __lock: threading.Lock = threading.Lock()
+    __instance: Optional['MenuRepository'] = None
+
+    def __init__(
+            self, connection_pool=None, embedding_cache: EmbeddingCache = None,
+            aws_csv_file: StringIO = None, database_csv_file: StringIO = None, index: VectorIndex = None,
+            storage: CompactEmbeddings = None
+    ) -> None:
+        self.__dsn = None
+        if connection_pool is None:
+            credentials = CredentialsProvider.instance()
+            if aws_csv_file:
+                get_secret(aws_csv_file)
+            else:
+                credentials.aws_secret()
+            self.__dsn = connection_string(database_csv_file) if database_csv_file else credentials.connection_string()
+            # no connection is opened up front so scripts can create the vector extension first
+            connection_pool = PostgresConnectionPool(0, 10, self.__dsn, index=index if index else vector_index())
+
+        self.__connection_pool = connection_pool
+        self.__embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+        # loaded lazily on the first lookup
+        self.__menu_index = MenuIndex(self.__connection_pool)
+        self.__deal_map = DealMap(self.__connection_pool)
+        # searches the compact embeddings column when EMBEDDING_DIMENSIONS or EMBEDDING_PRECISION is set
+        self.__storage = storage if storage else compact_embeddings()
+
+    @staticmethod
+    def connect(
+            connection_pool=None, embedding_cache: EmbeddingCache = None,
+            aws_csv_file: StringIO = None, database_csv_file: StringIO = None
+    ) -> 'MenuRepository':
+        """
+        This method is used to get the repository instance, the arguments are only used to create it.
+        @param connection_pool: pool to share, a PostgresConnectionPool is opened when None
+        @param embedding_cache: cache to reduce number of calls to OpenAI API
+        @param aws_csv_file: AWS SDK auth
+        @param database_csv_file: AWS RDS and PostgreSQL auth
+        @rtype: MenuRepository
+        @return: repository shared by every caller in this process
+        """
+        with MenuRepository.__lock:
+            if not MenuRepository.__instance:
+                MenuRepository.__instance = MenuRepository(connection_pool, embedding_cache,
+                                                           aws_csv_file, database_csv_file)
+
+            return MenuRepository.__instance
+
+    def connection_pool(
+            self
+    ) -> PostgresConnectionPool:
+        """
+        This method is used to get the pool of preconfigured connections.
+        @rtype: PostgresConnectionPool
+        @return: postgresql connection pool
+        """
+        return self.__connection_pool
+
+    def embedding_cache(
+            self
+    ) -> EmbeddingCache:
+        """
+        This method is used to get the embedding cache.
+        @rtype: EmbeddingCache
+        @return: embedding cache
+        """
+        return self.__embedding_cache
+
+    def menu_index(
+            self
+    ) -> MenuIndex:
+        """
+        This method is used to get the in memory index of the products table.
+        @rtype: MenuIndex
+        @return: menu index shared by every caller in this process
+        """
+        return self.__menu_index
+
+    def deal_map(
+            self
+    ) -> DealMap:
+        """
+        This method is used to get the precomputed best deal of every product.
+        @rtype: DealMap
+        @return: deal map shared by every caller in this process
+        """
+        return self.__deal_map
+
+    def storage(
+            self
+    ) -> CompactEmbeddings | None:
+        """
+        This method is used to get the compact embeddings storage which is searched instead of the
+        full embeddings.
+        @rtype: CompactEmbeddings | None
+        @return: None if the full embeddings are searched
+        """
+        return self.__storage
+
+    def embedding(
+            self, text: str, api_key: str = None
+    ) -> list[float] | np.ndarray:
+        """
+        This method returns the embedding of the text, from the cache if it has been seen before and the
+        configured provider is remote.
+        @param text: ex. "black coffee"
+        @param api_key: OpenAI auth
+        @rtype: list[float] | np.ndarray
+        @return: vector representation of the text
+        """
+        provider = embedding_provider(api_key=api_key if api_key else None)
+        if not provider.remote:
+            return provider.embed(text)
+
+        embedding = get_cached_embedding(self.__embedding_cache, text, provider.model)
+        if embedding is None:
+            embedding = provider.embed(text)
+            set_cached_embedding(self.__embedding_cache, text, embedding, provider.model)
+
+        return embedding
+
+    def nearest_product(
+            self, embedding: list[float] | np.ndarray
+    ) -> list[tuple]:
+        """
+        This method returns the product closest to the embedding.
+        @param embedding: vector representation of the order
+        @rtype: list[tuple]
+        @return: [(id, item_name, item_quantity, common_allergin, num_calories, price)]
+        """
+        return self.__nearest("nearest_product", (vector_param(embedding),), "products", PRODUCT_COLUMNS, embedding)
+
+    def nearest_products(
+            self, embedding: list[float] | np.ndarray, top_k: int = 3
+    ) -> list[tuple]:
+        """
+        This method returns the `top_k` products closest to the embedding.
+        @param embedding: vector representation of the order
+        @param top_k: number of products
+        @rtype: list[tuple]
+        @return: same rows as `nearest_product`, closest first
+        """
+        return self.__nearest("nearest_products", (vector_param(embedding), top_k), "products", PRODUCT_COLUMNS,
+                              embedding, top_k)
+
+    def nearest_deal(
+            self, embedding: list[float] | np.ndarray
+    ) -> list[tuple]:
+        """
+        This method returns the deal closest to the embedding.
+        @param embedding: vector representation of the product
+        @rtype: list[tuple]
+        @return: [(deal, item_type, item_name, item_quantity, price)]
+        """
+        return self.__nearest("nearest_deal", (vector_param(embedding),), "deals", DEAL_COLUMNS, embedding)
+
+    def invalidate(
+            self
+    ) -> None:
+        """
+        This method makes the menu index and the deal map reload on their next lookup.
+        @rtype: None
+        @return: Nothing
+        """
+        self.__menu_index.invalidate()
+        self.__deal_map.invalidate()
+
+    def direct_connection(
+            self
+    ) -> psycopg2.extensions.connection:
+        """
+        This method opens a connection outside the pool for scripts that create types, extensions or
+        tables and manage their own transactions. The secrets are not looked up again.
+        @rtype: psycopg2.extensions.connection
+        @return: connection in autocommit mode, the caller closes it
+        """
+        dsn = self.__dsn if self.__dsn else CredentialsProvider.instance().connection_string()
+        db_connection = psycopg2.connect(dsn)
+        db_connection.set_session(autocommit=True)
+
+        return db_connection
+
+    def close(
+            self
+    ) -> None:
+        """
+        This method closes every pooled connection.
+        @rtype: None
+        @return: Nothing
+        """
+        self.__connection_pool.closeall()
+
+    def __nearest(
+            self, name: str, params: tuple, table: str, columns: str, embedding: list[float] | np.ndarray,
+            limit: int = 1
+    ) -> list[tuple]:
+        db_connection = self.__connection_pool.getconn()
+        try:
+            cur = db_connection.cursor()
+            if self.__storage:
+                result = self.__storage.nearest(cur, table, columns, embedding, limit)
+            else:
+                result = execute_prepared(cur, name, params)
+            cur.close()
+        finally:
+            self.__connection_pool.putconn(db_connection)
+
+        return result
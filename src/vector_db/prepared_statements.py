@@ -0,0 +1,203 @@
+"""
+This module contains the server side prepared statements for the nearest neighbour queries. Every
+statement is prepared once per connection, the first time it is used on it, and then executed by name
+so PostgreSQL doesn't parse and plan it again on every request. asyncpg connections cache their own
+prepared statements, `async_execute_prepared` only shares the SQL and the timings with them.
+psycopg2 interpolates every parameter into the query text, it has no binary parameters, so the
+vectors of `execute_prepared` are still sent as text literals and parsed by pgvector (about 2ms to
+format 1536 floats). Only the asyncpg path sends them in binary.
+Timings are recorded per statement:
+    statement_timings()["nearest_product"] -> {"calls": 120, "mean_ms": 0.9, "p50_ms": 0.8, "p99_ms": 2.1}
+"""
+import time
+import logging
+import threading
+from weakref import WeakKeyDictionary
+from typing import Final
+import numpy as np
+import psycopg2.errors
+from pgvector.utils import to_db
+from src.django_beanhub.settings import DEBUG
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+STATEMENTS: Final = {
+    "nearest_product": ("(vector)",
+                        """ SELECT id, item_name, item_quantity, common_allergin, num_calories, price
+                            FROM products
+                            ORDER BY embeddings <-> $1
+                            LIMIT 1"""),
+    "nearest_products": ("(vector, int)",
+                         """ SELECT id, item_name, item_quantity, common_allergin, num_calories, price
+                             FROM products
+                             ORDER BY embeddings <-> $1
+                             LIMIT $2"""),
+    "nearest_product_batch": ("(vector[])",
+                              """ SELECT queries.ordinality, closest.id, closest.item_name, closest.item_quantity,
+                                         closest.common_allergin, closest.num_calories, closest.price
+                                  FROM unnest($1::vector[]) WITH ORDINALITY AS queries(embedding, ordinality)
+                                  CROSS JOIN LATERAL (
+                                      SELECT id, item_name, item_quantity, common_allergin, num_calories, price
+                                      FROM products
+                                      ORDER BY embeddings <-> queries.embedding
+                                      LIMIT 1
+                                  ) AS closest
+                                  ORDER BY queries.ordinality"""),
+    "nearest_deal": ("(vector)",
+                     """ SELECT deal, item_type, item_name, item_quantity, price
+                         FROM deals
+                         ORDER BY embeddings <-> $1
+                         LIMIT 1"""),
+}
+
+# keep the most recent timings of every statement for percentiles
+MAX_SAMPLES: Final = 1024
+
+_prepared: WeakKeyDictionary = WeakKeyDictionary()
+_timings: dict[str, list[float]] = {}
+_calls: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def vector_param(
+        embedding: list[float] | np.ndarray
+) -> np.ndarray:
+    """
+    This function returns the embedding in the form pgvector's adapters send, a text literal with
+    psycopg2 and binary with asyncpg.
+    @param embedding: vector representation of the order
+    @rtype: np.ndarray
+    @return: float32 array
+    """
+    return np.asarray(embedding, dtype=np.float32)
+
+
+def vector_array_param(
+        embeddings: list[list[float] | np.ndarray]
+) -> str:
+    """
+    This function returns embeddings as a vector[] literal, psycopg2 would otherwise send a text[].
+    @param embeddings: vector representations of the orders
+    @rtype: str
+    @return: ex. '{"[0.1,0.2]","[0.3,0.4]"}'
+    """
+    return '{' + ','.join(f'"{to_db(vector_param(embedding))}"' for embedding in embeddings) + '}'
+
+
+def execute_prepared(
+        cur, name: str, params: tuple
+) -> list[tuple]:
+    """
+    This function executes a prepared statement, preparing it on the cursor's connection first if needed.
+    @param cur: psycopg2 cursor of a connection in autocommit mode
+    @param name: key of `STATEMENTS` ex. "nearest_product"
+    @param params: parameters of the statement ex. (vector_param(embedding),)
+    @rtype: list[tuple]
+    @return: rows returned by the statement
+    """
+    execute_time = time.perf_counter()
+    _prepare(cur, name)
+
+    placeholders = ', '.join(['%s'] * len(params))
+    try:
+        cur.execute(f"EXECUTE {name} ({placeholders});", params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # the session lost its prepared statements ex. after DISCARD ALL, prepare again
+        _forget(cur.connection)
+        _prepare(cur, name)
+        cur.execute(f"EXECUTE {name} ({placeholders});", params)
+    result = cur.fetchall()
+
+    _record(name, (time.perf_counter() - execute_time) * 1000)
+
+    return result
+
+
+async def async_execute_prepared(
+        connection, name: str, params: tuple
+) -> list[tuple]:
+    """
+    This function runs a statement on an asyncpg connection, which prepares and caches it by itself.
+    @param connection: asyncpg connection with the vector codec registered
+    @param name: key of `STATEMENTS` ex. "nearest_product"
+    @param params: parameters of the statement ex. (vector_param(embedding),)
+    @rtype: list[tuple]
+    @return: rows returned by the statement
+    """
+    execute_time = time.perf_counter()
+    _, sql = STATEMENTS[name]
+    result = [tuple(record) for record in await connection.fetch(sql, *params)]
+
+    _record(name, (time.perf_counter() - execute_time) * 1000)
+
+    return result
+
+
+def statement_timings(
+
+) -> dict[str, dict]:
+    """
+    This function returns the timings of every prepared statement executed by this process.
+    @rtype: dict[str, dict]
+    @return: ex. {"nearest_product": {"calls": 120, "mean_ms": 0.9, "p50_ms": 0.8, "p99_ms": 2.1}}
+    """
+    with _lock:
+        samples = {name: list(timings) for name, timings in _timings.items()}
+        calls = dict(_calls)
+
+    return {
+        name: {
+            "calls": calls[name],
+            "mean_ms": float(np.mean(timings)),
+            "p50_ms": float(np.percentile(timings, 50)),
+            "p99_ms": float(np.percentile(timings, 99))
+        }
+        for name, timings in samples.items()
+    }
+
+
+def reset_statement_timings(
+
+) -> None:
+    """
+    This function clears the recorded timings.
+    @rtype: None
+    @return: Nothing
+    """
+    with _lock:
+        _timings.clear()
+        _calls.clear()
+
+
+def _prepare(
+        cur, name: str
+) -> None:
+    with _lock:
+        prepared = _prepared.setdefault(cur.connection, set())
+        if name in prepared:
+            return
+
+    types, sql = STATEMENTS[name]
+    cur.execute(f"PREPARE {name} {types} AS {sql};")
+
+    with _lock:
+        prepared.add(name)
+
+
+def _forget(
+        db_connection
+) -> None:
+    with _lock:
+        _prepared.pop(db_connection, None)
+
+
+def _record(
+        name: str, elapsed_ms: float
+) -> None:
+    with _lock:
+        timings = _timings.setdefault(name, [])
+        timings.append(elapsed_ms)
+        if len(timings) > MAX_SAMPLES:
+            del timings[:len(timings) - MAX_SAMPLES]
+        _calls[name] = _calls.get(name, 0) + 1
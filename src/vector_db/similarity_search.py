@@ -4,26 +4,26 @@ for the most similar embeddings to a given order. Currently unused.
 """
 from os import path
 from io import StringIO
-import psycopg2
-import numpy as np
-from pgvector.psycopg2 import register_vector
-from src.vector_db.aws_sdk_auth import get_secret
-from src.ai_integration.embeddings_api import openai_embedding_api
-from src.vector_db.aws_database_auth import connection_string
+from src.vector_db.embedding_cache import EmbeddingCache, get_cached_embedding, set_cached_embedding, provider_cache
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.menu_repository import MenuRepository
 from src.ai_integration.fine_tuned_nlp import ner_transformer
 
 
 def similarity_search(
         order: str, top_k: int = 3, key: str = None,
-        aws_csv_file: StringIO = None, database_csv_file: StringIO = None
+        aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        embedding_cache: EmbeddingCache = None, repository: MenuRepository = None
 ) -> list and bool:
     """
     This API is used to search for the most similar embeddings to a given order.
     @param order: customers order ex. "Can I have a black coffee with 3 shots of cream."
     @param top_k: The number of closest embeddings you want
     @param key: OpenAI auth
-    @param aws_csv_file: AWS SDK auth
-    @param database_csv_file: AWS RDS and PostgreSQL auth
+    @param aws_csv_file: AWS SDK auth, only used when the repository is created
+    @param database_csv_file: AWS RDS and PostgreSQL auth, only used when the repository is created
+    @param embedding_cache: cache to reduce number of calls to OpenAI API, defaults to the repository's
+    @param repository: defaults to the process wide MenuRepository
     @rtype: list[list[float]] + boolean
     @return: the list of 3 closest embeddings along with a boolean flag to mark success
     """
@@ -32,24 +32,17 @@ def similarity_search(
 
     formatted_thing = ner_transformer(order)
 
-    get_secret(aws_csv_file if not None else None)
-    db_connection = psycopg2.connect(connection_string(database_csv_file if not None else None))
-    db_connection.set_session(autocommit=True)
+    repository = repository if repository else MenuRepository.connect(aws_csv_file=aws_csv_file,
+                                                                      database_csv_file=database_csv_file)
 
-    cur = db_connection.cursor()
+    embedding_cache, model = provider_cache(embedding_cache, embedding_provider(api_key=key if key else None))
+    embedding = get_cached_embedding(embedding_cache, str(formatted_thing), model) if embedding_cache else None
+    if embedding is None:
+        embedding = repository.embedding(str(formatted_thing), key)
+        if embedding_cache:
+            set_cached_embedding(embedding_cache, str(formatted_thing), embedding, model)
 
-    embedding = openai_embedding_api(str(formatted_thing), key if key else None)
-    register_vector(db_connection)
-
-    cur.execute(f""" SELECT id, item_name, item_quantity, common_allergin, num_calories, price
-                        FROM products
-                        ORDER BY embeddings <-> %s limit {top_k};""",
-                (np.array(embedding),))
-
-    results = cur.fetchall()
-
-    cur.close()
-    db_connection.close()
+    results = repository.nearest_products(embedding, top_k)
 
     return results, True
 
@@ -0,0 +1,241 @@
+"""
+This module contains the function sync_products which brings the products table in line with the menu
+without dropping it. Every row stores two hashes:
+    - embedding_hash   hash of the embedded text and the embedding model, the row is only re-embedded
+                       when it changes
+    - content_hash     hash of the stock, allergin, calorie and price columns, which are updated in place
+                       when it changes
+Items are matched by their lower case name, so a renamed item is a new row and the old one is deleted.
+The hash columns are added in their own transaction the first time, and the embeddings are requested
+before the write transaction opens, so no lock is held across a network call. The changes are applied in
+one transaction and the vector index is maintained by postgres, so lookups never see an empty table and
+a price change never costs an embedding request:
+    python -m src.vector_db.sync_menu
+"""
+import hashlib
+import logging
+from io import StringIO
+from typing import Final
+import psycopg2.extras
+from src.ai_integration.embeddings_api import parse_menu_csv, get_calorie_range
+from src.ai_integration.embedding_provider import embedding_provider
+from src.ai_integration.vocabulary_compiler import VocabularyCompiler
+from src.vector_db.menu_repository import MenuRepository
+from src.vector_db.prepared_statements import vector_param
+from src.vector_db.compact_embeddings import COMPACT_COLUMN
+from src.vector_db.inventory import Inventory
+from src.django_beanhub.settings import DEBUG
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+HASH_COLUMNS: Final = ("embedding_hash", "content_hash")
+
+
+def menu_row(
+        item: dict
+) -> tuple:
+    """
+    This function returns the products columns of a menu item in the form the fill scripts insert them.
+    @param item: ex. {"MenuItem": {"item_name": "Latte", "item_quantity": 5, "common_allergin": "Lactose",
+                                   "num_calories": (120, 180), "price": 5.0}}
+    "itemName" is accepted for "item_name" and the calories can be given as "120-180"
+    @rtype: tuple
+    @return: (item_name, item_quantity, common_allergin, (min_calories, max_calories), price)
+    """
+    menu_item = item["MenuItem"]
+    item_name = menu_item["item_name"] if "item_name" in menu_item else menu_item["itemName"]
+    num_calories = menu_item["num_calories"]
+    if isinstance(num_calories, str):
+        num_calories = get_calorie_range(num_calories)
+
+    return (str(item_name).lower(),
+            int(menu_item["item_quantity"]),
+            str(menu_item["common_allergin"]).lower(),
+            (int(num_calories[0]), int(num_calories[1])),
+            float(menu_item["price"]))
+
+
+def embedding_hash(
+        item_name: str, model: str
+) -> str:
+    """
+    This function hashes the text an item is embedded from, the model is part of the hash so switching
+    the embedding provider re-embeds every row.
+    @param item_name: lower case item name
+    @param model: embedding model
+    @rtype: str
+    @return: hex digest
+    """
+    return hashlib.sha256(f"{model}\n{item_name}".encode("utf-8")).hexdigest()
+
+
+def content_hash(
+        row: tuple
+) -> str:
+    """
+    This function hashes the columns of a menu row which are updated in place.
+    @param row: output of `menu_row`
+    @rtype: str
+    @return: hex digest
+    """
+    _, item_quantity, common_allergin, num_calories, price = row
+
+    return hashlib.sha256(
+        f"{item_quantity}\n{common_allergin}\n{num_calories[0]}\n{num_calories[1]}\n{price!r}".encode("utf-8")
+    ).hexdigest()
+
+
+def sync_products(
+        data: list[dict], key: str = None, repository: MenuRepository = None, delete_missing: bool = True,
+        inventory: Inventory = None, aws_csv_file: StringIO = None, database_csv_file: StringIO = None,
+        vocabulary: VocabularyCompiler = None
+) -> dict[str, int]:
+    """
+    This function inserts, updates and deletes rows of the products table so it matches the menu items.
+    Only new items and items whose embedding hash changed are embedded, in one batch, before the write
+    transaction opens. The stock is only overwritten when the item changed in the menu, so units sold
+    since the last sync are kept.
+    @param data: menu items, ex. the output of parse_menu_csv
+    @param key: key for OpenAI auth
+    @param repository: defaults to the process wide MenuRepository
+    @param delete_missing: delete the rows which aren't in the menu items and the later rows of a duplicated
+    name, off when adding single items so no other row is touched
+    @param inventory: counters to reload from the synced table
+    @param aws_csv_file: AWS SDK auth, only used when the repository is created
+    @param database_csv_file: AWS RDS and PostgreSQL auth, only used when the repository is created
+    @param vocabulary: compiler of the entity vocabularies to reload from the synced table
+    @rtype: dict[str, int]
+    @return: number of rows per change ex. {"inserted": 1, "updated": 2, "embedded": 1, "deleted": 0,
+    "unchanged": 40}
+    """
+    provider = embedding_provider(api_key=key if key else None)
+    repository = repository if repository else MenuRepository.connect(aws_csv_file=aws_csv_file,
+                                                                      database_csv_file=database_csv_file)
+    storage = repository.storage()
+
+    rows = {}
+    for item in data:
+        row = menu_row(item)
+        rows[row[0]] = row
+
+    db_connection = repository.connection_pool().getconn()
+    try:
+        db_connection.autocommit = True
+        cur = db_connection.cursor()
+        cur.execute("SELECT count(*) FROM information_schema.columns WHERE table_name = 'products' "
+                    "AND column_name = ANY(%s);", (list(HASH_COLUMNS),))
+        if cur.fetchone()[0] < len(HASH_COLUMNS):
+            for column in HASH_COLUMNS:
+                cur.execute(f"ALTER TABLE products ADD COLUMN IF NOT EXISTS {column} text;")
+        cur.execute("SELECT id, item_name, embedding_hash, content_hash FROM products ORDER BY id;")
+
+        existing, deleted = {}, []
+        for product_id, item_name, stored_embedding_hash, stored_content_hash in cur.fetchall():
+            if delete_missing and (item_name in existing or item_name not in rows):
+                deleted.append(product_id)
+            elif item_name not in existing:
+                existing[item_name] = (product_id, stored_embedding_hash, stored_content_hash)
+
+        inserted, updated, embedded, unchanged = [], [], [], 0
+        for item_name, row in rows.items():
+            hashes = (embedding_hash(item_name, provider.model), content_hash(row))
+            if item_name not in existing:
+                inserted.append((row, hashes))
+                continue
+            product_id, stored_embedding_hash, stored_content_hash = existing[item_name]
+            if stored_content_hash != hashes[1]:
+                updated.append((product_id,) + row[1:] + (hashes[1],))
+            if stored_embedding_hash != hashes[0]:
+                embedded.append((product_id, item_name, hashes[0]))
+            unchanged += stored_content_hash == hashes[1] and stored_embedding_hash == hashes[0]
+
+        texts = [row[0] for row, _ in inserted] + [item_name for _, item_name, _ in embedded]
+        embeddings = provider.embed_batch(texts) if texts else []
+
+        db_connection.autocommit = False
+        new_embeddings = []
+        if inserted:
+            product_ids = psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO products (item_name, item_quantity, common_allergin, num_calories, price, "
+                "embedding_hash, content_hash, embeddings) VALUES %s RETURNING id;",
+                [row[:3] + row[3] + row[4:] + hashes + (vector_param(embedding),)
+                 for (row, hashes), embedding in zip(inserted, embeddings)],
+                template="(%s, %s, %s, ROW(%s, %s)::calorie_range, %s, %s, %s, %s)", fetch=True)
+            new_embeddings += [(product_id[0], embedding) for product_id, embedding in zip(product_ids, embeddings)]
+
+        if updated:
+            psycopg2.extras.execute_values(
+                cur,
+                "UPDATE products SET item_quantity = menu.item_quantity, common_allergin = menu.common_allergin, "
+                "num_calories = ROW(menu.min_calories, menu.max_calories)::calorie_range, price = menu.price, "
+                "content_hash = menu.content_hash "
+                "FROM (VALUES %s) AS menu (id, item_quantity, common_allergin, min_calories, max_calories, price, "
+                "content_hash) WHERE products.id = menu.id;",
+                [(row[0], row[1], row[2], row[3][0], row[3][1], row[4], row[5]) for row in updated],
+                template="(%s, %s::int, %s, %s::int, %s::int, %s::double precision, %s)")
+
+        if embedded:
+            reembedded = embeddings[len(inserted):]
+            psycopg2.extras.execute_values(
+                cur,
+                "UPDATE products SET embeddings = menu.embeddings, embedding_hash = menu.embedding_hash "
+                "FROM (VALUES %s) AS menu (id, embedding_hash, embeddings) WHERE products.id = menu.id;",
+                [(product_id, hashed, vector_param(embedding))
+                 for (product_id, _, hashed), embedding in zip(embedded, reembedded)],
+                template="(%s, %s, %s::vector)")
+            new_embeddings += [(product_id, embedding) for (product_id, _, _), embedding in zip(embedded, reembedded)]
+
+        if storage and new_embeddings:
+            projection = storage.projection(cur, "products")
+            psycopg2.extras.execute_values(
+                cur,
+                f"UPDATE products SET {COMPACT_COLUMN} = menu.compact::{storage.column_type()} "
+                f"FROM (VALUES %s) AS menu (id, compact) WHERE products.id = menu.id;",
+                [(product_id, storage.encode(embedding, projection)) for product_id, embedding in new_embeddings])
+
+        if deleted:
+            cur.execute("DELETE FROM products WHERE id = ANY(%s);", (deleted,))
+
+        db_connection.commit()
+        cur.close()
+    except Exception:
+        db_connection.rollback()
+        raise
+    finally:
+        repository.connection_pool().putconn(db_connection)
+
+    changes = {"inserted": len(inserted), "updated": len(updated), "embedded": len(embedded),
+               "deleted": len(deleted), "unchanged": unchanged}
+    logging.info("synced products %s", changes)
+
+    if inserted or updated or embedded or deleted:
+        repository.invalidate()
+        if inventory:
+            inventory.load(force=True)
+        if vocabulary and (inserted or deleted):
+            vocabulary.load(repository.connection_pool())
+
+    return changes
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successfully synced table
+    """
+    # imported here, add_item syncs single items without the redis, RabbitMQ and NER wiring of the manager
+    from src.external_connections.connection_manager import ConnectionManager  # pylint: disable=C0415
+
+    connection_manager = ConnectionManager.connect()
+    sync_products(parse_menu_csv(), repository=connection_manager.menu_repository(),
+                  inventory=connection_manager.inventory(), vocabulary=VocabularyCompiler.instance())
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
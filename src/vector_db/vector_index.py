@@ -0,0 +1,134 @@
+"""
+This module contains the index strategies used for the embeddings columns of the products and deals
+tables. Every query orders by L2 distance (`<->`), so both strategies are built with `vector_l2_ops`
+unless another operator class is passed for a compact column.
+The strategy is selected with the VECTOR_INDEX environment variable, ex.
+    VECTOR_INDEX=hnsw VECTOR_INDEX_M=16 VECTOR_INDEX_EF_SEARCH=40
+"""
+from os import getenv as env
+from typing import Final
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# most dimensions ivfflat and hnsw can index on a vector column, search a compact column for larger embeddings
+MAX_INDEX_DIMENSIONS: Final = 2000
+
+
+class VectorIndex:
+    """
+    This class is the interface of an index strategy.
+    """
+    method: str = None
+
+    def create_sql(
+            self, table: str, column: str = "embeddings", name: str = None, opclass: str = "vector_l2_ops"
+    ) -> str:
+        """
+        This method returns the statement which builds the index.
+        @param table: ex. "products"
+        @param column: vector column
+        @param name: index name, defaults to "<table>_<column>_idx"
+        @param opclass: operator class of the column ex. "halfvec_l2_ops" for a halfvec column
+        @rtype: str
+        @return: CREATE INDEX statement
+        """
+        name = name if name else f"{table}_{column}_idx"
+        return (f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                f"USING {self.method} ({column} {opclass}) WITH ({self._build_options()});")
+
+    def session_sql(
+            self
+    ) -> str:
+        """
+        This method returns the statement which sets the query time parameters of the index.
+        @rtype: str
+        @return: ex. "SET hnsw.ef_search = 40;"
+        """
+        return f"SET {self.method}.{self._search_options()};"
+
+    def _build_options(
+            self
+    ) -> str:
+        raise NotImplementedError
+
+    def _search_options(
+            self
+    ) -> str:
+        raise NotImplementedError
+
+    def __repr__(
+            self
+    ) -> str:
+        return f"{self.method}({self._build_options()}, {self._search_options()})"
+
+
+class IvfflatIndex(VectorIndex):
+    """
+    This class builds an ivfflat index, `lists` clusters of which `probes` are searched per query.
+    """
+    method = "ivfflat"
+
+    def __init__(
+            self, lists: int = 8, probes: int = 1
+    ) -> None:
+        self.lists = lists
+        self.probes = probes
+
+    def _build_options(
+            self
+    ) -> str:
+        return f"lists = {int(self.lists)}"
+
+    def _search_options(
+            self
+    ) -> str:
+        return f"probes = {int(self.probes)}"
+
+
+class HnswIndex(VectorIndex):
+    """
+    This class builds an hnsw index, a graph with `m` links per node whose candidate list is
+    `ef_construction` long at build time and `ef_search` long per query.
+    """
+    method = "hnsw"
+
+    def __init__(
+            self, m: int = 16, ef_construction: int = 64, ef_search: int = 40
+    ) -> None:
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    def _build_options(
+            self
+    ) -> str:
+        return f"m = {int(self.m)}, ef_construction = {int(self.ef_construction)}"
+
+    def _search_options(
+            self
+    ) -> str:
+        return f"ef_search = {int(self.ef_search)}"
+
+
+def vector_index(
+        method: str = None, num_rows: int = 0
+) -> VectorIndex:
+    """
+    This function returns the configured index strategy.
+    @param method: "ivfflat" or "hnsw", defaults to the VECTOR_INDEX environment variable
+    @param num_rows: rows in the table, used to size ivfflat lists when VECTOR_INDEX_LISTS isn't set
+    @rtype: VectorIndex
+    @return: index strategy
+    """
+    method = (method if method else env('VECTOR_INDEX', 'ivfflat')).lower()
+
+    if method == "hnsw":
+        return HnswIndex(m=int(env('VECTOR_INDEX_M', '16')),
+                         ef_construction=int(env('VECTOR_INDEX_EF_CONSTRUCTION', '64')),
+                         ef_search=int(env('VECTOR_INDEX_EF_SEARCH', '40')))
+    if method == "ivfflat":
+        return IvfflatIndex(lists=int(env('VECTOR_INDEX_LISTS', str(max(8, num_rows // 1000)))),
+                            probes=int(env('VECTOR_INDEX_PROBES', '1')))
+
+    raise ValueError(f"unknown vector index {method}, expected ivfflat or hnsw")
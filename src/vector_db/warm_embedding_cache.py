@@ -0,0 +1,149 @@
+"""
+This module contains the function `warm_embedding_cache` which embeds every name an order can resolve
+to, the alternatives of the item regex patterns and every row of menu.csv, in large batched requests
+and stores them in the embedding cache. Run it after a deploy or a redis flush so the first orders
+don't wait on OpenAI:
+    python -m src.vector_db.warm_embedding_cache
+"""
+import time
+import logging
+from os import path
+from os import getenv as env
+import redis
+from tqdm import tqdm
+from dotenv import load_dotenv
+from other.vocabulary import ITEM_PATTERNS, split_alternatives
+from src.django_beanhub.settings import DEBUG
+from src.ai_integration.embeddings_api import parse_menu_csv
+from src.ai_integration.embedding_provider import embedding_provider
+from src.vector_db.embedding_cache import (
+    EmbeddingCache, cache_key, get_cached_embeddings, set_cached_embeddings
+)
+
+LOGGING_LEVEL = logging.DEBUG if DEBUG else logging.INFO
+logging.basicConfig(level=LOGGING_LEVEL, format='%(asctime)s:%(levelname)s:%(message)s')
+
+load_dotenv()
+
+
+def warm_up_texts(
+        menu: list[dict] = None, patterns: dict[str, str] = None
+) -> tuple[list[str], list[tuple[str, str]]]:
+    """
+    This function returns every distinct name worth embedding ahead of time.
+    @param menu: parsed menu.csv, read from disk if not passed in
+    @param patterns: item regex patterns keyed by order detail, defaults to `ITEM_PATTERNS`
+    @rtype: tuple[list[str], list[tuple[str, str]]]
+    @return: names to embed and the skipped entries with the reason they were skipped
+     ex. (["coffee", ...], [("", "empty alternative in food pattern")])
+    """
+    if menu is None:
+        menu = parse_menu_csv()
+    if patterns is None:
+        patterns = ITEM_PATTERNS
+
+    candidates = []
+    skipped = []
+    for kind, pattern in patterns.items():
+        for alternative in split_alternatives(pattern):
+            if not alternative:
+                skipped.append((alternative, f"empty alternative in {kind} pattern"))
+            elif '\\' in alternative:
+                skipped.append((alternative, f"regex syntax in {kind} pattern"))
+            else:
+                candidates.append(alternative)
+    candidates += [item["MenuItem"]["item_name"].lower() for item in menu]
+
+    texts = {}
+    for text in candidates:
+        key = cache_key(text)
+        if key in texts:
+            if texts[key] != text:
+                skipped.append((text, f"shares a cache entry with {texts[key]}"))
+        else:
+            texts[key] = text
+
+    return list(texts.values()), skipped
+
+
+def warm_embedding_cache(
+        embedding_cache: redis.Redis | EmbeddingCache, api_key: str = None, texts: list[str] = None,
+        batch_size: int = 256, force: bool = False, progress: bool = True
+) -> dict:
+    """
+    This function embeds every name that isn't cached yet in batches and stores it in the cache.
+    @param embedding_cache: redis db 2 or the EmbeddingCache in front of it
+    @param api_key: OpenAI auth
+    @param texts: names to embed, defaults to `warm_up_texts()`
+    @param batch_size: number of names sent to OpenAI per request
+    @param force: embed names again even if they are already cached
+    @param progress: show a progress bar
+    @rtype: dict
+    @return: report ex. {"embedded": 70, "cached": 2, "skipped": [("", "empty alternative in food pattern")]}
+    """
+    warm_up_time = time.time()
+    skipped = []
+    if texts is None:
+        texts, skipped = warm_up_texts()
+
+    provider = embedding_provider(api_key=api_key if api_key else None)
+    if not provider.remote:
+        logging.info("%s embeds in process, nothing to warm up", provider.model)
+        return {"embedded": 0, "cached": 0, "skipped": skipped}
+
+    if force:
+        missing = list(texts)
+    else:
+        cached = get_cached_embeddings(embedding_cache, texts, provider.model)
+        missing = [text for text, embedding in zip(texts, cached) if embedding is None]
+
+    embedded = 0
+    batches = [missing[start:start + batch_size] for start in range(0, len(missing), batch_size)]
+    for batch in tqdm(batches, desc="warming embedding cache", unit="batch", disable=not progress):
+        try:
+            embeddings = provider.embed_batch(batch)
+        except Exception as e:
+            logging.error(f"Failed to embed batch of {len(batch)} names {e}.")
+            skipped += [(text, f"embedding request failed: {e}") for text in batch]
+            continue
+
+        set_cached_embeddings(embedding_cache, dict(zip(batch, embeddings)), provider.model)
+        embedded += len(batch)
+
+    report = {
+        "embedded": embedded,
+        "cached": len(texts) - len(missing),
+        "skipped": skipped
+    }
+    logging.info("embedding cache warm up time %s: embedded %s, already cached %s, skipped %s",
+                 time.time() - warm_up_time, report["embedded"], report["cached"], len(skipped))
+
+    return report
+
+
+def main(
+
+) -> int:  # pragma: no cover
+    """
+    @rtype: int
+    @return: 0 if successfully warmed up the cache
+    """
+    key_path = path.join(path.dirname(path.realpath(__file__)), "../..",
+                         "other", "openai_api_key.txt")
+    key = None
+    if path.exists(key_path):
+        with open(key_path, encoding='utf-8') as api_key:
+            key = api_key.readline().strip()
+
+    embedding_cache = redis.StrictRedis(host=env('REDIS_HOST'), port=env('REDIS_PORT'), db=2)
+    report = warm_embedding_cache(embedding_cache, key)
+
+    print(f"embedded: {report['embedded']}, already cached: {report['cached']}")
+    for text, reason in report["skipped"]:
+        print(f"skipped {text!r}: {reason}")
+
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
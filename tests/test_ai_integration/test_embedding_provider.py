@@ -0,0 +1,151 @@
+import os
+import asyncio
+import pytest
+import numpy as np
+from mock import MagicMock, AsyncMock, patch
+from src.ai_integration.embedding_provider import (
+    NgramEmbeddingProvider, OpenAIEmbeddingProvider, LlamaCppEmbeddingProvider, embedding_provider,
+    reset_embedding_providers
+)
+
+script_path = 'src.ai_integration.embedding_provider'
+
+MENU = ["black coffee", "latte", "espresso", "cappuccino", "glazed donut", "hot chocolate", "bagel", "green tea"]
+
+
+@pytest.fixture(autouse=True)
+def reset_providers(
+
+) -> None:
+    reset_embedding_providers()
+    yield
+    reset_embedding_providers()
+
+
+def test_ngram_provider_maps_misspellings_and_plurals_to_the_menu_item(
+
+) -> None:
+    # Arrange
+    provider = NgramEmbeddingProvider(vocabulary=MENU)
+    menu = np.stack(provider.embed_batch(MENU))
+
+    # Act
+    nearest = {order: MENU[int(np.argmin(np.linalg.norm(menu - provider.embed(order), axis=1)))]
+               for order in ["expresso", "Glazed Donuts", "a cappucino", "blak coffee", "lattes"]}
+
+    # Assert
+    assert nearest == {"expresso": "espresso", "Glazed Donuts": "glazed donut", "a cappucino": "cappuccino",
+                       "blak coffee": "black coffee", "lattes": "latte"}, \
+        f"expected every order to land on its menu item but got {nearest}"
+
+
+def test_ngram_provider_returns_the_same_unit_vector_in_every_instance(
+
+) -> None:
+    # Arrange
+    first = NgramEmbeddingProvider(vocabulary=MENU)
+    second = NgramEmbeddingProvider(vocabulary=MENU)
+
+    # Act
+    embedding = first.embed("black coffee")
+
+    # Assert
+    assert embedding.shape == (1536,), f"expected 1536 dimensions but got {embedding.shape}"
+    assert np.linalg.norm(embedding) == pytest.approx(1.0), f"expected a unit vector but got {np.linalg.norm(embedding)}"
+    assert np.array_equal(embedding, second.embed("black coffee")), "expected the buckets to be stable"
+    assert first.remote is False, "expected the n-gram provider to embed in process"
+
+
+def test_ngram_provider_fits_the_menu_vocabulary_once_on_first_use(
+        mocker
+) -> None:
+    # Arrange
+    mock_vocabulary = mocker.patch(script_path + '.menu_vocabulary', return_value=MENU)
+    provider = NgramEmbeddingProvider()
+
+    # Act
+    provider.embed("latte")
+    provider.embed_batch(["bagel", "green tea"])
+
+    # Assert
+    mock_vocabulary.assert_called_once()
+
+
+def test_openai_provider_embeds_batches_with_its_key(
+        mocker
+) -> None:
+    # Arrange
+    mock_batch_api = mocker.patch(script_path + '.openai_embedding_batch_api', return_value=[[0.1], [0.2]])
+    provider = OpenAIEmbeddingProvider("test_key")
+
+    # Act
+    embeddings = provider.embed_batch(["latte", "bagel"])
+
+    # Assert
+    assert embeddings == [[0.1], [0.2]], f"expected the OpenAI embeddings but got {embeddings}"
+    mock_batch_api.assert_called_once_with(["latte", "bagel"], "test_key")
+
+
+def test_llama_cpp_provider_embeds_a_batch_in_one_request_in_input_order(
+        mocker
+) -> None:
+    # Arrange
+    mock_openai = mocker.patch(script_path + '.OpenAI')
+    mocker.patch(script_path + '.AsyncOpenAI')
+    mock_openai.return_value.embeddings.create.return_value.data = [
+        MagicMock(index=1, embedding=[0.2]), MagicMock(index=0, embedding=[0.1])]
+    provider = LlamaCppEmbeddingProvider(base_url="http://llama:8080/v1", model="test.gguf", dimensions=1)
+
+    # Act
+    embeddings = provider.embed_batch(["latte", "bagel"])
+
+    # Assert
+    assert embeddings == [[0.1], [0.2]], f"expected embeddings in input order but got {embeddings}"
+    mock_openai.assert_called_once_with(base_url="http://llama:8080/v1", api_key="sk-no-key-required")
+    mock_openai.return_value.embeddings.create.assert_called_once_with(model="test.gguf", input=["latte", "bagel"])
+
+
+def test_llama_cpp_provider_embeds_without_blocking_the_event_loop(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch(script_path + '.OpenAI')
+    mock_async_openai = mocker.patch(script_path + '.AsyncOpenAI')
+    mock_async_openai.return_value.embeddings.create = AsyncMock(return_value=MagicMock(
+        data=[MagicMock(index=0, embedding=[0.3])]))
+    provider = LlamaCppEmbeddingProvider()
+
+    # Act
+    embedding = asyncio.run(provider.aembed("latte"))
+
+    # Assert
+    assert embedding == [0.3], f"expected the llama.cpp embedding but got {embedding}"
+
+
+def test_embedding_provider_is_selected_by_environment_variable_and_shared(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch(script_path + '.menu_vocabulary', return_value=MENU)
+
+    # Act
+    with patch.dict(os.environ, {"EMBEDDING_PROVIDER": "NGRAM"}):
+        first = embedding_provider(api_key="test_key")
+        second = embedding_provider()
+    with patch.dict(os.environ, {}, clear=True):
+        default = embedding_provider(api_key="test_key")
+
+    # Assert
+    assert isinstance(first, NgramEmbeddingProvider), f"expected the n-gram provider but got {first}"
+    assert first is second, "expected one provider per process"
+    assert isinstance(default, OpenAIEmbeddingProvider), f"expected OpenAI by default but got {default}"
+
+
+def test_embedding_provider_raises_for_unknown_provider(
+
+) -> None:
+    # Arrange
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        embedding_provider("word2vec")
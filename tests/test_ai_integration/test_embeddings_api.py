@@ -2,7 +2,8 @@ import pytest
 import pandas as pd
 from typing import Final
 from mock import MagicMock, patch
-from src.ai_integration.embeddings_api import openai_embedding_api, parse_menu_csv, parse_deals_csv
+from src.ai_integration.embeddings_api import openai_embedding_api, openai_embedding_batch_api, parse_menu_csv, parse_deals_csv
+from src.ai_integration.embeddings_api import openai_embeddings, reset_openai_embeddings
 
 script_path: Final[str] = 'src.ai_integration.embeddings_api'
 
@@ -11,7 +12,9 @@ script_path: Final[str] = 'src.ai_integration.embeddings_api'
 def mock_openai(
         mocker
 ) -> MagicMock:
-    return mocker.patch(script_path + '.OpenAIEmbeddings')
+    reset_openai_embeddings()
+    yield mocker.patch(script_path + '.OpenAIEmbeddings')
+    reset_openai_embeddings()
 
 
 def test_openai_embeddings_api(
@@ -31,6 +34,36 @@ def test_openai_embeddings_api(
     mock_openai.assert_called_once_with(api_key="foo_key")
 
 
+def test_openai_embedding_batch_api_embeds_every_text_in_one_request(
+        mock_openai
+) -> None:
+    # Arrange
+    expected_embeddings_instance = MagicMock()
+    mock_openai.return_value = expected_embeddings_instance
+    expected_vectors = [[1.0], [2.0]]
+    expected_embeddings_instance.embed_documents.return_value = expected_vectors
+
+    # Act
+    result_vectors = openai_embedding_batch_api(texts=["latte", "glazed donut"], api_key="foo_key")
+
+    # Assert
+    assert result_vectors == expected_vectors, f"expected {expected_vectors} but got {result_vectors}"
+    expected_embeddings_instance.embed_documents.assert_called_once_with(["latte", "glazed donut"])
+
+
+def test_openai_embedding_batch_api_returns_empty_list_without_calling_openai_when_given_no_texts(
+        mock_openai
+) -> None:
+    # Arrange
+
+    # Act
+    result_vectors = openai_embedding_batch_api(texts=[], api_key="foo_key")
+
+    # Assert
+    assert result_vectors == [], f"expected no vectors but got {result_vectors}"
+    mock_openai.assert_not_called()
+
+
 
 def test_parse_menu_csv(
         mocker
@@ -88,3 +121,18 @@ def test_parse_deal_csv(
 
     # Assert
     assert result == expected_output, f"expected parsing to be {expected_output} but got {result}"
+
+
+def test_openai_embeddings_builds_one_client_per_key(
+        mock_openai
+) -> None:
+    # Arrange
+    openai_embedding_api(text="latte", api_key="foo_key")
+
+    # Act
+    openai_embedding_batch_api(texts=["latte", "glazed donut"], api_key="foo_key")
+    openai_embeddings("bar_key")
+
+    # Assert
+    keys = [call.kwargs["api_key"] for call in mock_openai.call_args_list]
+    assert keys == ["foo_key", "bar_key"], f"expected one client per key but got {keys}"
@@ -0,0 +1,116 @@
+import pytest
+from src.ai_integration.entity_extractor import EntityExtractor, ENTITY_PATTERNS
+from src.ai_integration.benchmark_entity_extractor import (
+    benchmark_entity_extractor, regex_parse, transcriptions, ORDERS
+)
+
+
+@pytest.fixture
+def extractor(
+
+) -> EntityExtractor:
+    return EntityExtractor.instance()
+
+
+def test_spans_are_typed_and_located_in_the_order(
+        extractor
+) -> None:
+    # Arrange
+    order = "two large lattes and a glazed donut"
+
+    # Act
+    spans = extractor.spans(order)
+
+    # Assert
+    assert spans == [("quantities", "two", 0, 3), ("sizes", "large", 4, 9), ("coffee", "latte", 10, 16),
+                     ("quantities", "a", 21, 22), ("bakery", "glazed donut", 23, 35)], \
+        f"expected every entity with its label and position but got {spans}"
+
+
+def test_parse_matches_one_findall_per_pattern(
+        extractor
+) -> None:
+    # Arrange
+    orders = ORDERS + transcriptions(200, items=20)
+
+    # Act
+    mismatches = [order for order in orders if extractor.parse(order) != regex_parse(order)]
+
+    # Assert
+    assert not mismatches, f"expected the same entities as the patterns but got different ones for {mismatches}"
+
+
+@pytest.mark.parametrize("order, label, expected", [
+    ("an iced tea", "temperature", []),
+    ("a hot chocolate", "temperature", []),
+    ("a hot vanilla latte", "temperature", []),
+    ("an extra hot latte", "temperature", ["extra hot"]),
+    ("a blueberry muffin", "flavors", []),
+    ("a blueberry latte", "flavors", ["blueberry"]),
+    ("12 espressos and a shot of espresso", "quantities", ["12", "a"]),
+    ("two plain bagels", "food", ["plain bagel"]),
+])
+def test_parse_applies_the_lookaheads_and_plurals_of_the_patterns(
+        extractor, order, label, expected
+) -> None:
+    # Arrange
+
+    # Act
+    entities = extractor.parse(order)
+
+    # Assert
+    assert entities[label] == expected, f"expected {label} {expected} but got {entities[label]}"
+
+
+def test_parse_finds_the_cart_action_words(
+        extractor
+) -> None:
+    # Arrange
+
+    # Act
+    question = extractor.parse("how many glazed donuts do you have")
+    modification = extractor.parse("i don't want the latte")
+
+    # Assert
+    assert question["question"] == ["how many", "do you"], f"expected both question words but got {question}"
+    assert modification["modification"] == ["don't want"], f"expected a modification but got {modification}"
+
+
+def test_extractor_raises_for_an_alternative_which_is_not_a_plain_word(
+
+) -> None:
+    # Arrange
+    patterns = dict(ENTITY_PATTERNS, sizes=(r'\b(small|med\w+)\b', False))
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        EntityExtractor(patterns)
+
+
+def test_benchmark_entity_extractor_reports_both_parsers_agree(
+
+) -> None:
+    # Arrange
+    orders = transcriptions(10)
+
+    # Act
+    reports = benchmark_entity_extractor(orders, repeat=1)
+
+    # Assert
+    assert [report["parser"] for report in reports] == ["regex", "trie"], f"expected both parsers but got {reports}"
+    assert all(report["identical"] == 1.0 for report in reports), f"expected identical entities but got {reports}"
+
+
+def test_labels_from_matches_a_word_without_tokenizing_the_rest(
+        extractor
+) -> None:
+    # Arrange
+    order = "oat milk" + " " * 10_000 + "please"
+
+    # Act
+    labels = extractor.labels_from(order, 0)
+    hot = extractor.labels_from("a hot vanilla latte", 2)
+
+    # Assert
+    assert labels == {"milk_type"}, f"expected milk_type but got {labels}"
+    assert hot == set(), f"expected no temperature before a flavor but got {hot}"
@@ -1,21 +1,25 @@
 import os
 import pytest
 from mock import MagicMock
-from src.ai_integration.fine_tuned_nlp import ner_transformer, Order
+from src.ai_integration.fine_tuned_nlp import ner_transformer, Order, make_order_report
+from src.ai_integration.ner_server import NERServer
 
 
 @pytest.fixture
 def mock_ner_model(
         mocker
 ) -> dict:
-    ner_model_mock = mocker.patch('src.ai_integration.fine_tuned_nlp.NERModel')
+    ner_model_mock = mocker.patch('src.ai_integration.ner_server.NERModel')
     mock_instance = ner_model_mock.return_value
     mock_instance.predict.return_value = ([[{'test': 'O'}]], None)
+    NERServer.shutdown()
 
-    return {
+    yield {
         'ner_model_mock': ner_model_mock
     }
 
+    NERServer.shutdown()
+
 
 @pytest.fixture
 def mock_database_components(
@@ -27,10 +31,10 @@ def mock_database_components(
     mock_cursor = mocker.Mock()
     mock_cursor.cursor.return_value = mock_fetchall
 
-    mock_connection_pool = mocker.patch('src.ai_integration.fine_tuned_nlp.psycopg2.pool.SimpleConnectionPool')
+    mock_connection_pool = mocker.patch('src.ai_integration.fine_tuned_nlp.PostgresConnectionPool')
     mock_connection_pool.return_value.getconn.return_value = mock_cursor
 
-    mock_embedding_api = mocker.patch('src.vector_db.get_item.openai_embedding_api')
+    mock_embedding_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api')
     mock_embedding_api.return_value = [0.1, 0.2, 0.3]
 
     return {
@@ -275,3 +279,46 @@ def test_that_make_order_in_Order_class_returns_empty_dict_for_item_of_invalid_t
     # Assert
     assert actual_return_value == expected_return_value, \
         f"expected return value to be {expected_return_value} but got {actual_return_value}"
+
+
+def test_that_make_order_report_resolves_all_split_orders_with_one_batched_lookup_and_keeps_their_order(
+    mocker, mock_boto3_session_client, mock_database_components
+) -> None:
+    # Arrange
+    mocker.patch.dict(os.environ, {"OPENAI_API_KEY": "test_api_key"})
+    mock_get_items = mocker.patch('src.ai_integration.fine_tuned_nlp.get_items')
+    mock_get_items.return_value = ({
+        'latte': [(4, 'latte', 0, 'lactose', '(120,180)', 5.0)],
+        'pump of caramel': [(28, 'pump of caramel', 60, 'none', '(60,60)', 0.5)],
+        'sugar': [(30, 'sugar', 60, 'none', '(30,30)', 0.0)],
+        'glazed donut': [(48, 'glazed donut', 12, 'gluten', '(200,500)', 2.0)],
+    }, True)
+    split_orders = ["one latte with a pump of caramel and sugar", "a glazed donut"]
+
+    # Act
+    order_report, _ = make_order_report(split_orders, connection_pool=MagicMock(), aws_connected=True)
+
+    # Assert
+    mock_get_items.assert_called_once()
+    assert mock_get_items.call_args[0][0] == ['latte', 'pump of caramel', 'sugar', 'glazed donut'], \
+        f"expected every name to be looked up at once but got {mock_get_items.call_args[0][0]}"
+    assert list(order_report[0]) == ['CoffeeItem'] and list(order_report[1]) == ['BakeryItem'], \
+        f"expected reports in the same order as the split orders but got {order_report}"
+    assert order_report[0]['CoffeeItem']['price'] == [5.0, 0.5, 0.0], \
+        f"expected item, add-on then sweetener prices but got {order_report[0]['CoffeeItem']['price']}"
+
+
+def test_that_make_order_in_Order_class_reports_the_temperature_as_the_matched_word(
+        mocker, mock_boto3_session_client, mock_database_components
+) -> None:
+    # Arrange
+    mocker.patch.dict(os.environ, {"OPENAI_API_KEY": "test_api_key"})
+    item_details = {'latte': [(4, 'latte', 0, 'lactose', '(120,180)', 5.0)]}
+
+    # Act
+    actual_return_value = Order("an iced latte", connection_pool=MagicMock(), aws_connected=True).make_order(
+        item_details)
+
+    # Assert
+    assert actual_return_value['CoffeeItem']['temp'] == 'iced', \
+        f"expected temp to be iced but got {actual_return_value['CoffeeItem']['temp']}"
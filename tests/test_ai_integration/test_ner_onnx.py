@@ -0,0 +1,130 @@
+import os
+import json
+import pytest
+import torch
+from simpletransformers.ner import NERModel
+from transformers import BertConfig, BertForTokenClassification, BertTokenizerFast
+from src.ai_integration.ner_onnx import export_ner_model, OnnxNERModel, model_labels
+from src.ai_integration.ner_server import load_ner_model
+from src.ai_integration.benchmark_ner_onnx import benchmark_ner_runtimes, held_out_sentences, word_accuracy
+
+LABELS = ["O", "B-QUANTITY", "B-SIZE", "B-COFFEE-TYPE", "I-COFFEE-TYPE"]
+WORDS = ["a", "two", "large", "small", "latte", "black", "coffee", "please", "and"]
+
+
+@pytest.fixture(scope="module")
+def tiny_model(
+        tmp_path_factory
+) -> str:
+    model_path = str(tmp_path_factory.mktemp("ner_model"))
+    with open(os.path.join(model_path, "vocab.txt"), "w", encoding="utf-8") as vocab:
+        vocab.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(WORDS) + 5, hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                        intermediate_size=64, num_labels=len(LABELS))
+    BertForTokenClassification(config).save_pretrained(model_path)
+    BertTokenizerFast(os.path.join(model_path, "vocab.txt"), do_lower_case=False).save_pretrained(model_path)
+    with open(os.path.join(model_path, "model_args.json"), "w", encoding="utf-8") as model_args:
+        json.dump({"labels_list": LABELS}, model_args)
+
+    return model_path
+
+
+@pytest.fixture(scope="module")
+def exported(
+        tiny_model, tmp_path_factory
+) -> str:
+    output_dir = str(tmp_path_factory.mktemp("onnx"))
+    export_ner_model(tiny_model, output_dir)
+
+    return output_dir
+
+
+def test_export_writes_a_smaller_int8_model(
+        exported
+) -> None:
+    # Arrange
+    onnx_size = os.path.getsize(os.path.join(exported, "ner_model.onnx"))
+
+    # Act
+    quantized_size = os.path.getsize(os.path.join(exported, "ner_model.int8.onnx"))
+
+    # Assert
+    assert quantized_size < onnx_size, f"expected the int8 model to be smaller but got {quantized_size}"
+    assert model_labels(exported) == LABELS, f"expected the labels to be copied but got {model_labels(exported)}"
+
+
+def test_onnx_model_predicts_the_labels_of_the_pytorch_model(
+        tiny_model, exported
+) -> None:
+    # Arrange
+    sentences = ["two large latte please", "a black coffee and a small latte", "unknown words"]
+    pytorch = NERModel('bert', tiny_model, use_cuda=False,
+                       args={"silent": True, "use_multiprocessing_for_evaluation": False})
+
+    # Act
+    expected, _ = pytorch.predict(sentences)
+    predictions, outputs = OnnxNERModel(exported, quantized=False).predict(sentences)
+
+    # Assert
+    assert predictions == expected, f"expected {expected} but got {predictions}"
+    assert len(outputs[0][0]["two"]) == len(LABELS), f"expected the logits of every label but got {outputs[0][0]}"
+
+
+def test_onnx_model_returns_nothing_for_no_sentences(
+        exported
+) -> None:
+    # Arrange
+    model = OnnxNERModel(exported)
+
+    # Act
+    predictions, outputs = model.predict([])
+
+    # Assert
+    assert predictions == [] and outputs == [], f"expected no predictions but got {predictions}"
+
+
+def test_load_ner_model_serves_the_onnx_export_when_configured(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch.dict(os.environ, {"NER_RUNTIME": "onnx"})
+    mock_onnx_model = mocker.patch('src.ai_integration.ner_server.OnnxNERModel')
+
+    # Act
+    model = load_ner_model()
+
+    # Assert
+    assert model is mock_onnx_model.return_value, f"expected the ONNX model but got {model}"
+
+
+def test_benchmark_ner_runtimes_compares_every_runtime_to_the_first(
+        exported
+) -> None:
+    # Arrange
+    sentences = [(["two", "large", "latte"], ["B-QUANTITY", "B-SIZE", "B-COFFEE-TYPE"])]
+    models = {"onnx-fp32": OnnxNERModel(exported, quantized=False), "onnx-int8": OnnxNERModel(exported)}
+
+    # Act
+    reports = benchmark_ner_runtimes(models, sentences, repeat=1)
+
+    # Assert
+    assert [report["runtime"] for report in reports] == ["onnx-fp32", "onnx-int8"], \
+        f"expected both runtimes but got {reports}"
+    assert reports[0]["agreement"] == 1.0, f"expected the reference to agree with itself but got {reports}"
+
+
+def test_held_out_sentences_keeps_the_words_of_a_sentence_together(
+
+) -> None:
+    # Arrange
+    expected_accuracy = 0.5
+
+    # Act
+    sentences = held_out_sentences(fraction=0.1)
+    accuracy = word_accuracy([["O", "O"]], [["O", "B-SIZE"]])
+
+    # Assert
+    assert all(len(words) == len(labels) for words, labels in sentences), "expected a label for every word"
+    assert len(sentences) > 1, f"expected a tenth of the sentences but got {len(sentences)}"
+    assert accuracy == expected_accuracy, f"expected {expected_accuracy} but got {accuracy}"
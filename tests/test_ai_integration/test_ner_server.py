@@ -0,0 +1,155 @@
+import threading
+import pytest
+from mock import MagicMock
+from src.ai_integration.ner_server import NERServer
+
+
+def tag_everything(
+        sentences: list[str]
+) -> tuple[list, None]:
+    return [[{word: "O"} for word in sentence.split()] for sentence in sentences], None
+
+
+@pytest.fixture
+def mock_model(
+
+) -> MagicMock:
+    model = MagicMock()
+    model.predict.side_effect = tag_everything
+
+    return model
+
+
+def test_predict_loads_the_model_once(
+        mock_model
+) -> None:
+    # Arrange
+    load_model = MagicMock(return_value=mock_model)
+    server = NERServer(load_model, max_wait_ms=0)
+
+    # Act
+    first = server.predict(["a latte"])
+    second = server.predict(["a mocha"])
+    server.stop()
+
+    # Assert
+    load_model.assert_called_once_with()
+    assert first == [[{"a": "O"}, {"latte": "O"}]], f"expected the prediction of the sentence but got {first}"
+    assert second == [[{"a": "O"}, {"mocha": "O"}]], f"expected the prediction of the sentence but got {second}"
+
+
+def test_concurrent_calls_share_one_batch(
+        mock_model
+) -> None:
+    # Arrange
+    server = NERServer(lambda: mock_model, max_batch_size=4, max_wait_ms=5_000)
+    server.wait_until_loaded()
+    results = {}
+
+    def order(number: int) -> None:
+        results[number] = server.predict([f"order {number}"])
+
+    threads = [threading.Thread(target=order, args=(number,)) for number in range(4)]
+
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics = server.metrics()
+    server.stop()
+
+    # Assert
+    mock_model.predict.assert_called_once()
+    assert all(results[number] == [[{"order": "O"}, {str(number): "O"}]] for number in range(4)), \
+        f"expected every caller to get its own prediction but got {results}"
+    assert metrics["calls"] == 4 and metrics["batches"] == 1 and metrics["max_batch_size"] == 4, \
+        f"expected one batch of 4 calls but got {metrics}"
+
+
+def test_predict_raises_the_error_of_its_batch_and_keeps_serving(
+        mock_model
+) -> None:
+    # Arrange
+    mock_model.predict.side_effect = [RuntimeError("out of memory"), tag_everything(["a latte"])]
+    server = NERServer(lambda: mock_model, max_wait_ms=0)
+
+    # Act
+    with pytest.raises(RuntimeError):
+        server.predict(["a latte"])
+    prediction = server.predict(["a latte"])
+    server.stop()
+
+    # Assert
+    assert prediction == [[{"a": "O"}, {"latte": "O"}]], f"expected the server to keep serving but got {prediction}"
+
+
+def test_predict_raises_when_the_model_cannot_be_loaded(
+
+) -> None:
+    # Arrange
+    server = NERServer(MagicMock(side_effect=OSError("no model")), max_wait_ms=0)
+
+    # Act
+    loaded = server.wait_until_loaded(5)
+    with pytest.raises(OSError):
+        server.predict(["a latte"])
+    server.stop()
+
+    # Assert
+    assert not loaded, "expected the model not to be loaded"
+
+
+def test_instance_is_shared_until_shutdown(
+        mocker, mock_model
+) -> None:
+    # Arrange
+    mocker.patch('src.ai_integration.ner_server.NERModel', return_value=mock_model)
+    NERServer.shutdown()
+
+    # Act
+    first, second = NERServer.instance(), NERServer.instance()
+    NERServer.shutdown()
+    third = NERServer.instance()
+    NERServer.shutdown()
+
+    # Assert
+    assert first is second, "expected every caller to share the server"
+    assert third is not first, "expected a new server after shutdown"
+
+
+def test_predict_raises_when_the_batch_takes_longer_than_the_timeout(
+        mock_model
+) -> None:
+    # Arrange
+    release = threading.Event()
+    mock_model.predict.side_effect = lambda sentences: release.wait() and tag_everything(sentences)
+    server = NERServer(lambda: mock_model, max_wait_ms=0, predict_timeout=0.05)
+
+    # Act
+    with pytest.raises(TimeoutError):
+        server.predict(["a latte"])
+    release.set()
+    server.stop()
+
+    # Assert
+    mock_model.predict.assert_called_once()
+
+
+def test_instance_reloads_the_model_after_a_failed_load(
+        mocker, mock_model
+) -> None:
+    # Arrange
+    mocker.patch('src.ai_integration.ner_server.NERModel', side_effect=[OSError("no model"), mock_model])
+    NERServer.shutdown()
+
+    # Act
+    failed = NERServer.instance()
+    failed.wait_until_loaded(5)
+    server = NERServer.instance()
+    prediction = server.predict(["a latte"])
+    NERServer.shutdown()
+
+    # Assert
+    assert server is not failed, "expected a new server after the failed load"
+    assert prediction == [[{"a": "O"}, {"latte": "O"}]], f"expected the reloaded model to predict but got {prediction}"
@@ -0,0 +1,139 @@
+import os
+import pytest
+from src.ai_integration.ner_server import load_ner_model
+from src.ai_integration.benchmark_ner_tagger import benchmark_ner_tagger
+from src.ai_integration.ner_tagger import NERTagger, train_tagger, teacher_labels, split_sentences, vocabulary_labels
+
+SENTENCES = [
+    (["two", "large", "lattes", "please"], ["B-QUANTITY", "B-SIZE", "B-COFFEE-TYPE", "O"]),
+    (["a", "small", "black", "coffee"], ["B-QUANTITY", "B-SIZE", "B-COFFEE-TYPE", "I-COFFEE-TYPE"]),
+    (["one", "medium", "mocha", "thanks"], ["B-QUANTITY", "B-SIZE", "B-COFFEE-TYPE", "O"]),
+]
+
+
+@pytest.fixture(scope="module")
+def tagger(
+
+) -> NERTagger:
+    return train_tagger(SENTENCES, epochs=10)
+
+
+def test_train_tagger_learns_the_training_sentences(
+        tagger
+) -> None:
+    # Arrange
+    expected = [labels for _, labels in SENTENCES]
+
+    # Act
+    labels = [tagger.tag(words) for words, _ in SENTENCES]
+
+    # Assert
+    assert labels == expected, f"expected {expected} but got {labels}"
+    assert tagger.labels[0] == "O", f"expected the outside label first but got {tagger.labels}"
+
+
+def test_predict_returns_predictions_like_ner_model(
+        tagger
+) -> None:
+    # Arrange
+    sentences = ["two large lattes please", "an unseen order"]
+
+    # Act
+    predictions, outputs = tagger.predict(sentences)
+
+    # Assert
+    assert predictions[0] == [{"two": "B-QUANTITY"}, {"large": "B-SIZE"}, {"lattes": "B-COFFEE-TYPE"},
+                              {"please": "O"}], f"expected the labels of every word but got {predictions[0]}"
+    assert len(predictions[1]) == 3, f"expected a label for every unseen word but got {predictions[1]}"
+    assert len(outputs[0][0]["two"]) == len(tagger.labels), f"expected a score per label but got {outputs[0][0]}"
+
+
+def test_save_and_load_keep_the_weights(
+        tagger, tmp_path
+) -> None:
+    # Arrange
+    tagger_path = os.path.join(tmp_path, "ner_tagger.npz")
+
+    # Act
+    tagger.save(tagger_path)
+    loaded = NERTagger.load(tagger_path)
+
+    # Assert
+    assert loaded.parameters() == tagger.parameters(), f"expected {tagger.parameters()} but got {loaded.parameters()}"
+    assert loaded.predict(["a small black coffee"]) == tagger.predict(["a small black coffee"]), \
+        "expected the loaded tagger to tag like the saved one"
+
+
+def test_vocabulary_labels_marks_the_words_of_a_menu_item(
+
+) -> None:
+    # Arrange
+    words = ["an", "oat", "milk", "latte"]
+
+    # Act
+    labels = vocabulary_labels(words)
+
+    # Assert
+    assert any(label.startswith("B-") for label in labels[1]), f"expected oat to begin a span but got {labels}"
+    assert any(label.startswith("I-") for label in labels[2]), f"expected milk to continue a span but got {labels}"
+
+
+def test_teacher_labels_replaces_the_labels_with_the_predictions(
+        mocker
+) -> None:
+    # Arrange
+    teacher = mocker.Mock()
+    teacher.predict.return_value = ([[{"a": "O"}, {"latte": "B-COFFEE-TYPE"}]], None)
+
+    # Act
+    relabeled = teacher_labels([(["a", "latte"], ["B-QUANTITY", "O"])], teacher)
+
+    # Assert
+    assert relabeled == [(["a", "latte"], ["O", "B-COFFEE-TYPE"])], f"expected the teacher labels but got {relabeled}"
+    teacher.predict.assert_called_once_with(["a latte"])
+
+
+def test_split_sentences_holds_out_whole_sentences(
+
+) -> None:
+    # Arrange
+    fraction = 0.2
+
+    # Act
+    training, held_out = split_sentences(fraction)
+
+    # Assert
+    assert all(" " not in word for words, _ in training + held_out for word in words), \
+        "expected the words with spaces to be split"
+    assert all(len(words) == len(labels) for words, labels in training + held_out), "expected a label for every word"
+    assert round((len(training) + len(held_out)) * fraction) == len(held_out), \
+        f"expected a fifth of the sentences but got {len(held_out)}"
+
+
+def test_load_ner_model_serves_the_tagger_when_configured(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch.dict(os.environ, {"NER_RUNTIME": "tagger"})
+    mock_tagger = mocker.patch('src.ai_integration.ner_server.NERTagger')
+
+    # Act
+    model = load_ner_model()
+
+    # Assert
+    assert model is mock_tagger.load.return_value, f"expected the tagger but got {model}"
+
+
+def test_benchmark_ner_tagger_compares_every_model_to_the_first(
+        tagger
+) -> None:
+    # Arrange
+    sentences = SENTENCES[:2]
+
+    # Act
+    reports = benchmark_ner_tagger({"tagger": tagger, "copy": tagger}, sentences, repeat=1)
+
+    # Assert
+    assert [report["model"] for report in reports] == ["tagger", "copy"], f"expected both models but got {reports}"
+    assert reports[1]["f1_vs_reference"] == 1.0, f"expected the copy to agree with the tagger but got {reports}"
+    assert reports[0]["f1"] == 1.0 and reports[0]["tokens_per_s"] > 0, f"expected a perfect f1 but got {reports}"
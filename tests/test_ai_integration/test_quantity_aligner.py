@@ -0,0 +1,115 @@
+import pytest
+from src.ai_integration.entity_extractor import EntityExtractor
+from src.ai_integration.quantity_aligner import QuantityAligner, align_quantities, combine, verify_quantities
+from src.ai_integration.benchmark_quantity_aligner import benchmark_quantity_aligner, split_orders
+from src.ai_integration.benchmark_entity_extractor import transcriptions, ORDERS
+from other.quantity_correction import split_order
+
+
+@pytest.fixture
+def aligner(
+
+) -> QuantityAligner:
+    return QuantityAligner.instance()
+
+
+def test_pieces_match_split_order(
+        aligner
+) -> None:
+    # Arrange
+    orders = ORDERS + transcriptions(100, items=10) + ["grilled cheese", "cheesecake", "12 lattes", "  "]
+
+    # Act
+    mismatches = [order for order in orders if [piece for piece, _ in aligner.pieces(order)] != split_order(order)]
+
+    # Assert
+    assert not mismatches, f"expected the pieces of split_order but got different ones for {mismatches}"
+
+
+@pytest.mark.parametrize("order, order_type, expected", [
+    ("one black coffee with one cream and one sugar and a pump of caramel", "coffee", ["one", "one", "one", "a"]),
+    ("twenty two lattes", "coffee", ["22"]),
+    ("a couple of lattes with oat milk", "coffee", ["2", "1"]),
+    ("two dozen glazed donuts", "bakery", ["24"]),
+    ("one two lattes", "coffee", ["two"]),
+    ("hash brown", "food", ["1"]),
+    ("twenty two mango smoothies", "beverage", ["22"]),
+    ("two dozen chocolate chip muffins", "bakery", ["24"]),
+    ("a couple of vanilla milkshakes", "beverage", ["2"]),
+])
+def test_align_quantities_gives_every_item_the_quantity_said_before_it(
+        order, order_type, expected
+) -> None:
+    # Arrange
+    order_details = EntityExtractor.instance().parse(order)
+
+    # Act
+    quantities = align_quantities(order, order_type, order_details)
+
+    # Assert
+    assert quantities == expected, f"expected {expected} for {order} but got {quantities}"
+
+
+@pytest.mark.parametrize("order, order_type, expected", [
+    ("two bagels and three muffins", "bakery", ["two", "three"]),
+    ("two hash browns and one sausage", "food", ["two", "one"]),
+    ("twenty two lattes", "coffee", ["22"]),
+])
+def test_verify_quantities_keeps_the_parsed_quantities_unless_they_need_aligning(
+        order, order_type, expected
+) -> None:
+    # Arrange
+    order_details = EntityExtractor.instance().parse(order)
+
+    # Act
+    quantities = verify_quantities(order, order_type, order_details)
+
+    # Assert
+    assert quantities == expected, f"expected {expected} for {order} but got {quantities}"
+
+
+def test_combine_restarts_with_a_word_which_cannot_continue_the_quantity(
+
+) -> None:
+    # Arrange
+    phrase = (["twenty"], 20)
+
+    # Act
+    unit = combine(phrase, "two", 2)
+    article = combine(phrase, "a", 1)
+
+    # Assert
+    assert unit == (["twenty", "two"], 22), f"expected twenty two but got {unit}"
+    assert article == (["a"], 1), f"expected a new quantity but got {article}"
+
+
+def test_instance_is_rebuilt_when_the_extractor_is_swapped(
+        aligner
+) -> None:
+    # Arrange
+    extractor = EntityExtractor.instance()
+
+    # Act
+    EntityExtractor.swap(EntityExtractor())
+    try:
+        rebuilt = QuantityAligner.instance()
+    finally:
+        EntityExtractor.swap(extractor)
+
+    # Assert
+    assert rebuilt is not aligner, "expected the aligner to use the new extractor"
+
+
+def test_benchmark_quantity_aligner_reports_both_aligners_agree(
+
+) -> None:
+    # Arrange
+    orders = split_orders(20)
+
+    # Act
+    reports = benchmark_quantity_aligner(orders, repeat=1)
+
+    # Assert
+    assert [report["aligner"] for report in reports] == ["regex", "scan"], f"expected both aligners but got {reports}"
+    # items whose name starts with a flavor ex. "mango tea" are found by the scan and missed by the regexes
+    assert reports[1]["identical"] >= 0.9, f"expected the same quantities as the regexes but got {reports}"
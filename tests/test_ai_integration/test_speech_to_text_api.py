@@ -3,6 +3,7 @@ import pytest
 from typing import Final
 from mock import MagicMock, patch
 from speech_recognition import WaitTimeoutError, UnknownValueError, RequestError
+from src.external_connections.credentials_provider import CredentialsProvider
 from src.ai_integration.speech_to_text_api import google_cloud_speech_api, return_as_wav, record_until_silence, nova_speech_api, save_as_mp3, whisper_speech_api, whisper_multi_speech_api
 
 script_path: Final[str] = 'src.ai_integration.speech_to_text_api'
@@ -17,7 +18,9 @@ def mock_google_cloud(
 
 @pytest.fixture
 def mock_deepgram(mocker):
-    return mocker.patch(script_path + '.Deepgram')
+    CredentialsProvider._CredentialsProvider__instance = None
+    yield mocker.patch(script_path + '.Deepgram')
+    CredentialsProvider._CredentialsProvider__instance = None
 
 
 @pytest.fixture
@@ -234,7 +237,10 @@ def test_nova_speech_api_returns_expected_transcription_with_file_api_key(
         mocker, mock_deepgram
 ) -> None:
     # Arrange
-    mocker.patch(script_path + '.open', mocker.mock_open(read_data='fake_api_key'))
+    mocker.patch(script_path + '.open', mocker.mock_open(read_data='foo'))
+    mocker.patch('src.external_connections.credentials_provider.open', mocker.mock_open(read_data='fake_api_key'))
+    mocker.patch('src.external_connections.credentials_provider.path.exists', return_value=True)
+    mocker.patch.dict(os.environ, {"DEEPGRAM_API_KEY": ""})
     fake_response = {
         'results': {
             'channels': [
@@ -251,6 +257,7 @@ def test_nova_speech_api_returns_expected_transcription_with_file_api_key(
 
     # Assert
     assert transcript == 'test transcription', f"expected transcript to be 'test transcription' but got {transcript}"
+    mock_deepgram.assert_called_once_with('fake_api_key')
 
 
 def test_save_as_mp3(
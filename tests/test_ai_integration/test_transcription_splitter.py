@@ -0,0 +1,84 @@
+import pytest
+from src.ai_integration.transcription_splitter import TranscriptionSplitter, split_on_separators
+from src.ai_integration.benchmark_transcription_splitter import benchmark_transcription_splitter, regex_split
+from src.ai_integration.benchmark_entity_extractor import transcriptions, ORDERS
+
+
+@pytest.fixture
+def splitter(
+
+) -> TranscriptionSplitter:
+    return TranscriptionSplitter.instance()
+
+
+def test_split_drops_the_separators(
+        splitter
+) -> None:
+    # Arrange
+    order = "a latte and a glazed donut plus get also an iced tea"
+
+    # Act
+    parts = splitter.split(order)
+
+    # Assert
+    assert parts == ["a latte ", " a glazed donut ", " ", " ", " an iced tea"], \
+        f"expected one part per item but got {parts}"
+
+
+@pytest.mark.parametrize("order", [
+    "a latte and oat milk",
+    "a latte and two pumps of caramel",
+    "a bagel and cheesecake",
+    "an espresso and extra hot",
+])
+def test_split_keeps_a_separator_followed_by_an_exception(
+        splitter, order
+) -> None:
+    # Arrange
+
+    # Act
+    parts = splitter.split(order)
+
+    # Assert
+    assert parts == [order], f"expected {order} not to be split but got {parts}"
+
+
+def test_split_matches_the_split_pattern(
+        splitter
+) -> None:
+    # Arrange
+    orders = ORDERS + transcriptions(200, items=20) + ["and", "and   and", "latte andoat milk", "  plus  "]
+
+    # Act
+    mismatches = [order for order in orders if splitter.split(order) != regex_split(order)]
+
+    # Assert
+    assert not mismatches, f"expected the same parts as SPLIT_PATTERN but got different ones for {mismatches}"
+
+
+def test_split_on_separators_uses_the_shared_splitter(
+        mocker
+) -> None:
+    # Arrange
+    mock_split = mocker.patch.object(TranscriptionSplitter, "split", return_value=["a latte"])
+
+    # Act
+    parts = split_on_separators("a latte")
+
+    # Assert
+    assert parts == ["a latte"], f"expected the parts of the shared splitter but got {parts}"
+    mock_split.assert_called_once_with("a latte")
+
+
+def test_benchmark_transcription_splitter_reports_both_splitters_agree(
+
+) -> None:
+    # Arrange
+    lengths = [100, 1_000]
+
+    # Act
+    reports = benchmark_transcription_splitter(lengths, repeat=1)
+
+    # Assert
+    assert len(reports) == 7 * len(lengths), f"expected one report per case and length but got {len(reports)}"
+    assert all(report["identical"] for report in reports), f"expected identical parts but got {reports}"
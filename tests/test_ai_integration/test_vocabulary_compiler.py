@@ -0,0 +1,118 @@
+import pytest
+from mock import MagicMock
+from src.ai_integration.entity_extractor import EntityExtractor
+from src.ai_integration.transcription_splitter import TranscriptionSplitter
+from src.ai_integration.vocabulary_compiler import (
+    VocabularyCompiler, compile_patterns, classify, vocabulary_index, menu_words
+)
+from src.ai_integration.benchmark_vocabulary_compiler import benchmark_vocabulary_compiler
+from other.vocabulary import item_vocabulary, split_alternatives
+
+
+@pytest.fixture(autouse=True)
+def restore_extractor(
+
+) -> None:
+    extractor = EntityExtractor.instance()
+    yield
+    EntityExtractor.swap(extractor)
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("strawberry smoothie", "beverage"),
+    ("pump of espresso", "add_ons"),
+    ("chocolate chip cookie", "bakery"),
+    ("double espressos", "coffee"),
+    ("vanilla cannoli", None),
+])
+def test_classify_uses_the_last_words_of_the_name(
+        name, expected
+) -> None:
+    # Arrange
+    index = vocabulary_index(item_vocabulary())
+
+    # Act
+    label = classify(name, index)
+
+    # Assert
+    assert label == expected, f"expected {name} to be {expected} but got {label}"
+
+
+def test_compile_patterns_adds_new_menu_names_to_their_label(
+
+) -> None:
+    # Arrange
+    menu_names = ["Latte", "Strawberry Smoothie", "Flat White", "Hash Browns", "Mystery Box"]
+    deals = [("flat white", "CoffeeItem")]
+
+    # Act
+    patterns, unclassified = compile_patterns(menu_names, deals, categories={})
+
+    # Assert
+    coffee, beverage = split_alternatives(patterns["coffee"][0]), split_alternatives(patterns["beverage"][0])
+    assert coffee.count("flat white") == 1 and "latte" in coffee, f"expected flat white to be added but got {coffee}"
+    assert beverage[-1] == "strawberry smoothie", f"expected the smoothie after the patterns but got {beverage}"
+    assert "" not in split_alternatives(patterns["food"][0]), f"expected no empty alternative but got {patterns}"
+    assert unclassified == ["mystery box"], f"expected mystery box to be unclassified but got {unclassified}"
+
+
+def test_reload_swaps_the_extractor_and_the_splitter_only_when_the_menu_changes(
+
+) -> None:
+    # Arrange
+    compiler = VocabularyCompiler(categories={"mocha": "coffee"})
+    splitter = TranscriptionSplitter.instance()
+
+    # Act
+    swapped = compiler.reload(["Mocha", "Latte"], [])
+    unchanged = compiler.reload(["latte", "MOCHA"], [])
+
+    # Assert
+    assert swapped and not unchanged, f"expected only the first reload to compile but got {swapped}, {unchanged}"
+    entities = EntityExtractor.instance().parse("two mochas and a latte")
+    assert entities["coffee"] == ["mocha", "latte"], f"expected the new coffee to be parsed but got {entities}"
+    assert TranscriptionSplitter.instance() is not splitter, "expected the splitter to use the new extractor"
+
+
+def test_load_reads_the_products_and_deals_tables(
+
+) -> None:
+    # Arrange
+    mock_pool = MagicMock()
+    cursor = mock_pool.getconn.return_value.cursor.return_value
+    cursor.fetchall.side_effect = [[("Mocha",), (None,)], [("mocha", "CoffeeItem")]]
+
+    # Act
+    swapped = VocabularyCompiler(categories={}).load(mock_pool)
+
+    # Assert
+    assert swapped, "expected the vocabulary to be compiled"
+    assert EntityExtractor.instance().parse("a mocha")["coffee"] == ["mocha"], "expected mocha to be a coffee"
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+
+
+def test_menu_words_spells_a_name_like_a_transcription(
+
+) -> None:
+    # Arrange
+
+    # Act
+    words = menu_words("Egg and Cheese on a  Croissant!")
+
+    # Assert
+    assert words == "egg and cheese on a croissant", f"expected casefolded words but got {words}"
+
+
+def test_benchmark_vocabulary_compiler_reports_every_sku_count(
+
+) -> None:
+    # Arrange
+    orders = ["two large lattes and a glazed donut"]
+
+    # Act
+    reports = benchmark_vocabulary_compiler([0, 100], orders, repeat=1)
+
+    # Assert
+    assert [report["skus"] for report in reports] == [0, 100], f"expected both sku counts but got {reports}"
+    assert reports[1]["alternatives"] >= reports[0]["alternatives"] + 100, \
+        f"expected the made up skus to be compiled but got {reports}"
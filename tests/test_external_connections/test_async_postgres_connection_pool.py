@@ -0,0 +1,54 @@
+import asyncio
+from mock import AsyncMock
+from typing import Final
+from src.vector_db.vector_index import HnswIndex
+from src.external_connections.async_postgres_connection_pool import (
+    connect_kwargs, configure_connection, create_async_connection_pool
+)
+
+script_path: Final[str] = 'src.external_connections.async_postgres_connection_pool'
+
+
+def test_connect_kwargs_converts_libpq_connection_string(
+
+) -> None:
+    # Act
+    kwargs = connect_kwargs("dbname=mydb user=myuser password=mypassword host=localhost port=5432")
+
+    # Assert
+    assert kwargs == {"database": "mydb", "user": "myuser", "password": "mypassword",
+                      "host": "localhost", "port": 5432}, f"expected asyncpg arguments but got {kwargs}"
+
+
+def test_configure_connection_registers_vector_and_sets_index_search(
+        mocker
+) -> None:
+    # Arrange
+    mock_register_vector = mocker.patch(script_path + ".register_vector", new_callable=AsyncMock)
+    mock_connection = AsyncMock()
+
+    # Act
+    asyncio.run(configure_connection(mock_connection, HnswIndex(ef_search=40)))
+
+    # Assert
+    mock_register_vector.assert_awaited_once_with(mock_connection)
+    mock_connection.execute.assert_awaited_once_with("SET hnsw.ef_search = 40;")
+
+
+def test_create_async_connection_pool_sets_statement_timeout_and_size(
+        mocker
+) -> None:
+    # Arrange
+    mock_create_pool = mocker.patch(script_path + ".asyncpg.create_pool", new_callable=AsyncMock)
+
+    # Act
+    pool = asyncio.run(create_async_connection_pool("dbname=mydb host=localhost port=5432",
+                                                    min_size=2, max_size=8, statement_timeout=3000))
+
+    # Assert
+    assert pool is mock_create_pool.return_value, f"expected the asyncpg pool but got {pool}"
+    kwargs = mock_create_pool.call_args.kwargs
+    assert (kwargs["min_size"], kwargs["max_size"]) == (2, 8), f"expected pool of 2 to 8 but got {kwargs}"
+    assert kwargs["server_settings"] == {"statement_timeout": "3000"}, \
+        f"expected statement timeout of 3000 but got {kwargs['server_settings']}"
+    assert kwargs["database"] == "mydb", f"expected database mydb but got {kwargs}"
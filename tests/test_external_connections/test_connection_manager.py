@@ -1,12 +1,15 @@
 import os
+import asyncio
 
 import psycopg2
 import redis
 import pytest
 import logging
-from mock import patch, MagicMock
+from mock import patch, MagicMock, AsyncMock
 from typing import Final
 from src.external_connections.connection_manager import ConnectionManager
+from src.vector_db.menu_repository import MenuRepository
+from src.external_connections.credentials_provider import CredentialsProvider
 
 script_path: Final[str] = 'src.external_connections.connection_manager'
 
@@ -43,13 +46,15 @@ def mock_components(
     return {
         'botocore.session.Session': mocker.patch('boto3.session.Session.client', return_value=MagicMock()),
         'rabbitmq_connection_pool': mocker.patch(script_path + ".RabbitMQConnectionPool", return_value=MagicMock()),
-        'psycopg2.pool.SimpleConnectionPool': mocker.patch(script_path + ".psycopg2.pool.SimpleConnectionPool"),
+        'postgres_connection_pool': mocker.patch(script_path + ".PostgresConnectionPool"),
     }
 
 
 @pytest.fixture(autouse=True)
 def reset_connection_manager():
     ConnectionManager._ConnectionManager__instance = None
+    MenuRepository._MenuRepository__instance = None
+    CredentialsProvider._CredentialsProvider__instance = None
     yield
 
 
@@ -127,6 +132,7 @@ def test_connect_to_s3_fails_initially_and_succeeds_on_second_try(
     ('conversation', '_ConnectionManager__conversation_cache'),
     ('deal', '_ConnectionManager__deal_cache'),
     ('embedding', '_ConnectionManager__embedding_cache'),
+    ('inventory', '_ConnectionManager__inventory_cache'),
 ])
 @patch(script_path + ".redis.StrictRedis")
 def test_connect_to_redis_cache_success(
@@ -148,6 +154,7 @@ def test_connect_to_redis_cache_success(
     ('conversation', '_ConnectionManager__conversation_cache'),
     ('deal', '_ConnectionManager__deal_cache'),
     ('embedding', '_ConnectionManager__embedding_cache'),
+    ('inventory', '_ConnectionManager__inventory_cache'),
 ])
 @patch(script_path + ".redis.StrictRedis")
 @patch('time.sleep', return_value=None)
@@ -162,6 +169,7 @@ def test_connect_to_redis_cache_fails_initially_and_succeeds_on_second_try(
         redis.exceptions.ConnectionError(),
         MagicMock(name=f'{db_type}_cache'),
         MagicMock(name=f'{db_type}_cache'),
+        MagicMock(name=f'{db_type}_cache'),
     ]
 
     # Act
@@ -173,9 +181,9 @@ def test_connect_to_redis_cache_fails_initially_and_succeeds_on_second_try(
         f"Expected {db_type} cache to be initialized successfully"
 
 
-@patch(script_path + ".psycopg2.pool.SimpleConnectionPool")
+@patch(script_path + ".PostgresConnectionPool")
 def test_connect_to_postgresql_success(
-        mock_simple_connection_pool, mock_environment_variables, mock_components
+        mock_postgres_connection_pool, mock_environment_variables, mock_components
 ) -> None:
     # Arrange
 
@@ -184,8 +192,10 @@ def test_connect_to_postgresql_success(
     connection_pool = manager.connection_pool()
 
     # Assert
-    mock_simple_connection_pool.assert_called_once()
-    assert connection_pool == mock_simple_connection_pool.return_value, \
+    mock_postgres_connection_pool.assert_called_once()
+    assert mock_postgres_connection_pool.call_args.kwargs["maxconn"] == 10, \
+        f"expected 10 connections at most but got {mock_postgres_connection_pool.call_args}"
+    assert connection_pool == mock_postgres_connection_pool.return_value, \
         "Expected PostgreSQL connection pool to be initialized successfully"
 
 
@@ -206,14 +216,14 @@ def test_connect_to_rabbitmq_pool_success(
         f"Expected RabbitMQ connection pool to be initialized successfully"
 
 
-@patch(script_path + ".psycopg2.pool.SimpleConnectionPool")
+@patch(script_path + ".PostgresConnectionPool")
 @patch('time.sleep', return_value=None)
 def test_connect_to_postgresql_fails_initially_and_succeeds_on_second_try(
-        mock_sleep, mock_simple_connection_pool, mock_environment_variables, mock_components, caplog
+        mock_sleep, mock_postgres_connection_pool, mock_environment_variables, mock_components, caplog
 ) -> None:
     # Arrange
     mock_return_value = MagicMock(name='connection_pool')
-    mock_simple_connection_pool.side_effect = [
+    mock_postgres_connection_pool.side_effect = [
         psycopg2.Error("Failed to connect to PostgreSQL"),
         mock_return_value,
     ]
@@ -228,3 +238,71 @@ def test_connect_to_postgresql_fails_initially_and_succeeds_on_second_try(
         "Expected PostgreSQL connection pool to be initialized successfully"
     assert "Failed to connect to PostgreSQL" in caplog.text, \
         "Expected log message about PostgreSQL connection failure was not found"
+
+
+def test_async_connection_pool_is_opened_once_per_event_loop(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_create_pool = mocker.patch(script_path + ".create_async_connection_pool", new_callable=AsyncMock)
+    manager = ConnectionManager.connect()
+
+    async def get_pools():
+        return await manager.async_connection_pool(), await manager.async_connection_pool()
+
+    # Act
+    first, second = asyncio.run(get_pools())
+    asyncio.run(get_pools())
+
+    # Assert
+    assert first is second, "Expected the same pool within one event loop"
+    assert mock_create_pool.await_count == 2, \
+        f"Expected one pool per event loop but got {mock_create_pool.await_count}"
+
+
+def test_async_redis_cache_uses_the_database_of_the_cache_type(
+        mock_components
+) -> None:
+    # Arrange
+    manager = ConnectionManager.connect()
+
+    async def get_caches():
+        return manager.async_redis_cache("embedding"), manager.async_redis_cache("embedding")
+
+    # Act
+    first, second = asyncio.run(get_caches())
+
+    # Assert
+    assert first is second, "Expected the same client within one event loop"
+    assert first.connection_pool.connection_kwargs["db"] == 2, \
+        f"Expected embedding cache to use db 2 but got {first.connection_pool.connection_kwargs['db']}"
+
+
+def test_connection_manager_shares_its_pool_with_the_menu_repository(
+        mock_components
+) -> None:
+    # Act
+    manager = ConnectionManager.connect()
+
+    # Assert
+    assert MenuRepository.connect() is manager.menu_repository(), \
+        "Expected the vector_db helpers to use the connection manager's repository"
+    assert manager.menu_repository().connection_pool() is manager.connection_pool(), \
+        "Expected the repository to share the connection manager's pool"
+
+
+def test_inventory_shares_the_postgres_pool_and_only_syncs_when_enabled(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_inventory = mocker.patch(script_path + ".Inventory")
+    mock_thread = mocker.patch(script_path + ".threading.Thread")
+
+    # Act
+    manager = ConnectionManager.connect()
+
+    # Assert
+    assert manager.inventory() is mock_inventory.return_value, f"expected the inventory but got {manager.inventory()}"
+    assert mock_inventory.call_args.args[1] is manager.connection_pool(), \
+        f"expected the inventory to use the shared pool but got {mock_inventory.call_args}"
+    mock_thread.assert_not_called()
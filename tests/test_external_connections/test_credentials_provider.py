@@ -0,0 +1,116 @@
+import os
+import pytest
+from typing import Final
+from mock import patch
+from src.external_connections.credentials_provider import CredentialsProvider, read_key_file
+
+script_path: Final[str] = 'src.external_connections.credentials_provider'
+
+
+@pytest.fixture(autouse=True)
+def reset_credentials_provider(
+
+) -> None:
+    CredentialsProvider._CredentialsProvider__instance = None
+    yield
+    CredentialsProvider._CredentialsProvider__instance = None
+
+
+def test_instance_is_shared_by_the_process(
+
+) -> None:
+    # Act
+    first = CredentialsProvider.instance()
+    second = CredentialsProvider.instance()
+
+    # Assert
+    assert first is second, "expected one credentials provider per process"
+
+
+def test_connection_string_is_resolved_once(
+        mocker
+) -> None:
+    # Arrange
+    mock_connection_string = mocker.patch(script_path + '.connection_string', return_value="dbname=mydb")
+    provider = CredentialsProvider(refresh_interval=0)
+
+    # Act
+    results = [provider.connection_string() for _ in range(3)]
+
+    # Assert
+    assert results == ["dbname=mydb"] * 3, f"expected the same connection string but got {results}"
+    mock_connection_string.assert_called_once()
+
+
+def test_aws_secret_is_resolved_again_after_refresh_interval(
+        mocker
+) -> None:
+    # Arrange
+    mock_get_secret = mocker.patch(script_path + '.get_secret', side_effect=["first", "second"])
+    mock_monotonic = mocker.patch(script_path + '.time.monotonic', side_effect=[0.0, 10.0, 61.0, 61.0])
+    provider = CredentialsProvider(refresh_interval=60)
+
+    # Act
+    results = [provider.aws_secret(), provider.aws_secret(), provider.aws_secret()]
+
+    # Assert
+    assert results == ["first", "first", "second"], f"expected the secret to refresh after 60s but got {results}"
+    assert mock_get_secret.call_count == 2, f"expected two lookups but got {mock_get_secret.call_count}"
+    assert mock_monotonic.call_count == 4, f"expected the clock to be read on every lookup"
+
+
+def test_invalidate_resolves_the_credential_again(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch(script_path + '.read_key_file', side_effect=["old_key", "new_key"])
+    provider = CredentialsProvider(refresh_interval=0)
+    provider.openai_api_key()
+
+    # Act
+    provider.invalidate("openai_api_key")
+    key = provider.openai_api_key()
+
+    # Assert
+    assert key == "new_key", f"expected the rotated key but got {key}"
+
+
+def test_openai_api_key_falls_back_to_environment(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch(script_path + '.read_key_file', return_value=None)
+    mocker.patch.dict(os.environ, {"OPENAI_API_KEY": "env_key"})
+
+    # Act
+    key = CredentialsProvider(refresh_interval=0).openai_api_key()
+
+    # Assert
+    assert key == "env_key", f"expected the environment key but got {key}"
+
+
+def test_deepgram_api_key_prefers_environment_over_file(
+        mocker
+) -> None:
+    # Arrange
+    mock_read_key_file = mocker.patch(script_path + '.read_key_file', return_value="file_key")
+    mocker.patch.dict(os.environ, {"DEEPGRAM_API_KEY": "env_key"})
+
+    # Act
+    key = CredentialsProvider(refresh_interval=0).deepgram_api_key()
+
+    # Assert
+    assert key == "env_key", f"expected the environment key but got {key}"
+    mock_read_key_file.assert_not_called()
+
+
+def test_read_key_file_returns_none_when_file_is_missing(
+
+) -> None:
+    # Arrange
+    with patch(script_path + '.path.exists', return_value=False):
+        # Act
+        key = read_key_file("missing_key.txt")
+
+    # Assert
+    assert key is None, f"expected no key but got {key}"
@@ -0,0 +1,143 @@
+import time
+import threading
+import psycopg2
+import psycopg2.extensions
+import pytest
+from mock import MagicMock
+from typing import Final
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool, PoolTimeoutError
+from src.vector_db.vector_index import HnswIndex
+
+script_path: Final[str] = 'src.external_connections.postgres_connection_pool'
+
+
+@pytest.fixture
+def mock_connect(
+        mocker
+) -> MagicMock:
+    mocker.patch(script_path + '.register_vector')
+
+    def new_connection(*args, **kwargs) -> MagicMock:
+        connection = MagicMock()
+        connection.closed = 0
+        connection.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        return connection
+
+    return mocker.patch(script_path + '.psycopg2.connect', side_effect=new_connection)
+
+
+def test_connections_are_configured_once_when_created(
+        mocker, mock_connect
+) -> None:
+    # Arrange
+    mock_register_vector = mocker.patch(script_path + '.register_vector')
+
+    # Act
+    pool = PostgresConnectionPool(minconn=1, maxconn=2, dsn="dbname=test", statement_timeout=2000,
+                                  index=HnswIndex(ef_search=80))
+    db_connection = pool.getconn()
+    pool.putconn(db_connection)
+    pool.getconn()
+
+    # Assert
+    executed = [call.args[0] for call in db_connection.cursor.return_value.execute.call_args_list]
+    assert mock_connect.call_count == 1, f"expected one connection to be created but got {mock_connect.call_count}"
+    assert db_connection.autocommit is True, "expected connection to be in autocommit mode"
+    mock_register_vector.assert_called_once_with(db_connection)
+    assert executed == ["SET statement_timeout = 2000;", "SET hnsw.ef_search = 80;"], \
+        f"expected statement timeout and ef_search to be set but got {executed}"
+
+
+def test_getconn_raises_after_checkout_timeout_when_pool_is_exhausted(
+        mock_connect
+) -> None:
+    # Arrange
+    pool = PostgresConnectionPool(minconn=0, maxconn=1, checkout_timeout=0.05)
+    pool.getconn()
+
+    # Act / Assert
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+
+
+def test_getconn_waits_for_a_connection_to_be_returned(
+        mock_connect
+) -> None:
+    # Arrange
+    pool = PostgresConnectionPool(minconn=0, maxconn=1, checkout_timeout=2.0)
+    db_connection = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(db_connection,)).start()
+
+    # Act
+    returned_connection = pool.getconn()
+
+    # Assert
+    assert returned_connection is db_connection, "expected the returned connection to be handed out again"
+
+
+def test_getconn_replaces_connection_that_fails_health_check(
+        mocker, mock_connect
+) -> None:
+    # Arrange
+    mock_monotonic = mocker.patch(script_path + '.time.monotonic', return_value=100.0)
+    pool = PostgresConnectionPool(minconn=1, maxconn=1, health_check_interval=30.0)
+    stale_connection = pool.getconn()
+    pool.putconn(stale_connection)
+    stale_connection.cursor.return_value.execute.side_effect = psycopg2.OperationalError("server closed")
+    mock_monotonic.return_value = 200.0
+
+    # Act
+    db_connection = pool.getconn()
+
+    # Assert
+    assert db_connection is not stale_connection, "expected unhealthy connection to be replaced"
+    stale_connection.close.assert_called_once()
+    assert pool.stats()["size"] == 1, f"expected pool size to stay at 1 but got {pool.stats()}"
+
+
+def test_putconn_rolls_back_connection_left_in_a_transaction(
+        mock_connect
+) -> None:
+    # Arrange
+    pool = PostgresConnectionPool(minconn=0, maxconn=1)
+    db_connection = pool.getconn()
+    db_connection.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+
+    # Act
+    pool.putconn(db_connection)
+
+    # Assert
+    db_connection.rollback.assert_called_once()
+    assert pool.stats()["idle"] == 1, f"expected connection to be reusable but got {pool.stats()}"
+
+
+def test_pool_never_opens_more_than_maxconn_under_concurrency(
+        mock_connect
+) -> None:
+    # Arrange
+    pool = PostgresConnectionPool(minconn=0, maxconn=3, checkout_timeout=5.0)
+    in_use, max_in_use, lock = [0], [0], threading.Lock()
+
+    def worker() -> None:
+        for _ in range(20):
+            db_connection = pool.getconn()
+            with lock:
+                in_use[0] += 1
+                max_in_use[0] = max(max_in_use[0], in_use[0])
+            time.sleep(0.001)
+            with lock:
+                in_use[0] -= 1
+            pool.putconn(db_connection)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert max_in_use[0] <= 3, f"expected at most 3 connections in use but got {max_in_use[0]}"
+    assert mock_connect.call_count <= 3, f"expected at most 3 connections to be opened but got {mock_connect.call_count}"
+    assert pool.stats()["in_use"] == 0, f"expected every connection to be returned but got {pool.stats()}"
@@ -0,0 +1,11 @@
+import pytest
+from src.vector_db.menu_repository import MenuRepository
+
+
+@pytest.fixture(autouse=True)
+def reset_menu_repository(
+
+) -> None:
+    MenuRepository._MenuRepository__instance = None
+    yield
+    MenuRepository._MenuRepository__instance = None
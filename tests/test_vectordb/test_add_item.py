@@ -10,11 +10,13 @@ def mock_components(
         mocker
 ) -> dict:
     return {
-        'openai_embedding_api': mocker.patch('src.vector_db.add_item.openai_embedding_api'),
+        'openai_embedding_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api'),
+        'openai_embedding_batch_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api'),
         'connection_string': mocker.patch('src.vector_db.aws_database_auth.connection_string'),
         'register_vector': mocker.patch('pgvector.psycopg2.register_vector'),
-        'connect': mocker.patch('src.vector_db.add_item.psycopg2.connect'),
+        'connection_pool': mocker.patch('src.vector_db.menu_repository.PostgresConnectionPool'),
         'input': mocker.patch('builtins.input'),
+        'execute_values': mocker.patch('src.vector_db.sync_menu.psycopg2.extras.execute_values'),
     }
 
 
@@ -48,7 +50,8 @@ def test_add_item_returns_true_if_valid_item_given(
     aws_info = [
         ["secret_name", "region_name", "aws_access_key_id", "aws_secret_access_key"],
         ["name", "us-east-1", "aws_access_key_id", "aws_secret_access_key"]]
-
+    db_connection = mock_components['connection_pool'].return_value.getconn.return_value
+    db_connection.cursor.return_value.fetchone.return_value = (2,)
 
     # Act
     result = add_item(data, key, as_csv_file(aws_info), as_csv_file(database_info))
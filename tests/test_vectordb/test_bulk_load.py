@@ -0,0 +1,100 @@
+import struct
+import numpy as np
+import pytest
+from mock import MagicMock
+from pgvector.utils import to_db_binary
+from src.vector_db.bulk_load import (
+    COPY_SIGNATURE, bulk_load, copy_buffer, embedded_batches, encode_calorie_range, encode_int4, encode_text,
+    encode_vector
+)
+
+
+@pytest.fixture
+def mock_batch_api(
+        mocker
+) -> MagicMock:
+    return mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api',
+                        side_effect=lambda texts, _: [[float(len(text))] for text in texts])
+
+
+def test_encode_vector_matches_pgvector_binary_format(
+
+) -> None:
+    # Arrange
+    embedding = [0.1, 0.2, 0.3]
+
+    # Act
+    encoded = encode_vector(embedding)
+
+    # Assert
+    assert encoded == to_db_binary(np.array(embedding, dtype=np.float32)), \
+        f"expected pgvector binary format but got {encoded}"
+
+
+def test_encode_calorie_range_writes_composite_of_two_ints(
+
+) -> None:
+    # Arrange
+    expected = struct.pack('>i', 2) + struct.pack('>iii', 23, 4, 60) + struct.pack('>iii', 23, 4, 120)
+
+    # Act
+    encoded = encode_calorie_range((60, 120))
+
+    # Assert
+    assert encoded == expected, f"expected {expected} but got {encoded}"
+
+
+def test_copy_buffer_writes_header_rows_nulls_and_trailer(
+
+) -> None:
+    # Arrange
+    rows = [("latte", 5), ("mocha", None)]
+
+    # Act
+    data = copy_buffer(rows, [encode_text, encode_int4]).read()
+
+    # Assert
+    expected = COPY_SIGNATURE + struct.pack('>ii', 0, 0) + \
+        struct.pack('>hi', 2, 5) + b'latte' + struct.pack('>i', 4) + struct.pack('>i', 5) + \
+        struct.pack('>hi', 2, 5) + b'mocha' + struct.pack('>i', -1) + \
+        struct.pack('>h', -1)
+    assert data == expected, f"expected {expected} but got {data}"
+
+
+def test_embedded_batches_yields_batches_in_order(
+        mock_batch_api
+) -> None:
+    # Arrange
+    rows = [("a",), ("bb",), ("ccc",), ("dddd",), ("eeeee",)]
+    texts = [row[0] for row in rows]
+
+    # Act
+    batches = list(embedded_batches(rows, texts, "test_key", batch_size=2, max_workers=2))
+
+    # Assert
+    assert [batch for batch, _ in batches] == [rows[0:2], rows[2:4], rows[4:]], \
+        f"expected rows to keep their order but got {batches}"
+    assert [embeddings for _, embeddings in batches] == [[[1.0], [2.0]], [[3.0], [4.0]], [[5.0]]], \
+        f"expected embeddings to line up with their rows but got {batches}"
+    assert mock_batch_api.call_count == 3, f"expected 3 embedding requests but got {mock_batch_api.call_count}"
+
+
+def test_bulk_load_copies_and_commits_every_batch(
+        mock_batch_api
+) -> None:
+    # Arrange
+    mock_connection = MagicMock()
+    rows = [("latte",), ("mocha",), ("glazed donut",)]
+
+    # Act
+    loaded = bulk_load(mock_connection, "products", ["item_name", "embeddings"], [encode_text, encode_vector],
+                       rows, [row[0] for row in rows], batch_size=2)
+
+    # Assert
+    mock_cursor = mock_connection.cursor.return_value
+    assert loaded == 3, f"expected 3 rows to be loaded but got {loaded}"
+    assert mock_cursor.copy_expert.call_count == 2, f"expected one COPY per batch but got {mock_cursor.copy_expert.call_count}"
+    assert mock_connection.commit.call_count == 2, f"expected one commit per batch but got {mock_connection.commit.call_count}"
+    assert mock_cursor.copy_expert.call_args[0][0] == \
+        "COPY products (item_name, embeddings) FROM STDIN WITH (FORMAT binary)", \
+        f"expected binary COPY but got {mock_cursor.copy_expert.call_args[0][0]}"
@@ -0,0 +1,289 @@
+import os
+import asyncio
+import pytest
+import numpy as np
+from mock import MagicMock, AsyncMock, patch
+from src.vector_db.compact_embeddings import (
+    CompactEmbeddings, EmbeddingProjection, compact_embeddings, reset_compact_embeddings
+)
+from src.vector_db.benchmark_compact_embeddings import benchmark_compact_embeddings
+
+
+@pytest.fixture
+def embeddings(
+
+) -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(20, 1536)).astype(np.float32)
+
+
+def test_projection_keeps_the_nearest_row_of_every_query(
+        embeddings
+) -> None:
+    # Arrange
+    queries = embeddings[:5] + np.random.default_rng(1).normal(scale=0.1, size=(5, 1536)).astype(np.float32)
+    projection = EmbeddingProjection.fit(embeddings, 32)
+
+    # Act
+    projected = projection.project(embeddings)
+    nearest = [int(np.argmin(np.linalg.norm(projected - projection.project(query), axis=1))) for query in queries]
+
+    # Assert
+    assert projected.shape == (20, 32), f"expected 20 rows of 32 dimensions but got {projected.shape}"
+    assert nearest == [0, 1, 2, 3, 4], f"expected the nearest rows to be kept but got {nearest}"
+
+
+def test_projection_round_trips_through_bytes(
+        embeddings
+) -> None:
+    # Arrange
+    projection = EmbeddingProjection.fit(embeddings, 8)
+
+    # Act
+    loaded = EmbeddingProjection.from_bytes(*projection.to_bytes())
+
+    # Assert
+    assert np.array_equal(loaded.project(embeddings), projection.project(embeddings)), \
+        "expected the loaded projection to project like the fitted one"
+
+
+def test_encode_binary_keeps_the_sign_of_every_dimension(
+
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(precision="binary")
+    embedding = np.tile([0.5, -0.25, 0.0, 1.0], 384)
+
+    # Act
+    encoded = storage.encode(embedding)
+
+    # Assert
+    assert encoded == "1001" * 384, f"expected 1001 repeated but got {encoded[:8]}"
+    assert storage.column_type() == "bit(1536)", f"expected bit(1536) but got {storage.column_type()}"
+
+
+def test_encode_raises_without_projection_when_dimensions_are_reduced(
+
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(dimensions=64, precision="float16")
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        storage.encode(np.zeros(1536))
+
+
+def test_nearest_sql_reranks_candidates_with_full_precision(
+
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(dimensions=64, precision="float16", rerank=10)
+
+    # Act
+    sql = storage.nearest_sql("products", "id, item_name", 3)
+
+    # Assert
+    assert sql == "SELECT id, item_name FROM (SELECT id, item_name, embeddings FROM products " \
+                  "ORDER BY embeddings_compact <-> %s::halfvec(64) LIMIT 10) AS candidates " \
+                  "ORDER BY embeddings <-> %s LIMIT 3;", f"expected reranking query but got {sql}"
+
+
+def test_nearest_sql_searches_binary_column_by_hamming_distance(
+
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(precision="binary")
+
+    # Act
+    sql = storage.nearest_sql("deals", "deal")
+
+    # Assert
+    assert sql == "SELECT deal FROM deals ORDER BY embeddings_compact <~> %s::bit(1536) LIMIT 1;", \
+        f"expected hamming distance query but got {sql}"
+
+
+def test_compact_embeddings_is_off_by_default_and_read_from_environment(
+
+) -> None:
+    # Arrange
+    environment = {"EMBEDDING_DIMENSIONS": "128", "EMBEDDING_PRECISION": "FLOAT16", "EMBEDDING_RERANK": "5"}
+
+    # Act
+    with patch.dict(os.environ, {}, clear=True):
+        default = compact_embeddings()
+    with patch.dict(os.environ, environment):
+        configured = compact_embeddings()
+
+    # Assert
+    assert default is None, f"expected the full precision column by default but got {default}"
+    assert repr(configured) == "halfvec(128) rerank 5", f"expected halfvec(128) rerank 5 but got {configured!r}"
+
+
+def test_compact_embeddings_raises_for_unknown_precision(
+
+) -> None:
+    # Arrange
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        compact_embeddings(precision="int8")
+
+
+def test_migrate_re_encodes_every_row_and_indexes_the_compact_column(
+        mocker, embeddings
+) -> None:
+    # Arrange
+    mock_execute_values = mocker.patch('src.vector_db.compact_embeddings.psycopg2.extras.execute_values')
+    mock_connection = MagicMock()
+    mock_cursor = mock_connection.cursor.return_value
+    mock_cursor.fetchall.return_value = [(row_id, embedding) for row_id, embedding in enumerate(embeddings)]
+    storage = CompactEmbeddings(dimensions=16, precision="float16")
+
+    # Act
+    rows = storage.migrate(mock_connection, "products")
+
+    # Assert
+    executed = [call.args[0] for call in mock_cursor.execute.call_args_list]
+    values = mock_execute_values.call_args.args[2]
+    assert rows == 20, f"expected 20 rows but got {rows}"
+    assert len(values) == 20 and values[0][1].count(",") == 15, \
+        f"expected 20 rows of 16 dimensions but got {values[:1]}"
+    assert "ALTER TABLE products ADD COLUMN embeddings_compact halfvec(16);" in executed, \
+        f"expected the compact column to be added but got {executed}"
+    assert any("halfvec_l2_ops" in sql for sql in executed), f"expected a halfvec index but got {executed}"
+    assert storage.projection(mock_cursor, "products").dimensions == 16, \
+        "expected the fitted projection to be kept"
+    mock_connection.commit.assert_not_called()
+
+
+def test_benchmark_compact_embeddings_reports_top1_agreement(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch('src.vector_db.benchmark_compact_embeddings.register_vector')
+    mock_connection = MagicMock()
+    mock_connection.cursor.return_value.fetchone.side_effect = [
+        (2,),  # rows
+        (1,), (2,),  # exact search
+        (1,), (2,), (4096, 24000),  # full precision index
+        (4096, 600)  # compact column
+    ]
+    storage = MagicMock()
+    storage.nearest.side_effect = [[(1,)], [(3,)]]
+    storage.__repr__ = lambda _: "bit(1536)"
+    queries = [np.zeros(1536), np.ones(1536)]
+
+    # Act
+    reports = benchmark_compact_embeddings(mock_connection, "products", queries, [storage])
+
+    # Assert
+    assert [report["storage"] for report in reports] == ["vector(1536)", "bit(1536)"], \
+        f"expected full precision and binary reports but got {reports}"
+    assert reports[0]["top1_agreement"] == 1.0 and reports[1]["top1_agreement"] == 0.5, \
+        f"expected top-1 agreement of 1.0 and 0.5 but got {reports}"
+    assert reports[1]["column_bytes"] == 600, f"expected 600 column bytes but got {reports[1]}"
+    mock_connection.rollback.assert_called_once()
+
+
+def test_compact_embeddings_takes_the_full_dimensions_from_the_embedding_provider(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch('src.vector_db.compact_embeddings.embedding_provider').return_value.dimensions = 5120
+    reset_compact_embeddings()
+
+    # Act
+    with patch.dict(os.environ, {"EMBEDDING_PRECISION": "binary"}, clear=True):
+        storage = compact_embeddings()
+        shared = compact_embeddings()
+    reset_compact_embeddings()
+
+    # Assert
+    assert storage.column_type() == "bit(5120)", f"expected bit(5120) but got {storage.column_type()}"
+    assert storage is shared, "expected the storage to be created once per configuration"
+    assert storage.projection(MagicMock(), "products") is None, "expected no projection for every dimension"
+    with pytest.raises(ValueError):
+        CompactEmbeddings(dimensions=6000)
+
+
+def test_async_nearest_loads_the_projection_and_reranks_with_asyncpg_placeholders(
+        embeddings
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(dimensions=8, precision="float16", rerank=5, full_dimensions=1536)
+    mean, components = EmbeddingProjection.fit(embeddings, 8).to_bytes()
+    mock_connection = AsyncMock()
+    mock_connection.fetchrow.return_value = (mean, components, "fingerprint")
+    mock_connection.fetch.return_value = [(3, 'latte')]
+
+    # Act
+    rows = asyncio.run(storage.async_nearest(mock_connection, "products", "id, item_name", embeddings[3]))
+    asyncio.run(storage.async_nearest(mock_connection, "products", "id, item_name", embeddings[3]))
+
+    # Assert
+    sql, compact, full = mock_connection.fetch.call_args.args
+    assert rows == [(3, 'latte')], f"expected the fetched rows but got {rows}"
+    assert "$1::text::halfvec(8)" in sql and "embeddings <-> $2" in sql, f"expected asyncpg placeholders but got {sql}"
+    assert compact.count(",") == 7 and len(full) == 1536, \
+        f"expected 8 compact and 1536 full dimensions but got {compact}"
+    mock_connection.fetchrow.assert_awaited_once()
+
+
+def test_projection_is_reloaded_when_its_fingerprint_changes(
+        embeddings
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(dimensions=8, full_dimensions=1536, refresh_interval=0)
+    first, second = EmbeddingProjection.fit(embeddings, 8), EmbeddingProjection.fit(embeddings[:10], 8)
+    mock_cursor = MagicMock()
+    mock_cursor.fetchone.side_effect = [
+        first.to_bytes() + ("first",),  # load
+        ("first",),  # unchanged
+        ("second",), second.to_bytes() + ("second",)  # migrated by another process
+    ]
+
+    # Act
+    loaded = storage.projection(mock_cursor, "products")
+    unchanged = storage.projection(mock_cursor, "products")
+    reloaded = storage.projection(mock_cursor, "products")
+
+    # Assert
+    assert unchanged is loaded, "expected the projection to be kept while its fingerprint is the same"
+    assert np.array_equal(reloaded.mean, second.mean), "expected the projection of the new migration"
+    assert mock_cursor.execute.call_count == 4, \
+        f"expected 2 loads and 2 checks but got {mock_cursor.execute.call_args_list}"
+
+
+def test_projection_is_not_checked_within_the_refresh_interval(
+        embeddings
+) -> None:
+    # Arrange
+    storage = CompactEmbeddings(dimensions=8, full_dimensions=1536)
+    mock_cursor = MagicMock()
+    mock_cursor.fetchone.return_value = EmbeddingProjection.fit(embeddings, 8).to_bytes() + ("fingerprint",)
+
+    # Act
+    loaded = storage.projection(mock_cursor, "products")
+    cached = storage.projection(mock_cursor, "products")
+
+    # Assert
+    assert cached is loaded, "expected the loaded projection"
+    mock_cursor.execute.assert_called_once()
+
+
+def test_encode_table_commits_the_migration_and_restores_autocommit(
+        mocker, embeddings
+) -> None:
+    # Arrange
+    mocker.patch('src.vector_db.compact_embeddings.psycopg2.extras.execute_values')
+    mock_connection = MagicMock()
+    mock_connection.cursor.return_value.fetchall.return_value = list(enumerate(embeddings))
+    storage = CompactEmbeddings(dimensions=16, precision="float16", full_dimensions=1536)
+
+    # Act
+    rows = storage.encode_table(mock_connection, "deals")
+
+    # Assert
+    assert rows == 20, f"expected 20 rows but got {rows}"
+    mock_connection.commit.assert_called_once()
+    assert mock_connection.set_session.call_args_list[-1].kwargs == {"autocommit": True}, \
+        f"expected the connection back in autocommit mode but got {mock_connection.set_session.call_args_list}"
@@ -1,21 +1,24 @@
-import json
+import os
 import pytest
 from mock import MagicMock
 from io import StringIO
 import csv
 from src.vector_db.contain_item import contains_quantity
+from src.vector_db.embedding_cache import EmbeddingCache, set_cached_embedding
+from src.ai_integration.embedding_provider import reset_embedding_providers
 
 
 @pytest.fixture
 def mock_components(
         mocker
 ) -> dict:
-    mock_db_instance = mocker.patch('src.vector_db.contain_item.psycopg2.connect')
-    mock_db_instance.return_value.cursor.return_value.fetchall.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+    mock_pool = mocker.patch('src.vector_db.menu_repository.PostgresConnectionPool')
+    mock_pool.return_value.getconn.return_value.cursor.return_value.fetchall.return_value = \
+        [(7, 'test', 6, 'test', '(60,120)', 10.0)]
     key = "foo-key"
 
     return {
-        'openai_embedding_api': mocker.patch('src.vector_db.contain_item.openai_embedding_api'),
+        'openai_embedding_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api'),
         'connection_string': mocker.patch('src.vector_db.aws_database_auth.connection_string'),
         'api_key': mocker.patch('os.environ', dict({
             'OPENAI_API_KEY': key
@@ -61,6 +64,28 @@ def test_contains_quantity_returns_true_when_given_quantity_less_than_stock(
     assert res == expected_res, f"expected search to return {expected_res} but got {res}"
 
 
+def test_contains_quantity_uses_embedding_cache_instead_of_openai(
+        mocker, mock_boto3_session_client, mock_components
+) -> None:
+    # Arrange
+    embedding_cache = EmbeddingCache()
+    set_cached_embedding(embedding_cache, "test", [0.1, 0.2, 0.3])
+    database_info = [
+        ["dbname", "user", "password", "host", "port"],
+        ["mydb", "myuser", "mypassword", "localhost", "port"]]
+    aws_info = [
+        ["secret_name", "region_name", "aws_access_key_id", "aws_secret_access_key"],
+        ["name", "us-east-1", "aws_access_key_id", "aws_secret_access_key"]]
+
+    # Act
+    res = contains_quantity("test", aws_csv_file=as_csv_file(aws_info), database_csv_file=as_csv_file(database_info),
+                            embedding_cache=embedding_cache)
+
+    # Assert
+    assert res == '[true, 6]', f"expected search to return [true, 6] but got {res}"
+    mock_components['openai_embedding_api'].assert_not_called()
+
+
 def test_contains_quantity_returns_false_when_given_quantity_greater_than_stock(
         mocker, mock_boto3_session_client, mock_components
 ) -> None:
@@ -97,3 +122,59 @@ def test_get_item_returns_false_when_given_invalid_params(
 
     # Assert
     assert res == expected_res, f"expected {expected_res} but got {res}"
+
+
+def test_contains_quantity_checks_inventory_without_embedding_or_query(
+        mocker, mock_boto3_session_client, mock_components
+) -> None:
+    # Arrange
+    mock_inventory = MagicMock()
+    mock_inventory.check.return_value = (7, 2)
+    mock_repository = MagicMock()
+
+    # Act
+    res = contains_quantity("glazed donuts", quantity=3, repository=mock_repository, inventory=mock_inventory)
+
+    # Assert
+    assert res == '[false, 2]', f"expected the redis stock to be used but got {res}"
+    mock_inventory.check.assert_called_once_with("glazed donuts")
+    mock_repository.nearest_product.assert_not_called()
+    mock_components['openai_embedding_api'].assert_not_called()
+
+
+def test_contains_quantity_reads_inventory_of_the_nearest_product_for_unknown_names(
+        mocker, mock_boto3_session_client, mock_components
+) -> None:
+    # Arrange
+    mock_inventory = MagicMock()
+    mock_inventory.check.return_value = None
+    mock_inventory.available.return_value = 1
+    mock_repository = MagicMock()
+    mock_repository.nearest_product.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+
+    # Act
+    res = contains_quantity("something sweet", repository=mock_repository, inventory=mock_inventory)
+
+    # Assert
+    assert res == '[true, 1]', f"expected the redis stock of the nearest product but got {res}"
+    mock_inventory.available.assert_called_once_with(7)
+
+
+def test_contains_quantity_skips_the_cache_for_local_providers(
+        mocker, mock_boto3_session_client, mock_components
+) -> None:
+    # Arrange
+    reset_embedding_providers()
+    mocker.patch.dict(os.environ, {"EMBEDDING_PROVIDER": "ngram"})
+    embedding_cache = MagicMock()
+    mock_repository = MagicMock()
+    mock_repository.nearest_product.return_value = [(7, 'latte', 6, 'lactose', '(60,120)', 5.0)]
+
+    # Act
+    res = contains_quantity("latte", repository=mock_repository, embedding_cache=embedding_cache)
+    reset_embedding_providers()
+
+    # Assert
+    assert res == '[true, 6]', f"expected search to return [true, 6] but got {res}"
+    embedding_cache.get.assert_not_called()
+    embedding_cache.set.assert_not_called()
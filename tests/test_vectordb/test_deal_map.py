@@ -0,0 +1,98 @@
+import pytest
+from mock import MagicMock
+from src.vector_db.deal_map import DealMap
+from src.vector_db.menu_aliases import MenuAliases
+
+
+@pytest.fixture
+def mock_connection_pool(
+
+) -> MagicMock:
+    rows = [
+        ('glazed donut', 'two glazed donuts for $3', 'BakeryItem', 'glazed donut', 2, 3.0),
+        ('black coffee', 'coffee and a muffin for $4', 'BakeryItem', 'blueberry muffin', 1, 4.0),
+    ]
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.side_effect = lambda: rows if 'LATERAL' in mock_cursor.execute.call_args[0][0] \
+        else [('products fingerprint', 'deals fingerprint')]
+    mock_pool = MagicMock()
+    mock_pool.getconn.return_value.cursor.return_value = mock_cursor
+
+    return mock_pool
+
+
+def test_lookup_returns_precomputed_deal_for_product(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    deal_map = DealMap(mock_connection_pool)
+    expected_deal = ('coffee and a muffin for $4', 'BakeryItem', 'blueberry muffin', 1, 4.0)
+
+    # Act
+    deal = deal_map.lookup("black coffee")
+
+    # Assert
+    assert deal == expected_deal, f"expected {expected_deal} but got {deal}"
+
+
+def test_lookup_resolves_aliases_of_a_product(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    aliases = MenuAliases(menu=[{"MenuItem": {"item_name": "Black Coffee"}}], vocabulary=[])
+    deal_map = DealMap(mock_connection_pool, aliases=aliases)
+
+    # Act
+    plural = deal_map.lookup("Glazed Doughnuts")
+    synonym = deal_map.lookup("coffee")
+    unknown = deal_map.lookup("cappuccino")
+
+    # Assert
+    assert plural[0] == 'two glazed donuts for $3', f"expected glazed donut deal but got {plural}"
+    assert synonym[0] == 'coffee and a muffin for $4', f"expected black coffee deal but got {synonym}"
+    assert unknown is None, f"expected no deal for a product that isn't on the menu but got {unknown}"
+
+
+def test_deal_map_is_built_once_within_refresh_interval(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    deal_map = DealMap(mock_connection_pool, refresh_interval=60)
+
+    # Act
+    deal_map.lookup("black coffee")
+    deal_map.lookup("glazed donut")
+
+    # Assert
+    assert mock_connection_pool.getconn.call_count == 2, \
+        f"expected a fingerprint and a load query but got {mock_connection_pool.getconn.call_count}"
+
+
+def test_deal_map_rebuilds_when_a_table_is_refilled(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    deal_map = DealMap(mock_connection_pool, refresh_interval=0)
+    deal_map.lookup("black coffee")
+    mock_cursor = mock_connection_pool.getconn.return_value.cursor.return_value
+    mock_cursor.fetchall.side_effect = [[('products fingerprint', 'refilled deals fingerprint')],
+                                        [('black coffee', 'new deal', 'CoffeeItem', 'latte', 1, 5.0)]]
+
+    # Act
+    deal = deal_map.lookup("black coffee")
+
+    # Assert
+    assert deal[0] == 'new deal', f"expected the rebuilt deal but got {deal}"
+
+
+def test_lookup_resolves_aliases_of_the_products_loaded_from_the_table(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    deal_map = DealMap(mock_connection_pool)
+
+    # Act
+    deal = deal_map.lookup("coffee")
+
+    # Assert
+    assert deal[0] == 'coffee and a muffin for $4', f"expected the black coffee deal but got {deal}"
@@ -0,0 +1,225 @@
+import asyncio
+import numpy as np
+import pytest
+from mock import MagicMock, AsyncMock
+from src.vector_db.embedding_cache import (
+    EmbeddingCache, cache_key, encode_embedding, decode_embedding, get_cached_embedding, get_cached_embeddings,
+    set_cached_embedding, set_cached_embeddings, async_get_cached_embedding, async_set_cached_embedding,
+    provider_cache
+)
+
+
+@pytest.fixture
+def mock_redis(
+
+) -> MagicMock:
+    return MagicMock()
+
+
+def test_encode_embedding_stores_four_bytes_per_dimension(
+
+) -> None:
+    # Arrange
+    embedding = [0.1] * 1536
+
+    # Act
+    raw = encode_embedding(embedding)
+
+    # Assert
+    assert len(raw) == 1536 * 4, f"expected 6144 bytes but got {len(raw)}"
+
+
+def test_decode_embedding_round_trips_without_copying(
+
+) -> None:
+    # Arrange
+    raw = encode_embedding([0.1, 0.2, 0.3])
+
+    # Act
+    embedding = decode_embedding(raw)
+
+    # Assert
+    assert np.allclose(embedding, [0.1, 0.2, 0.3]), f"expected [0.1, 0.2, 0.3] but got {embedding}"
+    assert embedding.dtype == np.float32, f"expected float32 but got {embedding.dtype}"
+    assert not embedding.flags.owndata, "expected array to be backed by the redis bytes"
+
+
+def test_cache_key_is_versioned_by_model_and_normalized_text(
+
+) -> None:
+    # Arrange
+
+    # Act
+    key = cache_key("  Glazed  Donuts ", model="test-model")
+
+    # Assert
+    assert key == "emb:v2:test-model:glazed donut", f"expected emb:v2:test-model:glazed donut but got {key}"
+
+
+def test_get_cached_embedding_uses_one_get(
+        mock_redis
+) -> None:
+    # Arrange
+    mock_redis.get.return_value = encode_embedding([0.1, 0.2, 0.3])
+
+    # Act
+    embedding = get_cached_embedding(mock_redis, "latte")
+
+    # Assert
+    assert np.allclose(embedding, [0.1, 0.2, 0.3]), f"expected [0.1, 0.2, 0.3] but got {embedding}"
+    mock_redis.get.assert_called_once_with(cache_key("latte"))
+    mock_redis.exists.assert_not_called()
+
+
+def test_get_cached_embedding_returns_none_on_cache_miss(
+        mock_redis
+) -> None:
+    # Arrange
+    mock_redis.get.return_value = None
+
+    # Act
+    embedding = get_cached_embedding(mock_redis, "latte")
+
+    # Assert
+    assert embedding is None, f"expected cache miss but got {embedding}"
+
+
+def test_get_cached_embeddings_uses_one_mget_for_batch(
+        mock_redis
+) -> None:
+    # Arrange
+    mock_redis.mget.return_value = [None, encode_embedding([0.4, 0.5, 0.6])]
+
+    # Act
+    embeddings = get_cached_embeddings(mock_redis, ["latte", "glazed donut"])
+
+    # Assert
+    assert embeddings[0] is None, f"expected cache miss for latte but got {embeddings[0]}"
+    assert np.allclose(embeddings[1], [0.4, 0.5, 0.6]), f"expected [0.4, 0.5, 0.6] but got {embeddings[1]}"
+    mock_redis.mget.assert_called_once_with([cache_key("latte"), cache_key("glazed donut")])
+
+
+def test_set_cached_embeddings_uses_one_mset(
+        mock_redis
+) -> None:
+    # Arrange
+    embeddings = {"latte": [0.1, 0.2, 0.3], "glazed donut": [0.4, 0.5, 0.6]}
+
+    # Act
+    set_cached_embeddings(mock_redis, embeddings)
+    set_cached_embedding(mock_redis, "mocha", [0.7, 0.8, 0.9])
+
+    # Assert
+    mock_redis.mset.assert_called_once_with({
+        cache_key("latte"): encode_embedding([0.1, 0.2, 0.3]),
+        cache_key("glazed donut"): encode_embedding([0.4, 0.5, 0.6])
+    })
+    mock_redis.set.assert_called_once_with(cache_key("mocha"), encode_embedding([0.7, 0.8, 0.9]))
+
+
+def test_embedding_cache_answers_hot_names_without_going_to_redis(
+        mock_redis
+) -> None:
+    # Arrange
+    mock_redis.mget.return_value = [encode_embedding([0.1, 0.2, 0.3])]
+    embedding_cache = EmbeddingCache(mock_redis)
+
+    # Act
+    get_cached_embedding(embedding_cache, "latte")
+    get_cached_embedding(embedding_cache, "Lattes")
+    embedding = get_cached_embedding(embedding_cache, " latte ")
+    stats = embedding_cache.stats()
+
+    # Assert
+    assert np.allclose(embedding, [0.1, 0.2, 0.3]), f"expected [0.1, 0.2, 0.3] but got {embedding}"
+    assert mock_redis.mget.call_count == 1, f"expected redis to be read once but got {mock_redis.mget.call_count}"
+    assert stats["hits"] == 2 and stats["redis_hits"] == 1, f"expected 2 hits and 1 redis hit but got {stats}"
+
+
+def test_embedding_cache_writes_through_to_redis(
+        mock_redis
+) -> None:
+    # Arrange
+    embedding_cache = EmbeddingCache(mock_redis)
+
+    # Act
+    set_cached_embeddings(embedding_cache, {"latte": [0.1, 0.2, 0.3]})
+    embedding = get_cached_embedding(embedding_cache, "latte")
+
+    # Assert
+    mock_redis.mset.assert_called_once_with({cache_key("latte"): encode_embedding([0.1, 0.2, 0.3])})
+    mock_redis.mget.assert_not_called()
+    assert np.allclose(embedding, [0.1, 0.2, 0.3]), f"expected [0.1, 0.2, 0.3] but got {embedding}"
+
+
+def test_embedding_cache_evicts_least_recently_used_name(
+
+) -> None:
+    # Arrange
+    embedding_cache = EmbeddingCache(max_size=2)
+    set_cached_embedding(embedding_cache, "latte", [0.1])
+    set_cached_embedding(embedding_cache, "mocha", [0.2])
+    get_cached_embedding(embedding_cache, "latte")
+
+    # Act
+    set_cached_embedding(embedding_cache, "cappuccino", [0.3])
+    mocha = get_cached_embedding(embedding_cache, "mocha")
+    latte = get_cached_embedding(embedding_cache, "latte")
+    stats = embedding_cache.stats()
+
+    # Assert
+    assert mocha is None, f"expected mocha to be evicted but got {mocha}"
+    assert latte is not None, "expected recently used latte to stay cached"
+    assert stats["evictions"] == 1 and stats["size"] == 2, f"expected one eviction but got {stats}"
+
+
+def test_embedding_cache_expires_entries_after_ttl(
+        mocker
+) -> None:
+    # Arrange
+    mock_monotonic = mocker.patch('src.vector_db.embedding_cache.time.monotonic', return_value=100.0)
+    embedding_cache = EmbeddingCache(ttl=10.0)
+    set_cached_embedding(embedding_cache, "latte", [0.1])
+    mock_monotonic.return_value = 111.0
+
+    # Act
+    embedding = get_cached_embedding(embedding_cache, "latte")
+
+    # Assert
+    assert embedding is None, f"expected latte to have expired but got {embedding}"
+    assert embedding_cache.stats()["expirations"] == 1, f"expected one expiration but got {embedding_cache.stats()}"
+
+
+def test_async_cached_embedding_round_trips_through_async_redis(
+
+) -> None:
+    # Arrange
+    mock_async_redis = AsyncMock()
+    stored = {}
+    mock_async_redis.set.side_effect = lambda key, value: stored.update({key: value})
+    mock_async_redis.get.side_effect = stored.get
+
+    # Act
+    asyncio.run(async_set_cached_embedding(mock_async_redis, "Lattes", [0.1, 0.2, 0.3]))
+    embedding = asyncio.run(async_get_cached_embedding(mock_async_redis, "latte"))
+
+    # Assert
+    assert np.allclose(embedding, [0.1, 0.2, 0.3]), f"expected [0.1, 0.2, 0.3] but got {embedding}"
+    assert list(stored) == [cache_key("latte")], f"expected one normalized key but got {list(stored)}"
+
+
+def test_provider_cache_keys_by_the_model_and_skips_local_providers(
+        mock_redis
+) -> None:
+    # Arrange
+    remote = MagicMock(remote=True, model="text-embedding-ada-002")
+    local = MagicMock(remote=False, model="char-ngram-256")
+
+    # Act
+    remote_cache = provider_cache(mock_redis, remote)
+    local_cache = provider_cache(mock_redis, local)
+
+    # Assert
+    assert remote_cache == (mock_redis, "text-embedding-ada-002"), \
+        f"expected the cache and model but got {remote_cache}"
+    assert local_cache == (None, "char-ngram-256"), f"expected no cache for a local provider but got {local_cache}"
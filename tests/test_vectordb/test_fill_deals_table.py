@@ -10,10 +10,10 @@ def mock_components(
         mocker
 ) -> dict:
     return {
-        'openai_embedding_api': mocker.patch('src.vector_db.fill_deals_table.openai_embedding_api'),
+        'openai_embedding_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api'),
         'connection_string': mocker.patch('src.vector_db.aws_database_auth.connection_string'),
         'register_vector': mocker.patch('pgvector.psycopg2.register_vector'),
-        'connect': mocker.patch('src.vector_db.fill_deals_table.psycopg2.connect'),
+        'connect': mocker.patch('src.vector_db.menu_repository.psycopg2.connect'),
         'input': mocker.patch('builtins.input'),
     }
 
@@ -2,7 +2,8 @@ import csv
 import pytest
 from io import StringIO
 from mock import patch, MagicMock
-from src.vector_db.fill_products_table import fill_products_table
+from src.vector_db.fill_products_table import fill_products_table, bulk_fill_products_table
+from src.vector_db.sync_menu import embedding_hash, content_hash
 
 
 @pytest.fixture
@@ -10,10 +11,10 @@ def mock_components(
         mocker
 ) -> dict:
     return {
-        'openai_embedding_api': mocker.patch('src.vector_db.fill_products_table.openai_embedding_api'),
+        'openai_embedding_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api'),
         'connection_string': mocker.patch('src.vector_db.aws_database_auth.connection_string'),
         'register_vector': mocker.patch('pgvector.psycopg2.register_vector'),
-        'connect': mocker.patch('src.vector_db.fill_products_table.psycopg2.connect'),
+        'connect': mocker.patch('src.vector_db.menu_repository.psycopg2.connect'),
         'input': mocker.patch('builtins.input'),
     }
 
@@ -114,3 +115,61 @@ def test_fill_products_table_exits_when_no_entered(
 
     # Assert
     assert result is False, f"expect False but got {result}"
+
+
+def test_bulk_fill_products_table_resumes_by_skipping_loaded_items(
+        mocker, mock_components, mock_boto3_session_client
+) -> None:
+    # Arrange
+    mock_bulk_load = mocker.patch('src.vector_db.fill_products_table.bulk_load')
+    mocker.patch('src.vector_db.fill_products_table.register_vector')
+    mock_components['connect'].return_value.cursor.return_value.fetchall.return_value = [("black coffee",)]
+    data = [
+        {"MenuItem": {"item_name": "Black Coffee", "item_quantity": 5, "common_allergin": "none",
+                      "num_calories": (2, 10), "price": 2.0}},
+        {"MenuItem": {"item_name": "Latte", "item_quantity": 5, "common_allergin": "Lactose",
+                      "num_calories": (120, 180), "price": 5.0}}
+    ]
+    database_info = [
+        ["dbname", "user", "password", "host", "port"],
+        ["mydb", "myuser", "mypassword", "localhost", "port"]]
+    aws_info = [
+        ["secret_name", "region_name", "aws_access_key_id", "aws_secret_access_key"],
+        ["name", "us-east-1", "aws_access_key_id", "aws_secret_access_key"]]
+
+    # Act
+    result = bulk_fill_products_table(data, "mock_api_key", as_csv_file(aws_info), as_csv_file(database_info))
+
+    # Assert
+    rows, texts = mock_bulk_load.call_args[0][4], mock_bulk_load.call_args[0][5]
+    assert result is True, f"expect True but got {result}"
+    assert [row[:5] for row in rows] == [("latte", 5, "lactose", (120, 180), 5.0)], \
+        f"expected only latte to be loaded but got {rows}"
+    assert rows[0][5:] == (embedding_hash("latte", "text-embedding-ada-002"), content_hash(rows[0][:5])), \
+        f"expected the row to be loaded with its hashes but got {rows[0][5:]}"
+    assert texts == ["latte"], f"expected only latte to be embedded but got {texts}"
+    mock_components['input'].assert_not_called()
+
+
+def test_bulk_fill_products_table_encodes_the_compact_column_when_configured(
+        mocker, mock_components, mock_boto3_session_client
+) -> None:
+    # Arrange
+    mocker.patch('src.vector_db.fill_products_table.bulk_load')
+    mocker.patch('src.vector_db.fill_products_table.register_vector')
+    mock_storage = mocker.patch('src.vector_db.menu_repository.MenuRepository.storage').return_value
+    database_info = [
+        ["dbname", "user", "password", "host", "port"],
+        ["mydb", "myuser", "mypassword", "localhost", "port"]]
+    aws_info = [
+        ["secret_name", "region_name", "aws_access_key_id", "aws_secret_access_key"],
+        ["name", "us-east-1", "aws_access_key_id", "aws_secret_access_key"]]
+
+    # Act
+    result = bulk_fill_products_table([], "mock_api_key", as_csv_file(aws_info), as_csv_file(database_info))
+
+    # Assert
+    assert result is True, f"expect True but got {result}"
+    mock_storage.encode_table.assert_called_once()
+    assert mock_storage.encode_table.call_args.args[1] == "products", \
+        f"expected the products table to be encoded but got {mock_storage.encode_table.call_args}"
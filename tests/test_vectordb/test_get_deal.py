@@ -1,17 +1,20 @@
 import csv
-import json
 import queue
+import asyncio
 import pytest
+import psycopg2.errors
 from io import StringIO
-from mock import MagicMock, patch
-from src.vector_db.get_deal import get_deal
+from mock import MagicMock, AsyncMock, patch
+from src.vector_db.embedding_cache import encode_embedding
+from src.vector_db.get_deal import get_deal, async_get_deal
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
 
 
 @pytest.fixture
 def mock_components(
         mocker
 ) -> dict:
-    mock_embedding_api = mocker.patch('src.vector_db.get_deal.openai_embedding_api')
+    mock_embedding_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api')
     mock_embedding_api.return_value = [0.1, 0.2, 0.3]
 
     return {
@@ -68,8 +71,7 @@ def test_get_deal_returns_true_when_successfully_found_closest_item_and_adds_to_
     # Arrange
     mock_redis = mocker.Mock()
     mock_redis.set = MagicMock()
-    mock_redis.exists = MagicMock(return_value=False)
-    mock_redis.get = MagicMock(return_value=json.dumps([0.1, 0.2, 0.3]))
+    mock_redis.get = MagicMock(return_value=None)
     order = {
         "CoffeeItem": {
             "cart_action": "add",
@@ -94,8 +96,7 @@ def test_get_deal_returns_true_when_successfully_found_closest_item_and_cache_hi
     # Arrange
     mock_redis = mocker.Mock()
     mock_redis.set = MagicMock()
-    mock_redis.exists = MagicMock(return_value=True)
-    mock_redis.get = MagicMock(return_value=json.dumps([0.1, 0.2, 0.3]))
+    mock_redis.get = MagicMock(return_value=encode_embedding([0.1, 0.2, 0.3]))
     order = {
         "CoffeeItem": {
             "cart_action": "add",
@@ -160,8 +161,7 @@ def test_get_deal_returns_true_when_successfully_found_closest_item_using_embedd
     # Arrange
     mock_redis = mocker.Mock()
     mock_redis.set = MagicMock()
-    mock_redis.exists = MagicMock(return_value=True)
-    mock_redis.get = MagicMock(return_value=json.dumps([0.1, 0.2, 0.3]))
+    mock_redis.get = MagicMock(return_value=encode_embedding([0.1, 0.2, 0.3]))
 
     order = {
         "CoffeeItem": {
@@ -222,3 +222,130 @@ def test_get_deal_throws_correct_exception_when_queue_empty(
     # Assertions
     assert error_message == "Error, return_queue.get turned into a deadlock. Check the `get_embedding` function"
     assert success_flag is False
+
+
+def test_get_deal_uses_deal_map_instead_of_embedding_and_database(
+        mock_components, mock_normal_connect
+) -> None:
+    # Arrange
+    mock_deal_map = MagicMock()
+    mock_deal_map.lookup.return_value = ('two glazed donuts for $3', 'BakeryItem', 'glazed donut', 2, 3.0)
+    order = {
+        "BakeryItem": {
+            "cart_action": "insertion",
+            "item_name": "glazed donut"
+        }
+    }
+    expected_deal_object = {
+        "BakeryItem": {
+            "item_name": "glazed donut",
+            "quantity": [1],
+            "price": [3.0],
+            "cart_action": "insertion"
+        }
+    }
+
+    # Act
+    deal, deal_object, res = get_deal(order=order, api_key="test_key", deal_map=mock_deal_map)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert deal == 'two glazed donuts for $3', f"expected glazed donut deal but got {deal}"
+    assert deal_object == expected_deal_object, f"expected {expected_deal_object} but got {deal_object}"
+    mock_deal_map.lookup.assert_called_once_with("glazed donut")
+    mock_normal_connect.assert_not_called()
+
+
+def test_get_deal_returns_the_connection_to_the_pool_when_the_query_fails(
+        mock_components
+) -> None:
+    # Arrange
+    mock_pool = MagicMock(spec=PostgresConnectionPool)
+    mock_connection = mock_pool.getconn.return_value
+    mock_connection.cursor.return_value.execute.side_effect = psycopg2.errors.QueryCanceled("statement timeout")
+    order = {
+        "BakeryItem": {
+            "cart_action": "insertion",
+            "item_name": "glazed donut"
+        }
+    }
+
+    # Act
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        get_deal(order=order, api_key="test_key", connection_pool=mock_pool)
+
+    # Assert
+    mock_pool.putconn.assert_called_once_with(mock_connection)
+
+
+def test_async_get_deal_queries_a_pooled_connection_with_the_embedding(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch('src.ai_integration.embedding_provider.async_openai_embedding_api', return_value=[0.1, 0.2, 0.3])
+    mock_connection = AsyncMock()
+    mock_connection.fetch.return_value = [('two glazed donuts for $3', 'BakeryItem', 'glazed donut', 2, 3.0)]
+    mock_pool = AsyncMock()
+    mock_pool.acquire.return_value = mock_connection
+    order = {
+        "BakeryItem": {
+            "cart_action": "insertion",
+            "item_name": "glazed donut"
+        }
+    }
+
+    # Act
+    deal, deal_object, res = asyncio.run(async_get_deal(order=order, api_key="test_key",
+                                                        connection_pool=mock_pool))
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert deal == 'two glazed donuts for $3', f"expected glazed donut deal but got {deal}"
+    assert deal_object["BakeryItem"]["price"] == [3.0], f"expected the deal price but got {deal_object}"
+    mock_pool.release.assert_awaited_once_with(mock_connection)
+
+
+def test_async_get_deal_returns_false_when_item_type_is_invalid(
+
+) -> None:
+    # Arrange
+    order = {
+        "InvalidItem": {
+            "cart_action": "insertion",
+            "item_name": "glazed donut"
+        }
+    }
+
+    # Act
+    deal, deal_object, res = asyncio.run(async_get_deal(order=order, api_key="test_key"))
+
+    # Assert
+    assert res is False, f"expected search to be unsuccessful but {res}"
+    assert deal is None and deal_object is None, f"expected no deal but got {deal}, {deal_object}"
+
+
+def test_async_get_deal_searches_the_compact_column_when_configured(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch('src.ai_integration.embedding_provider.async_openai_embedding_api', return_value=[0.1, 0.2, 0.3])
+    mock_storage = mocker.patch('src.vector_db.get_deal.compact_embeddings').return_value
+    mock_storage.async_nearest = AsyncMock(return_value=[('coffee and a muffin for $4', 'BakeryItem',
+                                                          'blueberry muffin', 1, 4.0)])
+    mock_connection = AsyncMock()
+    mock_pool = AsyncMock()
+    mock_pool.acquire.return_value = mock_connection
+    order = {
+        "CoffeeItem": {
+            "cart_action": "insertion",
+            "item_name": "black coffee"
+        }
+    }
+
+    # Act
+    deal, _, res = asyncio.run(async_get_deal(order, api_key="test_key", connection_pool=mock_pool))
+
+    # Assert
+    assert res is True and deal == 'coffee and a muffin for $4', f"expected the compact search deal but got {deal}"
+    mock_storage.async_nearest.assert_awaited_once()
+    mock_connection.fetch.assert_not_called()
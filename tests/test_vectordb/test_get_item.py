@@ -1,10 +1,15 @@
+import os
 import csv
-import json
 import queue
+import asyncio
 import pytest
+import psycopg2.errors
 from io import StringIO
-from mock import MagicMock
-from src.vector_db.get_item import get_item
+from mock import MagicMock, AsyncMock, patch
+from src.vector_db.embedding_cache import cache_key, encode_embedding
+from src.vector_db.get_item import get_item, get_items, async_get_item
+from src.ai_integration.embedding_provider import reset_embedding_providers
+from src.external_connections.postgres_connection_pool import PostgresConnectionPool
 
 
 @pytest.fixture
@@ -14,7 +19,7 @@ def mock_components(
     mock_db_instance = mocker.patch('src.vector_db.get_item.psycopg2.connect')
     mock_db_instance.return_value.cursor.return_value.fetchall.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
 
-    mock_embedding_api = mocker.patch('src.vector_db.get_item.openai_embedding_api')
+    mock_embedding_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api')
     mock_embedding_api.return_value = [0.1, 0.2, 0.3]
 
     return {
@@ -47,7 +52,7 @@ def test_get_item_returns_true_when_successfully_found_closest_item_and_adds_to_
     # Arrange
     mock_redis = mocker.Mock()
     mock_redis.set = MagicMock()
-    mock_redis.exists = MagicMock(return_value=False)
+    mock_redis.get = MagicMock(return_value=None)
     database_info = [
         ["dbname", "user", "password", "host", "port"],
         ["mydb", "myuser", "mypassword", "localhost", "port"]]
@@ -66,8 +71,7 @@ def test_get_item_returns_true_when_successfully_found_closest_item_and_cache_hi
     # Arrange
     mock_redis = mocker.Mock()
     mock_redis.set = MagicMock()
-    mock_redis.exists = MagicMock(return_value=True)
-    mock_redis.get = MagicMock(return_value=json.dumps([0.1, 0.2, 0.3]))
+    mock_redis.get = MagicMock(return_value=encode_embedding([0.1, 0.2, 0.3]))
     database_info = [
         ["dbname", "user", "password", "host", "port"],
         ["mydb", "myuser", "mypassword", "localhost", "port"]]
@@ -96,6 +100,235 @@ def test_get_item_returns_true_when_successfully_found_closest_item_without_bein
     assert res is True, f"expected search to be successful but {res}"
 
 
+def test_get_item_skips_session_setup_for_preconfigured_connection_pool(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_register_vector = mocker.patch('src.vector_db.get_item.register_vector')
+    mock_pool = MagicMock(spec=PostgresConnectionPool)
+    mock_connection = mock_pool.getconn.return_value
+    mock_connection.cursor.return_value.fetchall.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+
+    # Act
+    _, res = get_item(order="test", api_key="test_key", connection_pool=mock_pool)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    mock_register_vector.assert_not_called()
+    mock_connection.set_session.assert_not_called()
+    mock_pool.putconn.assert_called_once_with(mock_connection)
+
+
+def test_get_item_returns_the_connection_to_the_pool_when_the_query_fails(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_pool = MagicMock(spec=PostgresConnectionPool)
+    mock_connection = mock_pool.getconn.return_value
+    mock_connection.cursor.return_value.execute.side_effect = psycopg2.errors.QueryCanceled("statement timeout")
+
+    # Act
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        get_item(order="test", api_key="test_key", connection_pool=mock_pool)
+
+    # Assert
+    mock_pool.putconn.assert_called_once_with(mock_connection)
+
+
+def test_get_items_returns_the_connection_to_the_pool_when_the_query_fails(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_batch_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api')
+    mock_batch_api.return_value = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    mock_pool = MagicMock(spec=PostgresConnectionPool)
+    mock_connection = mock_pool.getconn.return_value
+    mock_connection.cursor.return_value.execute.side_effect = psycopg2.errors.QueryCanceled("statement timeout")
+
+    # Act
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        get_items(["latte", "mocha"], api_key="test_key", connection_pool=mock_pool)
+
+    # Assert
+    mock_pool.putconn.assert_called_once_with(mock_connection)
+
+
+def test_get_item_and_get_items_search_the_compact_column_when_configured(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_batch_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api')
+    mock_batch_api.return_value = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    mock_storage = mocker.patch('src.vector_db.get_item.compact_embeddings').return_value
+    mock_storage.nearest.side_effect = [[(7, 'latte', 6, 'lactose', '(60,120)', 5.0)],
+                                        [(7, 'latte', 6, 'lactose', '(60,120)', 5.0)],
+                                        [(8, 'mocha', 4, 'lactose', '(60,120)', 6.0)]]
+    mock_pool = MagicMock(spec=PostgresConnectionPool)
+
+    # Act
+    result, _ = get_item(order="latte", api_key="test_key", connection_pool=mock_pool)
+    results, _ = get_items(["latte", "mocha"], api_key="test_key", connection_pool=mock_pool)
+
+    # Assert
+    assert result == [(7, 'latte', 6, 'lactose', '(60,120)', 5.0)], f"expected the compact search row but got {result}"
+    assert results["mocha"] == [(8, 'mocha', 4, 'lactose', '(60,120)', 6.0)], \
+        f"expected every name to be searched in the compact column but got {results}"
+    assert mock_storage.nearest.call_count == 3, \
+        f"expected 3 compact searches but got {mock_storage.nearest.call_count}"
+    mock_pool.getconn.return_value.cursor.return_value.execute.assert_not_called()
+
+
+def test_get_item_uses_menu_index_instead_of_database_when_passed_in(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_menu_index = MagicMock()
+    mock_menu_index.lookup.return_value = None
+    mock_menu_index.nearest.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+    mock_connect = mocker.patch('src.vector_db.get_item.psycopg2.connect')
+
+    # Act
+    result, res = get_item(order="test", api_key="test_key", menu_index=mock_menu_index)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert result == mock_menu_index.nearest.return_value, f"expected row from menu index but got {result}"
+    mock_connect.assert_not_called()
+
+
+def test_get_item_embeds_in_process_without_cache_or_openai_for_local_provider(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mocker.patch('src.ai_integration.embedding_provider.menu_vocabulary', return_value=["latte", "bagel"])
+    mock_redis = mocker.Mock()
+    mock_menu_index = MagicMock()
+    mock_menu_index.lookup.return_value = None
+    mock_menu_index.nearest.return_value = [(2, 'latte', 0, 'lactose', '(120,180)', 5.0)]
+    reset_embedding_providers()
+
+    # Act
+    with patch.dict(os.environ, {"EMBEDDING_PROVIDER": "ngram"}):
+        result, res = get_item(order="lattes", api_key="test_key", embedding_cache=mock_redis,
+                               menu_index=mock_menu_index)
+    reset_embedding_providers()
+
+    # Assert
+    embedding = mock_menu_index.nearest.call_args.args[0]
+    assert res is True and result == mock_menu_index.nearest.return_value, f"expected the latte row but got {result}"
+    assert embedding.shape == (1536,), f"expected a 1536 dimension embedding but got {embedding.shape}"
+    mock_components['openai_embedding_api'].assert_not_called()
+    mock_redis.get.assert_not_called()
+    mock_redis.set.assert_not_called()
+
+
+def test_get_items_resolves_every_distinct_name_with_one_batched_embedding_call_and_query(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_batch_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api')
+    mock_batch_api.return_value = [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    mocker.patch('src.vector_db.get_item.register_vector')
+    mock_connect = mocker.patch('src.vector_db.get_item.psycopg2.connect')
+    mock_cursor = mock_connect.return_value.cursor.return_value
+    mock_cursor.fetchall.return_value = [(1, 2, 'latte', 0, 'lactose', '(120,180)', 5.0),
+                                         (2, 27, 'whipped cream', 60, 'none', '(50,50)', 0.5)]
+    database_info = [
+        ["dbname", "user", "password", "host", "port"],
+        ["mydb", "myuser", "mypassword", "localhost", "port"]]
+    db = as_csv_file(database_info)
+
+    # Act
+    result, res = get_items(["latte", "whipped cream", "latte"], api_key="test_key", database_csv_file=db)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert result == {
+        "latte": [(2, 'latte', 0, 'lactose', '(120,180)', 5.0)],
+        "whipped cream": [(27, 'whipped cream', 60, 'none', '(50,50)', 0.5)]
+    }, f"expected every name to map to its closest row but got {result}"
+    mock_batch_api.assert_called_once_with(["latte", "whipped cream"], "test_key")
+    queries = [call.args[0] for call in mock_cursor.execute.call_args_list if call.args[0].startswith("EXECUTE")]
+    assert len(queries) == 1, f"expected one query for every name but got {len(queries)}"
+
+
+def test_get_items_only_embeds_cache_misses(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_batch_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api')
+    mock_batch_api.return_value = [[0.4, 0.5, 0.6]]
+    mock_redis = mocker.Mock()
+    mock_redis.mget = MagicMock(return_value=[encode_embedding([0.1, 0.2, 0.3]), None])
+    mock_menu_index = MagicMock()
+    mock_menu_index.lookup.return_value = None
+    mock_menu_index.nearest_many.return_value = [[(2, 'latte', 0, 'lactose', '(120,180)', 5.0)],
+                                                 [(5, 'oat milk', 60, 'oats', '(20,20)', 0.5)]]
+
+    # Act
+    result, res = get_items(["latte", "oat milk"], api_key="test_key", embedding_cache=mock_redis,
+                            menu_index=mock_menu_index)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert list(result) == ["latte", "oat milk"], f"expected both names to be resolved but got {result}"
+    mock_batch_api.assert_called_once_with(["oat milk"], "test_key")
+    mock_redis.mget.assert_called_once_with([cache_key("latte"), cache_key("oat milk")])
+    mock_redis.mset.assert_called_once_with({cache_key("oat milk"): encode_embedding([0.4, 0.5, 0.6])})
+
+
+def test_get_item_skips_embedding_when_name_resolves_through_alias_table(
+        mock_components
+) -> None:
+    # Arrange
+    mock_menu_index = MagicMock()
+    mock_menu_index.lookup.return_value = [(48, 'glazed donut', 12, 'gluten', '(200,500)', 2.0)]
+
+    # Act
+    result, res = get_item(order="glazed doughnuts", api_key="test_key", menu_index=mock_menu_index)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert result == mock_menu_index.lookup.return_value, f"expected alias row but got {result}"
+    mock_components['openai_embedding_api'].assert_not_called()
+    mock_menu_index.nearest.assert_not_called()
+
+
+def test_get_items_only_embeds_names_that_miss_the_alias_table(
+        mocker, mock_components
+) -> None:
+    # Arrange
+    mock_batch_api = mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api')
+    mock_batch_api.return_value = [[0.4, 0.5, 0.6]]
+    mock_menu_index = MagicMock()
+    mock_menu_index.lookup.side_effect = \
+        lambda name: [(2, 'latte', 0, 'lactose', '(120,180)', 5.0)] if name == "latte" else None
+    mock_menu_index.nearest_many.return_value = [[(9, 'macchiato', 9, 'lactose', '(15,30)', 8.0)]]
+
+    # Act
+    result, res = get_items(["latte", "frappuccino"], api_key="test_key", menu_index=mock_menu_index)
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert result["latte"][0][1] == 'latte' and result["frappuccino"][0][1] == 'macchiato', \
+        f"expected alias hit and semantic search result but got {result}"
+    mock_batch_api.assert_called_once_with(["frappuccino"], "test_key")
+
+
+def test_get_items_returns_false_when_given_no_names(
+        mock_components
+) -> None:
+    # Arrange
+    data = []
+
+    # Act
+    result, res = get_items(data)
+
+    # Assert
+    assert res is False, f"expected search to be unsuccessful but {res}"
+    assert result == {}, f"expected no results but got {result}"
+
+
 def test_get_item_returns_false_when_given_invalid_params(
         mock_boto3_session_client, mock_components
 ) -> None:
@@ -149,3 +382,49 @@ def test_get_item_throws_correct_exception_when_queue_empty(
 #
 #     # Assert
 #     assert res is False, f"expected search not to return most similar item but {res}"
+
+
+def test_async_get_item_queries_a_pooled_connection_and_caches_the_embedding(
+        mocker
+) -> None:
+    # Arrange
+    mock_embedding_api = mocker.patch('src.ai_integration.embedding_provider.async_openai_embedding_api',
+                                      return_value=[0.1, 0.2, 0.3])
+    mock_connection = AsyncMock()
+    mock_connection.fetch.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+    mock_pool = AsyncMock()
+    mock_pool.acquire.return_value = mock_connection
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = None
+
+    # Act
+    result, res = asyncio.run(async_get_item("black coffee", api_key="test_key", connection_pool=mock_pool,
+                                             embedding_cache=mock_cache))
+
+    # Assert
+    assert res is True, f"expected search to be successful but {res}"
+    assert result == [(7, 'test', 6, 'test', '(60,120)', 10.0)], f"expected the closest row but got {result}"
+    mock_embedding_api.assert_awaited_once_with("black coffee", "test_key")
+    mock_cache.set.assert_awaited_once_with(cache_key("black coffee"), encode_embedding([0.1, 0.2, 0.3]))
+    mock_pool.release.assert_awaited_once_with(mock_connection)
+
+
+def test_async_get_item_uses_cached_embedding_and_releases_connection_on_error(
+        mocker
+) -> None:
+    # Arrange
+    mock_embedding_api = mocker.patch('src.ai_integration.embedding_provider.async_openai_embedding_api')
+    mock_connection = AsyncMock()
+    mock_connection.fetch.side_effect = TimeoutError("statement timeout")
+    mock_pool = AsyncMock()
+    mock_pool.acquire.return_value = mock_connection
+    mock_cache = AsyncMock()
+    mock_cache.get.return_value = encode_embedding([0.1, 0.2, 0.3])
+
+    # Act
+    with pytest.raises(TimeoutError):
+        asyncio.run(async_get_item("black coffee", connection_pool=mock_pool, embedding_cache=mock_cache))
+
+    # Assert
+    mock_embedding_api.assert_not_called()
+    mock_pool.release.assert_awaited_once_with(mock_connection)
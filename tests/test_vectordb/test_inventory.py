@@ -0,0 +1,202 @@
+import pytest
+from mock import MagicMock
+from src.vector_db.inventory import (
+    Inventory, STOCK_KEY, NAMES_KEY, PENDING_KEY, EXPIRY_KEY, RESERVATION_PREFIX, LOAD_SCRIPT, CHECK_SCRIPT,
+    RESERVE_SCRIPT, SETTLE_SCRIPT, RELEASE_EXPIRED_SCRIPT, DRAIN_SCRIPT
+)
+
+
+@pytest.fixture
+def mock_redis(
+
+) -> MagicMock:
+    mock_client = MagicMock()
+    scripts = {source: MagicMock(name=name) for source, name in [
+        (LOAD_SCRIPT, "load"), (CHECK_SCRIPT, "check"), (RESERVE_SCRIPT, "reserve"), (SETTLE_SCRIPT, "settle"),
+        (RELEASE_EXPIRED_SCRIPT, "release_expired"), (DRAIN_SCRIPT, "drain")]}
+    mock_client.register_script.side_effect = lambda source: scripts[source]
+    mock_client.scripts = {str(script._mock_name): script for script in scripts.values()}
+
+    return mock_client
+
+
+@pytest.fixture
+def mock_pool(
+
+) -> MagicMock:
+    return MagicMock()
+
+
+def test_load_mirrors_every_product_with_its_normalized_name(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_pool.getconn.return_value.cursor.return_value.fetchall.return_value = [
+        (1, 'Glazed Donut', 12), (2, 'latte', None)]
+    mock_redis.scripts["load"].return_value = 2
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    loaded = inventory.load(force=True)
+
+    # Assert
+    assert loaded == 2, f"expected 2 counters but got {loaded}"
+    mock_redis.scripts["load"].assert_called_once_with(
+        keys=[STOCK_KEY, PENDING_KEY, EXPIRY_KEY, NAMES_KEY],
+        args=[RESERVATION_PREFIX, 1, 1, 'glazeddonut', 12, 2, 'latte', 0])
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+
+
+def test_check_resolves_the_name_and_stock_in_one_call(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["check"].return_value = [b'7', b'4']
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    stock = inventory.check("Glazed Donuts")
+
+    # Assert
+    assert stock == (7, 4), f"expected product 7 with 4 in stock but got {stock}"
+    mock_redis.scripts["check"].assert_called_once_with(keys=[NAMES_KEY, STOCK_KEY], args=['glazeddonut'])
+
+
+def test_check_returns_none_for_a_name_which_is_not_mirrored(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["check"].return_value = None
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    stock = inventory.check("a cup of something")
+
+    # Assert
+    assert stock is None, f"expected no stock but got {stock}"
+
+
+def test_reserve_holds_every_item_under_the_reservation(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["reserve"].return_value = [1]
+    inventory = Inventory(mock_redis, mock_pool, reservation_ttl=60)
+
+    # Act
+    reserved, short = inventory.reserve("order-1", {7: 2, 12: 1})
+
+    # Assert
+    assert (reserved, short) == (True, None), f"expected the order to be reserved but got {(reserved, short)}"
+    mock_redis.scripts["reserve"].assert_called_once_with(
+        keys=[STOCK_KEY, EXPIRY_KEY, RESERVATION_PREFIX + "order-1"], args=["order-1", 60, 7, 2, 12, 1])
+
+
+def test_reserve_reports_the_product_short_of_stock(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["reserve"].return_value = [0, b'12']
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    reserved, short = inventory.reserve("order-1", {7: 2, 12: 100})
+
+    # Assert
+    assert (reserved, short) == (False, 12), f"expected product 12 to be short but got {(reserved, short)}"
+
+
+def test_reserve_raises_when_the_reservation_already_exists(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["reserve"].return_value = [-1]
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        inventory.reserve("order-1", {7: 1})
+
+
+def test_commit_moves_units_to_pending_and_release_moves_them_back_to_stock(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["settle"].return_value = 3
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    committed = inventory.commit("order-1")
+    released = inventory.release("order-2")
+
+    # Assert
+    assert (committed, released) == (3, 3), f"expected 3 units each but got {(committed, released)}"
+    calls = mock_redis.scripts["settle"].call_args_list
+    assert calls[0].kwargs["keys"] == [PENDING_KEY, EXPIRY_KEY, RESERVATION_PREFIX + "order-1"], \
+        f"expected the commit to move units to pending but got {calls[0]}"
+    assert calls[1].kwargs["keys"] == [STOCK_KEY, EXPIRY_KEY, RESERVATION_PREFIX + "order-2"], \
+        f"expected the release to move units to stock but got {calls[1]}"
+
+
+def test_release_expired_returns_the_released_reservation_ids(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["release_expired"].return_value = [b'order-1', b'order-2']
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    released = inventory.release_expired()
+
+    # Assert
+    assert released == ["order-1", "order-2"], f"expected both expired reservations but got {released}"
+
+
+def test_write_back_subtracts_sold_units_in_one_statement(
+        mocker, mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_execute_values = mocker.patch('src.vector_db.inventory.psycopg2.extras.execute_values')
+    mock_redis.scripts["drain"].return_value = [b'7', b'2', b'12', b'1']
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    updated = inventory.write_back()
+
+    # Assert
+    assert updated == 2, f"expected 2 products to be updated but got {updated}"
+    assert mock_execute_values.call_args.args[2] == [(7, 2), (12, 1)], \
+        f"expected the sold units of both products but got {mock_execute_values.call_args}"
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+
+
+def test_write_back_keeps_sold_units_when_postgres_fails(
+        mocker, mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mocker.patch('src.vector_db.inventory.psycopg2.extras.execute_values', side_effect=TimeoutError("timeout"))
+    mock_redis.scripts["drain"].return_value = [b'7', b'2']
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    with pytest.raises(TimeoutError):
+        inventory.write_back()
+
+    # Assert
+    mock_redis.pipeline.return_value.hincrby.assert_called_once_with(PENDING_KEY, 7, 2)
+    mock_redis.pipeline.return_value.execute.assert_called_once()
+
+
+def test_write_back_does_nothing_without_sold_units(
+        mock_redis, mock_pool
+) -> None:
+    # Arrange
+    mock_redis.scripts["drain"].return_value = []
+    inventory = Inventory(mock_redis, mock_pool)
+
+    # Act
+    updated = inventory.write_back()
+
+    # Assert
+    assert updated == 0, f"expected nothing to be written back but got {updated}"
+    mock_pool.getconn.assert_not_called()
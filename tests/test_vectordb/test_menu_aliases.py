@@ -0,0 +1,93 @@
+import pytest
+from src.vector_db.menu_aliases import MenuAliases, normalize_name
+
+
+@pytest.fixture
+def menu_aliases(
+
+) -> MenuAliases:
+    menu = [
+        {"MenuItem": {"item_name": "Black coffee"}},
+        {"MenuItem": {"item_name": "Glazed Donut"}},
+        {"MenuItem": {"item_name": "Pump of Caramel"}},
+        {"MenuItem": {"item_name": "Egg and Cheese on a Croissant"}},
+        {"MenuItem": {"item_name": "Hashbrowns"}},
+    ]
+    vocabulary = ["coffee", "glazed doughnut", "pumps of caramel", "hash brown", "frappuccino"]
+
+    return MenuAliases(menu=menu, vocabulary=vocabulary)
+
+
+@pytest.mark.parametrize("name,expected_key", [
+    ("glazed donut", "glazeddonut"),
+    ("Glazed Doughnuts", "glazeddonut"),
+    ("pumps of caramel", "pumpofcaramel"),
+    ("egg and cheese on croissant", "eggandcheeseoncroissant"),
+    ("hash browns", "hashbrown"),
+    ("coffee", "blackcoffee"),
+])
+def test_resolve_returns_menu_item_for_exact_and_normalized_names(
+        menu_aliases, name, expected_key
+) -> None:
+    # Arrange
+
+    # Act
+    key = menu_aliases.resolve(name)
+
+    # Assert
+    assert key == expected_key, f"expected {name} to resolve to {expected_key} but got {key}"
+
+
+def test_resolve_returns_none_and_counts_miss_when_name_is_not_on_menu(
+        menu_aliases
+) -> None:
+    # Arrange
+
+    # Act
+    menu_aliases.resolve("latte")
+    key = menu_aliases.resolve("frappuccino")
+    stats = menu_aliases.stats()
+
+    # Assert
+    assert key is None, f"expected frappuccino to need semantic search but got {key}"
+    assert stats["hits"] == 0 and stats["misses"] == 2, f"expected 2 misses but got {stats}"
+
+
+def test_stats_report_hit_rate(
+        menu_aliases
+) -> None:
+    # Arrange
+
+    # Act
+    menu_aliases.resolve("black coffee")
+    menu_aliases.resolve("glazed donut")
+    menu_aliases.resolve("glazed donut")
+    menu_aliases.resolve("mocha")
+    stats = menu_aliases.stats()
+
+    # Assert
+    assert stats["hit_rate"] == 0.75, f"expected hit rate of 0.75 but got {stats}"
+
+
+def test_unresolved_lists_pattern_alternatives_without_a_menu_item(
+        menu_aliases
+) -> None:
+    # Arrange
+
+    # Act
+    unresolved = menu_aliases.unresolved()
+
+    # Assert
+    assert unresolved == ["frappuccino"], f"expected only frappuccino to be unresolved but got {unresolved}"
+
+
+def test_normalize_name_ignores_case_plurals_articles_and_spacing(
+
+) -> None:
+    # Arrange
+
+    # Act
+    key = normalize_name("  The Strawberry Smoothies ")
+
+    # Assert
+    assert key == "strawberrysmoothie", f"expected strawberrysmoothie but got {key}"
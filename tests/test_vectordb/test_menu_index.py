@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+from mock import MagicMock
+from src.vector_db.menu_aliases import MenuAliases
+from src.vector_db.menu_index import MenuIndex
+
+
+@pytest.fixture
+def mock_connection_pool(
+        mocker
+) -> MagicMock:
+    mocker.patch('src.vector_db.menu_index.register_vector')
+    rows = [
+        (1, 'black coffee', 20, 'none', '(2,10)', 2.0, np.array([1.0, 0.0, 0.0], dtype=np.float32)),
+        (2, 'latte', 0, 'lactose', '(120,180)', 5.0, np.array([0.0, 1.0, 0.0], dtype=np.float32)),
+        (3, 'glazed donut', 12, 'gluten', '(200,500)', 2.0, np.array([0.0, 0.0, 1.0], dtype=np.float32)),
+    ]
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.side_effect = lambda: rows if 'embeddings' in mock_cursor.execute.call_args[0][0] \
+        else [(3, 'fingerprint')]
+    mock_pool = MagicMock()
+    mock_pool.getconn.return_value.cursor.return_value = mock_cursor
+
+    return mock_pool
+
+
+def test_nearest_returns_same_shape_as_get_item(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool)
+    expected_result = [(2, 'latte', 0, 'lactose', '(120,180)', 5.0)]
+
+    # Act
+    result = menu_index.nearest([0.1, 0.9, 0.2])
+
+    # Assert
+    assert result == expected_result, f"expected {expected_result} but got {result}"
+
+
+def test_nearest_many_returns_closest_row_for_every_embedding_in_order(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool)
+    embeddings = [[0.0, 0.0, 0.8], [0.9, 0.1, 0.0]]
+
+    # Act
+    result = menu_index.nearest_many(embeddings)
+
+    # Assert
+    assert [rows[0][1] for rows in result] == ['glazed donut', 'black coffee'], \
+        f"expected glazed donut then black coffee but got {result}"
+
+
+def test_menu_index_only_loads_table_once_within_refresh_interval(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool, refresh_interval=60)
+
+    # Act
+    menu_index.nearest([1.0, 0.0, 0.0])
+    menu_index.nearest([0.0, 1.0, 0.0])
+    menu_index.nearest([0.0, 0.0, 1.0])
+
+    # Assert
+    assert mock_connection_pool.getconn.call_count == 2, \
+        f"expected a fingerprint and a load query but got {mock_connection_pool.getconn.call_count}"
+
+
+def test_menu_index_reloads_after_being_invalidated(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool, refresh_interval=60)
+    menu_index.nearest([1.0, 0.0, 0.0])
+
+    # Act
+    menu_index.invalidate()
+    menu_index.nearest([1.0, 0.0, 0.0])
+
+    # Assert
+    assert mock_connection_pool.getconn.call_count == 4, \
+        f"expected the table to be fingerprinted and loaded again but got {mock_connection_pool.getconn.call_count}"
+
+
+def test_lookup_resolves_normalized_names_without_an_embedding(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    aliases = MenuAliases(menu=[{"MenuItem": {"item_name": "Glazed Donut"}}], vocabulary=[])
+    menu_index = MenuIndex(mock_connection_pool, aliases=aliases)
+    expected_result = [(3, 'glazed donut', 12, 'gluten', '(200,500)', 2.0)]
+
+    # Act
+    result = menu_index.lookup("glazed doughnuts")
+
+    # Assert
+    assert result == expected_result, f"expected {expected_result} but got {result}"
+    assert menu_index.alias_stats()["hits"] == 1, f"expected an alias hit but got {menu_index.alias_stats()}"
+
+
+def test_lookup_returns_none_for_names_that_need_semantic_search(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    aliases = MenuAliases(menu=[{"MenuItem": {"item_name": "Glazed Donut"}}], vocabulary=[])
+    menu_index = MenuIndex(mock_connection_pool, aliases=aliases)
+
+    # Act
+    result = menu_index.lookup("cappuccino")
+
+    # Assert
+    assert result is None, f"expected no alias match but got {result}"
+    assert menu_index.alias_stats()["misses"] == 1, f"expected an alias miss but got {menu_index.alias_stats()}"
+
+
+def test_menu_index_fingerprints_the_embeddings(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool)
+
+    # Act
+    menu_index.nearest([1.0, 0.0, 0.0])
+    fingerprint_sql = mock_connection_pool.getconn.return_value.cursor.return_value.execute.call_args_list[0][0][0]
+
+    # Assert
+    assert "md5(embeddings::text)" in fingerprint_sql, \
+        f"expected re-embedded rows to change the fingerprint but got {fingerprint_sql}"
+
+
+def test_lookup_builds_the_aliases_from_the_rows_of_every_reload(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool, refresh_interval=60)
+    before = menu_index.lookup("Glazed Doughnuts")
+    mock_cursor = mock_connection_pool.getconn.return_value.cursor.return_value
+    mock_cursor.fetchall.side_effect = [[(1, 'new fingerprint')],
+                                        [(4, 'oatmeal cookie', 6, 'gluten', '(150,200)', 1.5,
+                                          np.array([1.0, 0.0, 0.0], dtype=np.float32))]]
+
+    # Act
+    menu_index.invalidate()
+    added = menu_index.lookup("oatmeal cookies")
+    removed = menu_index.lookup("glazed doughnuts")
+
+    # Assert
+    assert before[0][1] == 'glazed donut', f"expected the loaded row to resolve by alias but got {before}"
+    assert added[0][1] == 'oatmeal cookie', f"expected the added row to resolve by alias but got {added}"
+    assert removed is None, f"expected the removed row not to resolve but got {removed}"
+
+
+def test_alias_stats_count_the_lookups_of_every_reload(
+        mock_connection_pool
+) -> None:
+    # Arrange
+    menu_index = MenuIndex(mock_connection_pool, refresh_interval=60)
+    menu_index.lookup("Glazed Doughnuts")
+    mock_cursor = mock_connection_pool.getconn.return_value.cursor.return_value
+    mock_cursor.fetchall.side_effect = [[(1, 'new fingerprint')],
+                                        [(4, 'oatmeal cookie', 6, 'gluten', '(150,200)', 1.5,
+                                          np.array([1.0, 0.0, 0.0], dtype=np.float32))]]
+
+    # Act
+    menu_index.invalidate()
+    menu_index.lookup("oatmeal cookies")
+    menu_index.lookup("pumpkin loaf")
+    stats = menu_index.alias_stats()
+
+    # Assert
+    assert (stats["hits"], stats["misses"]) == (2, 1), \
+        f"expected the lookups before the reload to count but got {stats}"
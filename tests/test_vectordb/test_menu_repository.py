@@ -0,0 +1,162 @@
+import os
+import csv
+import pytest
+from io import StringIO
+from mock import MagicMock, patch
+from src.vector_db.menu_repository import MenuRepository
+from src.external_connections.credentials_provider import CredentialsProvider
+from src.vector_db.prepared_statements import reset_statement_timings
+
+
+@pytest.fixture(autouse=True)
+def reset_credentials(
+
+) -> None:
+    CredentialsProvider._CredentialsProvider__instance = None
+    reset_statement_timings()
+
+
+@pytest.fixture
+def mock_components(
+        mocker
+) -> dict:
+    return {
+        'get_secret': mocker.patch('src.external_connections.credentials_provider.get_secret'),
+        'connection_pool': mocker.patch('src.vector_db.menu_repository.PostgresConnectionPool'),
+        'openai_embedding_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api',
+                                             return_value=[0.1, 0.2, 0.3]),
+        'connect': mocker.patch('src.vector_db.menu_repository.psycopg2.connect'),
+    }
+
+
+def as_csv_file(
+        data: [[str]]
+) -> StringIO:
+    file_object = StringIO()
+    writer = csv.writer(file_object)
+    writer.writerows(data)
+    file_object.seek(0)
+
+    return file_object
+
+
+def database_csv_file(
+
+) -> StringIO:
+    return as_csv_file([
+        ["dbname", "user", "password", "host", "port"],
+        ["mydb", "myuser", "mypassword", "localhost", "5432"]])
+
+
+def test_connect_looks_up_secrets_and_opens_pool_once(
+        mock_components
+) -> None:
+    # Act
+    first = MenuRepository.connect(database_csv_file=database_csv_file())
+    second = MenuRepository.connect()
+
+    # Assert
+    assert first is second, "expected one repository per process"
+    mock_components['get_secret'].assert_called_once()
+    mock_components['connection_pool'].assert_called_once()
+
+
+def test_connect_uses_given_pool_without_secrets(
+        mock_components
+) -> None:
+    # Arrange
+    mock_pool = MagicMock()
+
+    # Act
+    repository = MenuRepository.connect(connection_pool=mock_pool)
+
+    # Assert
+    assert repository.connection_pool() is mock_pool, f"expected the given pool but got {repository.connection_pool()}"
+    mock_components['get_secret'].assert_not_called()
+
+
+def test_nearest_product_runs_prepared_statement_on_a_pooled_connection(
+        mock_components
+) -> None:
+    # Arrange
+    mock_pool = MagicMock()
+    mock_cursor = mock_pool.getconn.return_value.cursor.return_value
+    mock_cursor.fetchall.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+    repository = MenuRepository.connect(connection_pool=mock_pool)
+
+    # Act
+    result = repository.nearest_product([0.1, 0.2, 0.3])
+
+    # Assert
+    assert result == [(7, 'test', 6, 'test', '(60,120)', 10.0)], f"expected the closest row but got {result}"
+    assert mock_cursor.execute.call_args.args[0].startswith("EXECUTE nearest_product"), \
+        f"expected the prepared statement to be executed but got {mock_cursor.execute.call_args}"
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+
+
+def test_nearest_products_returns_connection_when_query_fails(
+        mock_components
+) -> None:
+    # Arrange
+    mock_pool = MagicMock()
+    mock_pool.getconn.return_value.cursor.return_value.fetchall.side_effect = TimeoutError("statement timeout")
+    repository = MenuRepository.connect(connection_pool=mock_pool)
+
+    # Act
+    with pytest.raises(TimeoutError):
+        repository.nearest_products([0.1, 0.2, 0.3], top_k=3)
+
+    # Assert
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+
+
+def test_nearest_deal_searches_compact_column_when_configured(
+        mock_components
+) -> None:
+    # Arrange
+    mock_pool = MagicMock()
+    mock_cursor = mock_pool.getconn.return_value.cursor.return_value
+    mock_cursor.fetchall.return_value = [('deal', 'coffee', 'latte', 2, 5.0)]
+    with patch.dict(os.environ, {"EMBEDDING_PRECISION": "binary", "EMBEDDING_RERANK": "3"}):
+        repository = MenuRepository.connect(connection_pool=mock_pool)
+
+    # Act
+    result = repository.nearest_deal([0.1] * 1536)
+
+    # Assert
+    query = mock_cursor.execute.call_args.args[0]
+    assert result == [('deal', 'coffee', 'latte', 2, 5.0)], f"expected the closest deal but got {result}"
+    assert "embeddings_compact <~> %s::bit(1536) LIMIT 3" in query, \
+        f"expected the binary column to be searched but got {query}"
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+
+
+def test_embedding_only_calls_openai_once_per_text(
+        mock_components
+) -> None:
+    # Arrange
+    repository = MenuRepository.connect(connection_pool=MagicMock())
+
+    # Act
+    repository.embedding("black coffee", "test_key")
+    embedding = repository.embedding("Black Coffee", "test_key")
+
+    # Assert
+    assert list(embedding) == pytest.approx([0.1, 0.2, 0.3]), f"expected the cached embedding but got {embedding}"
+    mock_components['openai_embedding_api'].assert_called_once_with("black coffee", "test_key")
+
+
+def test_direct_connection_reuses_the_connection_string(
+        mock_components
+) -> None:
+    # Arrange
+    repository = MenuRepository.connect(database_csv_file=database_csv_file())
+
+    # Act
+    db_connection = repository.direct_connection()
+
+    # Assert
+    assert db_connection is mock_components['connect'].return_value, f"expected a new connection but got {db_connection}"
+    mock_components['connect'].assert_called_once_with(
+        "dbname=mydb user=myuser password=mypassword host=localhost port=5432")
+    mock_components['get_secret'].assert_called_once()
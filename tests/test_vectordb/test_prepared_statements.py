@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+import psycopg2.errors
+from mock import MagicMock
+from src.vector_db.prepared_statements import (
+    execute_prepared, vector_param, vector_array_param, statement_timings, reset_statement_timings
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_timings(
+
+) -> None:
+    reset_statement_timings()
+    yield
+    reset_statement_timings()
+
+
+def executed(
+        cur: MagicMock
+) -> list[str]:
+    return [call.args[0].split()[0] + " " + call.args[0].split()[1] for call in cur.execute.call_args_list]
+
+
+def test_execute_prepared_prepares_the_statement_before_executing_it_by_name(
+
+) -> None:
+    # Arrange
+    cur = MagicMock()
+    cur.fetchall.return_value = [(7, 'test', 6, 'test', '(60,120)', 10.0)]
+
+    # Act
+    result = execute_prepared(cur, "nearest_product", (vector_param([0.1, 0.2]),))
+
+    # Assert
+    assert result == [(7, 'test', 6, 'test', '(60,120)', 10.0)], f"expected the fetched rows but got {result}"
+    assert executed(cur) == ["PREPARE nearest_product", "EXECUTE nearest_product"], \
+        f"expected prepare then execute but got {executed(cur)}"
+
+
+def test_execute_prepared_only_prepares_once_per_connection(
+
+) -> None:
+    # Arrange
+    cur = MagicMock()
+    other_cur = MagicMock()
+
+    # Act
+    execute_prepared(cur, "nearest_product", (vector_param([0.1, 0.2]),))
+    execute_prepared(cur, "nearest_product", (vector_param([0.3, 0.4]),))
+    execute_prepared(other_cur, "nearest_product", (vector_param([0.1, 0.2]),))
+
+    # Assert
+    assert executed(cur) == ["PREPARE nearest_product", "EXECUTE nearest_product", "EXECUTE nearest_product"], \
+        f"expected one prepare on the connection but got {executed(cur)}"
+    assert executed(other_cur)[0] == "PREPARE nearest_product", \
+        f"expected a new connection to prepare the statement but got {executed(other_cur)}"
+
+
+def test_execute_prepared_prepares_again_when_the_session_lost_the_statement(
+
+) -> None:
+    # Arrange
+    cur = MagicMock()
+    execute_prepared(cur, "nearest_deal", (vector_param([0.1, 0.2]),))
+    cur.execute.reset_mock()
+    cur.execute.side_effect = [psycopg2.errors.InvalidSqlStatementName("nearest_deal does not exist"), None, None]
+
+    # Act
+    execute_prepared(cur, "nearest_deal", (vector_param([0.1, 0.2]),))
+
+    # Assert
+    assert executed(cur) == ["EXECUTE nearest_deal", "PREPARE nearest_deal", "EXECUTE nearest_deal"], \
+        f"expected the statement to be prepared again but got {executed(cur)}"
+
+
+def test_execute_prepared_passes_every_parameter(
+
+) -> None:
+    # Arrange
+    cur = MagicMock()
+    embedding = vector_param([0.1, 0.2])
+
+    # Act
+    execute_prepared(cur, "nearest_products", (embedding, 3))
+
+    # Assert
+    sql, params = cur.execute.call_args.args
+    assert sql == "EXECUTE nearest_products (%s, %s);", f"expected two placeholders but got {sql}"
+    assert params[1] == 3, f"expected top_k to be passed but got {params}"
+
+
+def test_statement_timings_reports_calls_and_percentiles(
+
+) -> None:
+    # Arrange
+    cur = MagicMock()
+
+    # Act
+    for _ in range(3):
+        execute_prepared(cur, "nearest_product", (vector_param([0.1, 0.2]),))
+    timings = statement_timings()
+
+    # Assert
+    assert list(timings) == ["nearest_product"], f"expected timings of one statement but got {timings}"
+    assert timings["nearest_product"]["calls"] == 3, f"expected 3 calls but got {timings['nearest_product']}"
+    assert set(timings["nearest_product"]) == {"calls", "mean_ms", "p50_ms", "p99_ms"}, \
+        f"expected mean and percentiles but got {timings['nearest_product']}"
+
+
+def test_vector_param_returns_float32_array(
+
+) -> None:
+    # Act
+    result = vector_param([0.1, 0.2])
+
+    # Assert
+    assert result.dtype == np.float32, f"expected float32 but got {result.dtype}"
+
+
+def test_vector_array_param_returns_vector_array_literal(
+
+) -> None:
+    # Act
+    result = vector_array_param([[0.5, 1.0], np.array([2.0, 3.0])])
+
+    # Assert
+    assert result == '{"[0.5,1.0]","[2.0,3.0]"}', f"expected a vector[] literal but got {result}"
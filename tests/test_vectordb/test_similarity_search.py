@@ -1,26 +1,30 @@
 import pytest
-from mock import patch, MagicMock
+from mock import MagicMock
 from io import StringIO
 import csv
 from src.vector_db.similarity_search import similarity_search
+from src.ai_integration.ner_server import NERServer
 
 
 @pytest.fixture
 def mock_components(
         mocker
 ) -> dict:
-    ner_model_mock = mocker.patch('src.ai_integration.fine_tuned_nlp.NERModel')
+    ner_model_mock = mocker.patch('src.ai_integration.ner_server.NERModel')
     mock_instance = ner_model_mock.return_value
 
     mock_instance.predict.return_value = ([{"entity": "example", "score": 0.99}], None)
+    NERServer.shutdown()
 
-    return {
+    yield {
         'ner_model_mock': ner_model_mock,
-        'openai_embedding_api': mocker.patch('src.vector_db.similarity_search.openai_embedding_api'),
+        'openai_embedding_api': mocker.patch('src.ai_integration.embedding_provider.openai_embedding_api'),
         'connection_string': mocker.patch('src.vector_db.aws_database_auth.connection_string'),
-        'connect': mocker.patch('src.vector_db.similarity_search.psycopg2.connect'),
+        'connection_pool': mocker.patch('src.vector_db.menu_repository.PostgresConnectionPool'),
     }
 
+    NERServer.shutdown()
+
 
 @pytest.fixture()
 def mock_boto3_session_client(
@@ -67,7 +71,7 @@ def test_similarity_search_returns_valid_object_when_given_valid_params(
         mocker, mock_boto3_session_client, mock_components
 ) -> None:
     # Arrange
-    expected_res = 'connect().cursor().fetchall()'
+    expected_res = 'PostgresConnectionPool().getconn().cursor().fetchall()'
     data = str({"input": {"Test"}})
     key = "mock_api_key"
     database_info = [
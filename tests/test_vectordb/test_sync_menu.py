@@ -0,0 +1,245 @@
+import pytest
+from mock import MagicMock
+from src.vector_db.sync_menu import sync_products, menu_row, embedding_hash, content_hash
+
+script_path = 'src.vector_db.sync_menu'
+
+LATTE = {"MenuItem": {"item_name": "Latte", "item_quantity": 5, "common_allergin": "Lactose",
+                      "num_calories": (120, 180), "price": 5.0}}
+BAGEL = {"MenuItem": {"itemName": "Bagel", "item_quantity": "10", "common_allergin": "Gluten",
+                      "num_calories": "250-300", "price": 2.5}}
+
+
+@pytest.fixture
+def mock_provider(
+        mocker
+) -> MagicMock:
+    mock_provider = MagicMock(model="test-model")
+    mock_provider.embed_batch.side_effect = lambda texts: [[float(i)] for i in range(len(texts))]
+    mocker.patch(script_path + '.embedding_provider', return_value=mock_provider)
+
+    return mock_provider
+
+
+@pytest.fixture
+def mock_execute_values(
+        mocker
+) -> MagicMock:
+    return mocker.patch(script_path + '.psycopg2.extras.execute_values', return_value=[(3,)])
+
+
+@pytest.fixture
+def mock_repository(
+
+) -> MagicMock:
+    mock_repository = MagicMock()
+    mock_repository.storage.return_value = None
+    cursor(mock_repository).fetchone.return_value = (2,)
+
+    return mock_repository
+
+
+def stored(
+        product_id: int, item: dict, model: str = "test-model", price: float = None
+) -> tuple:
+    row = menu_row(item)
+    if price is not None:
+        row = row[:4] + (price,)
+
+    return product_id, row[0], embedding_hash(row[0], model), content_hash(row)
+
+
+def cursor(
+        mock_repository: MagicMock
+) -> MagicMock:
+    return mock_repository.connection_pool.return_value.getconn.return_value.cursor.return_value
+
+
+def test_menu_row_accepts_the_fill_script_and_add_item_payloads(
+
+) -> None:
+    # Arrange
+
+    # Act
+    rows = [menu_row(LATTE), menu_row(BAGEL)]
+
+    # Assert
+    assert rows == [("latte", 5, "lactose", (120, 180), 5.0), ("bagel", 10, "gluten", (250, 300), 2.5)], \
+        f"expected both payloads to give the same columns but got {rows}"
+
+
+def test_sync_products_embeds_only_new_items_and_deletes_missing_ones(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE), (2, "espresso", "hash", "hash")]
+
+    # Act
+    changes = sync_products([LATTE, BAGEL], repository=mock_repository)
+
+    # Assert
+    assert changes == {"inserted": 1, "updated": 0, "embedded": 0, "deleted": 1, "unchanged": 1}, \
+        f"expected bagel to be inserted and espresso deleted but got {changes}"
+    mock_provider.embed_batch.assert_called_once_with(["bagel"])
+    inserted = mock_execute_values.call_args.args[2]
+    assert inserted[0][:8] == ("bagel", 10, "gluten", 250, 300, 2.5, embedding_hash("bagel", "test-model"),
+                               content_hash(menu_row(BAGEL))), f"expected bagel with its hashes but got {inserted}"
+    cursor(mock_repository).execute.assert_any_call("DELETE FROM products WHERE id = ANY(%s);", ([2],))
+    mock_repository.connection_pool.return_value.getconn.return_value.commit.assert_called_once()
+    mock_repository.invalidate.assert_called_once()
+
+
+def test_sync_products_updates_a_price_change_in_place_without_embedding(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE, price=4.0)]
+    mock_inventory = MagicMock()
+
+    # Act
+    changes = sync_products([LATTE], repository=mock_repository, inventory=mock_inventory)
+
+    # Assert
+    assert changes == {"inserted": 0, "updated": 1, "embedded": 0, "deleted": 0, "unchanged": 0}, \
+        f"expected latte to be updated but got {changes}"
+    mock_provider.embed_batch.assert_not_called()
+    assert mock_execute_values.call_args.args[2] == [(1, 5, "lactose", 120, 180, 5.0, content_hash(menu_row(LATTE)))], \
+        f"expected the new price of latte but got {mock_execute_values.call_args}"
+    mock_inventory.load.assert_called_once_with(force=True)
+
+
+def test_sync_products_recompiles_the_vocabulary_only_when_names_change(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    mock_vocabulary = MagicMock()
+
+    # Act
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE, price=4.0)]
+    sync_products([LATTE], repository=mock_repository, vocabulary=mock_vocabulary)
+    price_change_loads = mock_vocabulary.load.call_count
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE)]
+    sync_products([LATTE, BAGEL], repository=mock_repository, vocabulary=mock_vocabulary)
+
+    # Assert
+    assert price_change_loads == 0, f"expected a price change to keep the vocabulary but got {price_change_loads} loads"
+    mock_vocabulary.load.assert_called_once_with(mock_repository.connection_pool.return_value)
+
+
+def test_sync_products_re_embeds_every_row_when_the_model_changes(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE, model="old-model")]
+
+    # Act
+    changes = sync_products([LATTE], repository=mock_repository)
+
+    # Assert
+    assert changes == {"inserted": 0, "updated": 0, "embedded": 1, "deleted": 0, "unchanged": 0}, \
+        f"expected latte to be re-embedded but got {changes}"
+    mock_provider.embed_batch.assert_called_once_with(["latte"])
+    product_id, hashed, embedding = mock_execute_values.call_args.args[2][0]
+    assert (product_id, hashed, embedding.tolist()) == (1, embedding_hash("latte", "test-model"), [0.0]), \
+        f"expected the new embedding of latte but got {mock_execute_values.call_args}"
+
+
+def test_sync_products_keeps_other_rows_when_adding_a_single_item(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE)]
+
+    # Act
+    changes = sync_products([BAGEL], repository=mock_repository, delete_missing=False)
+
+    # Assert
+    assert changes == {"inserted": 1, "updated": 0, "embedded": 0, "deleted": 0, "unchanged": 0}, \
+        f"expected only bagel to be inserted but got {changes}"
+
+
+def test_sync_products_does_nothing_when_the_menu_is_unchanged(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE), stored(2, BAGEL)]
+
+    # Act
+    changes = sync_products([LATTE, BAGEL], repository=mock_repository)
+
+    # Assert
+    assert changes["unchanged"] == 2, f"expected both items to be unchanged but got {changes}"
+    mock_provider.embed_batch.assert_not_called()
+    mock_execute_values.assert_not_called()
+    mock_repository.invalidate.assert_not_called()
+
+
+def test_sync_products_rolls_back_when_a_statement_fails(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = []
+    mock_execute_values.side_effect = TimeoutError("timeout")
+    db_connection = mock_repository.connection_pool.return_value.getconn.return_value
+
+    # Act
+    with pytest.raises(TimeoutError):
+        sync_products([LATTE], repository=mock_repository)
+
+    # Assert
+    db_connection.rollback.assert_called_once()
+    db_connection.commit.assert_not_called()
+    mock_repository.connection_pool.return_value.putconn.assert_called_once_with(db_connection)
+    mock_repository.invalidate.assert_not_called()
+
+
+def test_sync_products_adds_the_hash_columns_only_when_they_are_missing(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE)]
+    alter = "ALTER TABLE products ADD COLUMN IF NOT EXISTS embedding_hash text;"
+
+    # Act
+    sync_products([LATTE], repository=mock_repository)
+    altered_with_columns = [call for call in cursor(mock_repository).execute.call_args_list if call.args[0] == alter]
+    cursor(mock_repository).fetchone.return_value = (0,)
+    sync_products([LATTE], repository=mock_repository)
+
+    # Assert
+    assert altered_with_columns == [], f"expected no ALTER when the columns exist but got {altered_with_columns}"
+    cursor(mock_repository).execute.assert_any_call(alter)
+
+
+def test_sync_products_embeds_before_the_write_transaction_opens(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = []
+    db_connection = mock_repository.connection_pool.return_value.getconn.return_value
+    autocommit = []
+    mock_provider.embed_batch.side_effect = lambda texts: autocommit.append(db_connection.autocommit) or [[0.0]]
+
+    # Act
+    sync_products([LATTE], repository=mock_repository)
+
+    # Assert
+    assert autocommit == [True], f"expected the embeddings outside of a transaction but got {autocommit}"
+    assert db_connection.autocommit is False, "expected the writes to run in a transaction"
+    db_connection.commit.assert_called_once()
+
+
+def test_sync_products_keeps_duplicate_names_when_adding_a_single_item(
+        mock_provider, mock_execute_values, mock_repository
+) -> None:
+    # Arrange
+    cursor(mock_repository).fetchall.return_value = [stored(1, LATTE, price=4.0), stored(2, LATTE)]
+
+    # Act
+    changes = sync_products([LATTE], repository=mock_repository, delete_missing=False)
+
+    # Assert
+    assert changes == {"inserted": 0, "updated": 1, "embedded": 0, "deleted": 0, "unchanged": 0}, \
+        f"expected only the first latte to be updated but got {changes}"
+    assert mock_execute_values.call_args.args[2][0][0] == 1, \
+        f"expected the first latte to be updated but got {mock_execute_values.call_args}"
@@ -0,0 +1,101 @@
+import os
+import pytest
+from mock import MagicMock, patch
+from src.vector_db.vector_index import HnswIndex, IvfflatIndex, vector_index
+from src.vector_db.benchmark_vector_index import benchmark_vector_index
+
+
+def test_ivfflat_index_builds_with_lists_and_searches_with_probes(
+
+) -> None:
+    # Arrange
+    index = IvfflatIndex(lists=16, probes=4)
+
+    # Act
+    create_sql = index.create_sql("products")
+    session_sql = index.session_sql()
+
+    # Assert
+    assert create_sql == "CREATE INDEX IF NOT EXISTS products_embeddings_idx ON products " \
+                         "USING ivfflat (embeddings vector_l2_ops) WITH (lists = 16);", \
+        f"expected ivfflat index with 16 lists but got {create_sql}"
+    assert session_sql == "SET ivfflat.probes = 4;", f"expected 4 probes but got {session_sql}"
+
+
+def test_hnsw_index_builds_with_m_and_ef_construction_and_searches_with_ef_search(
+
+) -> None:
+    # Arrange
+    index = HnswIndex(m=8, ef_construction=32, ef_search=20)
+
+    # Act
+    create_sql = index.create_sql("deals")
+    session_sql = index.session_sql()
+
+    # Assert
+    assert create_sql == "CREATE INDEX IF NOT EXISTS deals_embeddings_idx ON deals " \
+                         "USING hnsw (embeddings vector_l2_ops) WITH (m = 8, ef_construction = 32);", \
+        f"expected hnsw index but got {create_sql}"
+    assert session_sql == "SET hnsw.ef_search = 20;", f"expected ef_search of 20 but got {session_sql}"
+
+
+def test_vector_index_is_selected_by_environment_variables(
+
+) -> None:
+    # Arrange
+    environment = {"VECTOR_INDEX": "HNSW", "VECTOR_INDEX_M": "24", "VECTOR_INDEX_EF_SEARCH": "100"}
+
+    # Act
+    with patch.dict(os.environ, environment):
+        index = vector_index()
+
+    # Assert
+    assert isinstance(index, HnswIndex), f"expected hnsw index but got {index}"
+    assert (index.m, index.ef_construction, index.ef_search) == (24, 64, 100), \
+        f"expected m = 24, ef_construction = 64, ef_search = 100 but got {index}"
+
+
+def test_vector_index_defaults_to_ivfflat_sized_by_rows(
+
+) -> None:
+    # Arrange
+
+    # Act
+    with patch.dict(os.environ, {}, clear=True):
+        small_index = vector_index(num_rows=50)
+        large_index = vector_index(num_rows=20_000)
+
+    # Assert
+    assert small_index.lists == 8 and large_index.lists == 20, \
+        f"expected 8 and 20 lists but got {small_index} and {large_index}"
+
+
+def test_vector_index_raises_for_unknown_method(
+
+) -> None:
+    # Arrange
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        vector_index("annoy")
+
+
+def test_benchmark_vector_index_reports_recall_against_exact_search(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch('src.vector_db.benchmark_vector_index.register_vector')
+    mock_connection = MagicMock()
+    # exact search, then one index which misses the second query
+    mock_connection.cursor.return_value.fetchone.side_effect = [(1,), (2,), (1,), (3,)]
+    queries = [[0.1, 0.2], [0.3, 0.4]]
+
+    # Act
+    reports = benchmark_vector_index(mock_connection, "products", queries, [HnswIndex()])
+
+    # Assert
+    assert [report["index"] for report in reports] == ["exact", "hnsw(m = 16, ef_construction = 64, ef_search = 40)"], \
+        f"expected exact and hnsw reports but got {reports}"
+    assert reports[1]["recall@1"] == 0.5, f"expected recall@1 of 0.5 but got {reports[1]}"
+    assert reports[1]["p99_ms"] >= reports[1]["p50_ms"], f"expected p99 to be at least p50 but got {reports[1]}"
+    mock_connection.rollback.assert_called_once()
@@ -0,0 +1,81 @@
+import pytest
+from mock import MagicMock
+from src.vector_db.embedding_cache import EmbeddingCache, cache_key, set_cached_embedding
+from src.vector_db.warm_embedding_cache import warm_up_texts, warm_embedding_cache
+
+
+@pytest.fixture
+def mock_batch_api(
+        mocker
+) -> MagicMock:
+    return mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api',
+                        side_effect=lambda texts, _: [[float(len(text))] for text in texts])
+
+
+def test_warm_up_texts_collects_pattern_alternatives_and_menu_rows(
+
+) -> None:
+    # Arrange
+    menu = [{"MenuItem": {"item_name": "Black Coffee"}}, {"MenuItem": {"item_name": "Hash Browns"}}]
+    patterns = {"coffee": r'\b(coffee|black coffee)s?\b', "food": r'\b(fruit||oatmeal)s?\b'}
+
+    # Act
+    texts, skipped = warm_up_texts(menu, patterns)
+
+    # Assert
+    assert texts == ["coffee", "black coffee", "fruit", "oatmeal", "hash browns"], \
+        f"expected every distinct name but got {texts}"
+    assert skipped == [("", "empty alternative in food pattern")], f"expected empty alternative to be reported but got {skipped}"
+
+
+def test_warm_up_texts_reports_names_sharing_a_cache_entry(
+
+) -> None:
+    # Arrange
+    patterns = {"add_ons": r'\b(pump of caramel|pumps of caramel)s?\b'}
+
+    # Act
+    texts, skipped = warm_up_texts([], patterns)
+
+    # Assert
+    assert texts == ["pump of caramel"], f"expected plural to share the singular entry but got {texts}"
+    assert skipped == [("pumps of caramel", "shares a cache entry with pump of caramel")], \
+        f"expected plural to be reported but got {skipped}"
+
+
+def test_warm_embedding_cache_only_embeds_uncached_names_in_batches(
+        mock_batch_api
+) -> None:
+    # Arrange
+    embedding_cache = EmbeddingCache()
+    set_cached_embedding(embedding_cache, "latte", [0.1])
+    texts = ["latte", "mocha", "glazed donut", "oat milk"]
+
+    # Act
+    report = warm_embedding_cache(embedding_cache, "test_key", texts=texts, batch_size=2, progress=False)
+
+    # Assert
+    assert report == {"embedded": 3, "cached": 1, "skipped": []}, f"expected 3 names to be embedded but got {report}"
+    assert mock_batch_api.call_count == 2, f"expected 2 batched requests but got {mock_batch_api.call_count}"
+    assert embedding_cache.get_embedding("oat milk") is not None, "expected oat milk to be cached"
+
+
+def test_warm_embedding_cache_reports_failed_batches_and_continues(
+        mocker
+) -> None:
+    # Arrange
+    mocker.patch('src.ai_integration.embedding_provider.openai_embedding_batch_api',
+                 side_effect=[Exception("rate limited"), [[0.2]]])
+    mock_redis = MagicMock()
+    mock_redis.mget.return_value = [None, None]
+
+    # Act
+    report = warm_embedding_cache(mock_redis, texts=["latte", "mocha"], batch_size=1, progress=False)
+
+    # Assert
+    assert report["embedded"] == 1, f"expected second batch to be embedded but got {report}"
+    assert report["skipped"] == [("latte", "embedding request failed: rate limited")], \
+        f"expected failed name to be reported but got {report['skipped']}"
+    mock_redis.mset.assert_called_once()
+    assert list(mock_redis.mset.call_args[0][0]) == [cache_key("mocha")], \
+        f"expected only mocha to be cached but got {mock_redis.mset.call_args}"